@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+住所の正規化（Google Maps検索用・キャッシュキー用の共通実装）
+スクレイパー、Place ID収集、各トランジットスクリプトで同じ結果になるように一本化する。
+
+例: "東京都千代田区 神田須田町１丁目２０−１" → "東京都千代田区神田須田町1-20-1"
+    "東京都渋谷区神宮前２丁目２２番３号"   → "東京都渋谷区神宮前2-22-3"
+"""
+
+import re
+from functools import lru_cache
+
+CACHE_SIZE = 4096
+
+
+def _build_table():
+    """全角英数字→半角、各種ダッシュ→'-'、全角スペース→半角の変換表"""
+    table = {}
+    for offset in range(10):
+        table[0xFF10 + offset] = ord('0') + offset
+    for offset in range(26):
+        table[0xFF21 + offset] = ord('A') + offset
+        table[0xFF41 + offset] = ord('a') + offset
+    for dash in '−－‐‑‒–—―─ｰ':
+        table[ord(dash)] = '-'
+    table[ord('　')] = ' '
+    return table
+
+
+TRANSLATE_TABLE = _build_table()
+
+# 数字の間の長音記号（「２ー５」の入力ゆれ）。カタカナの「ー」は変換しない
+LONG_VOWEL_DASH = re.compile(r'(?<=\d)ー(?=\d)')
+# 丁目・番地・番の後に数字が続く場合はハイフンに（2丁目22番3号 → 2-22-3号）
+BLOCK_SEPARATOR = re.compile(r'(\d)\s*(?:丁目|番地|番)\s*(?=\d)')
+# 末尾側に残った番地・番・号は削除（3号 → 3、5番地 → 5）。末尾の「丁目」は残す
+BLOCK_SUFFIX = re.compile(r'(\d)\s*(?:番地|番|号)')
+WHITESPACE = re.compile(r'\s+')
+DASH_RUN = re.compile(r'-{2,}')
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def normalize_address(address):
+    """
+    住所を正規化（Google Maps検索用）
+
+    全角英数字・ダッシュの半角化、丁目/番地/号のハイフン形式への統一、空白の除去を行う。
+    None・空文字はそのまま返す
+    """
+    if not address:
+        return address
+    normalized = address.translate(TRANSLATE_TABLE)
+    normalized = LONG_VOWEL_DASH.sub('-', normalized)
+    normalized = BLOCK_SEPARATOR.sub(r'\1-', normalized)
+    normalized = BLOCK_SUFFIX.sub(r'\1', normalized)
+    normalized = WHITESPACE.sub('', normalized)
+    return DASH_RUN.sub('-', normalized)
+
+
+def normalize_many(addresses):
+    """
+    複数の住所をまとめて正規化
+
+    Returns:
+        入力と同じ順のリスト（重複はキャッシュから返す）
+    """
+    return [normalize_address(address) for address in addresses]
+
+
+def cache_info():
+    """メモ化の統計（hits, misses, maxsize, currsize）"""
+    return normalize_address.cache_info()
@@ -5,7 +5,6 @@ Yawaraへの複数ルート詳細分析
 - 銀座線を使った代替ルート
 - 徒歩時間を削減できる可能性のあるルート
 """
-import json
 import time
 from datetime import datetime
 from selenium import webdriver
@@ -14,6 +13,8 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 
+import atomic_io
+
 def analyze_route_details(driver, route_element, route_index):
     """ルートの詳細情報を解析"""
     try:
@@ -211,8 +212,7 @@ def main():
     
     # JSON形式で保存
     output_file = f"/app/output/japandatascience.com/timeline-mapping/data/yawara_route_analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(results, f, ensure_ascii=False, indent=2)
+    atomic_io.atomic_write_json(output_file, results)
     
     print(f"\n詳細な分析結果を保存しました: {output_file}")
 
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+到着時刻スイープのバッチ処理
+物件×目的地ごとに8:00〜20:00の到着時刻プロファイルを取得し、
+data/travel_time_profiles.jsonに保存する
+
+使い方:
+    python arrival_time_sweep.py [開始時刻] [終了時刻] [間隔(分)]
+    python arrival_time_sweep.py 08:00 20:00 60
+"""
+
+import sys
+import time
+from datetime import datetime, timedelta
+from jst import JST
+import logging
+
+sys.path.insert(0, '/app/output/japandatascience.com/timeline-mapping/api')
+
+from google_maps_scraper import GoogleMapsScraper
+from deadline import Deadline
+from json_data_loader import JsonDataLoader
+from travel_time_profile import TravelTimeProfile, load_profiles, save_profiles, profile_key, to_minute_of_day
+import log_setup
+
+logger = logging.getLogger(__name__)
+
+# 1スロットあたりの時間予算（秒）。ルートの予算はスロット数倍
+SLOT_BUDGET_SECONDS = 30
+
+
+def build_arrival_slots(start='08:00', end='20:00', step_minutes=60, days_ahead=1):
+    """明日の到着時刻スロットを生成"""
+    base = (datetime.now(JST) + timedelta(days=days_ahead)).replace(hour=0, minute=0, second=0, microsecond=0)
+    slots = []
+    minute = to_minute_of_day(start)
+    while minute <= to_minute_of_day(end):
+        slots.append(base + timedelta(minutes=minute))
+        minute += step_minutes
+    return slots
+
+
+def sweep_all(start='08:00', end='20:00', step_minutes=60):
+    """全物件×全目的地の到着時刻プロファイルを取得"""
+    data_loader = JsonDataLoader()
+    properties = data_loader.get_all_properties()
+    destinations = data_loader.get_all_destinations()
+    slots = build_arrival_slots(start, end, step_minutes)
+    profiles = load_profiles()
+
+    logger.info("=" * 60)
+    logger.info("⏱ 到着時刻スイープ開始")
+    logger.info("  ルート数: %d件", len(properties) * len(destinations))
+    logger.info("  スロット: %s〜%s / %s分間隔（%d件）", start, end, step_minutes, len(slots))
+    logger.info("=" * 60)
+
+    for prop in properties:
+        # 物件ごとに1セッションを使い回す
+        scraper = GoogleMapsScraper()
+        try:
+            for dest in destinations:
+                started = time.time()
+                try:
+                    samples = scraper.sweep_arrival_times(
+                        prop['address'], dest['address'], slots, dest_name=dest['name'],
+                        origin_place_id=prop.get('place_id'), dest_place_id=dest.get('place_id'),
+                        origin_lat=prop.get('lat'), origin_lon=prop.get('lon'),
+                        dest_lat=dest.get('lat'), dest_lon=dest.get('lon'),
+                        deadline=Deadline(SLOT_BUDGET_SECONDS * len(slots))
+                    )
+                except Exception as e:
+                    # このルートは前回のプロファイルを残し、次の目的地に進む
+                    logger.error("%s → %s: スイープ失敗 %s", prop['name'], dest['name'], e,
+                                 extra=log_setup.fields(property=prop['name'], destination=dest['name'],
+                                                        outcome='exception', error=str(e)))
+                    continue
+                profile = TravelTimeProfile()
+                for sample in samples:
+                    profile.add(sample['arrival_slot'], sample['travel_time'])
+                profiles[profile_key(prop['name'], dest['name'])] = profile
+                elapsed = time.time() - started
+                logger.info("%s → %s: %d/%dスロット (%.1f秒)", prop['name'], dest['name'],
+                            len(profile.points), len(slots), elapsed,
+                            extra=log_setup.fields(property=prop['name'], destination=dest['name'],
+                                                   outcome='swept', slots=len(slots),
+                                                   points=len(profile.points), elapsed=round(elapsed, 3)))
+            # 物件単位で保存（途中停止に備える）
+            save_profiles(profiles)
+        finally:
+            scraper.close()
+
+    logger.info("✅ プロファイル保存完了: %dルート", len(profiles))
+    return profiles
+
+
+if __name__ == "__main__":
+    log_setup.configure()
+    args = sys.argv[1:]
+    start = args[0] if len(args) > 0 else '08:00'
+    end = args[1] if len(args) > 1 else '20:00'
+    step = int(args[2]) if len(args) > 2 else 60
+    sweep_all(start, end, step)
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+data/*.json のクラッシュセーフな書き込み
+一時ファイルに書いてfsyncし、renameで置き換える。読み込み側（フロントエンドのfetch等）は
+ロック不要で、常に置き換え前か後の完全なファイルだけを見る。
+
+- snapshots=N: 置き換え前のファイルを .snapshots/<ファイル名>.<世代番号> に残し、新しい方からN世代保持
+  （ハードリンクなのでコピーは発生しない）。手動の *_backup_YYYYMMDD コピーの代わり
+- locked(path): 書き込み側同士の排他（<path>.lock へのflock、読み込み→更新→書き込みを囲む）
+"""
+
+import os
+import json
+import shutil
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows等ではプロセス内の排他のみ
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+LOCK_SUFFIX = '.lock'
+SNAPSHOT_DIR = '.snapshots'
+# 主要データファイルで保持する世代数
+SNAPSHOT_KEEP = int(os.environ.get('DATA_SNAPSHOT_KEEP', '5'))
+
+_locks = {}  # ロックファイルのパス -> [RLock, fd, 深さ]
+_locks_guard = threading.Lock()
+
+
+@contextmanager
+def locked(path):
+    """
+    パスへの書き込みを排他する（同じプロセス内では再入可能）
+    読み込みはロック不要
+    """
+    lock_path = os.path.abspath(path) + LOCK_SUFFIX
+    with _locks_guard:
+        entry = _locks.setdefault(lock_path, [threading.RLock(), None, 0])
+    with entry[0]:
+        if entry[2] == 0:
+            fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            entry[1] = fd
+        entry[2] += 1
+        try:
+            yield
+        finally:
+            entry[2] -= 1
+            if entry[2] == 0:
+                if fcntl is not None:
+                    fcntl.flock(entry[1], fcntl.LOCK_UN)
+                os.close(entry[1])
+                entry[1] = None
+
+
+def _fsync_dir(directory):
+    """renameをディスクに確定させる（ディレクトリのfsyncに対応しない環境では無視）"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def snapshot_dir(path):
+    return os.path.join(os.path.dirname(os.path.abspath(path)), SNAPSHOT_DIR)
+
+
+def list_generations(path):
+    """保存済みの世代番号（古い順）"""
+    directory = snapshot_dir(path)
+    prefix = os.path.basename(path) + '.'
+    if not os.path.isdir(directory):
+        return []
+    generations = []
+    for name in os.listdir(directory):
+        suffix = name[len(prefix):]
+        if name.startswith(prefix) and suffix.isdigit():
+            generations.append(int(suffix))
+    return sorted(generations)
+
+
+def generation_path(path, generation):
+    return os.path.join(snapshot_dir(path), f"{os.path.basename(path)}.{generation:04d}")
+
+
+def _snapshot(path, keep):
+    """現在のファイルを次の世代として残し、古い世代を削除"""
+    if not os.path.exists(path):
+        return None
+    generations = list_generations(path)
+    generations.append((generations[-1] + 1) if generations else 1)
+    target = generation_path(path, generations[-1])
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        os.link(path, target)
+    except OSError:
+        shutil.copy2(path, target)
+    for old in generations[:-keep]:
+        try:
+            os.remove(generation_path(path, old))
+        except OSError:
+            pass
+    return target
+
+
+@contextmanager
+def atomic_open(path, mode='w', encoding='utf-8', snapshots=0, temp_path=None):
+    """
+    一時ファイルに書き込み、正常終了時にpathへ置き換える（例外時は一時ファイルを削除）
+
+    Args:
+        snapshots: 置き換え前のファイルを残す世代数（0で残さない）
+        temp_path: 一時ファイルのパス（省略時は同じディレクトリに作成。途中経過を見せたい場合に指定）
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    if temp_path is None:
+        fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix='.tmp', dir=directory)
+        os.close(fd)
+    binary = 'b' in mode
+    try:
+        with open(temp_path, mode, **({} if binary else {'encoding': encoding})) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        with locked(path):
+            if os.path.exists(path):
+                # 既存ファイルの権限を引き継ぐ（mkstempは0600）
+                shutil.copymode(path, temp_path)
+                if snapshots:
+                    _snapshot(path, snapshots)
+            else:
+                os.chmod(temp_path, 0o644)
+            os.replace(temp_path, path)
+            _fsync_dir(directory)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write(path, data, snapshots=0):
+    """文字列またはバイト列をアトミックに書き込む"""
+    with atomic_open(path, 'wb' if isinstance(data, bytes) else 'w', snapshots=snapshots) as f:
+        f.write(data)
+
+
+def atomic_write_json(path, obj, snapshots=0, **dump_kwargs):
+    """
+    JSONをアトミックに書き込む
+    dump_kwargsの既定は ensure_ascii=False, indent=2（リポジトリ内のJSONの書式）
+    """
+    dump_kwargs.setdefault('ensure_ascii', False)
+    dump_kwargs.setdefault('indent', 2)
+    with atomic_open(path, snapshots=snapshots) as f:
+        json.dump(obj, f, **dump_kwargs)
+
+
+def restore_generation(path, generation=None, snapshots=SNAPSHOT_KEEP):
+    """
+    保存済みの世代に戻す（省略時は直前の世代）。現在のファイルも新しい世代として残る
+
+    Returns:
+        戻した世代のスナップショットのパス
+    """
+    generations = list_generations(path)
+    if not generations:
+        raise FileNotFoundError(f"スナップショットがありません: {path}")
+    source = generation_path(path, generation if generation is not None else generations[-1])
+    with open(source, 'rb') as f:
+        data = f.read()
+    atomic_write(path, data, snapshots=snapshots)
+    logger.info("%s を %s から復元しました", path, source)
+    return source
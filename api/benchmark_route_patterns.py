@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ルートカード抽出のマイクロベンチマーク
+ゴールデンテキスト（tests/golden_route_cards.json）に対して、従来のインライン正規表現
+（項目ごとにre.search/re.findall）と route_patterns.extract_card の
+1カードあたりの時間を比較し、結果がゴールデンと一致するかも表示する
+
+使用方法:
+    python benchmark_route_patterns.py --repeat 20000
+"""
+
+import os
+import re
+import json
+import argparse
+import timeit
+
+import route_patterns
+
+GOLDEN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tests', 'golden_route_cards.json')
+
+
+def legacy_extract(text):
+    """変更前の extract_route_details の抽出処理（比較用）"""
+    hour_match = re.search(r'(\d+)\s*時間', text)
+    minute_match = re.search(r'(\d+)\s*分', text)
+    if not minute_match and not hour_match:
+        travel_time = None
+    else:
+        hours = int(hour_match.group(1)) if hour_match else 0
+        minutes = int(minute_match.group(1)) if minute_match else 0
+        travel_time = hours * 60 + minutes
+    time_pattern = r'(\d{1,2}:\d{2})[^\d]*(?:\([^)]+\)[^\d]*)?\s*-\s*(\d{1,2}:\d{2})'
+    time_match = re.search(time_pattern, text)
+    fare_match = re.search(r'([\d,]+)\s*円', text)
+    line_matches = re.findall(r'([^\s]+(?:線|ライン|Line))', text)
+    return {
+        'travel_time': travel_time,
+        'departure_time': time_match.group(1) if time_match else None,
+        'arrival_time': time_match.group(2) if time_match else None,
+        'fare': int(fare_match.group(1).replace(',', '')) if fare_match else None,
+        'train_lines': list(set(line_matches)),
+    }
+
+
+def compare(card, result):
+    """ゴールデンと一致しない項目名"""
+    expected = card['expected']
+    return [key for key in result if key in expected and
+            (sorted(result[key]) != sorted(expected[key]) if key == 'train_lines' else result[key] != expected[key])]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ルートカード抽出のベンチマーク')
+    parser.add_argument('--repeat', type=int, default=20000, help='カードごとの繰り返し回数')
+    args = parser.parse_args()
+
+    with open(GOLDEN_FILE, 'r', encoding='utf-8') as f:
+        cards = json.load(f)['cards']
+
+    print(f"{'カード':<28} {'従来(µs)':>10} {'route_patterns(µs)':>18}  不一致（従来 / route_patterns）")
+    totals = [0.0, 0.0]
+    for card in cards:
+        text = card['text']
+        row = []
+        for i, func in enumerate((legacy_extract, route_patterns.extract_card)):
+            seconds = min(timeit.repeat(lambda: func(text), number=args.repeat, repeat=3))
+            row.append(seconds / args.repeat * 1e6)
+            totals[i] += row[-1]
+        legacy_diff = compare(card, legacy_extract(text))
+        new_diff = compare(card, route_patterns.extract_card(text))
+        print(f"{card['name']:<28} {row[0]:>10.2f} {row[1]:>18.2f}  "
+              f"{','.join(legacy_diff) or '-'} / {','.join(new_diff) or '-'}")
+    print(f"{'合計':<28} {totals[0]:>10.2f} {totals[1]:>18.2f}")
+
+
+if __name__ == "__main__":
+    main()
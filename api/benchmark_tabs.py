@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+タブ多重化のベンチマーク
+1物件→N目的地のルートを、1セッション1タブ（従来のscrape_route逐次）と
+1セッションKタブ（TabMultiplexer）で取得し、ルート/分とメモリ/ルートを比較する
+
+メモリは読み込み完了時点の全タブのJSヒープ合計（performance.memory）のピーク。
+--rss-cmd を指定すると、同じタイミングでそのコマンドの出力（バイト数）も記録する
+（例: Seleniumノードのコンテナ内で `ps -C chrome -o rss= | awk '{s+=$1} END {print s*1024}'`）
+
+使用方法:
+    python benchmark_tabs.py --tabs 3 --routes 9
+"""
+
+import sys
+import json
+import time
+import argparse
+import subprocess
+from datetime import datetime, timedelta
+from jst import JST
+
+sys.path.insert(0, '/app/output/japandatascience.com/timeline-mapping/api')
+
+from google_maps_scraper import GoogleMapsScraper
+from json_data_loader import JsonDataLoader
+from tab_multiplexer import TabMultiplexer, browser_memory_bytes
+import log_setup
+
+
+class MemoryProbe:
+    """読み込み完了時のメモリのピークを記録"""
+
+    def __init__(self, driver_getter, rss_cmd=None):
+        self.driver_getter = driver_getter
+        self.rss_cmd = rss_cmd
+        self.peak_heap = 0
+        self.peak_rss = 0
+
+    def __call__(self):
+        driver = self.driver_getter()
+        self.peak_heap = max(self.peak_heap, browser_memory_bytes(driver))
+        if self.rss_cmd:
+            try:
+                output = subprocess.run(self.rss_cmd, shell=True, capture_output=True,
+                                        text=True, timeout=10).stdout.strip()
+                self.peak_rss = max(self.peak_rss, int(float(output)))
+            except (ValueError, subprocess.SubprocessError):
+                pass
+
+
+def build_jobs(routes):
+    """最初の物件から各目的地へのジョブを作る"""
+    loader = JsonDataLoader()
+    prop = loader.get_all_properties()[0]
+    destinations = loader.get_all_destinations()[:routes]
+    arrival_time = (datetime.now(JST) + timedelta(days=1)).replace(hour=10, minute=0, second=0, microsecond=0)
+    return [{
+        'origin_address': prop['address'],
+        'dest_address': dest['address'],
+        'dest_name': dest['name'],
+        'arrival_time': arrival_time,
+        'origin_place_id': prop.get('place_id'),
+        'origin_lat': prop.get('lat'),
+        'origin_lon': prop.get('lon'),
+        'dest_place_id': dest.get('place_id'),
+        'dest_lat': dest.get('lat'),
+        'dest_lon': dest.get('lon')
+    } for dest in destinations]
+
+
+def summarize(mode, tabs, jobs, results, elapsed, probe):
+    success = sum(1 for r in results if r and r.get('success'))
+    return {
+        'mode': mode,
+        'tabs': tabs,
+        'routes': len(jobs),
+        'success': success,
+        'elapsed_seconds': round(elapsed, 1),
+        'routes_per_minute': round(len(jobs) / elapsed * 60, 2) if elapsed > 0 else None,
+        'peak_js_heap_mb': round(probe.peak_heap / 1024 / 1024, 1),
+        'js_heap_mb_per_route_in_flight': round(probe.peak_heap / 1024 / 1024 / tabs, 1),
+        'peak_rss_mb': round(probe.peak_rss / 1024 / 1024, 1) if probe.peak_rss else None
+    }
+
+
+def run_baseline(jobs, rss_cmd):
+    scraper = GoogleMapsScraper()
+    probe = MemoryProbe(lambda: scraper.driver, rss_cmd)
+    original_extract = scraper.extract_route_details
+
+    def extract_with_probe(*args, **kwargs):
+        probe()
+        return original_extract(*args, **kwargs)
+
+    scraper.extract_route_details = extract_with_probe
+    try:
+        started = time.time()
+        results = [scraper.scrape_route(**job) for job in jobs]
+        elapsed = time.time() - started
+    finally:
+        scraper.close()
+    return summarize('single_tab', 1, jobs, results, elapsed, probe)
+
+
+def run_multiplexed(jobs, tabs, rss_cmd):
+    scraper = GoogleMapsScraper()
+    probe = MemoryProbe(lambda: scraper.driver, rss_cmd)
+    try:
+        started = time.time()
+        results = TabMultiplexer(scraper, tabs=tabs, on_loaded=probe).scrape_routes(jobs)
+        elapsed = time.time() - started
+    finally:
+        scraper.close()
+    return summarize('multiplexed', tabs, jobs, results, elapsed, probe)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='タブ多重化のベンチマーク')
+    parser.add_argument('--tabs', type=int, default=3, help='多重化するタブ数')
+    parser.add_argument('--routes', type=int, default=9, help='取得するルート数')
+    parser.add_argument('--rss-cmd', help='ブラウザのRSS（バイト）を出力するシェルコマンド')
+    parser.add_argument('--skip-baseline', action='store_true', help='従来方式の計測を省略')
+    args = parser.parse_args()
+
+    jobs = build_jobs(args.routes)
+    report = []
+    if not args.skip_baseline:
+        report.append(run_baseline(jobs, args.rss_cmd))
+    report.append(run_multiplexed(jobs, args.tabs, args.rss_cmd))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    log_setup.configure()
+    main()
@@ -10,19 +10,43 @@ import json
 import time
 import re
 import logging
-from datetime import datetime
 from urllib.parse import quote
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
+import request_scheduler
+import selenium_hub
+import address_normalizer
+import atomic_io
+import log_setup
 
-# ロギング設定
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
+DATA_DIR = '/app/output/japandatascience.com/timeline-mapping/data'
+PROPERTIES_BASE_FILE = f'{DATA_DIR}/properties_base.json'
+DESTINATIONS_FILE = f'{DATA_DIR}/destinations.json'
+
+def merge_place_ids(path, list_key, results):
+    """
+    ロックを取ってファイルを読み直し、(名前, 住所)が一致する要素に取得結果を反映して保存する
+
+    Returns:
+        保存したデータ
+    """
+    with atomic_io.locked(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        for item in data[list_key]:
+            result = results.get((item['name'], item['address']))
+            if result is None:
+                continue
+            item['place_id'] = result['place_id']
+            item['place_id_format'] = result['place_id_format']
+            item['lat'] = result['lat']
+            item['lon'] = result['lon']
+        atomic_io.atomic_write_json(path, data, snapshots=atomic_io.SNAPSHOT_KEEP)
+    return data
+
 class PlaceIdCollector:
     """Place ID収集専用クラス"""
     
@@ -40,39 +64,17 @@ class PlaceIdCollector:
         chrome_options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36')
         chrome_options.add_argument('--accept-language=ja-JP,ja;q=0.9')
         
-        self.driver = webdriver.Remote(
-            command_executor='http://selenium:4444/wd/hub',
-            options=chrome_options
-        )
+        self.driver = selenium_hub.create_remote(chrome_options)
         self.driver.set_page_load_timeout(30)
         self.driver.implicitly_wait(10)
         logger.info("WebDriver初期化完了")
     
     def normalize_address(self, address):
         """
-        住所を正規化（Google Maps検索用）
+        住所を正規化（Google Maps検索用、address_normalizerの共通実装）
         例: "東京都千代田区 神田須田町１丁目２０−１" → "東京都千代田区神田須田町1-20-1"
         """
-        # 全角スペースを削除
-        normalized = address.replace('　', '').replace(' ', '')
-        
-        # 「丁目」を「-」に変換
-        normalized = re.sub(r'(\d+)丁目(\d+)−(\d+)', r'\1-\2-\3', normalized)
-        normalized = re.sub(r'(\d+)丁目(\d+)番(\d+)', r'\1-\2-\3', normalized)
-        normalized = re.sub(r'(\d+)丁目(\d+)', r'\1-\2', normalized)
-        
-        # 「番」「号」を削除
-        normalized = re.sub(r'(\d+)番(\d+)号', r'\1-\2', normalized)
-        normalized = re.sub(r'(\d+)番', r'\1', normalized)
-        normalized = re.sub(r'(\d+)号', r'\1', normalized)
-        
-        # 全角数字を半角に
-        normalized = normalized.translate(str.maketrans('０１２３４５６７８９', '0123456789'))
-        
-        # 全角ハイフンを半角に
-        normalized = normalized.replace('−', '-').replace('ー', '-')
-        
-        return normalized
+        return address_normalizer.normalize_address(address)
     
     def extract_place_id(self, address, name=None, category=None):
         """
@@ -96,6 +98,7 @@ class PlaceIdCollector:
             logger.info(f"🔍 Place ID取得中: {name or address[:30]}...")
             logger.debug(f"  URL: {url}")
             
+            request_scheduler.acquire(request_scheduler.PLACE_ID)
             self.driver.get(url)
             time.sleep(3)  # ページ読み込み待機
             
@@ -158,72 +161,48 @@ class PlaceIdCollector:
             }
     
     def update_json_files(self):
-        """JSONファイルを更新"""
-        
-        # バックアップ作成
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        """
+        JSONファイルを更新
+        Place IDの取得中はロックせず、書き込み時にロックを取って読み直し、取得結果を反映する
+        （取得中に他のプロセスが加えた変更を上書きしない）
+        """
         
         # properties_base.json読み込み
-        with open('/app/output/japandatascience.com/timeline-mapping/data/properties_base.json', 'r', encoding='utf-8') as f:
+        with open(PROPERTIES_BASE_FILE, 'r', encoding='utf-8') as f:
             properties_data = json.load(f)
         
-        # バックアップ保存
-        with open(f'/app/output/japandatascience.com/timeline-mapping/data/properties_base_backup_{timestamp}.json', 'w', encoding='utf-8') as f:
-            json.dump(properties_data, f, ensure_ascii=False, indent=2)
-        
         # destinations.json読み込み
-        with open('/app/output/japandatascience.com/timeline-mapping/data/destinations.json', 'r', encoding='utf-8') as f:
+        with open(DESTINATIONS_FILE, 'r', encoding='utf-8') as f:
             destinations_data = json.load(f)
         
-        # バックアップ保存
-        with open(f'/app/output/japandatascience.com/timeline-mapping/data/destinations_backup_{timestamp}.json', 'w', encoding='utf-8') as f:
-            json.dump(destinations_data, f, ensure_ascii=False, indent=2)
-        
         print("\n" + "="*60)
         print("Place ID収集開始")
         print("="*60)
         
         # 物件のPlace ID取得
         print(f"\n物件: {len(properties_data['properties'])}件")
+        property_results = {}
         for i, prop in enumerate(properties_data['properties'], 1):
             result = self.extract_place_id(prop['address'], prop['name'])
-            
-            # JSONに追加
-            prop['place_id'] = result['place_id']
-            prop['place_id_format'] = result['place_id_format']
-            prop['lat'] = result['lat']
-            prop['lon'] = result['lon']
+            property_results[(prop['name'], prop['address'])] = result
             
             status = "✓" if result['place_id'] else "✗"
             print(f"  [{i:2d}/{len(properties_data['properties'])}] {status} {prop['name']}")
-            
-            # レート制限対策
-            time.sleep(1)
         
         # 目的地のPlace ID取得
         print(f"\n目的地: {len(destinations_data['destinations'])}件")
+        destination_results = {}
         for i, dest in enumerate(destinations_data['destinations'], 1):
             # カテゴリも渡す
             result = self.extract_place_id(dest['address'], dest['name'], dest.get('category'))
-            
-            # JSONに追加
-            dest['place_id'] = result['place_id']
-            dest['place_id_format'] = result['place_id_format']
-            dest['lat'] = result['lat']
-            dest['lon'] = result['lon']
+            destination_results[(dest['name'], dest['address'])] = result
             
             status = "✓" if result['place_id'] else "✗"
             print(f"  [{i:2d}/{len(destinations_data['destinations'])}] {status} {dest['name']}")
-            
-            # レート制限対策
-            time.sleep(1)
-        
-        # ファイル保存
-        with open('/app/output/japandatascience.com/timeline-mapping/data/properties_base.json', 'w', encoding='utf-8') as f:
-            json.dump(properties_data, f, ensure_ascii=False, indent=2)
         
-        with open('/app/output/japandatascience.com/timeline-mapping/data/destinations.json', 'w', encoding='utf-8') as f:
-            json.dump(destinations_data, f, ensure_ascii=False, indent=2)
+        # ファイル保存（アトミックに置き換え、置き換え前の内容は世代スナップショットに残す）
+        properties_data = merge_place_ids(PROPERTIES_BASE_FILE, 'properties', property_results)
+        destinations_data = merge_place_ids(DESTINATIONS_FILE, 'destinations', destination_results)
         
         # 統計
         props_with_id = sum(1 for p in properties_data['properties'] if p.get('place_id'))
@@ -261,4 +240,5 @@ def main():
         collector.close()
 
 if __name__ == "__main__":
+    log_setup.configure()
     main()
\ No newline at end of file
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+通勤時間マトリクスの列指向バイナリ出力（フロントエンド配信用）
+properties.json（物件 × 目的地のルート）を、文字列表（目的地・路線・駅）と
+型付き配列（所要時間・運賃・徒歩時間・利用駅・路線）に変換する。
+
+    python commute_matrix.py [properties.json] [出力ディレクトリ]
+
+出力:
+- commute_matrix.<版>.bin      各列をリトルエンディアンで連結（要素サイズ境界に整列）
+- commute_matrix.<版>.bin.gz   gzip圧縮版（brotliがあれば .bin.br も）
+- commute_matrix.json          マニフェスト（文字列表・列の位置・ファイル一覧）
+
+<版>はバイナリの内容ハッシュ。マニフェストを最後に置き換えるため、読み込み側は
+常にマニフェストと対応するバイナリを取得できる（直前の版のファイルも残す）。
+マトリクスのセル番号は 物件番号 × 目的地数 + 目的地番号。欠損値は型ごとの最大値。
+"""
+
+import os
+import sys
+import gzip
+import json
+import hashlib
+import logging
+from array import array
+from datetime import datetime
+
+import atomic_io
+import log_setup
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+FORMAT = 'commute-matrix'
+FORMAT_VERSION = 1
+MANIFEST_NAME = 'commute_matrix.json'
+BINARY_PREFIX = 'commute_matrix.'
+# 公開中の版と直前の版のバイナリを残す（取得途中のクライアント用）
+KEEP_VERSIONS = 2
+
+DATA_DIR = '/app/output/japandatascience.com/timeline-mapping/data'
+
+# 型 → (arrayの型コード, バイト数, 欠損値)
+DTYPES = {
+    'uint8': ('B', 1, 0xFF),
+    'uint16': ('H', 2, 0xFFFF),
+    'uint32': ('I', 4, 0xFFFFFFFF),
+}
+
+
+class StringTable:
+    """文字列 → 番号（初出順）"""
+
+    def __init__(self, initial=()):
+        self.index = {}
+        self.values = []
+        for value in initial:
+            self.add(value)
+
+    def add(self, value):
+        number = self.index.get(value)
+        if number is None:
+            number = self.index[value] = len(self.values)
+            self.values.append(value)
+        return number
+
+
+def parse_rent(rent):
+    """"280,000円" → 280000（数値でなければ欠損）"""
+    if isinstance(rent, (int, float)):
+        return int(rent)
+    digits = ''.join(ch for ch in str(rent or '') if ch.isdigit())
+    return int(digits) if digits else None
+
+
+def route_destination(route):
+    """ルートの目的地名（properties.jsonは表示名、詳細版はdestination_name）"""
+    return route.get('destination_name') or route.get('destination')
+
+
+def route_lines(route):
+    """利用路線（train_lines、なければdetails.trainsから）"""
+    if route.get('train_lines'):
+        return route['train_lines']
+    details = route.get('details') or {}
+    return [train['line'] for train in details.get('trains') or [] if train.get('line')]
+
+
+def route_walk(route):
+    """徒歩時間（分）。total_walk_time → details の順に探す"""
+    if route.get('total_walk_time') is not None:
+        return route['total_walk_time']
+    details = route.get('details') or {}
+    if details.get('walk_only'):
+        return details.get('walk_time') or route.get('total_time')
+    if 'walk_to_station' in details or 'walk_from_station' in details:
+        return (details.get('walk_to_station') or 0) + (details.get('walk_from_station') or 0)
+    return None
+
+
+def _cell(value, dtype):
+    """欠損・範囲外は欠損値に"""
+    missing = DTYPES[dtype][2]
+    if value is None or isinstance(value, bool):
+        return missing
+    value = int(round(value))
+    return value if 0 <= value < missing else missing
+
+
+def build_matrix(properties, destination_order=()):
+    """
+    物件リスト → (マニフェストの内容, 列名 → (型, array))
+
+    Args:
+        properties: properties.jsonの物件要素
+        destination_order: 目的地名の表示順（destinations.jsonの順など）。含まれない目的地は初出順で後ろに追加
+    """
+    properties = list(properties)
+    destinations = StringTable(destination_order)
+    for prop in properties:
+        for route in prop.get('routes') or []:
+            destinations.add(route_destination(route))
+    lines = StringTable()
+    stations = StringTable()
+
+    cells = len(properties) * len(destinations.values)
+    total_time = array('H', [DTYPES['uint16'][2]]) * cells
+    fare = array('H', [DTYPES['uint16'][2]]) * cells
+    walk = array('B', [DTYPES['uint8'][2]]) * cells
+    station = array('H', [DTYPES['uint16'][2]]) * cells
+    cell_lines = [()] * cells
+
+    for p, prop in enumerate(properties):
+        for route in prop.get('routes') or []:
+            cell = p * len(destinations.values) + destinations.index[route_destination(route)]
+            total_time[cell] = _cell(route.get('total_time'), 'uint16')
+            fare[cell] = _cell(route.get('fare'), 'uint16')
+            walk[cell] = _cell(route_walk(route), 'uint8')
+            station_used = (route.get('details') or {}).get('station_used')
+            if station_used:
+                station[cell] = stations.add(station_used)
+            cell_lines[cell] = tuple(lines.add(line) for line in route_lines(route))
+
+    # 路線はセルごとの可変長リスト（CSR形式: line_offsets[i]〜line_offsets[i+1]がセルiの路線）
+    line_offsets = array('I', [0])
+    line_ids = array('H')
+    for ids in cell_lines:
+        line_ids.extend(ids)
+        line_offsets.append(len(line_ids))
+
+    rent = array('I', (_cell(parse_rent(prop.get('rent')), 'uint32') for prop in properties))
+
+    columns = {
+        'total_time': ('uint16', total_time),
+        'fare': ('uint16', fare),
+        'walk_time': ('uint8', walk),
+        'station': ('uint16', station),
+        'line_offsets': ('uint32', line_offsets),
+        'line_ids': ('uint16', line_ids),
+        'rent': ('uint32', rent),
+    }
+    content = {
+        'property_count': len(properties),
+        'destination_count': len(destinations.values),
+        'missing': {dtype: spec[2] for dtype, spec in DTYPES.items()},
+        'strings': {
+            'destinations': destinations.values,
+            'lines': lines.values,
+            'stations': stations.values,
+        },
+        'properties': {
+            'name': [prop.get('name') for prop in properties],
+            'address': [prop.get('address') for prop in properties],
+            'rent_display': [prop.get('rent') for prop in properties],
+            'area': [prop.get('area') for prop in properties],
+        },
+    }
+    return content, columns
+
+
+def pack_columns(columns):
+    """
+    列を連結したバイト列と列の位置情報
+
+    各列は要素サイズの倍数の位置から始まる（JSのTypedArrayをコピーなしで作れる）
+    """
+    buffer = bytearray()
+    layout = {}
+    for name, (dtype, values) in columns.items():
+        size = DTYPES[dtype][1]
+        buffer.extend(b'\0' * (-len(buffer) % size))
+        data = array(values.typecode, values)
+        if data.itemsize != size:
+            raise ValueError(f'{name}: array型の要素サイズが{size}バイトではありません')
+        if sys.byteorder == 'big':
+            data.byteswap()
+        layout[name] = {'dtype': dtype, 'offset': len(buffer), 'length': len(values)}
+        buffer.extend(data.tobytes())
+    return bytes(buffer), layout
+
+
+def _file_entry(path, data):
+    return {'path': os.path.basename(path), 'bytes': len(data)}
+
+
+def export_matrix(properties, out_dir=DATA_DIR, destination_order=(), source=None):
+    """
+    マトリクスを書き出す
+
+    Returns:
+        マニフェスト（dict）
+    """
+    content, columns = build_matrix(properties, destination_order)
+    raw, layout = pack_columns(columns)
+    version = hashlib.sha256(raw).hexdigest()[:16]
+
+    base = os.path.join(out_dir, f'{BINARY_PREFIX}{version}.bin')
+    files = {}
+    variants = [('raw', base, raw), ('gzip', base + '.gz', gzip.compress(raw, 9, mtime=0))]
+    if brotli is not None:
+        variants.append(('br', base + '.br', brotli.compress(raw, quality=11)))
+    for kind, path, data in variants:
+        if not os.path.exists(path):
+            atomic_io.atomic_write(path, data)
+        files[kind] = _file_entry(path, data)
+
+    manifest = {
+        'format': FORMAT,
+        'format_version': FORMAT_VERSION,
+        'version': version,
+        'sha256': hashlib.sha256(raw).hexdigest(),
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'source': source,
+        **content,
+        'columns': layout,
+        'files': files,
+    }
+    # マニフェストの置き換えが公開の区切り
+    atomic_io.atomic_write_json(os.path.join(out_dir, MANIFEST_NAME), manifest, separators=(',', ':'),
+                                indent=None)
+    _prune(out_dir, version)
+
+    logger.info("通勤マトリクス出力: %d物件 × %d目的地 %dB (gzip %dB) 版 %s",
+                manifest['property_count'], manifest['destination_count'], len(raw), files['gzip']['bytes'],
+                version,
+                extra=log_setup.fields(properties=manifest['property_count'],
+                                       destinations=manifest['destination_count'], bytes=len(raw),
+                                       gzip_bytes=files['gzip']['bytes'], version=version))
+    return manifest
+
+
+def _prune(out_dir, current):
+    """公開中・直前以外の版のバイナリを削除"""
+    versions = {}
+    for name in os.listdir(out_dir):
+        if name.startswith(BINARY_PREFIX) and '.bin' in name:
+            version = name[len(BINARY_PREFIX):].split('.', 1)[0]
+            path = os.path.join(out_dir, name)
+            versions.setdefault(version, []).append(path)
+    ordered = sorted(versions, key=lambda v: max(os.path.getmtime(p) for p in versions[v]), reverse=True)
+    ordered.remove(current)
+    for version in ordered[KEEP_VERSIONS - 1:]:
+        for path in versions[version]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def load_matrix(manifest_path):
+    """
+    マニフェストと対応するバイナリを読み込む（検証・デバッグ用）
+
+    Returns:
+        マニフェストに 'data'（列名 → list）を追加したdict
+    """
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('format') != FORMAT or manifest.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"未対応の形式です: {manifest.get('format')} v{manifest.get('format_version')}")
+    directory = os.path.dirname(manifest_path)
+    with open(os.path.join(directory, manifest['files']['raw']['path']), 'rb') as f:
+        raw = f.read()
+    if hashlib.sha256(raw).hexdigest() != manifest['sha256']:
+        raise ValueError('バイナリがマニフェストと一致しません')
+
+    data = {}
+    for name, column in manifest['columns'].items():
+        code, size, _ = DTYPES[column['dtype']]
+        values = array(code)
+        values.frombytes(raw[column['offset']:column['offset'] + column['length'] * size])
+        if sys.byteorder == 'big':
+            values.byteswap()
+        data[name] = values.tolist()
+    manifest['data'] = data
+    return manifest
+
+
+def iter_routes(matrix):
+    """
+    load_matrixの結果をルート単位で返す
+
+    Yields:
+        (物件番号, 目的地名, {'total_time', 'fare', 'walk_time', 'station', 'train_lines'})
+    """
+    data = matrix['data']
+    missing = matrix['missing']
+    strings = matrix['strings']
+    width = matrix['destination_count']
+    for cell, minutes in enumerate(data['total_time']):
+        if minutes == missing['uint16']:
+            continue
+        start, end = data['line_offsets'][cell], data['line_offsets'][cell + 1]
+        fare = data['fare'][cell]
+        walk = data['walk_time'][cell]
+        station = data['station'][cell]
+        yield cell // width, strings['destinations'][cell % width], {
+            'total_time': minutes,
+            'fare': None if fare == missing['uint16'] else fare,
+            'walk_time': None if walk == missing['uint8'] else walk,
+            'station': None if station == missing['uint16'] else strings['stations'][station],
+            'train_lines': [strings['lines'][i] for i in data['line_ids'][start:end]],
+        }
+
+
+def export_file(source, out_dir=None):
+    """properties.jsonを読み込んで書き出す（目的地の順は同じディレクトリのdestinations.jsonに従う）"""
+    directory = os.path.dirname(os.path.abspath(source))
+    with open(source, 'r', encoding='utf-8') as f:
+        properties = json.load(f)['properties']
+    order = []
+    destinations_file = os.path.join(directory, 'destinations.json')
+    if os.path.exists(destinations_file):
+        with open(destinations_file, 'r', encoding='utf-8') as f:
+            order = [dest['name'] for dest in json.load(f).get('destinations', [])]
+    return export_matrix(properties, out_dir or directory, order, source=os.path.basename(source))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    export_file(sys.argv[1] if len(sys.argv) > 1 else os.path.join(DATA_DIR, 'properties.json'),
+                sys.argv[2] if len(sys.argv) > 2 else None)
@@ -11,20 +11,22 @@ import os
 import json
 import time
 from datetime import datetime, timedelta
-import pytz
+from jst import JST
 import logging
 
 sys.path.insert(0, '/app/output/japandatascience.com/timeline-mapping/api')
 
 from google_maps_scraper import GoogleMapsScraper
 from json_data_loader import JsonDataLoader
+import atomic_io
+import log_setup
+from retry_scheduler import RetryScheduler
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
+# 再試行に使うセッション数
+RETRY_SESSIONS = int(os.environ.get('RETRY_SESSIONS', '2'))
+
 def retry_failed_routes():
     """La Belle三越前の失敗ルートを再試行"""
     logger.info("=" * 60)
@@ -43,25 +45,34 @@ def retry_failed_routes():
     ]
     
     # 到着時刻設定
-    jst = pytz.timezone('Asia/Tokyo')
-    tomorrow = datetime.now(jst) + timedelta(days=1)
+    tomorrow = datetime.now(JST) + timedelta(days=1)
     arrival_time = tomorrow.replace(hour=10, minute=0, second=0, microsecond=0)
     
-    scraper = GoogleMapsScraper()
-    scraper.setup_driver()
+    # 複数セッションで取得し、失敗は分類ごとの方針（待ち時間・取得方法・別セッション）で再試行
+    sessions = [GoogleMapsScraper() for _ in range(RETRY_SESSIONS)]
+    try:
+        scheduler = RetryScheduler(sessions)
+        outcomes = scheduler.run([
+            {'origin_address': origin, 'dest_address': dest, 'dest_name': dest_name, 'arrival_time': arrival_time}
+            for origin, dest, dest_name in failed_routes
+        ])
+    finally:
+        for scraper in sessions:
+            scraper.close()
     
     results = []
-    for origin, dest, dest_name in failed_routes:
-        logger.info(f"再試行: La Belle → {dest_name}")
-        start_time = time.time()
-        
-        result = scraper.scrape_route(origin, dest, dest_name, arrival_time)
-        elapsed = time.time() - start_time
-        
+    for (origin, dest, dest_name), result in zip(failed_routes, outcomes):
+        elapsed = result['processing_time']
         if result.get('success'):
-            logger.info(f"  ✅ 成功: {result['travel_time']}分 ({elapsed:.1f}秒)")
+            logger.info("  %s: 成功 %s分 (%.1f秒, 試行%d回)", dest_name, result['travel_time'], elapsed,
+                        len(result['attempts']),
+                        extra=log_setup.fields(destination=dest_name, outcome='success',
+                                               travel_time=result['travel_time'], attempts=result['attempts']))
         else:
-            logger.error(f"  ❌ 失敗: {result.get('error', '不明')} ({elapsed:.1f}秒)")
+            logger.error("  %s: 失敗 %s [%s] (%.1f秒, 試行%d回)", dest_name, result.get('error', '不明'),
+                         result.get('error_code'), elapsed, len(result['attempts']),
+                         extra=log_setup.fields(destination=dest_name, outcome='failed',
+                                                error_code=result.get('error_code'), attempts=result['attempts']))
         
         results.append({
             'property_name': 'La Belle 三越前 0702',
@@ -73,12 +84,15 @@ def retry_failed_routes():
             'route_type': result.get('route_type'),
             'train_lines': result.get('train_lines', []),
             'fare': result.get('fare'),
+            'error_code': result.get('error_code'),
+            'attempts': result['attempts'],
             'processing_time': elapsed,
             'timestamp': datetime.now().isoformat(),
             'is_retry': True
         })
     
-    scraper.close()
+    if scheduler.stats:
+        logger.info("失敗の内訳: %s", scheduler.stats, extra=log_setup.fields(failure_counts=scheduler.stats))
     return results
 
 def process_remaining_properties():
@@ -102,8 +116,7 @@ def process_remaining_properties():
     ]
     
     # 到着時刻設定
-    jst = pytz.timezone('Asia/Tokyo')
-    tomorrow = datetime.now(jst) + timedelta(days=1)
+    tomorrow = datetime.now(JST) + timedelta(days=1)
     arrival_time = tomorrow.replace(hour=10, minute=0, second=0, microsecond=0)
     
     all_results = []
@@ -124,7 +137,6 @@ def process_remaining_properties():
         
         prop_results = []
         for dest in destinations:
-            print(f"  → {dest['name']}...", end="", flush=True)
             start_time = time.time()
             
             result = scraper.scrape_route(
@@ -136,9 +148,15 @@ def process_remaining_properties():
             elapsed = time.time() - start_time
             
             if result.get('success'):
-                print(f" ✅ {result['travel_time']}分 ({elapsed:.1f}秒)")
+                logger.info("  → %s: %s分 (%.1f秒)", dest['name'], result['travel_time'], elapsed,
+                            extra=log_setup.fields(property=prop_name, destination=dest['name'],
+                                                   outcome='success', travel_time=result['travel_time'],
+                                                   elapsed=round(elapsed, 3)))
             else:
-                print(f" ❌ {result.get('error', '不明')} ({elapsed:.1f}秒)")
+                logger.warning("  → %s: 失敗 %s (%.1f秒)", dest['name'], result.get('error', '不明'), elapsed,
+                               extra=log_setup.fields(property=prop_name, destination=dest['name'],
+                                                      outcome='failed', error=result.get('error'),
+                                                      elapsed=round(elapsed, 3)))
             
             prop_results.append({
                 'property_name': prop_name,
@@ -160,9 +178,6 @@ def process_remaining_properties():
         # サマリー
         success_count = sum(1 for r in prop_results if r['success'])
         logger.info(f"  完了: 成功 {success_count}/9")
-        
-        # メモリ解放のため少し待機
-        time.sleep(2)
     
     return all_results
 
@@ -204,8 +219,7 @@ def save_final_results(retry_results, new_results):
     
     # 最終ファイルとして保存
     final_file = '/app/output/japandatascience.com/timeline-mapping/data/batch_progress_final.json'
-    with open(final_file, 'w', encoding='utf-8') as f:
-        json.dump(progress, f, ensure_ascii=False, indent=2)
+    atomic_io.atomic_write_json(final_file, progress)
     
     logger.info(f"✅ 最終結果を保存: {final_file}")
     logger.info(f"  総成功: {progress['total_success']}")
@@ -215,6 +229,7 @@ def save_final_results(retry_results, new_results):
     return progress
 
 if __name__ == "__main__":
+    log_setup.configure()
     # 1. 失敗ルートの再試行
     retry_results = retry_failed_routes()
     
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+properties.jsonの差分配信（物件・ルート単位のバージョン管理）
+出力のたびに物件（routes以外の項目）とルート（物件×目的地）の内容ハッシュを前回と比べ、
+変わった行にだけ新しいバージョン番号を付ける。
+
+- properties.versions.json: 行ごとのバージョン（作成・更新・削除）とハッシュ、記録時のファイルのハッシュ
+- properties.delta.jsonl:   バージョンごとのJSON Patch形式の差分ログ（直近 DELTA_LOG_KEEP 件）
+
+properties.jsonはpublishを呼ばない書き込み元（PHPの保存API・手動編集など）でも書き換わるため、
+changes_sinceはファイルのハッシュが記録時と違えば先に記録し直してから差分を返す。
+
+パスは配列の位置ではなく名前で指す（JSON Pointerのエスケープ ~0 ~1 を適用）:
+    /properties/<物件名>                   物件の項目（routes以外）
+    /properties/<物件名>/routes/<目的地>    ルート1件
+"""
+
+import os
+import sys
+import json
+import hashlib
+import logging
+from datetime import datetime
+
+import atomic_io
+import log_setup
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = '/app/output/japandatascience.com/timeline-mapping/data'
+PROPERTIES_FILE = os.path.join(DATA_DIR, 'properties.json')
+VERSIONS_SUFFIX = '.versions.json'
+DELTA_SUFFIX = '.delta.jsonl'
+# 差分ログと削除記録の保持件数（これより古いsinceには全件を返す）
+DELTA_LOG_KEEP = int(os.environ.get('DELTA_LOG_KEEP', '200'))
+
+
+def pointer(*parts):
+    """JSON Pointer（RFC 6901）"""
+    return ''.join('/' + str(part).replace('~', '~0').replace('/', '~1') for part in parts)
+
+
+def row_hash(value):
+    return hashlib.sha1(json.dumps(value, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def route_destination(route):
+    return route.get('destination_name') or route.get('destination')
+
+
+def property_fields(prop):
+    """物件の行（routes以外の項目）"""
+    return {key: value for key, value in prop.items() if key != 'routes'}
+
+
+def versions_path(path):
+    return path[:-len('.json')] + VERSIONS_SUFFIX if path.endswith('.json') else path + VERSIONS_SUFFIX
+
+
+def delta_path(path):
+    return path[:-len('.json')] + DELTA_SUFFIX if path.endswith('.json') else path + DELTA_SUFFIX
+
+
+def load_state(path):
+    """バージョン状態（なければ初期状態）"""
+    try:
+        with open(versions_path(path), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'version': 0, 'horizon': 0, 'properties': {}, 'file_hash': None}
+
+
+def read_properties(path):
+    """(物件リスト, ファイル内容のハッシュ)"""
+    with open(path, 'rb') as f:
+        content = f.read()
+    return json.loads(content.decode('utf-8'))['properties'], hashlib.sha1(content).hexdigest()
+
+
+def _touch(entry, digest, version):
+    """行の状態を更新。変わっていればTrue"""
+    if entry.get('h') == digest and not entry.get('d'):
+        return False
+    if entry.get('d') or 'c' not in entry:
+        entry['c'] = version
+    entry.update(v=version, h=digest, d=False)
+    return True
+
+
+def diff(state, properties):
+    """
+    前回の状態と今回の物件リストを比べ、状態を更新してJSON Patchの操作列を返す
+
+    stateは次のバージョン番号で書き換えられる（変更がなければ呼び出し側で破棄してよい）
+    """
+    version = state['version'] + 1
+    rows = state['properties']
+    adds, route_ops, removes = [], [], []
+    seen = set()
+
+    for prop in properties:
+        name = prop['name']
+        seen.add(name)
+        entry = rows.setdefault(name, {'routes': {}})
+        fields = property_fields(prop)
+        was_new = entry.get('d', True) or 'c' not in entry
+        if _touch(entry, row_hash(fields), version):
+            adds.append({'op': 'add' if was_new else 'replace', 'path': pointer('properties', name),
+                         'value': fields})
+
+        routes = {}
+        for route in prop.get('routes') or []:
+            routes[route_destination(route)] = route
+        for destination, route in routes.items():
+            route_entry = entry['routes'].setdefault(destination, {})
+            route_new = route_entry.get('d', True) or 'c' not in route_entry
+            if _touch(route_entry, row_hash(route), version):
+                route_ops.append({'op': 'add' if route_new else 'replace',
+                                  'path': pointer('properties', name, 'routes', destination), 'value': route})
+        for destination, route_entry in entry['routes'].items():
+            if destination not in routes and not route_entry.get('d'):
+                route_entry.update(v=version, d=True)
+                route_ops.append({'op': 'remove', 'path': pointer('properties', name, 'routes', destination)})
+
+    for name, entry in rows.items():
+        if name not in seen and not entry.get('d'):
+            entry.update(v=version, d=True)
+            for route_entry in entry['routes'].values():
+                route_entry.update(v=version, d=True)
+            removes.append({'op': 'remove', 'path': pointer('properties', name)})
+
+    state['version'] = version
+    return adds + route_ops + removes
+
+
+def _prune_tombstones(state):
+    """horizonより古い削除記録を消す"""
+    horizon = state['horizon']
+    rows = state['properties']
+    for name in [n for n, e in rows.items() if e.get('d') and e['v'] <= horizon]:
+        del rows[name]
+    for entry in rows.values():
+        for destination in [d for d, e in entry['routes'].items() if e.get('d') and e['v'] <= horizon]:
+            del entry['routes'][destination]
+
+
+def publish(path, properties=None, file_hash=None):
+    """
+    物件リスト（省略時はpathのproperties.json）の変更を記録する
+
+    file_hashは物件リストを読んだときのファイルのハッシュ（省略時はpathから計算）
+
+    Returns:
+        (バージョン番号, 操作数)。変更がなければ操作数0でバージョンは据え置き
+    """
+    if properties is None:
+        properties, file_hash = read_properties(path)
+    elif file_hash is None and os.path.exists(path):
+        file_hash = read_properties(path)[1]
+    with atomic_io.locked(versions_path(path)):
+        state = load_state(path)
+        ops = diff(state, properties)
+        if not ops:
+            if state.get('file_hash') != file_hash:
+                # 内容は同じで書式だけ違う書き込み: ハッシュだけ更新
+                state['version'] -= 1
+                state['file_hash'] = file_hash
+                atomic_io.atomic_write_json(versions_path(path), state, indent=None, separators=(',', ':'))
+                return state['version'], 0
+            return state['version'] - 1, 0
+
+        entry = {'version': state['version'], 'base': state['version'] - 1,
+                 'generated_at': datetime.now().isoformat(timespec='seconds'), 'ops': ops}
+        # 前回の状態保存前に中断していた場合の同じ番号の記録は置き換える
+        log = [item for item in _read_log(path) if item['version'] < entry['version']]
+        log.append(entry)
+        if len(log) > DELTA_LOG_KEEP:
+            log = log[-DELTA_LOG_KEEP:]
+        # 保持しているログより古いsinceは差分で追えない
+        state['horizon'] = log[0]['base']
+        state['file_hash'] = file_hash
+        _prune_tombstones(state)
+
+        atomic_io.atomic_write(delta_path(path), ''.join(
+            json.dumps(item, ensure_ascii=False, separators=(',', ':')) + '\n' for item in log))
+        atomic_io.atomic_write_json(versions_path(path), state, indent=None, separators=(',', ':'))
+    logger.info("差分配信: v%s → v%s (%d件の変更)", entry['base'], entry['version'], len(ops),
+                extra=log_setup.fields(base=entry['base'], version=entry['version'], changes=len(ops)))
+    return state['version'], len(ops)
+
+
+def _read_log(path):
+    try:
+        with open(delta_path(path), 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def changes_since(path, since=None):
+    """
+    sinceより後に変わった行だけを返す（APIの since= 用）
+
+    同じ行の複数回の変更は最新の値1件にまとめる。sinceが未指定・保持範囲外なら全件。
+    ファイルが記録後に書き換えられていれば記録し直してから返し、記録できなければ全件
+
+    Returns:
+        {'version', 'since', 'full', 'ops'}（full=Trueなら 'properties' に全件）
+    """
+    properties, file_hash = read_properties(path)
+    state = load_state(path)
+    if state.get('file_hash') != file_hash:
+        logger.info("properties.jsonが記録後に変更されているため差分を記録し直します")
+        try:
+            publish(path, properties, file_hash)
+        except OSError as e:
+            logger.warning("差分を記録できないため全件を返します: %s", e)
+            return {'version': state['version'], 'since': since, 'full': True, 'properties': properties}
+        state = load_state(path)
+        if state.get('file_hash') != file_hash:
+            # 記録中にさらに書き換えられた
+            return {'version': state['version'], 'since': since, 'full': True, 'properties': properties}
+    version = state['version']
+    if since is None or since < state['horizon'] or since > version:
+        return {'version': version, 'since': since, 'full': True, 'properties': properties}
+
+    current = {prop['name']: prop for prop in properties}
+    adds, route_ops, removes = [], [], []
+    for name, entry in state['properties'].items():
+        prop = current.get(name)
+        if entry.get('d') or prop is None:
+            if entry['v'] > since and entry.get('c', 0) <= since:
+                removes.append({'op': 'remove', 'path': pointer('properties', name)})
+            continue
+        if entry['v'] > since:
+            adds.append({'op': 'add' if entry['c'] > since else 'replace',
+                         'path': pointer('properties', name), 'value': property_fields(prop)})
+        routes = {route_destination(route): route for route in prop.get('routes') or []}
+        for destination, route_entry in entry['routes'].items():
+            if route_entry['v'] <= since:
+                continue
+            route_path = pointer('properties', name, 'routes', destination)
+            if route_entry.get('d') or destination not in routes:
+                if route_entry.get('c', 0) <= since:
+                    route_ops.append({'op': 'remove', 'path': route_path})
+            else:
+                route_ops.append({'op': 'add' if route_entry['c'] > since else 'replace',
+                                  'path': route_path, 'value': routes[destination]})
+    return {'version': version, 'since': since, 'full': False, 'ops': adds + route_ops + removes}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    publish(sys.argv[1] if len(sys.argv) > 1 else PROPERTIES_FILE)
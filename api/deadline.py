@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+リクエスト単位の時間予算（デッドライン）
+scrape_routeの各ステップが残り時間を消費し、足りなければ
+任意の処理（詳細展開・デバッグ保存など）を省略して部分結果を返すために使う
+"""
+
+import time
+
+
+class DeadlineExceeded(Exception):
+    """時間予算を使い切った"""
+
+
+class Deadline:
+    """
+    残り時間を管理する
+
+    Deadline(None)は無制限（従来動作）。
+    各待機はclamp()/sleep()を通すことで残り時間を超えないようにする。
+    """
+
+    def __init__(self, seconds=None, clock=time.monotonic):
+        self.clock = clock
+        self.started = clock()
+        self.budget = seconds
+        self.expires_at = None if seconds is None else self.started + seconds
+        self.cancelled = False
+
+    @classmethod
+    def coerce(cls, value):
+        """None・秒数・Deadlineのいずれかを受け取りDeadlineにする"""
+        if isinstance(value, Deadline):
+            return value
+        return cls(value)
+
+    @property
+    def unlimited(self):
+        return self.expires_at is None
+
+    def elapsed(self):
+        return self.clock() - self.started
+
+    def remaining(self):
+        """残り秒数（無制限ならinf）"""
+        if self.expires_at is None:
+            return float('inf')
+        return max(0.0, self.expires_at - self.clock())
+
+    def expired(self):
+        return self.remaining() <= 0.0
+
+    def has_time_for(self, seconds):
+        """指定秒数の処理を行う余裕があるか"""
+        return self.remaining() >= seconds
+
+    def clamp(self, timeout, minimum=0.1):
+        """タイムアウト値を残り時間以内に丸める"""
+        return max(minimum, min(timeout, self.remaining()))
+
+    def sleep(self, seconds):
+        """残り時間を超えない範囲で待機"""
+        duration = min(seconds, self.remaining())
+        if duration > 0:
+            time.sleep(duration)
+
+    def child(self):
+        """同じ期限を持つ独立したDeadline（個別にcancel()できる）"""
+        child = Deadline(None, self.clock)
+        child.budget = self.budget
+        child.expires_at = self.expires_at
+        return child
+
+    def cancel(self):
+        """即座に期限切れにする（以降の待機は打ち切られる）"""
+        self.cancelled = True
+        self.expires_at = self.clock()
+
+    def check(self, step=''):
+        """期限切れならDeadlineExceededを送出"""
+        if self.expired():
+            if self.cancelled:
+                raise DeadlineExceeded(f'{step or "request"} cancelled')
+            raise DeadlineExceeded(step or 'deadline exceeded')
+
+    def __repr__(self):
+        if self.cancelled:
+            return 'Deadline(cancelled)'
+        if self.unlimited:
+            return 'Deadline(unlimited)'
+        return f'Deadline(remaining={self.remaining():.1f}s of {self.budget:.1f}s)'
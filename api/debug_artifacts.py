@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+デバッグ用アーティファクト（ページHTML・スクリーンショット）の非同期保存
+スクレイプスレッドはキューに積むだけで、圧縮とファイル書き込みはバックグラウンドスレッドが行う。
+
+- サンプリング（DEBUG_ARTIFACT_SAMPLE_RATE）と1分あたりの上限で取得自体を間引く
+  （page_sourceやスクリーンショットの取得もWebDriver呼び出しなので、採用時のみ実行する）
+- キューが満杯なら待たずに破棄（スクレイプを止めない）
+- 1件あたりのサイズ上限を超えた分は切り捨て
+- 保存先はリングバッファ: 件数・合計サイズの上限を超えたら古いものから削除
+- 圧縮はzstandardが使えればzstd、なければgzip
+- プロセス終了時（atexit）にキューの残りを書き出す（上限DEBUG_ARTIFACT_EXIT_FLUSH_SECONDS秒）
+- 1回だけ実行するCLIなどはcapture(wait=True)で呼び出し側スレッドで書き込み、書けたパスだけを受け取る
+
+ファイル名: {連番}_{リクエストID}_{種類}.{拡張子}.{zst|gz}
+"""
+
+import os
+import re
+import time
+import gzip
+import queue
+import atexit
+import random
+import logging
+import threading
+from collections import deque
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_DIR = os.environ.get(
+    'DEBUG_ARTIFACT_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'debug_artifacts'))
+SAMPLE_RATE = float(os.environ.get('DEBUG_ARTIFACT_SAMPLE_RATE', '1.0'))
+MAX_PER_MINUTE = int(os.environ.get('DEBUG_ARTIFACT_MAX_PER_MINUTE', '30'))
+MAX_ENTRIES = int(os.environ.get('DEBUG_ARTIFACT_MAX_ENTRIES', '200'))
+MAX_TOTAL_BYTES = int(float(os.environ.get('DEBUG_ARTIFACT_MAX_MB', '100')) * 1024 * 1024)
+# 1件あたりの圧縮前サイズ上限（バイト）
+MAX_ARTIFACT_BYTES = int(float(os.environ.get('DEBUG_ARTIFACT_MAX_ITEM_MB', '5')) * 1024 * 1024)
+QUEUE_SIZE = 32
+# 終了時にキューの書き出しを待つ上限（秒）
+EXIT_FLUSH_SECONDS = float(os.environ.get('DEBUG_ARTIFACT_EXIT_FLUSH_SECONDS', '10'))
+
+FILENAME_PATTERN = re.compile(r'^(\d{8})_(.+)_([A-Za-z0-9-]+)\.([A-Za-z0-9]+)\.(zst|gz|raw)$')
+UNSAFE_CHARS = re.compile(r'[^\w.-]+')
+# 圧縮済みの形式（再圧縮しない）
+PRECOMPRESSED = {'png', 'jpg', 'webp'}
+
+
+def new_request_id(*parts):
+    """ログとアーティファクトを突き合わせるためのリクエストID"""
+    head = '-'.join(str(part)[:10] for part in parts if part)
+    return f"{head}-{time.strftime('%Y%m%d_%H%M%S')}-{random.randint(0, 0xffff):04x}"
+
+
+def safe_id(request_id):
+    """ファイル名に使えない文字を置換"""
+    return UNSAFE_CHARS.sub('_', str(request_id or 'unknown'))[:80].strip('_') or 'unknown'
+
+
+class ArtifactWriter:
+    """
+    圧縮アーティファクトのリングバッファ
+
+    Args:
+        directory: 保存先ディレクトリ
+        sample_rate: 取得する割合（0〜1）
+        max_per_minute: 1分あたりの取得上限（0で無制限）
+        max_entries / max_total_bytes: リングバッファの件数・合計サイズ上限
+        max_artifact_bytes: 1件あたりの圧縮前サイズ上限
+        compression: 'zstd' / 'gzip'（zstdが使えない場合はgzip）
+    """
+
+    def __init__(self, directory=ARTIFACT_DIR, sample_rate=SAMPLE_RATE, max_per_minute=MAX_PER_MINUTE,
+                 max_entries=MAX_ENTRIES, max_total_bytes=MAX_TOTAL_BYTES,
+                 max_artifact_bytes=MAX_ARTIFACT_BYTES, queue_size=QUEUE_SIZE,
+                 compression=None, clock=time.time, rng=random.random):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.max_per_minute = max_per_minute
+        self.max_entries = max_entries
+        self.max_total_bytes = max_total_bytes
+        self.max_artifact_bytes = max_artifact_bytes
+        if compression is None:
+            compression = os.environ.get('DEBUG_ARTIFACT_COMPRESSION', 'zstd')
+        self.compression = 'zstd' if compression == 'zstd' and zstandard is not None else 'gzip'
+        self.clock = clock
+        self.rng = rng
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()  # _write（リングバッファの更新）の直列化
+        self.recent = deque()   # 直近1分の取得時刻
+        self.entries = deque()  # (パス, サイズ) 古い順
+        self.total_bytes = 0
+        self.sequence = 0
+        self.stats = {'captured': 0, 'sampled_out': 0, 'rate_limited': 0,
+                      'dropped': 0, 'written': 0, 'truncated': 0, 'evicted': 0, 'errors': 0}
+        self._thread = None
+        self._load_existing()
+
+    def _load_existing(self):
+        """既存ファイルからリングバッファの状態を復元"""
+        if not os.path.isdir(self.directory):
+            return
+        for name in sorted(os.listdir(self.directory)):
+            match = FILENAME_PATTERN.match(name)
+            if not match:
+                continue
+            path = os.path.join(self.directory, name)
+            size = os.path.getsize(path)
+            self.entries.append((path, size))
+            self.total_bytes += size
+            self.sequence = max(self.sequence, int(match.group(1)))
+
+    def _admit(self):
+        """サンプリングとレート制限（呼び出し側スレッドで実行、ロックは短時間のみ）"""
+        if self.sample_rate < 1.0 and self.rng() >= self.sample_rate:
+            self.stats['sampled_out'] += 1
+            return False
+        now = self.clock()
+        with self.lock:
+            while self.recent and now - self.recent[0] > 60:
+                self.recent.popleft()
+            if self.max_per_minute and len(self.recent) >= self.max_per_minute:
+                self.stats['rate_limited'] += 1
+                return False
+            self.recent.append(now)
+            self.sequence += 1
+            return self.sequence
+
+    def _path_for(self, sequence, request_id, kind, ext):
+        suffix = 'raw' if ext in PRECOMPRESSED else ('zst' if self.compression == 'zstd' else 'gz')
+        name = f"{sequence:08d}_{safe_id(request_id)}_{safe_id(kind).replace('_', '-')}.{ext}.{suffix}"
+        return os.path.join(self.directory, name)
+
+    def capture(self, request_id, kind, data, ext='html', wait=False):
+        """
+        アーティファクトを保存キューに積む（ブロックしない）
+
+        Args:
+            request_id: リクエストID（ファイル名に含める）
+            kind: 種類（timeout, page-source, screenshot など）
+            data: str / bytes、または取得関数（採用された場合のみ呼び出し側スレッドで実行）
+            ext: 拡張子（html, png など）
+            wait: Trueならキューを使わず呼び出し側スレッドで書き込む
+
+        Returns:
+            wait=Trueなら書き込んだパス、Falseなら書き込み予定のパス（終了時またはflush()までに書き出す）。
+            間引き・破棄・書き込み失敗の場合はNone
+        """
+        sequence = self._admit()
+        if not sequence:
+            return None
+        if callable(data):
+            try:
+                data = data()
+            except Exception as e:
+                logger.warning("デバッグ情報の取得に失敗: %s", e)
+                self.stats['errors'] += 1
+                return None
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        path = self._path_for(sequence, request_id, kind, ext)
+        if wait:
+            self.stats['captured'] += 1
+            with self.write_lock:
+                try:
+                    self._write(path, data)
+                except Exception as e:
+                    self.stats['errors'] += 1
+                    logger.warning("デバッグ情報の保存に失敗: %s", e)
+                    return None
+            return path
+        try:
+            self.queue.put_nowait((path, data))
+        except queue.Full:
+            self.stats['dropped'] += 1
+            return None
+        self.stats['captured'] += 1
+        self._ensure_thread()
+        return path
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='debug-artifacts', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            path, data = self.queue.get()
+            try:
+                with self.write_lock:
+                    self._write(path, data)
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.warning("デバッグ情報の保存に失敗: %s", e)
+            finally:
+                self.queue.task_done()
+
+    def compress(self, data):
+        if self.compression == 'zstd':
+            return zstandard.ZstdCompressor(level=3).compress(data)
+        return gzip.compress(data, compresslevel=6)
+
+    def _write(self, path, data):
+        if len(data) > self.max_artifact_bytes:
+            data = data[:self.max_artifact_bytes]
+            self.stats['truncated'] += 1
+        payload = data if path.endswith('.raw') else self.compress(data)
+        os.makedirs(self.directory, exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(payload)
+        self.entries.append((path, len(payload)))
+        self.total_bytes += len(payload)
+        self.stats['written'] += 1
+        self._evict()
+
+    def _evict(self):
+        """件数・合計サイズの上限を超えた分を古い順に削除"""
+        while self.entries and (len(self.entries) > self.max_entries
+                                or self.total_bytes > self.max_total_bytes):
+            path, size = self.entries.popleft()
+            self.total_bytes -= size
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self.stats['evicted'] += 1
+
+    def flush(self, timeout=None):
+        """キューが空になるまで待つ（テスト・終了処理用）"""
+        if timeout is None:
+            self.queue.join()
+            return True
+        end = time.time() + timeout
+        while self.queue.unfinished_tasks:
+            if time.time() >= end:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def find(self, request_id):
+        """リクエストIDのアーティファクトのパス一覧"""
+        key = f"_{safe_id(request_id)}_"
+        return [path for path, _ in self.entries if key in os.path.basename(path)]
+
+
+def read_artifact(path):
+    """保存したアーティファクトを展開して読み込む"""
+    with open(path, 'rb') as f:
+        payload = f.read()
+    if path.endswith('.gz'):
+        return gzip.decompress(payload)
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError('zstandardがインストールされていません')
+        return zstandard.ZstdDecompressor().decompress(payload)
+    return payload
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """プロセス共有のArtifactWriter"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = ArtifactWriter()
+            # デーモンスレッドは終了時に止まるため、キューの残りを書き出してから終了する
+            atexit.register(_flush_at_exit, _writer)
+        return _writer
+
+
+def _flush_at_exit(writer):
+    if writer.queue.unfinished_tasks and not writer.flush(timeout=EXIT_FLUSH_SECONDS):
+        logger.warning("終了時にデバッグ情報を書き出せませんでした（残り%d件）", writer.queue.unfinished_tasks)
+
+
+def capture(request_id, kind, data, ext='html', wait=False):
+    """共有ライターにアーティファクトを積む（ArtifactWriter.captureを参照）"""
+    return get_writer().capture(request_id, kind, data, ext, wait)
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ルート取得失敗の分類コード
+scrape_routeの失敗結果に'error_code'として付け、再試行の方針（retry_scheduler）を決める。
+エラーメッセージの文字列ではなくコードで判定する。
+"""
+
+import selenium_hub
+import request_scheduler
+from deadline import DeadlineExceeded
+
+TRIPS_TIMEOUT = 'trips_timeout'      # ルート一覧（data-trip-index）が表示されない
+PLACE_ID_MISS = 'place_id_miss'      # 出発地・目的地のPlace IDが取れず、ルートも表示されない
+BLOCKED = 'blocked'                  # 同意画面・CAPTCHA（不審なトラフィック）ページ
+DRIVER_DEAD = 'driver_dead'          # WebDriverセッション・Hubへの接続が切れた
+PARSE_FAILURE = 'parse_failure'      # ルート一覧はあるが所要時間を読めない
+DEADLINE = 'deadline'                # 時間予算切れ・レート制限待ちのタイムアウト
+HUB_UNAVAILABLE = 'hub_unavailable'  # 全Hubのブレーカーが開いている
+UNKNOWN = 'unknown'
+
+ALL = (TRIPS_TIMEOUT, PLACE_ID_MISS, BLOCKED, DRIVER_DEAD, PARSE_FAILURE, DEADLINE, HUB_UNAVAILABLE, UNKNOWN)
+
+# 再試行時の取得方法（scrape_routeのstrategy）
+NO_PLACE_ID_URL = 'no_place_id'  # Place IDを調べず住所だけのURLで検索
+CLICK_FLOW = 'click_flow'        # クリック操作で交通手段・到着時刻を設定し直す
+
+# 同意画面・CAPTCHAのURLとページ文言
+BLOCKED_URL_MARKERS = ('consent.google.', '/sorry/')
+BLOCKED_TEXT_MARKERS = ('通常と異なるトラフィック', 'unusual traffic', 'recaptcha',
+                        'Google サービスをご利用になる前に', 'before you continue to google')
+# セッション切れを示すSeleniumの例外名
+DEAD_SESSION_ERROR_NAMES = {'InvalidSessionIdException', 'NoSuchWindowException', 'SessionNotCreatedException'}
+
+
+def classify_exception(exc):
+    """scrape_route内で発生した例外のコード"""
+    if isinstance(exc, selenium_hub.HubUnavailable):
+        return HUB_UNAVAILABLE
+    if isinstance(exc, (DeadlineExceeded, request_scheduler.RateLimitTimeout)):
+        return DEADLINE
+    names = {cls.__name__ for cls in type(exc).__mro__}
+    if names & DEAD_SESSION_ERROR_NAMES or selenium_hub.is_connection_error(exc):
+        return DRIVER_DEAD
+    if 'TimeoutException' in names:
+        return TRIPS_TIMEOUT
+    return UNKNOWN
+
+
+def is_blocked_page(url, text=''):
+    """同意画面・CAPTCHAページか（URLと、取得済みならページ先頭のテキストで判定）"""
+    if any(marker in (url or '') for marker in BLOCKED_URL_MARKERS):
+        return True
+    lowered = (text or '').lower()
+    return any(marker.lower() in lowered for marker in BLOCKED_TEXT_MARKERS)
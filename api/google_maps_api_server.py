@@ -5,25 +5,88 @@ HTTPサービスとしてGoogle Maps経路検索機能を提供
 v5最終版スクレイパー統合版
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
 from pydantic import BaseModel, validator
 from typing import Optional
-import uvicorn
-import json
-import traceback
+import logging
 from datetime import datetime, timedelta
 import os
 import sys
-import pytz
+import time
 
 # メインスクレイピングモジュールをインポート
-sys.path.append('/app/output/japandatascience.com/timeline-mapping/api')
+# （コンテナでは/app/srcから起動するため、スクレイパーのディレクトリが未登録なら追加する）
+API_DIR = os.environ.get('SCRAPER_API_DIR', '/app/output/japandatascience.com/timeline-mapping/api')
+if os.path.isdir(API_DIR) and API_DIR not in sys.path:
+    sys.path.append(API_DIR)
 from google_maps_scraper import GoogleMapsScraper
+from metrics import REGISTRY, CONTENT_TYPE
+from request_scheduler import INTERACTIVE
+from deadline import Deadline
+from scraper_pool import ScraperPool, READY, WARMING, BUSY
+from hedging import HedgedRunner
+import selenium_hub
+import data_versions
+import log_setup
+import travel_time_profile
+from jst import JST
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Google Maps Transit API v5", version="5.0.0")
 
-# グローバルスクレイパーインスタンス（再利用）
-scraper = None
+# ウォーム済みスクレイパーのプール（起動時に事前生成、SCRAPER_POOL_SIZEで数を指定）
+scraper_pool = ScraperPool(lambda: GoogleMapsScraper(lane=INTERACTIVE))
+# 遅いセッションを別セッションで追い越すヘッジ実行（HEDGE_PERCENTILEで閾値指定）
+hedged_runner = HedgedRunner(scraper_pool)
+
+# リクエストあたりの既定の時間予算（秒）: PHP側のタイムアウト（60秒）より短くする
+DEFAULT_BUDGET_SECONDS = float(os.environ.get('SCRAPE_BUDGET_SECONDS', '50'))
+
+# メトリクス
+REQUESTS_TOTAL = REGISTRY.counter(
+    'transit_requests_total', 'Transit API requests by outcome.', ['outcome'])
+QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    'transit_queue_wait_seconds', 'Time spent waiting for a free scraper session.')
+SCRAPE_SECONDS = REGISTRY.histogram(
+    'transit_scrape_seconds', 'Total scrape_route duration.')
+PHASE_SECONDS = REGISTRY.histogram(
+    'transit_scrape_phase_seconds', 'scrape_route duration per phase.', ['phase'])
+SESSIONS = REGISTRY.gauge(
+    'transit_browser_sessions', 'Browser sessions by state.', ['state'])
+HEDGES_TOTAL = REGISTRY.counter(
+    'transit_hedged_requests_total', 'Hedged scrapes by which attempt won.', ['winner'])
+HUB_CIRCUIT_OPEN = REGISTRY.gauge(
+    'transit_selenium_hub_circuit_open', 'Whether the circuit breaker for a Selenium hub is open (1) or not (0).', ['hub'])
+DRIVER_RESTARTS_TOTAL = REGISTRY.counter(
+    'transit_driver_restarts_total', 'WebDriver restarts and session respawns since startup.')
+DRIVER_RESTARTS_TOTAL.set_function(scraper_pool.driver_restarts)
+# ルート結果のキャッシュ（現在は無効なので常にmiss）。ヒット率はresult['from_cache']から数える
+CACHE_REQUESTS_TOTAL = REGISTRY.counter(
+    'transit_cache_requests_total', 'Successful route results by whether they came from the cache.', ['result'])
+CACHE_HIT_RATIO = REGISTRY.gauge(
+    'transit_cache_hit_ratio', 'Share of successful route results served from the cache since startup.')
+
+def cache_hit_ratio():
+    """起動後の成功結果のうちキャッシュから返した割合（結果がなければ0）"""
+    hits = CACHE_REQUESTS_TOTAL.get(result='hit')
+    total = hits + CACHE_REQUESTS_TOTAL.get(result='miss')
+    return hits / total if total else 0.0
+
+CACHE_HIT_RATIO.set_function(cache_hit_ratio)
+for _result in ('hit', 'miss'):
+    CACHE_REQUESTS_TOTAL.inc(0, result=_result)  # 結果が出る前から0で出力
+
+def update_session_gauges():
+    """プールの状態をセッションゲージに反映"""
+    counts = scraper_pool.counts()
+    SESSIONS.set(counts[BUSY], state='active')
+    SESSIONS.set(counts[READY], state='idle')
+    SESSIONS.set(counts[WARMING], state='warming')
+    for hub, state in selenium_hub.get_registry().states().items():
+        HUB_CIRCUIT_OPEN.set(0 if state == selenium_hub.CLOSED else 1, hub=hub)
+
+update_session_gauges()
 
 class TransitRequest(BaseModel):
     origin: str
@@ -31,6 +94,8 @@ class TransitRequest(BaseModel):
     arrival_time: Optional[str] = None
     days_ahead: Optional[int] = None  # 何日後か（0=今日, 1=明日）
     target_time: Optional[str] = None  # "10:00"形式の時刻
+    timeout_seconds: Optional[float] = None  # 時間予算（秒）。呼び出し元のタイムアウトより短く指定
+    all_details: Optional[bool] = False  # Trueなら全ルートの詳細（乗車区間・徒歩・使用駅）を返す
     
     @validator('origin', 'destination')
     def validate_location(cls, v):
@@ -47,30 +112,18 @@ class TransitRequest(BaseModel):
                 raise ValueError('arrival_time must be ISO format')
         return v
 
-def get_or_create_scraper():
-    """スクレイパーインスタンスを取得または作成"""
-    global scraper
-    if scraper is None:
-        print("[API] スクレイパーインスタンスを初期化中...")
-        scraper = GoogleMapsScraper()
-        scraper.setup_driver()
-        print("[API] スクレイパー初期化完了")
-    return scraper
-
 def determine_arrival_time(request: TransitRequest):
     """リクエストから到着時刻を決定"""
-    jst = pytz.timezone('Asia/Tokyo')
-    
     # arrival_timeが指定されている場合（ISO形式）
     if request.arrival_time:
         try:
             dt = datetime.fromisoformat(request.arrival_time.replace('Z', '+00:00'))
-            return dt.astimezone(jst)
+            return dt.astimezone(JST)
         except Exception as e:
-            print(f"[API] arrival_time解析エラー: {e}")
+            logger.warning("arrival_time解析エラー: %s", e)
     
     # days_aheadとtarget_timeが指定されている場合
-    now = datetime.now(jst)
+    now = datetime.now(JST)
     
     if request.days_ahead is not None:
         target_date = now + timedelta(days=request.days_ahead)
@@ -92,32 +145,64 @@ def determine_arrival_time(request: TransitRequest):
     
     # 過去の時刻チェック
     if arrival_time < now:
-        print(f"[API] 過去の時刻のため明日に変更: {arrival_time}")
+        logger.info("過去の時刻のため明日に変更: %s", arrival_time)
         arrival_time = arrival_time + timedelta(days=1)
     
     return arrival_time
 
+def raise_hub_unavailable(retry_after):
+    """Selenium Hub停止中の503（Retry-After付き）"""
+    raise HTTPException(
+        status_code=503,
+        detail='Selenium Hubが停止中です。しばらくしてから再試行してください',
+        headers={'Retry-After': str(max(1, int(retry_after or 0) + 1))}
+    )
+
+def run_scrape(deadline, **kwargs):
+    """ウォーム済みセッションでscrape_routeを実行（遅延時はヘッジ、メトリクス記録付き）"""
+    hubs = selenium_hub.get_registry()
+    if not hubs.available():
+        # Hub障害中はセッション待ちをせず即座に返す
+        REQUESTS_TOTAL.inc(outcome='hub_unavailable')
+        raise_hub_unavailable(hubs.retry_after())
+    started = time.time()
+    outcome = hedged_runner.run(deadline, **kwargs)
+    if outcome is None:
+        QUEUE_WAIT_SECONDS.observe(time.time() - started)
+        REQUESTS_TOTAL.inc(outcome='queue_timeout')
+        raise HTTPException(status_code=503, detail='スクレイパーが混雑しています（時間予算内に空きなし）')
+    QUEUE_WAIT_SECONDS.observe(outcome.queue_wait)
+    SCRAPE_SECONDS.observe(time.time() - started - outcome.queue_wait)
+    for phase, seconds in outcome.phase_timings.items():
+        PHASE_SECONDS.observe(seconds, phase=phase)
+    if outcome.hedged:
+        HEDGES_TOTAL.inc(winner='hedge' if outcome.hedge_won else 'primary')
+    return outcome.result
+
 @app.post("/api/transit")
-async def get_transit_route(request: TransitRequest):
+def get_transit_route(request: TransitRequest):
     """
     Google Mapsから公共交通機関のルート情報を取得
+    同期エンドポイントとしてスレッドプールで実行（イベントループを塞がない）
     """
+    # 時間予算はキュー待ちも含めてリクエスト受信時点から数える
+    deadline = Deadline(request.timeout_seconds or DEFAULT_BUDGET_SECONDS)
     try:
-        print(f"[API] リクエスト受信: {request.origin} → {request.destination}")
+        logger.info("リクエスト受信: %s → %s", request.origin, request.destination,
+                    extra=log_setup.fields(origin=request.origin, destination=request.destination))
         
         # 到着時刻を決定
         arrival_time = determine_arrival_time(request)
-        print(f"[API] 到着時刻: {arrival_time.strftime('%Y-%m-%d %H:%M')} JST")
-        
-        # スクレイパーを取得
-        scraper = get_or_create_scraper()
+        logger.info("到着時刻: %s JST", arrival_time, extra=log_setup.fields(arrival_time=arrival_time))
         
         # ルート情報をスクレイピング
-        result = scraper.scrape_route(
+        result = run_scrape(
+            deadline,
             origin_address=request.origin,
             dest_address=request.destination,
             dest_name=request.destination,  # 簡略化のため目的地名と同じ
-            arrival_time=arrival_time
+            arrival_time=arrival_time,
+            all_details=bool(request.all_details)
         )
         
         if result.get('success'):
@@ -134,56 +219,122 @@ async def get_transit_route(request: TransitRequest):
                     "route_type": result['route_type'],
                     "all_routes": result.get('all_routes', []),
                     "place_ids": result.get('place_ids', {}),
-                    "from_cache": result.get('from_cache', False)
+                    "from_cache": result.get('from_cache', False),
+                    "partial": result.get('partial', False),
+                    "skipped": result.get('skipped', [])
                 },
                 "timestamp": datetime.now().isoformat()
             }
             
-            # キャッシュからの場合はログに記録
-            if result.get('from_cache'):
-                print(f"[API] ⚡ キャッシュから返却")
-            else:
-                print(f"[API] ✅ 新規取得: {result['travel_time']}分")
+            logger.info("取得完了: %s分 (%s)", result['travel_time'],
+                        'キャッシュ' if result.get('from_cache') else '新規',
+                        extra=log_setup.fields(outcome='success', travel_time=result['travel_time'],
+                                               from_cache=result.get('from_cache', False),
+                                               partial=result.get('partial', False),
+                                               elapsed=round(deadline.elapsed(), 3)))
             
+            REQUESTS_TOTAL.inc(outcome='partial' if result.get('partial') else 'success')
+            CACHE_REQUESTS_TOTAL.inc(result='hit' if result.get('from_cache') else 'miss')
             return response
         else:
             # エラーレスポンス
             error_msg = result.get('error', 'ルート情報を取得できませんでした')
-            print(f"[API] ❌ エラー: {error_msg}")
+            logger.warning("取得失敗: %s", error_msg,
+                           extra=log_setup.fields(outcome='failed', error=error_msg,
+                                                  error_code=result.get('error_code'),
+                                                  elapsed=round(deadline.elapsed(), 3)))
+            if result.get('hub_unavailable'):
+                REQUESTS_TOTAL.inc(outcome='hub_unavailable')
+                raise_hub_unavailable(result.get('retry_after'))
+            if result.get('deadline_exceeded'):
+                REQUESTS_TOTAL.inc(outcome='deadline_exceeded')
+                raise HTTPException(status_code=504, detail=error_msg)
+            REQUESTS_TOTAL.inc(outcome='scrape_failed')
             raise HTTPException(status_code=500, detail=error_msg)
             
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[API] システムエラー: {e}")
-        traceback.print_exc()
+        REQUESTS_TOTAL.inc(outcome='exception')
+        logger.exception("システムエラー: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/properties")
+def get_properties(since: Optional[int] = None):
+    """
+    物件データ。since（前回受け取ったversion）を指定すると、それ以降に変わった行だけを
+    JSON Patch形式で返す。未指定・差分ログの保持範囲外なら全件（full=true）
+    """
+    try:
+        return data_versions.changes_since(data_versions.PROPERTIES_FILE, since)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail='properties.jsonがありません')
+
+@app.get("/api/travel-time")
+def get_travel_time(property: str, destination: str, arrival: str):
+    """
+    到着時刻スイープのプロファイル（arrival_time_sweep.py）から、任意の到着時刻（"HH:MM"）の
+    所要時間を返す。サンプル間は線形補間
+    """
+    try:
+        minute = travel_time_profile.to_minute_of_day(arrival)
+    except ValueError:
+        minute = None
+    if minute is None or not 0 <= minute < 24 * 60:
+        raise HTTPException(status_code=400, detail='arrivalは"HH:MM"形式で指定してください')
+    travel_time = travel_time_profile.query_travel_time(property, destination, minute)
+    if travel_time is None:
+        raise HTTPException(status_code=404, detail='このルートの所要時間プロファイルがありません')
+    return {"property": property, "destination": destination, "arrival": arrival, "travel_time": travel_time}
+
 @app.get("/health")
 async def health_check():
-    """ヘルスチェックエンドポイント"""
-    global scraper
+    """ヘルスチェックエンドポイント（ウォーム済み・ウォームアップ中のセッション数を含む）"""
+    counts = scraper_pool.counts()
+    if not selenium_hub.get_registry().available():
+        status = "hub_unavailable"
+    elif counts[READY] + counts[BUSY] > 0:
+        status = "healthy"
+    else:
+        status = "warming"
     return {
-        "status": "healthy",
+        "status": status,
         "version": "5.0.0",
-        "scraper_initialized": scraper is not None
+        "scraper_initialized": counts[READY] + counts[BUSY] > 0,
+        "sessions": {
+            "ready": counts[READY],
+            "busy": counts[BUSY],
+            "warming": counts[WARMING],
+            "total": scraper_pool.size
+        },
+        "selenium_hubs": selenium_hub.get_registry().states()
     }
 
+@app.get("/metrics")
+def metrics_endpoint():
+    """Prometheus形式のメトリクス"""
+    update_session_gauges()
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@app.on_event("startup")
+def startup_event():
+    """起動時にスクレイパーセッションを事前生成（バックグラウンドでウォームアップ）"""
+    log_setup.configure()
+    logger.info("スクレイパーセッションを%d個ウォームアップ中...", scraper_pool.size)
+    scraper_pool.start()
+
 @app.on_event("shutdown")
-async def shutdown_event():
+def shutdown_event():
     """シャットダウン時の処理"""
-    global scraper
-    if scraper:
-        print("[API] スクレイパーを終了中...")
-        scraper.close()
-        scraper = None
-        print("[API] スクレイパー終了完了")
+    logger.info("スクレイパーを終了中...")
+    scraper_pool.close()
+    logger.info("スクレイパー終了完了")
 
 if __name__ == "__main__":
     # デバッグ用: 直接実行
-    print("Google Maps Transit API v5 を起動中...")
-    print("URL: http://localhost:8000")
-    print("ドキュメント: http://localhost:8000/docs")
+    import uvicorn
+    log_setup.configure()
+    logger.info("Google Maps Transit API v5 を起動中... (http://localhost:8000, ドキュメント: /docs)")
     
     uvicorn.run(
         app, 
@@ -114,7 +114,9 @@ function callScrapingService($origin, $destination, $arrivalTime = null) {
     // リクエストデータ
     $requestData = [
         'origin' => $origin,
-        'destination' => $destination
+        'destination' => $destination,
+        // 下記HTTPタイムアウト（60秒）より短い時間予算。超過時は部分結果が返る
+        'timeout_seconds' => 50
     ];
     
     if ($arrivalTime) {
@@ -5,54 +5,9 @@ details.total_timeは削除（未使用のため）
 """
 import json
 
-# 路線名の正規化辞書
-LINE_NAME_MAP = {
-    "銀座線": "東京メトロ銀座線",
-    "丸ノ内線": "東京メトロ丸ノ内線",
-    "日比谷線": "東京メトロ日比谷線",
-    "東西線": "東京メトロ東西線",
-    "千代田線": "東京メトロ千代田線",
-    "有楽町線": "東京メトロ有楽町線",
-    "半蔵門線": "東京メトロ半蔵門線",
-    "南北線": "東京メトロ南北線",
-    "副都心線": "東京メトロ副都心線",
-    "山手線": "JR山手線",
-    "中央線": "JR中央線",
-    "京浜東北線": "JR京浜東北線",
-    "浅草線": "都営浅草線",
-    "三田線": "都営三田線",
-    "新宿線": "都営新宿線",
-    "大江戸線": "都営大江戸線"
-}
-
-def normalize_line_name(line_name):
-    """路線名を正規化"""
-    if not line_name:
-        return line_name
-    
-    # 既にマッピングに存在する場合はそのまま返す
-    if line_name in LINE_NAME_MAP.values():
-        return line_name
-    
-    # マッピングから検索
-    for short_name, full_name in LINE_NAME_MAP.items():
-        if short_name in line_name:
-            return full_name
-    
-    return line_name
-
-def normalize_station_name(station_name):
-    """駅名を正規化（「(東京都)」を追加）"""
-    if not station_name:
-        return station_name
-    
-    # 既に「(東京都)」が含まれている場合はそのまま
-    if "(東京都)" in station_name:
-        return station_name
-    
-    # 「駅」を削除して「(東京都)」を追加
-    cleaned_name = station_name.replace("駅", "")
-    return f"{cleaned_name}(東京都)"
+# 路線名・駅名の正規化はtransit_names（最長一致のオートマトン）に集約
+from transit_names import (LINE_NAME_MAP, normalize_line_name, normalize_station_name,
+                           normalize_line_names, normalize_station_names)
 
 def convert_to_properties_format(google_result, destination_id, destination_name):
     """
@@ -76,14 +31,18 @@ def convert_to_properties_format(google_result, destination_id, destination_name
         first_train_wait = details.get("trains")[0].get("wait_time", 0)
         total_wait_time = max(0, total_wait_time - first_train_wait)
     
-    # 路線情報の正規化
+    # 路線情報の正規化（路線名・駅名はまとめて変換）
+    trains = details.get("trains", [])
+    lines = normalize_line_names([train.get("line", "") for train in trains])
+    from_stations = normalize_station_names([train.get("from", "") for train in trains])
+    to_stations = normalize_station_names([train.get("to", "") for train in trains])
     normalized_trains = []
-    for i, train in enumerate(details.get("trains", [])):
+    for i, train in enumerate(trains):
         normalized_train = {
-            "line": normalize_line_name(train.get("line", "")),
+            "line": lines[i],
             "time": train.get("time", 0),
-            "from": normalize_station_name(train.get("from", "")),
-            "to": normalize_station_name(train.get("to", ""))
+            "from": from_stations[i],
+            "to": to_stations[i]
         }
         
         # 乗り換え情報の処理
@@ -5,40 +5,135 @@ Google Maps スクレイピングツール
 URLパラメータとクリック操作の両方を活用し、Place ID事前取得も統合
 """
 
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.keys import Keys
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
 import time
-import re
 import logging
 import json
 import gc
 from datetime import datetime, timedelta
-import pytz
-from urllib.parse import quote
-
-# ロギング設定
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+import request_scheduler
+import selenium_hub
+import debug_artifacts
+import address_normalizer
+import maps_url
+import route_patterns
+import log_setup
+import failure_codes
+from deadline import Deadline, DeadlineExceeded
+from jst import JST
+
 logger = logging.getLogger(__name__)
 
+# Seleniumはimportに時間がかかるため、最初のスクレイパー生成時に読み込む（_import_selenium）
+webdriver = By = WebDriverWait = EC = Keys = None
+TimeoutException = NoSuchElementException = None
+
+
+def _import_selenium():
+    """Seleniumのモジュールを読み込んでモジュール変数に設定する（2回目以降は何もしない）"""
+    global webdriver, By, WebDriverWait, EC, Keys, TimeoutException, NoSuchElementException
+    if webdriver is not None:
+        return
+    from selenium import webdriver as _webdriver
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.common.keys import Keys
+    from selenium.common.exceptions import TimeoutException, NoSuchElementException
+    webdriver = _webdriver
+
+# 詳細展開（任意の付加情報）に必要な最低残り時間（秒）
+DETAILS_MIN_SECONDS = 10
+# デバッグHTML取得に必要な最低残り時間（秒）。保存自体はdebug_artifactsのバックグラウンドで行う
+DEBUG_DUMP_MIN_SECONDS = 3
+# 一覧から抽出するルート数
+MAX_ROUTES = 3
+# 詳細パネルを開いてからテキストを読むまでの待ち時間（秒）
+DETAILS_EXPAND_WAIT = 3
+# 詳細パネルのテキストを探すセレクタ（上から順に試す。詳細情報は500文字以上のはず）
+DETAIL_TEXT_SELECTORS = [
+    # 詳細情報を含む正確なコンテナ（HTMLから確認済み）
+    "//div[@class='m6QErb WNBkOb XiKgde']",
+    "//div[@class='m6QErb DxyBCb kA9KIf dS8AEf XiKgde']",
+    # フォールバック：m6QErbクラスを含む要素
+    "//div[contains(@class, 'm6QErb') and contains(@class, 'XiKgde')]",
+    "//div[contains(@class, 'm6QErb')]"
+]
+DETAIL_TEXT_MIN_LENGTH = 500
+# ウォームページで目的地を差し替えた後、ルート一覧の更新完了を待つ最大秒数
+WARM_SWAP_TIMEOUT = 15
+# ルート一覧の変化がこの時間（ミリ秒）止まったら更新完了とみなす
+WARM_SETTLE_MS = 500
+
+# ルート一覧の親要素にMutationObserverを仕掛ける（差し替え前に実行）
+WARM_OBSERVER_SCRIPT = """
+const first = document.querySelector('div[data-trip-index]');
+if (!first) return false;
+const target = first.parentElement.parentElement || first.parentElement;
+window.__tripWatch = {changed: false, last: 0, href: location.href};
+if (window.__tripObserver) window.__tripObserver.disconnect();
+window.__tripObserver = new MutationObserver(() => {
+    window.__tripWatch.changed = true;
+    window.__tripWatch.last = performance.now();
+});
+window.__tripObserver.observe(target, {childList: true, subtree: true, characterData: true});
+return true;
+"""
+
+# 一覧が変化し、ルートが存在し、URLが更新され、変化が落ち着いたか
+WARM_READY_SCRIPT = """
+const watch = window.__tripWatch;
+if (!watch || !watch.changed) return false;
+if (document.querySelectorAll('div[data-trip-index]').length === 0) return false;
+if (location.href === watch.href) return false;
+return performance.now() - watch.last >= arguments[0];
+"""
+
+# Place IDのある目的地: 読み込み済みのアプリ内でURLだけを切り替える（ページは再読み込みしない）
+WARM_URL_SWAP_SCRIPT = """
+history.pushState(null, '', arguments[0]);
+window.dispatchEvent(new PopStateEvent('popstate', {state: null}));
+return true;
+"""
+
+# 目的地入力欄が表示されているか。詳細パネル表示中なら「戻る」で一覧に戻す
+WARM_LIST_SCRIPT = """
+const box = document.querySelector('#directions-searchbox-1 input');
+if (box && box.offsetParent) return true;
+const back = document.querySelector('button[aria-label="戻る"]');
+if (back) back.click();
+return false;
+"""
+
 class GoogleMapsScraper:
     """Google Maps スクレイパー"""
     
-    def __init__(self):
+    def __init__(self, lane=request_scheduler.BATCH, warm_page=False):
+        _import_selenium()
         self.driver = None
+        self.hub_url = None       # 接続中のSelenium Hub
+        self.lane = lane          # アクセス優先度レーン（interactive / batch / place_id）
         # self.place_id_cache = {}  # Place IDキャッシュ - 無効化
         # self.route_cache = {}     # ルート結果キャッシュ - 無効化
         self.route_count = 0      # 処理済みルート数
+        self.restart_count = 0    # WebDriver再起動回数
+        self.phase_timings = {}   # 直近ルートのフェーズ別所要時間（秒）
+        self.current_phase = None     # 実行中のフェーズ（ヘッジ判定用）
+        self.phase_started_at = None  # 実行中フェーズの開始時刻
+        self.request_id = None        # 実行中ルートのID（デバッグ情報のファイル名用）
+        self.failure_code = None      # 直近のルート抽出の失敗コード（failure_codes）
+        # ウォームページモード: 出発地・到着時刻が同じなら経路ページを読み込み直さず目的地だけ差し替える
+        self.warm_page = warm_page
+        self._warm_key = None     # 現在読み込まれている経路ページの（出発地, 到着時刻）
+        self.warm_stats = {'swapped': 0, 'fallback': 0}
         self.setup_driver()       # WebDriverを初期化
         
     def setup_driver(self):
-        """Selenium WebDriverのセットアップ"""
+        """
+        Selenium WebDriverのセットアップ
+        既にドライバーがある場合は何もしない（二重呼び出しによるセッションリーク防止）
+        """
+        if self.driver is not None:
+            return
         chrome_options = webdriver.ChromeOptions()
         chrome_options.add_argument('--headless')
         chrome_options.add_argument('--no-sandbox')
@@ -52,59 +147,47 @@ class GoogleMapsScraper:
         chrome_options.add_argument('--disable-background-timer-throttling')
         chrome_options.add_argument('--disable-renderer-backgrounding')
         
-        self.driver = webdriver.Remote(
-            command_executor='http://selenium:4444/wd/hub',
-            options=chrome_options
-        )
+        # 負荷の低いHubを選択（障害中のHubはサーキットブレーカーで即座に除外）
+        self.driver, self.hub_url = selenium_hub.get_registry().create_session(chrome_options)
         self.driver.set_page_load_timeout(30)
         self.driver.implicitly_wait(10)
-        logger.info("WebDriver初期化完了")
+        logger.info("WebDriver初期化完了 (%s)", self.hub_url)
+
+    def ensure_driver(self):
+        """
+        ドライバーがなければ作り直す（再起動失敗後の復旧）
+
+        Raises:
+            selenium_hub.HubUnavailable: Hubが停止中
+        """
+        if self.driver is None:
+            self.setup_driver()
     
     def normalize_address(self, address):
         """
-        住所を正規化（Google Maps検索用）
+        住所を正規化（Google Maps検索用、address_normalizerの共通実装）
         例: "東京都千代田区 神田須田町１丁目２０−１" → "東京都千代田区神田須田町1-20-1"
         """
-        # 全角スペースを削除
-        normalized = address.replace('　', '').replace(' ', '')
-        
-        # 「丁目」を「-」に変換
-        normalized = re.sub(r'(\d+)丁目(\d+)−(\d+)', r'\1-\2-\3', normalized)
-        normalized = re.sub(r'(\d+)丁目(\d+)番(\d+)', r'\1-\2-\3', normalized)
-        normalized = re.sub(r'(\d+)丁目(\d+)', r'\1-\2', normalized)
-        
-        # 「番」「号」を削除
-        normalized = re.sub(r'(\d+)番(\d+)号', r'\1-\2', normalized)
-        normalized = re.sub(r'(\d+)番', r'\1', normalized)
-        normalized = re.sub(r'(\d+)号', r'\1', normalized)
-        
-        # 全角数字を半角に
-        normalized = normalized.translate(str.maketrans('０１２３４５６７８９', '0123456789'))
-        
-        # 全角ハイフンを半角に
-        normalized = normalized.replace('−', '-').replace('ー', '-')
-        
-        return normalized
+        return address_normalizer.normalize_address(address)
     
     def generate_google_maps_timestamp(self, year, month, day, hour, minute):
         """
         Google Maps用のタイムスタンプを生成
         重要: JSTの時刻をUTC基準で計算（タイムゾーン無視）
         """
-        # UTC時刻として作成（タイムゾーンを無視）
-        utc_time = datetime(year, month, day, hour, minute, 0, tzinfo=pytz.UTC)
-        return int(utc_time.timestamp())
+        return maps_url.maps_timestamp(datetime(year, month, day, hour, minute))
     
-    def get_place_id(self, address, name=None):
+    def get_place_id(self, address, name=None, deadline=None):
         """
         住所または名前からPlace IDを取得
         駅や空港は名前で検索、それ以外は住所で検索
         """
+        deadline = Deadline.coerce(deadline)
         # 駅や空港は名前で検索
         if name and ('駅' in name or 'Station' in name.lower() if name else False or '空港' in name or 'Airport' in name.lower() if name else False):
             search_query = name
             normalized = name  # キャッシュ用
-            logger.info(f"🚉 駅/空港を名前で検索: {name}")
+            logger.info("🚉 駅/空港を名前で検索: %s", name)
         else:
             # それ以外は住所を正規化して検索
             normalized = self.normalize_address(address)
@@ -117,43 +200,27 @@ class GoogleMapsScraper:
         
         try:
             # Google Mapsで検索
-            url = f"https://www.google.com/maps/search/{quote(search_query)}"
+            url = maps_url.search_url(search_query)
             
-            logger.info(f"🔍 Place ID取得中: {name or address[:30]}...")
+            logger.info("🔍 Place ID取得中: %s...", name or address[:30])
+            request_scheduler.acquire(self.lane, None if deadline.unlimited else deadline.remaining())
+            deadline.check('place_id')
+            self.invalidate_warm_page()
             self.driver.get(url)
-            time.sleep(3)
+            deadline.sleep(3)
             
             # URLからPlace IDを抽出
             current_url = self.driver.current_url
-            logger.debug(f"Place ID抽出用URL: {current_url}")
+            logger.debug("Place ID抽出用URL: %s", current_url)
             place_id = None
             
             # 複数のパターンで検索（ChIJ形式と0x形式の両方に対応）
-            patterns = [
-                # ChIJ形式のパターン
-                r'!1s(ChIJ[A-Za-z0-9_-]+)',
-                r'/place/[^/]+/@[^/]+/data=.*!1s(ChIJ[A-Za-z0-9_-]+)',
-                r'ftid=(ChIJ[A-Za-z0-9_-]+)',
-                # 0x形式のパターン
-                r'!1s(0x[0-9a-f]+:0x[0-9a-f]+)',
-                r'/place/[^/]+/@[^/]+/data=.*!1s(0x[0-9a-f]+:0x[0-9a-f]+)',
-                r'ftid=(0x[0-9a-f]+:0x[0-9a-f]+)',
-                r'!3m1!1s(0x[0-9a-f]+:0x[0-9a-f]+)'
-            ]
-            
-            for pattern in patterns:
-                match = re.search(pattern, current_url)
-                if match:
-                    place_id = match.group(1)
-                    logger.info(f"   ✅ Place ID: {place_id}")
-                    break
+            place_id = route_patterns.extract_place_id(current_url)
+            if place_id:
+                logger.info("   ✅ Place ID: %s", place_id)
             
             # 座標を抽出
-            lat, lon = None, None
-            coord_match = re.search(r'@([\d.]+),([\d.]+)', current_url)
-            if coord_match:
-                lat = coord_match.group(1)
-                lon = coord_match.group(2)
+            lat, lon = route_patterns.extract_coordinates(current_url)
             
             result = {
                 'place_id': place_id,
@@ -167,81 +234,37 @@ class GoogleMapsScraper:
             
             return result
             
+        except (DeadlineExceeded, request_scheduler.RateLimitTimeout):
+            raise
         except Exception as e:
-            logger.error(f"Place ID取得エラー: {e}")
+            logger.error("Place ID取得エラー: %s", e)
             return {'place_id': None, 'lat': None, 'lon': None, 'normalized_address': normalized}
     
+    def address_only_info(self, address):
+        """Place IDを調べない場合の地点情報（URLは正規化した住所だけで組み立てる）"""
+        return {'place_id': None, 'lat': None, 'lon': None, 'normalized_address': self.normalize_address(address)}
+    
     def build_url_with_timestamp(self, origin_info, dest_info, arrival_time):
         """
-        タイムスタンプ付きURLを構築
-        ユーザー提供の動作確認済みフォーマットを使用
+        タイムスタンプ付きURLを構築（maps_urlの正規形）
+        Place ID・緯度経度は両端に揃っている場合のみdataパラメータに埋め込む
         """
-        # 住所を正規化してエンコード
-        origin_str = quote(origin_info['normalized_address'])
-        dest_str = quote(dest_info['normalized_address'])
-        
-        # 基本URL
-        url = f"https://www.google.com/maps/dir/{origin_str}/{dest_str}/"
-        
-        # dataパラメータの構築（動作確認済みのフォーマット）
-        data_parts = []
-        
-        # Place IDがある場合
-        if origin_info.get('place_id') and dest_info.get('place_id'):
-            data_parts.append("!4m18!4m17")
-            # 出発地ブロック
-            data_parts.append("!1m5!1m1")
-            data_parts.append(f"!1s{origin_info['place_id']}")
-            if origin_info.get('lon') and origin_info.get('lat'):
-                # 緯度経度は小数点4桁まで
-                data_parts.append(f"!2m2!1d{float(origin_info['lon']):.4f}!2d{float(origin_info['lat']):.4f}")
-            
-            # 目的地ブロック
-            data_parts.append("!1m5!1m1")
-            data_parts.append(f"!1s{dest_info['place_id']}")
-            if dest_info.get('lon') and dest_info.get('lat'):
-                # 緯度経度は小数点4桁まで
-                data_parts.append(f"!2m2!1d{float(dest_info['lon']):.4f}!2d{float(dest_info['lat']):.4f}")
-            
-            # 時刻指定（Place IDブロックの後）
-            if arrival_time:
-                jst = pytz.timezone('Asia/Tokyo')
-                arrival_jst = arrival_time.astimezone(jst)
-                timestamp = self.generate_google_maps_timestamp(
-                    arrival_jst.year,
-                    arrival_jst.month,
-                    arrival_jst.day,
-                    arrival_jst.hour,
-                    arrival_jst.minute
-                )
-                data_parts.append(f"!2m3!6e1!7e2!8j{timestamp}")
-            
-            # 公共交通機関モード（最後）
-            data_parts.append("!3e3")
-        else:
-            # Place IDがない場合
-            if arrival_time:
-                jst = pytz.timezone('Asia/Tokyo')
-                arrival_jst = arrival_time.astimezone(jst)
-                timestamp = self.generate_google_maps_timestamp(
-                    arrival_jst.year,
-                    arrival_jst.month,
-                    arrival_jst.day,
-                    arrival_jst.hour,
-                    arrival_jst.minute
-                )
-                data_parts.append(f"!2m3!6e1!7e2!8j{timestamp}")
-            data_parts.append("!3e3")
-        
-        if data_parts:
-            url += "data=" + "".join(data_parts)
-        
-        return url
+        return maps_url.directions_url(maps_url.endpoint_from_info(origin_info),
+                                       maps_url.endpoint_from_info(dest_info), arrival_time)
     
-    def click_transit_and_set_time(self, arrival_time):
+    def click_transit_and_set_time(self, arrival_time, deadline=None, skipped=None):
         """
         公共交通機関ボタンをクリックし、時刻を設定
+
+        Args:
+            skipped: 時間不足で時刻設定を省略した場合に'set_time'を追加するリスト
         """
+        deadline = Deadline.coerce(deadline)
+        if not deadline.has_time_for(5):
+            logger.warning("残り時間不足のため時刻設定をスキップ - URLパラメータを使用")
+            if skipped is not None:
+                skipped.append('set_time')
+            return True
         logger.info("公共交通機関モードと時刻設定を開始")
         
         # 1. 公共交通機関ボタンをクリック
@@ -261,9 +284,9 @@ class GoogleMapsScraper:
                 transit_btn = self.driver.find_element(By.XPATH, selector)
                 if transit_btn.is_displayed():
                     transit_btn.click()
-                    logger.info(f"公共交通機関ボタンをクリック")
+                    logger.info("公共交通機関ボタンをクリック")
                     transit_clicked = True
-                    time.sleep(2)
+                    deadline.sleep(2)
                     break
             except:
                 continue
@@ -289,9 +312,9 @@ class GoogleMapsScraper:
                 time_btn = self.driver.find_element(By.XPATH, selector)
                 if time_btn.is_displayed():
                     time_btn.click()
-                    logger.info(f"時刻オプションボタンをクリック")
+                    logger.info("時刻オプションボタンをクリック")
                     time_option_clicked = True
-                    time.sleep(1)
+                    deadline.sleep(1)
                     break
             except:
                 continue
@@ -316,19 +339,18 @@ class GoogleMapsScraper:
                     if arrival_option.is_displayed():
                         arrival_option.click()
                         logger.info("「到着時刻」を選択")
-                        time.sleep(1)
+                        deadline.sleep(1)
                         break
                 except:
                     continue
                     
         except Exception as e:
-            logger.warning(f"到着時刻オプションの選択に失敗: {e}")
+            logger.warning("到着時刻オプションの選択に失敗: %s", e)
         
         # 4. 日付・時刻を入力
         try:
             # JSTに変換
-            jst = pytz.timezone('Asia/Tokyo')
-            arrival_jst = arrival_time.astimezone(jst)
+            arrival_jst = arrival_time.astimezone(JST)
             date_str = arrival_jst.strftime('%Y/%m/%d')
             time_str = arrival_jst.strftime('%H:%M')
             
@@ -346,7 +368,7 @@ class GoogleMapsScraper:
                     if date_input.is_displayed():
                         date_input.clear()
                         date_input.send_keys(date_str)
-                        logger.info(f"日付を入力: {date_str}")
+                        logger.info("日付を入力: %s", date_str)
                         break
                 except:
                     continue
@@ -366,16 +388,16 @@ class GoogleMapsScraper:
                         time_input.clear()
                         time_input.send_keys(time_str)
                         time_input.send_keys(Keys.RETURN)
-                        logger.info(f"時刻を入力: {time_str}")
+                        logger.info("時刻を入力: %s", time_str)
                         break
                 except:
                     continue
                     
         except Exception as e:
-            logger.error(f"日付・時刻の入力に失敗: {e}")
+            logger.error("日付・時刻の入力に失敗: %s", e)
             return False
         
-        time.sleep(3)
+        deadline.sleep(3)
         logger.info("時刻設定完了")
         return True
     
@@ -394,7 +416,7 @@ class GoogleMapsScraper:
         
         try:
             # 徒歩時間を抽出（約X分、Xmのパターン）
-            walk_pattern = re.findall(r'約\s*(\d+)\s*分[、,]\s*(\d+)\s*m', text)
+            walk_pattern = route_patterns.WALK.findall(text)
             if walk_pattern:
                 # 最初の徒歩 = 駅までの徒歩
                 detailed_info['walk_to_station'] = int(walk_pattern[0][0])
@@ -403,13 +425,13 @@ class GoogleMapsScraper:
                     detailed_info['walk_from_station'] = int(walk_pattern[-1][0])
             
             # 使用駅を抽出（「XXX駅から」のパターン）
-            station_from_pattern = re.search(r'([^\s]+駅)から\s*(\d+:\d+)', text)
+            station_from_pattern = route_patterns.STATION_DEPARTURE.search(text)
             if station_from_pattern:
                 detailed_info['station_used'] = station_from_pattern.group(1).replace('駅', '')
                 first_train_departure = station_from_pattern.group(2)
             else:
                 # 別のパターン: 時刻の後に駅名
-                alt_pattern = re.search(r'(\d+:\d+)\s*([^\s]+駅)', text)
+                alt_pattern = route_patterns.TIME_THEN_STATION.search(text)
                 if alt_pattern:
                     detailed_info['station_used'] = alt_pattern.group(2).replace('駅', '')
                     first_train_departure = alt_pattern.group(1)
@@ -418,13 +440,13 @@ class GoogleMapsScraper:
             
             # 電車情報を抽出
             # 路線名を探す（XX線のパターン）
-            lines_in_text = re.findall(r'((?:地下鉄)?[^\s]+線)', text)
+            lines_in_text = route_patterns.DETAIL_LINE.findall(text)
             
             # 駅名を全て抽出
-            all_stations = re.findall(r'([^\s]+駅)', text)
+            all_stations = route_patterns.STATION.findall(text)
             
             # 時刻を全て抽出
-            all_times = re.findall(r'(\d{1,2}:\d{2})', text)
+            all_times = route_patterns.CLOCK.findall(text)
             
             # 電車の詳細を構築
             if lines_in_text:
@@ -494,119 +516,214 @@ class GoogleMapsScraper:
             if detailed_info['wait_time_minutes'] is None:
                 detailed_info['wait_time_minutes'] = 3  # デフォルト3分
             
-            logger.info(f"詳細情報抽出完了: 駅まで{detailed_info['walk_to_station']}分, 駅から{detailed_info['walk_from_station']}分, 使用駅:{detailed_info['station_used']}, 電車{len(detailed_info['trains'])}本")
+            logger.debug("詳細情報抽出完了: 駅まで%s分, 駅から%s分, 使用駅:%s, 電車%d本",
+                         detailed_info['walk_to_station'], detailed_info['walk_from_station'],
+                         detailed_info['station_used'], len(detailed_info['trains']),
+                         extra=log_setup.fields(sample='route_details',
+                                                walk_to_station=detailed_info['walk_to_station'],
+                                                walk_from_station=detailed_info['walk_from_station'],
+                                                station_used=detailed_info['station_used'],
+                                                trains=len(detailed_info['trains'])))
             
         except Exception as e:
-            logger.warning(f"詳細情報抽出エラー: {e}")
+            logger.warning("詳細情報抽出エラー: %s", e)
         
         return detailed_info
     
-    def extract_route_details(self):
-        """ルート詳細を抽出（改良版）"""
+    def extract_route_details(self, deadline=None, details=False, first_details=None, skipped=None,
+                              max_routes=MAX_ROUTES):
+        """
+        ルート一覧から各ルートの情報を抽出
+
+        Args:
+            details: Trueなら各ルートの詳細パネルを順に開き、乗車区間・徒歩・使用駅を追加する
+                     （同じページ内で処理するため、比較のための再検索は不要）
+            first_details: 呼び出し元で展開済みの1番目のルートの詳細情報
+            skipped: 時間不足で省略した詳細展開を記録するリスト
+        """
+        deadline = Deadline.coerce(deadline)
         try:
             # まず既存の要素を確認
             route_elements = self.driver.find_elements(By.XPATH, "//div[@data-trip-index]")
             
             if not route_elements:
                 # 要素がない場合のみ待機
-                logger.warning(f"ルート要素が見つかりません。待機中...")
-                wait = WebDriverWait(self.driver, 5)  # 20秒から5秒に短縮
+                logger.warning("ルート要素が見つかりません。待機中...")
+                wait = WebDriverWait(self.driver, deadline.clamp(5))  # 20秒から5秒に短縮
                 try:
                     route_elements = wait.until(
                         EC.presence_of_all_elements_located((By.XPATH, "//div[@data-trip-index]"))
                     )
                 except TimeoutException:
-                    logger.error(f"ルート要素の待機タイムアウト")
-                    # HTMLを保存してデバッグ
-                    with open('/app/output/japandatascience.com/timeline-mapping/api/timeout_debug.html', 'w') as f:
-                        f.write(self.driver.page_source)
-                    logger.info("デバッグ用HTMLを保存: timeout_debug.html")
+                    logger.error("ルート要素の待機タイムアウト")
+                    self.failure_code = failure_codes.TRIPS_TIMEOUT
+                    # HTMLを保存してデバッグ（残り時間がある場合のみ）
+                    if deadline.has_time_for(DEBUG_DUMP_MIN_SECONDS):
+                        saved = debug_artifacts.capture(self.request_id, 'timeout',
+                                                        lambda: self.driver.page_source)
+                        if saved:
+                            logger.info("デバッグ用HTMLを保存キューに追加: %s", saved)
                     return []
             
-            logger.info(f"{len(route_elements)}個のルートを検出")
+            logger.info("%s個のルートを検出", len(route_elements))
+            
+            # 詳細パネルを開くと一覧の要素は古くなるため、先に全カードのテキストを読む
+            texts = []
+            for element in route_elements[:max_routes]:
+                try:
+                    texts.append(element.text)
+                except Exception as e:
+                    logger.error("ルート%sのテキスト取得エラー: %s", len(texts) + 1, e)
+                    texts.append('')
             
             routes = []
-            for i, element in enumerate(route_elements[:3]):  # 最初の3つのルートのみ
+            details_stopped = False  # 時間切れ・Hub停止で以降の詳細展開を打ち切った
+            for i, text in enumerate(texts):
                 try:
-                    text = element.text
-                    
-                    # 所要時間を抽出
-                    hour_match = re.search(r'(\d+)\s*時間', text)
-                    minute_match = re.search(r'(\d+)\s*分', text)
-                    
-                    if not minute_match and not hour_match:
+                    # 所要時間・時刻・運賃・路線を1回の走査で抽出（徒歩の「約X分」は所要時間に数えない）
+                    card = route_patterns.extract_card(text)
+                    if card['travel_time'] is None:
                         continue
                     
-                    hours = int(hour_match.group(1)) if hour_match else 0
-                    minutes = int(minute_match.group(1)) if minute_match else 0
-                    travel_time = hours * 60 + minutes
-                    
-                    # 出発・到着時刻を抽出
-                    time_pattern = r'(\d{1,2}:\d{2})[^\d]*(?:\([^)]+\)[^\d]*)?\s*-\s*(\d{1,2}:\d{2})'
-                    time_match = re.search(time_pattern, text)
-                    if time_match:
-                        departure_time = time_match.group(1)
-                        arrival_time = time_match.group(2)
-                    else:
-                        departure_time = None
-                        arrival_time = None
-                    
-                    # 料金を抽出
-                    fare_match = re.search(r'([\d,]+)\s*円', text)
-                    fare = int(fare_match.group(1).replace(',', '')) if fare_match else None
-                    
-                    # 路線情報を抽出
-                    train_lines = []
-                    # 路線名パターン（「線」「ライン」などを含む）
-                    line_pattern = r'([^\s]+(?:線|ライン|Line))'
-                    line_matches = re.findall(line_pattern, text)
-                    if line_matches:
-                        train_lines = list(set(line_matches))  # 重複を除去
-                    
-                    # ルートタイプを判定
-                    if '徒歩' in text and not any(word in text for word in ['駅', '線', '電車', 'バス']):
-                        route_type = '徒歩のみ'
-                    elif any(word in text for word in ['線', '駅', '電車', 'バス']) or train_lines:
-                        route_type = '公共交通機関'
-                    else:
-                        route_type = '不明'
+                    travel_time = card['travel_time']
+                    train_lines = card['train_lines']
+                    route_type = route_patterns.classify_route_type(text, train_lines)
                     
                     route_info = {
                         'index': i + 1,
                         'travel_time': travel_time,
-                        'departure_time': departure_time,
-                        'arrival_time': arrival_time,
-                        'fare': fare,
+                        'departure_time': card['departure_time'],
+                        'arrival_time': card['arrival_time'],
+                        'fare': card['fare'],
                         'route_type': route_type,
                         'train_lines': train_lines,
                         'summary': text[:200]
                     }
                     
-                    # 最初のルートに詳細情報を追加
-                    if i == 0 and 'detailed_info' in locals() and detailed_info:
-                        route_info.update(detailed_info)
+                    if details and route_type == '公共交通機関':
+                        detailed_info = None
+                        if not details_stopped and deadline.has_time_for(DETAILS_MIN_SECONDS):
+                            try:
+                                detailed_info = self.expand_trip_details(i, deadline)
+                            except (DeadlineExceeded, selenium_hub.HubUnavailable) as e:
+                                # カードの情報は残し、部分結果として以降の詳細展開も省略する
+                                logger.warning("ルート%sの詳細展開を中断: %s", i + 1, e)
+                                details_stopped = True
+                                if skipped is not None:
+                                    skipped.append(f'details:{i + 1}')
+                        else:
+                            logger.warning("残り時間不足のためルート%sの詳細展開をスキップ", i+1)
+                            if skipped is not None:
+                                skipped.append(f'details:{i + 1}')
+                        if detailed_info:
+                            route_info.update(detailed_info)
+                    elif i == 0 and first_details:
+                        # scrape_routeで展開済みの1番目のルートの詳細情報
+                        route_info.update(first_details)
                     
                     routes.append(route_info)
-                    logger.info(f"ルート{i+1}: {travel_time}分 ({route_type}) 料金:{fare}円 路線:{','.join(train_lines)}")
+                    logger.debug("ルート%d: %d分 (%s) 料金:%s円 路線:%s", i + 1, travel_time, route_type,
+                                 card['fare'], train_lines,
+                                 extra=log_setup.fields(sample='route_card', route=i + 1, travel_time=travel_time,
+                                                        route_type=route_type, fare=card['fare'],
+                                                        train_lines=train_lines))
                     
                 except Exception as e:
-                    logger.error(f"ルート{i+1}の抽出エラー: {e}")
+                    logger.error("ルート%sの抽出エラー: %s", i+1, e)
             
+            if not routes:
+                # カードはあるが所要時間を読めなかった
+                self.failure_code = failure_codes.PARSE_FAILURE
             return routes
             
         except TimeoutException:
             logger.error("ルート情報の読み込みタイムアウト")
+            self.failure_code = failure_codes.TRIPS_TIMEOUT
             return []
         except Exception as e:
-            logger.error(f"ルート抽出エラー: {e}")
+            logger.error("ルート抽出エラー: %s", e)
+            self.failure_code = failure_codes.classify_exception(e)
             return []
     
+    def classify_empty_result(self, place_id_missed=False):
+        """ルートが1件も取れなかった原因のコード（同意画面・CAPTCHAを優先して判定）"""
+        try:
+            current_url = self.driver.current_url
+            head = self.driver.find_element(By.TAG_NAME, 'body').text[:2000]
+        except Exception as e:
+            return failure_codes.classify_exception(e)
+        if failure_codes.is_blocked_page(current_url, head):
+            return failure_codes.BLOCKED
+        code = self.failure_code or failure_codes.TRIPS_TIMEOUT
+        if code == failure_codes.TRIPS_TIMEOUT and place_id_missed:
+            return failure_codes.PLACE_ID_MISS
+        return code
+    
+    def read_expanded_text(self):
+        """開いている詳細パネルのテキスト（十分な長さのものがなければ最後に読めたもの）"""
+        expanded_text = None
+        for selector in DETAIL_TEXT_SELECTORS:
+            try:
+                expanded_text = self.driver.find_element(By.XPATH, selector).text
+                if expanded_text and len(expanded_text) > DETAIL_TEXT_MIN_LENGTH:
+                    logger.debug("詳細テキスト取得成功: %d文字", len(expanded_text),
+                                 extra=log_setup.fields(sample='detail_text', chars=len(expanded_text)))
+                    break
+            except Exception:
+                continue
+        return expanded_text
+    
+    def return_to_trip_list(self, deadline=None):
+        """詳細パネルからルート一覧に戻る（一覧が表示されたらTrue）"""
+        deadline = Deadline.coerce(deadline)
+        try:
+            self.driver.execute_script(WARM_LIST_SCRIPT)
+            WebDriverWait(self.driver, deadline.clamp(5), poll_frequency=0.3).until(
+                lambda driver: driver.find_elements(By.XPATH, "//div[@data-trip-index]")
+            )
+            return True
+        except Exception as e:
+            logger.warning("ルート一覧に戻れませんでした: %s", e)
+            return False
+    
+    def expand_trip_details(self, index, deadline=None):
+        """
+        一覧のindex番目（0始まり）のルートの詳細パネルを開いて詳細情報を抽出し、一覧に戻る
+
+        Returns:
+            extract_detailed_info_from_textの結果。開けなかった場合はNone
+        """
+        deadline = Deadline.coerce(deadline)
+        try:
+            trip = self.driver.find_element(By.XPATH, f"//div[@data-trip-index='{index}']")
+            buttons = trip.find_elements(By.XPATH, ".//button[contains(., '詳細')]")
+            if buttons and buttons[0].is_displayed():
+                buttons[0].click()
+            else:
+                trip.click()
+            deadline.sleep(DETAILS_EXPAND_WAIT)
+            expanded_text = self.read_expanded_text()
+        except (DeadlineExceeded, selenium_hub.HubUnavailable):
+            raise
+        except Exception as e:
+            logger.warning("ルート%sの詳細展開エラー: %s", index + 1, e)
+            expanded_text = None
+        finally:
+            self.return_to_trip_list(deadline)
+        
+        if not expanded_text:
+            return None
+        return self.extract_detailed_info_from_text(expanded_text)
+    
     def cleanup_after_route(self):
         """各ルート処理後のメモリクリーンアップ"""
+        if self.driver is None:
+            return
         try:
-            # ページをabout:blankにしてメモリ解放
-            self.driver.execute_script("window.location.href='about:blank'")
-            time.sleep(0.5)
+            if not (self.warm_page and self._warm_key):
+                # ページをabout:blankにしてメモリ解放（ウォームページモードでは経路ページを残す）
+                self.driver.execute_script("window.location.href='about:blank'")
+                time.sleep(0.5)
             
             # ガベージコレクション実行
             gc.collect()
@@ -619,28 +736,170 @@ class GoogleMapsScraper:
                 self.route_count = 0
                 
         except Exception as e:
-            logger.warning(f"クリーンアップエラー: {e}")
+            logger.warning("クリーンアップエラー: %s", e)
     
     def restart_driver(self):
         """WebDriverを再起動する"""
+        self._warm_key = None
         try:
             if self.driver:
-                self.driver.quit()
+                try:
+                    self.driver.quit()
+                finally:
+                    self.driver = None
             self.setup_driver()
+            self.restart_count += 1
             logger.info("WebDriver再起動完了")
         except Exception as e:
-            logger.error(f"WebDriver再起動エラー: {e}")
+            # driverはNoneのまま残し、次のscrape_routeのensure_driver()で再作成する
+            logger.error("WebDriver再起動エラー: %s", e)
     
+    def resolve_place(self, address, name=None, place_id=None, lat=None, lon=None, deadline=None):
+        """外部から渡されたPlace IDがあればそれを使い、なければ検索して取得"""
+        if place_id:
+            return {'place_id': place_id, 'lat': lat, 'lon': lon,
+                    'normalized_address': self.normalize_address(address)}
+        return self.get_place_id(address, name, deadline)
+
+    def build_route_result(self, routes, origin_address, dest_address, dest_name,
+                           origin_info, dest_info, url):
+        """抽出したルート一覧からscrape_routeの成功結果を構築（公共交通機関の最短を代表に）"""
+        # 公共交通機関のルートを優先
+        transit_routes = [r for r in routes if r['route_type'] == '公共交通機関']
+        if transit_routes:
+            shortest = min(transit_routes, key=lambda r: r['travel_time'])
+        else:
+            shortest = min(routes, key=lambda r: r['travel_time'])
+        
+        return {
+            'success': True,
+            'origin': origin_address,
+            'destination': dest_address,
+            'destination_name': dest_name,
+            'travel_time': shortest['travel_time'],
+            'departure_time': shortest.get('departure_time'),
+            'arrival_time': shortest.get('arrival_time'),
+            'fare': shortest.get('fare'),
+            'route_type': shortest['route_type'],
+            'train_lines': shortest.get('train_lines', []),
+            'walk_to_station': shortest.get('walk_to_station'),
+            'walk_from_station': shortest.get('walk_from_station'),
+            'wait_time_minutes': shortest.get('wait_time_minutes'),
+            'station_used': shortest.get('station_used'),
+            'trains': shortest.get('trains', []),
+            'all_routes': routes,
+            'place_ids': {
+                'origin': origin_info.get('place_id'),
+                'destination': dest_info.get('place_id')
+            },
+            'url': url,
+            'cache_key': maps_url.url_cache_key(url)  # URL形式に依存しない重複排除用キー
+        }
+
+    def invalidate_warm_page(self):
+        """経路ページ以外を読み込む前に呼ぶ（ウォームページを使い回せなくなる）"""
+        self._warm_key = None
+
+    def _warm_page_key(self, origin_info, arrival_time):
+        """ウォームページを使い回せる条件（出発地と到着時刻）"""
+        origin = origin_info.get('place_id') or origin_info.get('normalized_address')
+        return (origin, arrival_time.isoformat() if arrival_time else None)
+
+    def swap_destination(self, origin_info, dest_info, dest_name, arrival_time, deadline=None):
+        """
+        読み込み済みの経路ページで目的地だけを差し替えてルートを再検索する
+        ルート一覧の変化をMutationObserverで検知して完了とみなす
+
+        入力欄には住所（駅・空港は名前）しか入れられないため、目的地のPlace IDがある場合は
+        Place ID入りのURLにアプリ内で切り替える（history.pushState＋popstate、再読み込みなし）
+
+        Returns:
+            差し替え後に表示中のURL。使えない・失敗した場合はNone（呼び出し元で通常の遷移にフォールバック）
+        """
+        deadline = Deadline.coerce(deadline)
+        if self._warm_key is None or self._warm_key != self._warm_page_key(origin_info, arrival_time):
+            return None
+        dest_place_id = dest_info.get('place_id')
+        if dest_place_id:
+            target = self.build_url_with_timestamp(origin_info, dest_info, arrival_time)
+            query = dest_place_id
+        elif dest_name and ('駅' in dest_name or '空港' in dest_name):
+            query = dest_name
+        else:
+            query = dest_info['normalized_address']
+        try:
+            # 詳細パネルが開いていれば一覧に戻す
+            if not self.driver.execute_script(WARM_LIST_SCRIPT):
+                deadline.sleep(1)
+                if not self.driver.execute_script(WARM_LIST_SCRIPT):
+                    raise RuntimeError('目的地入力欄が表示されていません')
+            if not self.driver.execute_script(WARM_OBSERVER_SCRIPT):
+                raise RuntimeError('ルート一覧がありません')
+            
+            if dest_place_id:
+                self.driver.execute_script(WARM_URL_SWAP_SCRIPT, target)
+            else:
+                box = self.driver.find_element(By.CSS_SELECTOR, '#directions-searchbox-1 input')
+                box.click()
+                box.send_keys(Keys.CONTROL, 'a')
+                box.send_keys(Keys.DELETE)
+                box.send_keys(query)
+                box.send_keys(Keys.RETURN)
+            
+            WebDriverWait(self.driver, deadline.clamp(WARM_SWAP_TIMEOUT), poll_frequency=0.2).until(
+                lambda driver: driver.execute_script(WARM_READY_SCRIPT, WARM_SETTLE_MS)
+            )
+            if dest_place_id and dest_place_id not in self.driver.current_url:
+                raise RuntimeError('表示中のURLに目的地のPlace IDがありません')
+            self.warm_stats['swapped'] += 1
+            logger.info("♻️ ウォームページで目的地を差し替え: %s", query[:30])
+            return self.driver.current_url
+        except Exception as e:
+            logger.warning("目的地の差し替えに失敗、通常の遷移に切り替え: %s", e)
+            self._warm_key = None
+            self.warm_stats['fallback'] += 1
+            return None
+
+    def _enter_phase(self, phase):
+        """フェーズ開始を記録して開始時刻を返す"""
+        self.current_phase = phase
+        self.phase_started_at = time.time()
+        return self.phase_started_at
+
     def scrape_route(self, origin_address, dest_address, dest_name=None, arrival_time=None,
                      origin_place_id=None, dest_place_id=None, 
-                     origin_lat=None, origin_lon=None, dest_lat=None, dest_lon=None):
+                     origin_lat=None, origin_lon=None, dest_lat=None, dest_lon=None,
+                     deadline=None, all_details=False, strategy=None):
         """
         ルート情報をスクレイピング
         Place IDを外部から受け取る（オプション）
         Place IDが渡されない場合は従来通り取得
+        
+        deadline: 時間予算（秒またはDeadline）。各ステップが残り時間を消費し、
+        不足時は詳細展開を省略して'partial': Trueの結果を返す
+        all_details: Trueなら一覧の全ルート（最大MAX_ROUTES）の詳細を同じページで展開し、
+        all_routesの各要素に乗車区間・徒歩・使用駅を含める（ルート比較用）
+        strategy: 再試行時の取得方法（failure_codes.NO_PLACE_ID_URL: Place IDを調べず住所だけのURL、
+        failure_codes.CLICK_FLOW: URLパラメータを信用せずクリック操作で交通手段・時刻を設定）
+        
+        失敗時の結果には'error_code'（failure_codesの分類）を付ける
         """
+        self.phase_timings = {}
+        self.failure_code = None
+        self.request_id = debug_artifacts.new_request_id(origin_address, dest_address)
+        phase_start = self._enter_phase('place_id')
+        deadline = Deadline.coerce(deadline)
+        skipped = []  # 時間不足で省略したステップ
+        url = None
+        detailed_info = None  # 1番目のルートの詳細情報（詳細パネルを開いた場合）
         
         try:
+            self.ensure_driver()
+            if not deadline.unlimited:
+                # 暗黙待機・ページロードのタイムアウトも残り時間以内に
+                self.driver.implicitly_wait(deadline.clamp(10))
+                self.driver.set_page_load_timeout(deadline.clamp(30, minimum=1))
+            
             # Place ID情報の準備
             if origin_place_id:
                 # Place IDが渡された場合はそれを使用
@@ -650,10 +909,12 @@ class GoogleMapsScraper:
                     'lon': origin_lon,
                     'normalized_address': self.normalize_address(origin_address)
                 }
-                logger.info(f"📍 外部Place ID使用（出発地）: {origin_place_id}")
+                logger.info("📍 外部Place ID使用（出発地）: %s", origin_place_id)
+            elif strategy == failure_codes.NO_PLACE_ID_URL:
+                origin_info = self.address_only_info(origin_address)
             else:
                 # Place IDが渡されない場合は従来通り取得
-                origin_info = self.get_place_id(origin_address, "出発地")
+                origin_info = self.get_place_id(origin_address, "出発地", deadline)
             
             if dest_place_id:
                 # Place IDが渡された場合はそれを使用
@@ -663,30 +924,46 @@ class GoogleMapsScraper:
                     'lon': dest_lon,
                     'normalized_address': self.normalize_address(dest_address)
                 }
-                logger.info(f"📍 外部Place ID使用（目的地）: {dest_place_id}")
+                logger.info("📍 外部Place ID使用（目的地）: %s", dest_place_id)
+            elif strategy == failure_codes.NO_PLACE_ID_URL:
+                dest_info = self.address_only_info(dest_address)
             else:
                 # Place IDが渡されない場合は従来通り取得
-                dest_info = self.get_place_id(dest_address, dest_name)
+                dest_info = self.get_place_id(dest_address, dest_name, deadline)
+            self.phase_timings['place_id'] = time.time() - phase_start
             
             # タイムスタンプ付きURLを構築
             url = self.build_url_with_timestamp(origin_info, dest_info, arrival_time)
             
-            logger.info(f"📍 ルート検索: {dest_name or dest_address[:30]}...")
-            logger.info(f"URL: {url}")
+            logger.info("📍 ルート検索: %s...", dest_name or dest_address[:30])
+            logger.info("URL: %s", url)
             
-            self.driver.get(url)
-            time.sleep(5)  # 初期ロード待機
+            phase_start = self._enter_phase('page_load')
+            request_scheduler.acquire(self.lane, None if deadline.unlimited else deadline.remaining())
+            deadline.check('page_load')
+            swapped_url = self.warm_page and self.swap_destination(origin_info, dest_info, dest_name,
+                                                                   arrival_time, deadline)
+            if swapped_url:
+                # 結果のurl・cache_keyは実際に表示しているページのもの
+                url = swapped_url
+            else:
+                self.driver.get(url)
+                deadline.sleep(5)  # 初期ロード待機
+                if self.warm_page:
+                    self._warm_key = self._warm_page_key(origin_info, arrival_time)
+            self.phase_timings['page_load'] = time.time() - phase_start
+            phase_start = self._enter_phase('details')
             
             # 現在のURLを記録
             current_url = self.driver.current_url
-            logger.info(f"📍 現在のURL: {current_url}")
+            logger.info("📍 現在のURL: %s", current_url)
             
             # ルート要素の存在を確認
             try:
                 route_elements = self.driver.find_elements(By.XPATH, "//div[@data-trip-index]")
-                if route_elements:
+                if route_elements and strategy != failure_codes.CLICK_FLOW:
                     # ルート要素が既に存在 = URLパラメータが適用済み
-                    logger.info(f"✅ ルート要素検出（{len(route_elements)}個）- URLパラメータ適用済み")
+                    logger.info("✅ ルート要素検出（%s個）- URLパラメータ適用済み", len(route_elements))
                     
                     # 公共交通機関と時刻が既に設定されている場合はスキップ
                     if '!3e3' in current_url and '!8j' in current_url:
@@ -695,221 +972,275 @@ class GoogleMapsScraper:
                         # 時刻設定が必要な場合は先に設定
                         if arrival_time:
                             try:
-                                self.click_transit_and_set_time(arrival_time)
-                                time.sleep(3)  # 時刻設定後の再読み込みを待つ
+                                self.click_transit_and_set_time(arrival_time, deadline, skipped)
+                                deadline.sleep(3)  # 時刻設定後の再読み込みを待つ
                                 # ルート要素を再取得
                                 route_elements = self.driver.find_elements(By.XPATH, "//div[@data-trip-index]")
-                                logger.info(f"時刻設定後のルート要素: {len(route_elements)}個")
+                                logger.info("時刻設定後のルート要素: %s個", len(route_elements))
                             except Exception as e:
-                                logger.warning(f"時刻設定エラー（続行）: {e}")
+                                logger.warning("時刻設定エラー（続行）: %s", e)
                     
                     # 「詳細」ボタンまたは最初のルート要素をクリックして詳細表示
-                    detailed_info = None
-                    
-                    # まず「詳細」ボタンを探してクリック
-                    try:
-                        # 詳細ボタンのセレクタ（複数パターン）
-                        detail_button_selectors = [
-                            "//button[contains(@id, 'section-directions-trip-details-msg-0')]",
-                            "//button[contains(., '詳細')]",
-                            "//button[contains(@class, 'TIQqpf') and contains(., '詳細')]",
-                            "//span[text()='詳細']/..",
-                            "//div[@data-trip-index='0']//button[contains(., '詳細')]"
-                        ]
-                        
-                        detail_clicked = False
-                        for selector in detail_button_selectors:
-                            try:
-                                detail_btn = self.driver.find_element(By.XPATH, selector)
-                                if detail_btn.is_displayed():
-                                    detail_btn.click()
-                                    logger.info("✅ 「詳細」ボタンをクリック")
-                                    detail_clicked = True
-                                    time.sleep(3)  # 詳細展開を待つ
-                                    break
-                            except:
-                                continue
-                        
-                        # 詳細ボタンが見つからない場合は、最初のルート要素全体をクリック
-                        if not detail_clicked and route_elements:
-                            route_elements[0].click()
-                            logger.info("最初のルート要素をクリックして詳細表示")
-                            time.sleep(3)
-                        
-                        # 展開された詳細情報を取得
-                        # 詳細ボタンクリック後、詳細情報が展開される
+                    # まず「詳細」ボタンを探してクリック（任意の付加情報なので残り時間を確認）
+                    if all_details:
+                        logger.info("全ルートの詳細を一覧から順に展開します")
+                    elif not deadline.has_time_for(DETAILS_MIN_SECONDS):
+                        logger.warning("残り時間不足のため詳細展開をスキップ (%.1f秒)", deadline.remaining())
+                        skipped.append('details')
+                    else:
                         try:
-                            # 複数のセレクタパターンを試す（詳細表示後のDOM構造）
-                            detail_selectors = [
-                                # 詳細情報を含む正確なコンテナ（HTMLから確認済み）
-                                "//div[@class='m6QErb WNBkOb XiKgde']",
-                                "//div[@class='m6QErb DxyBCb kA9KIf dS8AEf XiKgde']",
-                                # フォールバック：m6QErbクラスを含む要素
-                                "//div[contains(@class, 'm6QErb') and contains(@class, 'XiKgde')]",
-                                "//div[contains(@class, 'm6QErb')]"
+                            # 詳細ボタンのセレクタ（複数パターン）
+                            detail_button_selectors = [
+                                "//button[contains(@id, 'section-directions-trip-details-msg-0')]",
+                                "//button[contains(., '詳細')]",
+                                "//button[contains(@class, 'TIQqpf') and contains(., '詳細')]",
+                                "//span[text()='詳細']/..",
+                                "//div[@data-trip-index='0']//button[contains(., '詳細')]"
                             ]
-                            
-                            expanded_text = None
-                            for selector in detail_selectors:
+                        
+                            detail_clicked = False
+                            for selector in detail_button_selectors:
                                 try:
-                                    expanded_element = self.driver.find_element(By.XPATH, selector)
-                                    expanded_text = expanded_element.text
-                                    if expanded_text and len(expanded_text) > 500:  # 詳細情報は長いはず
-                                        logger.info(f"✅ 詳細テキスト取得成功: {len(expanded_text)}文字")
-                                        # 取得内容の一部をログ出力（デバッグ用）
-                                        if "小川町駅" in expanded_text or "中河原駅" in expanded_text:
-                                            logger.info("✅ 駅名を含む詳細情報を確認")
+                                    detail_btn = self.driver.find_element(By.XPATH, selector)
+                                    if detail_btn.is_displayed():
+                                        detail_btn.click()
+                                        logger.info("✅ 「詳細」ボタンをクリック")
+                                        detail_clicked = True
+                                        deadline.sleep(3)  # 詳細展開を待つ
                                         break
                                 except:
                                     continue
+                        
+                            # 詳細ボタンが見つからない場合は、最初のルート要素全体をクリック
+                            if not detail_clicked and route_elements:
+                                route_elements[0].click()
+                                logger.info("最初のルート要素をクリックして詳細表示")
+                                deadline.sleep(3)
+                        
+                            # 展開された詳細情報を取得
+                            # 詳細ボタンクリック後、詳細情報が展開される
+                            try:
+                                # 複数のセレクタパターンを試す（詳細表示後のDOM構造）
+                                expanded_text = self.read_expanded_text()
                             
-                            if expanded_text:
-                                # 詳細情報を抽出
-                                detailed_info = self.extract_detailed_info_from_text(expanded_text)
+                                if expanded_text:
+                                    # 詳細情報を抽出
+                                    detailed_info = self.extract_detailed_info_from_text(expanded_text)
                                 
-                                # 詳細情報が取得できた場合、基本情報も抽出して結果を返す
-                                if detailed_info and detailed_info.get('trains'):
-                                    # 所要時間を抽出
-                                    time_match = re.search(r'(\d+)\s*時間\s*(\d+)\s*分|(\d+)\s*分', expanded_text)
-                                    if time_match:
-                                        if time_match.group(1):  # 時間と分
-                                            travel_time = int(time_match.group(1)) * 60 + int(time_match.group(2))
-                                        else:  # 分のみ
-                                            travel_time = int(time_match.group(3))
-                                    else:
-                                        travel_time = 60  # デフォルト
-                                    
-                                    # 料金を抽出
-                                    fare_match = re.search(r'([\d,]+)\s*円', expanded_text)
-                                    fare = int(fare_match.group(1).replace(',', '')) if fare_match else None
-                                    
-                                    # 時刻を抽出
-                                    time_pattern = r'(\d{1,2}:\d{2})[^\d]*(?:\([^)]+\)[^\d]*)?\s*-\s*(\d{1,2}:\d{2})'
-                                    time_match = re.search(time_pattern, expanded_text)
-                                    if time_match:
-                                        departure_time = time_match.group(1)
-                                        arrival_time = time_match.group(2)
-                                    else:
-                                        departure_time = None
-                                        arrival_time = None
-                                    
-                                    # 詳細情報が取得できたので、結果を構築して返す
-                                    result = {
-                                        'success': True,
-                                        'origin': origin_address,
-                                        'destination': dest_address,
-                                        'destination_name': dest_name,
-                                        'travel_time': travel_time,
-                                        'departure_time': departure_time,
-                                        'arrival_time': arrival_time,
-                                        'fare': fare,
-                                        'route_type': '公共交通機関',
-                                        'train_lines': [train['line'] for train in detailed_info.get('trains', [])],
-                                        'walk_to_station': detailed_info.get('walk_to_station'),
-                                        'walk_from_station': detailed_info.get('walk_from_station'),
-                                        'wait_time_minutes': detailed_info.get('wait_time_minutes'),
-                                        'station_used': detailed_info.get('station_used'),
-                                        'trains': detailed_info.get('trains', []),
-                                        'place_ids': {
-                                            'origin': origin_info.get('place_id'),
-                                            'destination': dest_info.get('place_id')
-                                        },
-                                        'url': url
-                                    }
-                                    
-                                    logger.info("✅ 詳細情報から結果を構築しました")
-                                    return result
+                                    # 詳細情報が取得できた場合、基本情報も抽出して結果を返す
+                                    if detailed_info and detailed_info.get('trains'):
+                                        # 所要時間・運賃・時刻を抽出（見つからなければ所要時間は60分）
+                                        card = route_patterns.extract_card(expanded_text)
+                                        route = {
+                                            'index': 1,
+                                            'travel_time': card['travel_time'] or 60,
+                                            'departure_time': card['departure_time'],
+                                            'arrival_time': card['arrival_time'],
+                                            'fare': card['fare'],
+                                            'route_type': '公共交通機関',
+                                            'train_lines': [train['line'] for train in detailed_info['trains']],
+                                            'summary': expanded_text[:200]
+                                        }
+                                        route.update(detailed_info)
+                                        
+                                        # 詳細情報が取得できたので、一覧を読まずに結果を構築して返す
+                                        self.phase_timings['details'] = time.time() - phase_start
+                                        selenium_hub.get_registry().record_success(self.hub_url)
+                                        result = self.build_route_result([route], origin_address, dest_address,
+                                                                         dest_name, origin_info, dest_info, url)
+                                        if skipped:
+                                            result['partial'] = True
+                                            result['skipped'] = skipped
+                                        logger.info("✅ 詳細情報から結果を構築しました")
+                                        return result
                                 
-                            else:
-                                # 最後の手段：ページ全体のテキストから抽出
-                                logger.warning("特定セレクタで取得できず、ページ全体から取得を試みます")
-                                try:
-                                    page_text = self.driver.find_element(By.XPATH, "//body").text
-                                    if "小川町駅" in page_text and "中河原駅" in page_text:
-                                        logger.info(f"✅ ページ全体から詳細情報を取得: {len(page_text)}文字")
-                                        detailed_info = self.extract_detailed_info_from_text(page_text)
-                                    else:
-                                        logger.warning("詳細テキストが取得できませんでした")
-                                except Exception as e:
-                                    logger.warning(f"ページ全体のテキスト取得失敗: {e}")
+                                else:
+                                    # 最後の手段：ページ全体のテキストから抽出
+                                    logger.warning("特定セレクタで取得できず、ページ全体から取得を試みます")
+                                    try:
+                                        page_text = self.driver.find_element(By.XPATH, "//body").text
+                                        if "小川町駅" in page_text and "中河原駅" in page_text:
+                                            logger.info("✅ ページ全体から詳細情報を取得: %s文字", len(page_text))
+                                            detailed_info = self.extract_detailed_info_from_text(page_text)
+                                        else:
+                                            logger.warning("詳細テキストが取得できませんでした")
+                                    except Exception as e:
+                                        logger.warning("ページ全体のテキスト取得失敗: %s", e)
                                 
-                        except Exception as e:
-                            logger.warning(f"詳細テキスト取得エラー: {e}")
+                            except Exception as e:
+                                logger.warning("詳細テキスト取得エラー: %s", e)
                             
-                    except Exception as e:
-                        logger.warning(f"詳細表示クリックエラー: {e}")
+                        except Exception as e:
+                            logger.warning("詳細表示クリックエラー: %s", e)
                 else:
-                    # ルート要素なし = 手動で設定が必要
+                    # ルート要素なし（またはクリック操作での再試行） = 手動で設定が必要
                     logger.info("ルート要素未検出 - 手動設定モードへ")
                     if arrival_time:
                         try:
-                            self.click_transit_and_set_time(arrival_time)
+                            self.click_transit_and_set_time(arrival_time, deadline, skipped)
                         except Exception as e:
-                            logger.warning(f"クリック操作エラー（続行）: {e}")
+                            logger.warning("クリック操作エラー（続行）: %s", e)
             except Exception as e:
-                logger.warning(f"ルート要素確認エラー: {e}")
+                logger.warning("ルート要素確認エラー: %s", e)
                 # エラーの場合は従来のフローを試す
                 if arrival_time:
                     try:
-                        self.click_transit_and_set_time(arrival_time)
+                        self.click_transit_and_set_time(arrival_time, deadline, skipped)
                     except Exception as e:
-                        logger.warning(f"クリック操作エラー（続行）: {e}")
+                        logger.warning("クリック操作エラー（続行）: %s", e)
+            
+            if detailed_info is not None:
+                # 1番目のルートの詳細パネルが開いたままなので一覧に戻す
+                self.return_to_trip_list(deadline)
+            self.phase_timings['details'] = time.time() - phase_start
             
-            # ルート詳細を抽出
-            routes = self.extract_route_details()
+            # ルート詳細を抽出（all_detailsなら各ルートの詳細もここで展開）
+            phase_start = self._enter_phase('extract')
+            routes = self.extract_route_details(deadline, details=all_details, first_details=detailed_info,
+                                                skipped=skipped)
+            self.phase_timings['extract'] = time.time() - phase_start
+            selenium_hub.get_registry().record_success(self.hub_url)
             
             if routes:
-                # 公共交通機関のルートを優先
-                transit_routes = [r for r in routes if r['route_type'] == '公共交通機関']
-                if transit_routes:
-                    shortest = min(transit_routes, key=lambda r: r['travel_time'])
-                else:
-                    shortest = min(routes, key=lambda r: r['travel_time'])
+                result = self.build_route_result(routes, origin_address, dest_address, dest_name,
+                                                 origin_info, dest_info, url)
                 
-                result = {
-                    'success': True,
-                    'origin': origin_address,
-                    'destination': dest_address,
-                    'destination_name': dest_name,
-                    'travel_time': shortest['travel_time'],
-                    'departure_time': shortest.get('departure_time'),
-                    'arrival_time': shortest.get('arrival_time'),
-                    'fare': shortest.get('fare'),
-                    'route_type': shortest['route_type'],
-                    'train_lines': shortest.get('train_lines', []),
-                    'walk_to_station': shortest.get('walk_to_station'),
-                    'walk_from_station': shortest.get('walk_from_station'),
-                    'wait_time_minutes': shortest.get('wait_time_minutes'),
-                    'trains': shortest.get('trains', []),
-                    'all_routes': routes,
-                    'place_ids': {
-                        'origin': origin_info.get('place_id'),
-                        'destination': dest_info.get('place_id')
-                    },
-                    'url': url
-                }
+                if skipped:
+                    result['partial'] = True
+                    result['skipped'] = skipped
                 
                 # キャッシュ無効化
                 # self.route_cache[cache_key] = result
                 
                 return result
             else:
+                self._warm_key = None
+                place_id_missed = not (origin_info.get('place_id') and dest_info.get('place_id'))
                 return {
                     'success': False,
                     'error': 'ルート情報を取得できませんでした',
+                    'error_code': self.classify_empty_result(
+                        place_id_missed and strategy != failure_codes.NO_PLACE_ID_URL),
                     'url': url
                 }
                 
+        except selenium_hub.HubUnavailable as e:
+            logger.error("Selenium Hub利用不可: %s", e)
+            return {
+                'success': False,
+                'error': str(e),
+                'error_code': failure_codes.HUB_UNAVAILABLE,
+                'hub_unavailable': True,
+                'retry_after': e.retry_after
+            }
+        except (DeadlineExceeded, request_scheduler.RateLimitTimeout) as e:
+            logger.error("時間予算切れ: %s (%.1f秒経過)", e, deadline.elapsed())
+            self._warm_key = None
+            return {
+                'success': False,
+                'error': f'時間予算を超過しました: {e}',
+                'error_code': failure_codes.DEADLINE,
+                'deadline_exceeded': True,
+                'partial': True,
+                'skipped': skipped,
+                'url': url
+            }
         except Exception as e:
-            logger.error(f"スクレイピングエラー: {e}")
+            logger.error("スクレイピングエラー: %s", e)
+            self._warm_key = None
+            error_code = failure_codes.classify_exception(e)
+            if selenium_hub.is_connection_error(e):
+                # Hub・セッションの障害はブレーカーに記録し、セッションを作り直す
+                selenium_hub.get_registry().record_failure(self.hub_url)
+                self.restart_driver()
+            elif error_code == failure_codes.DRIVER_DEAD:
+                # ブラウザ側のセッション切れ（Hubは正常）
+                self.restart_driver()
             return {
                 'success': False,
-                'error': str(e)
+                'error': str(e),
+                'error_code': error_code
             }
         finally:
+            self.current_phase = None
+            if not deadline.unlimited:
+                try:
+                    self.driver.implicitly_wait(10)
+                    self.driver.set_page_load_timeout(30)
+                except Exception:
+                    pass
             # ルート処理後のクリーンアップ
             self.cleanup_after_route()
     
+    def rewrite_url_timestamp(self, url, arrival_time):
+        """URLの!8j<timestamp>セグメントだけを書き換える"""
+        return maps_url.with_time(url, arrival_time)
+
+    def sweep_arrival_times(self, origin_address, dest_address, arrival_times, dest_name=None,
+                            origin_place_id=None, dest_place_id=None,
+                            origin_lat=None, origin_lon=None, dest_lat=None, dest_lon=None,
+                            deadline=None):
+        """
+        複数の到着時刻でルートを取得（到着時刻スイープ）
+        Place ID解決とURL構築は1回だけ行い、時刻ごとに!8jセグメントのみ書き換えて再読み込みする
+
+        deadline: ルート全体の時間予算（秒またはDeadline）。切れたら残りのスロットは取得しない
+
+        Returns:
+            [{'arrival_slot', 'travel_time', 'departure_time', 'arrival_time', 'route_type', 'train_lines', 'fare'}]
+            取得失敗・時間切れのスロットはtravel_time=None
+        """
+        deadline = Deadline.coerce(deadline)
+        self.ensure_driver()
+        origin_info = self.resolve_place(origin_address, "出発地", origin_place_id, origin_lat, origin_lon, deadline)
+        dest_info = self.resolve_place(dest_address, dest_name, dest_place_id, dest_lat, dest_lon, deadline)
+
+        base_url = self.build_url_with_timestamp(origin_info, dest_info, arrival_times[0])
+        logger.info("⏱ 到着時刻スイープ: %s (%sスロット)", dest_name or dest_address[:30], len(arrival_times))
+
+        samples = []
+        stopped = False  # 時間切れ以降のスロットは取得しない
+        try:
+            for slot in arrival_times:
+                url = self.rewrite_url_timestamp(base_url, slot)
+                sample = {'arrival_slot': slot.strftime('%H:%M'), 'travel_time': None, 'url': url}
+                samples.append(sample)
+                if stopped:
+                    continue
+                try:
+                    self.ensure_driver()
+                    request_scheduler.acquire(self.lane, None if deadline.unlimited else deadline.remaining())
+                    deadline.check('sweep')
+                    self.invalidate_warm_page()
+                    self.driver.get(url)
+                    routes = self.extract_route_details(deadline)
+                except (DeadlineExceeded, request_scheduler.RateLimitTimeout) as e:
+                    logger.warning("時間予算切れのため%s着以降のスロットを省略: %s", sample['arrival_slot'], e)
+                    stopped = True
+                    continue
+                except Exception as e:
+                    logger.warning("%s着の取得エラー: %s", sample['arrival_slot'], e)
+                    if selenium_hub.is_connection_error(e):
+                        selenium_hub.get_registry().record_failure(self.hub_url)
+                        self.restart_driver()
+                    continue
+                if routes:
+                    transit_routes = [r for r in routes if r['route_type'] == '公共交通機関'] or routes
+                    best = min(transit_routes, key=lambda r: r['travel_time'])
+                    sample.update({
+                        'travel_time': best['travel_time'],
+                        'departure_time': best.get('departure_time'),
+                        'arrival_time': best.get('arrival_time'),
+                        'route_type': best['route_type'],
+                        'train_lines': best.get('train_lines', []),
+                        'fare': best.get('fare')
+                    })
+                logger.info("  %s着: %s分", sample['arrival_slot'], sample['travel_time'])
+        finally:
+            self.cleanup_after_route()
+
+        return samples
+
     def close(self):
         """ドライバーを閉じる"""
         if self.driver:
@@ -918,13 +1249,14 @@ class GoogleMapsScraper:
                 logger.info("Seleniumセッション終了")
             except:
                 pass
+            self.driver = None
+            self._warm_key = None
 
 def test_v5_ultimate():
     """動作テスト"""
     
     # 明日の10時到着
-    jst = pytz.timezone('Asia/Tokyo')
-    tomorrow = datetime.now(jst) + timedelta(days=1)
+    tomorrow = datetime.now(JST) + timedelta(days=1)
     arrival_time = tomorrow.replace(hour=10, minute=0, second=0, microsecond=0)
     
     print("="*60)
@@ -976,4 +1308,5 @@ def test_v5_ultimate():
         scraper.close()
 
 if __name__ == "__main__":
+    log_setup.configure()
     test_v5_ultimate()
\ No newline at end of file
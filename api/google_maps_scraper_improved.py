@@ -21,6 +21,8 @@ from selenium.webdriver.common.action_chains import ActionChains
 import traceback
 import os
 from pathlib import Path
+from address_normalizer import normalize_address
+import maps_url
 
 # ログ設定
 logging.basicConfig(
@@ -35,35 +37,6 @@ def normalize_id(text_id):
     """
     return text_id.lower().replace('-', '_')
 
-def normalize_address(address):
-    """
-    住所文字列をGoogle Mapsが解釈しやすい形式に正規化する
-    """
-    if not address:
-        return address
-    
-    original = address
-    
-    # 1. 全角英数字を半角に変換
-    address = address.translate(str.maketrans(
-        '０１２３４５６７８９',
-        '0123456789'
-    ))
-    
-    # 2. 丁目・番地・号をハイフン形式に統一
-    address = re.sub(r'(\d+)丁目\s*', r'\1-', address)
-    address = re.sub(r'(\d+)番地?\s*', r'\1-', address)
-    address = re.sub(r'(\d+)号\s*', r'\1', address)
-    
-    # 3. 不要なスペースを削除
-    address = re.sub(r'(\d+)\s*-\s*(\d+)', r'\1-\2', address)
-    address = re.sub(r'(\d+)\s+(?=[^\u4e00-\u9fff])', r'\1', address)
-    
-    if address != original:
-        logger.info(f"Address normalized: '{original}' → '{address}'")
-    
-    return address
-
 def setup_driver():
     """Setup Chrome driver with remote Selenium Grid"""
     options = Options()
@@ -269,19 +242,11 @@ def scrape_route(origin, destination):
         driver = setup_driver()
         logger.info(f"Scraping route from '{origin}' to '{destination}'")
         
-        # URLを構築（日本時間の朝9時出発を指定）
-        base_url = "https://www.google.com/maps/dir/"
-        params = {
-            'api': '1',
-            'origin': origin,
-            'destination': destination,
-            'travelmode': 'transit',
-            'departure_time': '9am'  # 朝9時出発
-        }
-        
-        # パラメータをURLエンコード
-        from urllib.parse import urlencode
-        url = f"{base_url}?{urlencode(params)}"
+        # URLを構築（日本時間の翌朝9時出発を指定、maps_urlの正規形）
+        departure = (datetime.now(maps_url.JST) + timedelta(days=1)).replace(
+            hour=9, minute=0, second=0, microsecond=0)
+        url = maps_url.directions_url(maps_url.Endpoint(origin), maps_url.Endpoint(destination),
+                                      departure, maps_url.DEPART)
         
         logger.info(f"Navigating to: {url}")
         driver.get(url)
@@ -21,6 +21,8 @@ from selenium.webdriver.common.action_chains import ActionChains
 import traceback
 import os
 from pathlib import Path
+from address_normalizer import normalize_address
+import maps_url
 
 # ログ設定
 logging.basicConfig(
@@ -29,53 +31,6 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def normalize_address(address):
-    """
-    住所文字列をGoogle Mapsが解釈しやすい形式に正規化する
-    """
-    if not address:
-        return address
-    
-    # 元の住所を記録
-    original = address
-    
-    # 1. 全角英数字を半角に変換
-    # 全角数字
-    address = address.translate(str.maketrans(
-        '０１２３４５６７８９',
-        '0123456789'
-    ))
-    # 全角アルファベット（大文字）
-    address = address.translate(str.maketrans(
-        'ＡＢＣＤＥＦＧＨＩＪＫＬＭＮＯＰＱＲＳＴＵＶＷＸＹＺ',
-        'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
-    ))
-    # 全角アルファベット（小文字）
-    address = address.translate(str.maketrans(
-        'ａｂｃｄｅｆｇｈｉｊｋｌｍｎｏｐｑｒｓｔｕｖｗｘｙｚ',
-        'abcdefghijklmnopqrstuvwxyz'
-    ))
-    
-    # 2. 丁目・番地・号をハイフン形式に統一
-    # 例: "2丁目22番3号" → "2-22-3"
-    address = re.sub(r'(\d+)丁目\s*', r'\1-', address)
-    address = re.sub(r'(\d+)番地?\s*', r'\1-', address)
-    address = re.sub(r'(\d+)号\s*', r'\1', address)
-    
-    # 3. 不要なスペースを削除
-    # 数字-数字の間のスペースを削除
-    address = re.sub(r'(\d+)\s*-\s*(\d+)', r'\1-\2', address)
-    # 数字の後のスペースを削除（ただし、その後に漢字が続く場合は残す）
-    address = re.sub(r'(\d+)\s+(?=[^\u4e00-\u9fff])', r'\1', address)
-    
-    # 4. 建物名は保持（Google Mapsでの認識率向上のため）
-    
-    # ログ出力
-    if address != original:
-        logger.info(f"Address normalized: '{original}' → '{address}'")
-    
-    return address
-
 def setup_driver():
     """Setup Chrome driver with remote Selenium Grid"""
     options = Options()
@@ -245,19 +200,12 @@ def extract_route_details(driver, origin, destination, arrival_time=None):
     destination = normalize_address(destination)
     logger.info(f"[{request_id}] Normalized addresses - Origin: {origin}, Destination: {destination}")
     
-    # URL構築とページ読み込み
-    from urllib.parse import quote
-    encoded_origin = quote(origin)
-    encoded_destination = quote(destination)
-    
-    # Google Maps Direction API v1 形式を使用（api=1が必須）
-    url = f"https://www.google.com/maps/dir/?api=1&origin={encoded_origin}&destination={encoded_destination}&travelmode=transit"
-    
+    # URL構築（maps_urlの正規形。naiveな時刻はJSTとして扱う）
     if arrival_time and isinstance(arrival_time, datetime):
-        # 到着時刻は公共交通機関モードでのみ有効
-        timestamp = int(arrival_time.timestamp())
-        url += f"&arrival_time={timestamp}"
-        logger.info(f"Using arrival time: {arrival_time} (timestamp: {timestamp})")
+        url = maps_url.directions_url(maps_url.Endpoint(origin), maps_url.Endpoint(destination), arrival_time)
+        logger.info(f"Using arrival time: {arrival_time}")
+    else:
+        url = maps_url.directions_url(maps_url.Endpoint(origin), maps_url.Endpoint(destination))
     
     logger.info(f"[{request_id}] Loading URL: {url}")
     
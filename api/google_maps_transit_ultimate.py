@@ -7,6 +7,14 @@ Updated: 2025-08-14
 
 import json
 import sys
+import os
+
+# 常駐デーモン（scraper_daemon.py）が起動していれば、Seleniumをimportする前に委譲する
+if __name__ == "__main__" and len(sys.argv) >= 3:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from scraper_daemon import delegate_cli
+    delegate_cli('ultimate', sys.argv[1:])
+
 import time
 import re
 import logging
@@ -19,8 +27,11 @@ from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import TimeoutException, NoSuchElementException, StaleElementReferenceException
 from selenium.webdriver.common.action_chains import ActionChains
 import traceback
-import os
-from pathlib import Path
+import selenium_hub
+import debug_artifacts
+import request_scheduler
+from address_normalizer import normalize_address
+import maps_url
 
 # ログ設定
 logging.basicConfig(
@@ -36,43 +47,6 @@ def normalize_id(text_id):
     """
     return text_id.lower().replace('-', '_')
 
-def normalize_address(address):
-    """
-    住所文字列をGoogle Mapsが解釈しやすい形式に正規化する
-    """
-    if not address:
-        return address
-    
-    original = address
-    
-    # 1. 全角英数字を半角に変換
-    address = address.translate(str.maketrans(
-        '０１２３４５６７８９',
-        '0123456789'
-    ))
-    address = address.translate(str.maketrans(
-        'ＡＢＣＤＥＦＧＨＩＪＫＬＭＮＯＰＱＲＳＴＵＶＷＸＹＺ',
-        'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
-    ))
-    address = address.translate(str.maketrans(
-        'ａｂｃｄｅｆｇｈｉｊｋｌｍｎｏｐｑｒｓｔｕｖｗｘｙｚ',
-        'abcdefghijklmnopqrstuvwxyz'
-    ))
-    
-    # 2. 丁目・番地・号をハイフン形式に統一
-    address = re.sub(r'(\d+)丁目\s*', r'\1-', address)
-    address = re.sub(r'(\d+)番地?\s*', r'\1-', address)
-    address = re.sub(r'(\d+)号\s*', r'\1', address)
-    
-    # 3. 不要なスペースを削除
-    address = re.sub(r'(\d+)\s*-\s*(\d+)', r'\1-\2', address)
-    address = re.sub(r'(\d+)\s+(?=[^\u4e00-\u9fff])', r'\1', address)
-    
-    if address != original:
-        logger.info(f"Address normalized: '{original}' → '{address}'")
-    
-    return address
-
 def setup_driver():
     """Setup Chrome driver with remote Selenium Grid"""
     options = Options()
@@ -84,11 +58,7 @@ def setup_driver():
     options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
     options.add_argument('--accept-language=ja-JP,ja;q=0.9')
     
-    driver = webdriver.Remote(
-        command_executor='http://selenium:4444/wd/hub',
-        options=options
-    )
-    return driver
+    return selenium_hub.create_remote(options)
 
 def parse_duration_text(text):
     """Parse duration text like '15分' or '15 min' to integer minutes"""
@@ -143,8 +113,8 @@ def ensure_transit_mode(driver):
             except (TimeoutException, NoSuchElementException):
                 continue
                 
-        # URLにtravelmode=transitが含まれていれば、モードは正しいと判断
-        if 'travelmode=transit' in driver.current_url or 'data=!3e3' in driver.current_url:
+        # URLに公共交通機関モード（travelmode=transit / !3e3）が含まれていれば、モードは正しいと判断
+        if 'travelmode=transit' in driver.current_url or '!3e3' in driver.current_url:
             logger.info("Transit mode confirmed via URL")
             return True
             
@@ -588,26 +558,24 @@ def extract_route_fallback(driver):
 def save_debug_info(driver, request_id, trip_element=None):
     """
     デバッグ情報を保存（スクリーンショットとHTML）
+    1回だけ実行するCLIのため、debug_artifactsで圧縮して呼び出し側で書き込む（wait=True）
     """
     if not os.environ.get('DEBUG', '').lower() == 'true':
         return
         
     try:
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        debug_dir = Path('/app/output/japandatascience.com/timeline-mapping/api/debug')
-        debug_dir.mkdir(parents=True, exist_ok=True)
-        
         # スクリーンショット
-        screenshot_path = debug_dir / f'{request_id}_{timestamp}.png'
-        driver.save_screenshot(str(screenshot_path))
-        logger.info(f"Saved screenshot: {screenshot_path}")
+        screenshot_path = debug_artifacts.capture(request_id, 'screenshot',
+                                                  driver.get_screenshot_as_png, ext='png', wait=True)
+        if screenshot_path:
+            logger.info(f"Saved screenshot: {screenshot_path}")
         
         # HTML保存
         if trip_element:
-            html_path = debug_dir / f'{request_id}_{timestamp}.html'
-            with open(html_path, 'w', encoding='utf-8') as f:
-                f.write(trip_element.get_attribute('innerHTML'))
-            logger.info(f"Saved HTML: {html_path}")
+            html_path = debug_artifacts.capture(request_id, 'trip',
+                                                lambda: trip_element.get_attribute('innerHTML'), wait=True)
+            if html_path:
+                logger.info(f"Saved HTML: {html_path}")
             
     except Exception as e:
         logger.error(f"Error saving debug info: {e}")
@@ -626,27 +594,23 @@ def extract_route_details(driver, origin, destination, arrival_time=None, depart
     destination = normalize_address(destination)
     logger.info(f"[{request_id}] Normalized addresses - Origin: {origin}, Destination: {destination}")
     
-    # URL構築
-    from urllib.parse import quote
-    encoded_origin = quote(origin)
-    encoded_destination = quote(destination)
-    
-    # Google Maps Direction API v1形式
-    url = f"https://www.google.com/maps/dir/?api=1&origin={encoded_origin}&destination={encoded_destination}&travelmode=transit"
-    
+    # URL構築（maps_urlの正規形。naiveな時刻はJSTとして扱う）
     if arrival_time and isinstance(arrival_time, datetime):
-        timestamp = int(arrival_time.timestamp())
-        url += f"&arrival_time={timestamp}"
-        logger.info(f"Using arrival time: {arrival_time} (timestamp: {timestamp})")
+        url = maps_url.directions_url(maps_url.Endpoint(origin), maps_url.Endpoint(destination),
+                                      arrival_time, maps_url.ARRIVE)
+        logger.info(f"Using arrival time: {arrival_time}")
     elif departure_time and isinstance(departure_time, datetime):
-        timestamp = int(departure_time.timestamp())
-        url += f"&departure_time={timestamp}"
-        logger.info(f"Using departure time: {departure_time} (timestamp: {timestamp})")
+        url = maps_url.directions_url(maps_url.Endpoint(origin), maps_url.Endpoint(destination),
+                                      departure_time, maps_url.DEPART)
+        logger.info(f"Using departure time: {departure_time}")
+    else:
+        url = maps_url.directions_url(maps_url.Endpoint(origin), maps_url.Endpoint(destination))
     
     logger.info(f"[{request_id}] Loading URL: {url}")
     
     try:
-        # ページ読み込み
+        # ページ読み込み（プロセス共通のレート制限を対話レーンで通す）
+        request_scheduler.acquire(request_scheduler.INTERACTIVE)
         driver.get(url)
         
         # Step 1: 基盤の安定化
@@ -662,19 +626,11 @@ def extract_route_details(driver, origin, destination, arrival_time=None, depart
         # Wait for trip elements to load
         time.sleep(3)
         
-        # Save screenshot for debugging
-        debug_dir = Path('/app/output/japandatascience.com/timeline-mapping/api/debug')
-        debug_dir.mkdir(exist_ok=True)
-        session_id = f"{origin[:10]}-{destination[:10]}-{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        screenshot_path = debug_dir / f"screenshot_{session_id}.png"
-        driver.save_screenshot(str(screenshot_path))
-        logger.info(f"Saved screenshot to: {screenshot_path}")
-        
-        # Save page source for debugging
-        page_source_path = debug_dir / f"page_source_{session_id}.html"
-        with open(page_source_path, 'w', encoding='utf-8') as f:
-            f.write(driver.page_source)
-        logger.info(f"Saved page source to: {page_source_path}")
+        # Save page source for debugging (sampled, compressed and written before returning the path)
+        page_source_path = debug_artifacts.capture(request_id, 'page-source', lambda: driver.page_source,
+                                                   wait=True)
+        if page_source_path:
+            logger.info(f"Saved page source to: {page_source_path}")
         
         # ルート要素を取得（複数のセレクタを試す）
         trip_elements = []
@@ -777,24 +733,32 @@ def extract_route_details(driver, origin, destination, arrival_time=None, depart
             'error': str(e) if os.environ.get('DEBUG', '').lower() == 'true' else None
         }
 
-def main():
-    """Main function to handle command line arguments and execute scraping"""
-    if len(sys.argv) < 3:
-        print(json.dumps({
-            'status': 'error',
-            'message': 'Usage: python google_maps_transit_ultimate.py <origin> <destination> [departure|arrival] [time]'
-        }))
-        sys.exit(1)
+def usage_error():
+    """引数不足時のエラー出力"""
+    return {
+        'status': 'error',
+        'message': 'Usage: python google_maps_transit_ultimate.py <origin> <destination> [departure|arrival] [time]'
+    }
+
+def parse_cli_args(args):
+    """
+    コマンドライン引数を解析
     
-    origin = sys.argv[1]
-    destination = sys.argv[2]
+    Returns:
+        (origin, destination, arrival_time, departure_time)、引数不足ならNone
+    """
+    if len(args) < 2:
+        return None
+    
+    origin = args[0]
+    destination = args[1]
     arrival_time = None
     departure_time = None
     
-    if len(sys.argv) > 3:
-        mode = sys.argv[3]
-        if len(sys.argv) > 4:
-            time_str = sys.argv[4]
+    if len(args) > 2:
+        mode = args[2]
+        if len(args) > 3:
+            time_str = args[3]
             try:
                 if time_str == '9AM':
                     # 今日の9AMを設定
@@ -814,6 +778,17 @@ def main():
             except:
                 pass
     
+    return origin, destination, arrival_time, departure_time
+
+def main():
+    """Main function to handle command line arguments and execute scraping"""
+    parsed = parse_cli_args(sys.argv[1:])
+    if parsed is None:
+        print(json.dumps(usage_error()))
+        sys.exit(1)
+    
+    origin, destination, arrival_time, departure_time = parsed
+    
     driver = None
     try:
         driver = setup_driver()
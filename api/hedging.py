@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ヘッジ付きスクレイピング
+実行中のscrape_routeが現在のフェーズで直近レイテンシのパーセンタイルを超えたら、
+空いているウォーム済みセッションで同じリクエストを重複実行する。
+先に成功した結果を採用し、負けた側はデッドラインでキャンセルする。負けた側のセッションは
+実行中のWebDriver呼び出しと競合しないよう、そのスレッドがscrape_routeから戻った後に作り直す。
+"""
+
+import os
+import time
+import queue
+import logging
+import threading
+from collections import deque, namedtuple
+
+logger = logging.getLogger(__name__)
+
+# ヘッジを出すパーセンタイル（0で無効）
+HEDGE_PERCENTILE = float(os.environ.get('HEDGE_PERCENTILE', '95'))
+# パーセンタイルを信用するのに必要なサンプル数
+HEDGE_MIN_SAMPLES = int(os.environ.get('HEDGE_MIN_SAMPLES', '20'))
+# フェーズごとに保持する直近サンプル数
+LATENCY_WINDOW = 200
+# 実行中スクレイプの監視間隔（秒）
+POLL_INTERVAL = 0.2
+
+HedgeResult = namedtuple('HedgeResult', ['result', 'phase_timings', 'hedged', 'hedge_won', 'queue_wait'])
+
+
+class LatencyTracker:
+    """フェーズ別の直近レイテンシ"""
+
+    def __init__(self, window=LATENCY_WINDOW, min_samples=HEDGE_MIN_SAMPLES):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, phase, seconds):
+        with self._lock:
+            samples = self._samples.get(phase)
+            if samples is None:
+                samples = self._samples[phase] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def record_timings(self, phase_timings):
+        """scrape_routeのphase_timingsをまとめて記録"""
+        for phase, seconds in phase_timings.items():
+            self.record(phase, seconds)
+
+    def percentile(self, phase, p):
+        """
+        フェーズのpパーセンタイル（秒）
+
+        Returns:
+            サンプル不足ならNone
+        """
+        with self._lock:
+            samples = sorted(self._samples.get(phase, ()))
+        if len(samples) < self.min_samples:
+            return None
+        rank = (p / 100.0) * (len(samples) - 1)
+        lower = int(rank)
+        upper = min(lower + 1, len(samples) - 1)
+        return samples[lower] + (samples[upper] - samples[lower]) * (rank - lower)
+
+
+class _Attempt:
+    """1セッションでの実行"""
+
+    def __init__(self, session, deadline, hedge):
+        self.session = session
+        self.scraper = session.scraper
+        self.deadline = deadline
+        self.hedge = hedge
+        self.released = False
+        self.cancelled = False  # 結果を使わない（スレッド側でセッションを返却する）
+        self.finished = False   # 結果をキューに積んだ
+        self.error = None
+
+
+class HedgedRunner:
+    """
+    ScraperPool上でscrape_routeをヘッジ付きで実行する
+
+    Args:
+        pool: ScraperPool
+        tracker: LatencyTracker
+        percentile: ヘッジを出すパーセンタイル（0で無効）
+    """
+
+    def __init__(self, pool, tracker=None, percentile=HEDGE_PERCENTILE):
+        self.pool = pool
+        self.tracker = tracker or LatencyTracker()
+        self.percentile = percentile
+        self._lock = threading.Lock()
+
+    def _start(self, session, deadline, hedge, results, kwargs):
+        attempt = _Attempt(session, deadline.child(), hedge)
+
+        def work():
+            outcome = None
+            try:
+                outcome = attempt.scraper.scrape_route(deadline=attempt.deadline, **kwargs)
+            except Exception as e:
+                attempt.error = e
+            with self._lock:
+                cancelled = attempt.cancelled
+                attempt.finished = not cancelled
+            if cancelled:
+                # キャンセル済み: scrape_routeが戻ってからセッションを作り直す
+                self._release(attempt, broken=True)
+            else:
+                results.put((attempt, outcome, attempt.error))
+
+        threading.Thread(target=work, daemon=True,
+                         name=f'scrape-{"hedge" if hedge else "primary"}-{session.index}').start()
+        return attempt
+
+    def _release(self, attempt, broken):
+        with self._lock:
+            if attempt.released:
+                return
+            attempt.released = True
+        self.pool.checkin(attempt.session, broken=broken)
+
+    def _cancel(self, attempt):
+        """
+        負けた実行をデッドラインで打ち切る
+        ドライバーはここでは閉じない（実行中のスレッドがまだ使っている）。セッションの返却は
+        scrape_routeから戻ったスレッドが行い、既に戻っていれば（結果が未読のまま）ここで返却する
+        """
+        with self._lock:
+            finished = attempt.finished
+            attempt.cancelled = True
+        attempt.deadline.cancel()
+        if finished:
+            self._release(attempt, broken=attempt.error is not None)
+
+    def _should_hedge(self, attempt):
+        if self.percentile <= 0:
+            return False
+        scraper = attempt.scraper
+        phase = scraper.current_phase
+        started = scraper.phase_started_at
+        if phase is None or started is None:
+            return False
+        threshold = self.tracker.percentile(phase, self.percentile)
+        if threshold is None:
+            return False
+        return time.time() - started > threshold
+
+    def run(self, deadline, checkout_timeout=None, **kwargs):
+        """
+        scrape_routeを実行
+
+        Returns:
+            HedgeResult。時間内にセッションを確保できなければNone
+        """
+        if checkout_timeout is None:
+            checkout_timeout = deadline.remaining()
+        queued_at = time.time()
+        session = self.pool.checkout(timeout=checkout_timeout)
+        queue_wait = time.time() - queued_at
+        if session is None:
+            return None
+
+        results = queue.Queue()
+        running = [self._start(session, deadline, False, results, kwargs)]
+        hedged = False
+        last = None
+
+        while running:
+            try:
+                attempt, outcome, error = results.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                if deadline.expired():
+                    break
+                if not hedged and self._should_hedge(running[0]):
+                    spare = self.pool.checkout(timeout=0)
+                    if spare is not None:
+                        hedged = True
+                        logger.info("フェーズ'%s'が遅延、別セッションでヘッジ実行", running[0].scraper.current_phase)
+                        running.append(self._start(spare, deadline, True, results, kwargs))
+                continue
+
+            running.remove(attempt)
+            self.tracker.record_timings(attempt.scraper.phase_timings)
+            self._release(attempt, broken=error is not None)
+            if error is not None:
+                outcome = {'success': False, 'error': str(error)}
+            last = HedgeResult(outcome, dict(attempt.scraper.phase_timings), hedged, attempt.hedge, queue_wait)
+            if outcome.get('success'):
+                break
+
+        for attempt in running:
+            self._cancel(attempt)
+
+        if last is None:
+            return HedgeResult({
+                'success': False,
+                'error': '時間予算を超過しました',
+                'deadline_exceeded': True,
+                'partial': True
+            }, {}, hedged, False, queue_wait)
+        return last
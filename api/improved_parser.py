@@ -8,6 +8,8 @@ import re
 import json
 from datetime import datetime
 
+from transit_names import find_line, find_lines, clean_station_name
+
 def parse_directions_panel_text(panel_text):
     """
     Parse the full directions panel text to extract route details
@@ -110,13 +112,14 @@ def parse_directions_panel_text(panel_text):
         
         # Check if it's a transit segment
         elif any(keyword in content for keyword in ['線', '各停', '急行', '快速', 'JR']):
-            # Extract line name
-            line_match = re.search(r'([^各停急行快速\n]*線)', content)
-            if not line_match:
-                # Try alternative patterns
-                line_match = re.search(r'(JR[^\n]+)', content)
-            
-            line_name = line_match.group(1).strip() if line_match else '電車'
+            # Extract line name (known lines via the longest-match automaton first)
+            line_name = find_line(content)
+            if not line_name:
+                line_match = re.search(r'([^各停急行快速\n]*線)', content)
+                if not line_match:
+                    # Try alternative patterns
+                    line_match = re.search(r'(JR[^\n]+)', content)
+                line_name = line_match.group(1).strip() if line_match else '電車'
             
             # Extract station name (should be in previous line or segment)
             station_name = None
@@ -179,7 +182,7 @@ def parse_directions_panel_text(panel_text):
             to_station = None
             
             # Look for the next station name after this transit segment
-            from_station_clean = step['from_station'].replace('駅', '').strip() if step['from_station'] else None
+            from_station_clean = clean_station_name(step['from_station']) if step['from_station'] else None
             if from_station_clean:
                 # Find the index of current station in station_names list
                 for idx, stn in enumerate(station_names):
@@ -190,13 +193,13 @@ def parse_directions_panel_text(panel_text):
                         break
             
             if not station_used and step['from_station']:
-                station_used = step['from_station'].replace('駅', '').strip()
+                station_used = clean_station_name(step['from_station'])
             
             train = {
                 'line': step['line'],
                 'time': step['duration'],
-                'from': step['from_station'].replace('駅', '').strip() if step['from_station'] else '不明',
-                'to': to_station.replace('駅', '').strip() if to_station else '不明'
+                'from': clean_station_name(step['from_station']) if step['from_station'] else '不明',
+                'to': clean_station_name(to_station) if to_station else '不明'
             }
             
             # Check for transfer (only if there's another transit after the transfer walk)
@@ -230,7 +233,7 @@ def extract_route_lines(panel_text):
         # Pattern for train lines
         if re.search(r'[線]', line) and len(line) < 50:
             # Extract individual lines
-            line_matches = re.findall(r'([^、\s]+線)', line)
+            line_matches = find_lines(line) or re.findall(r'([^、\s]+線)', line)
             lines.extend(line_matches)
     
     return lines
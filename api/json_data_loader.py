@@ -78,7 +78,11 @@ class JsonDataLoader:
                 'building_floors': '',
                 'age': '',
                 'station_walk': '',
-                'url': ''
+                'url': '',
+                # Place ID・座標（collect_place_ids.pyで付与済みの場合）
+                'place_id': prop.get('place_id'),
+                'lat': prop.get('lat'),
+                'lon': prop.get('lon')
             })
         return properties
     
@@ -98,7 +102,10 @@ class JsonDataLoader:
                 'address': dest.get('address', ''),  # 絶対に変更しない
                 'owner': dest.get('owner', ''),
                 'monthly_frequency': dest.get('monthly_frequency', 0),
-                'time_preference': dest.get('time_preference', '')
+                'time_preference': dest.get('time_preference', ''),
+                'place_id': dest.get('place_id'),
+                'lat': dest.get('lat'),
+                'lon': dest.get('lon')
             })
         return destinations
     
@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日本時間（Asia/Tokyo）のタイムゾーン
+pytzの代わりに標準ライブラリのzoneinfoを使う（import時間の短縮）。
+tzdataがない環境では固定オフセット（+09:00、日本に夏時間はないため結果は同じ）を使う
+"""
+
+from datetime import timedelta, timezone
+
+try:
+    from zoneinfo import ZoneInfo
+    JST = ZoneInfo('Asia/Tokyo')
+except Exception:
+    JST = timezone(timedelta(hours=9), 'JST')
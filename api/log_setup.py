@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ロギング設定（構造化フィールド・モジュール別レベル・繰り返しログの間引き・JSON出力）
+
+ログは %形式の遅延フォーマットで書く（出力されないレベルでは文字列を組み立てない）。
+集計したい値は fields() で extra に渡す:
+
+    logger.debug("ルート%d: %d分", i, travel_time,
+                 extra=log_setup.fields(sample='route_card', route=i, travel_time=travel_time))
+
+sample= を付けたレコードは同じロガー・キーごとに SAMPLE_EVERY 件に1件だけ出力し、
+JSONには重み（sample_every）と前回から省いた件数（suppressed）を付ける。
+WARNING以上は間引かない。
+
+環境変数:
+    LOG_LEVEL         全体のレベル（既定 INFO）
+    LOG_LEVELS        モジュール別レベル（例: "google_maps_scraper=DEBUG,hedging=WARNING"）
+    LOG_FORMAT        text（既定）または json（1行1レコード）
+    LOG_SAMPLE_EVERY  間引きの間隔（既定 20。1なら全件）
+"""
+
+import os
+import sys
+import json
+import logging
+import threading
+from datetime import datetime
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOG_LEVELS = os.environ.get('LOG_LEVELS', '')
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')
+SAMPLE_EVERY = int(os.environ.get('LOG_SAMPLE_EVERY', '20'))
+
+# LogRecordの標準属性（JSONの追加フィールドから除く）
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_configured = False
+
+
+def fields(sample=None, **values):
+    """ログ呼び出しの extra（構造化フィールドと間引きキー）"""
+    extra = {'fields': values}
+    if sample:
+        extra['sample'] = sample
+    return extra
+
+
+def parse_levels(spec):
+    """"name=LEVEL,name=LEVEL" → {name: levelno}"""
+    levels = {}
+    for item in (spec or '').split(','):
+        name, sep, level = item.partition('=')
+        if not sep or not name.strip():
+            continue
+        levelno = logging.getLevelName(level.strip().upper())
+        if isinstance(levelno, int):
+            levels[name.strip()] = levelno
+    return levels
+
+
+class SamplingFilter(logging.Filter):
+    """sample付きのレコードを（ロガー名, キー）ごとにN件に1件だけ通す（最初の1件は必ず通す）"""
+
+    def __init__(self, every=SAMPLE_EVERY):
+        super().__init__()
+        self.every = max(1, every)
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = getattr(record, 'sample', None)
+        if key is None or self.every == 1 or record.levelno >= logging.WARNING:
+            return True
+        with self._lock:
+            count = self._counts.get((record.name, key), 0)
+            self._counts[(record.name, key)] = count + 1
+        if count % self.every:
+            return False
+        record.sample_every = self.every
+        record.suppressed = self.every - 1 if count else 0
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """1行1レコードのJSON（ts, level, logger, msg と構造化フィールド）"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', None) or {})
+        for key, value in vars(record).items():
+            if key not in _RESERVED and key != 'fields':
+                entry.setdefault(key, value)
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure(level=None, levels=None, fmt=None, sample_every=None, stream=None, force=False):
+    """
+    ルートロガーにハンドラを設定する（2回目以降はforce=Trueのときだけ設定し直す）
+
+    引数を省略した項目は環境変数（LOG_LEVEL / LOG_LEVELS / LOG_FORMAT / LOG_SAMPLE_EVERY）から読む
+    """
+    global _configured
+    if _configured and not force:
+        return
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    handler = logging.StreamHandler(stream or sys.stderr)
+    json_format = (fmt or LOG_FORMAT).lower() == 'json'
+    handler.setFormatter(JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT))
+    handler.addFilter(SamplingFilter(SAMPLE_EVERY if sample_every is None else sample_every))
+    root.addHandler(handler)
+    root.setLevel(level or LOG_LEVEL.upper())
+
+    for name, levelno in (parse_levels(LOG_LEVELS) if levels is None else levels).items():
+        logging.getLogger(name).setLevel(levelno)
+    _configured = True
@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Google Mapsの記録再生ハーネス
+実サイトで取得したページ（HTML・ルートパネルのテキスト・最終URL・所要時間）を保存し、
+ローカルのHTTPサーバーから遅延を付けて再生する。GOOGLE_MAPS_BASE_URLをこのサーバーに
+向ければ、GoogleMapsScraperのスループットと抽出精度をオフラインで再現性をもって計測できる。
+
+使用方法:
+    python maps_replay.py seed                    # debug_capture/ と test_golden/ から初期データ作成
+    python maps_replay.py serve --port 8765 --latency 1.5 --jitter 0.5
+    GOOGLE_MAPS_BASE_URL=http://<ホスト>:8765 python maps_replay.py bench
+
+記録（実サイト）:
+    from maps_replay import CaptureStore, record_route
+    record_route(scraper, CaptureStore(), origin_address=..., dest_address=..., arrival_time=...)
+"""
+
+import os
+import re
+import sys
+import json
+import gzip
+import time
+import random
+import hashlib
+import logging
+import argparse
+import threading
+import unicodedata
+from datetime import datetime, timedelta, timezone
+from urllib.parse import quote, unquote, urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from address_normalizer import normalize_address
+
+logger = logging.getLogger(__name__)
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+CAPTURE_DIR = os.environ.get('REPLAY_CAPTURE_DIR', os.path.join(API_DIR, 'replay_captures'))
+DEBUG_CAPTURE_DIR = os.path.join(API_DIR, 'debug_capture')
+GOLDEN_DIR = os.path.join(API_DIR, 'test_golden')
+
+SCRIPT_PATTERN = re.compile(r'<script\b[^>]*>.*?</script\s*>', re.IGNORECASE | re.DOTALL)
+TRIP_PANEL_PATTERN = re.compile(r'<div[^>]*data-trip-index[^>]*>(.*?)</div>', re.DOTALL)
+TAG_PATTERN = re.compile(r'<[^>]+>')
+
+
+# ---------------------------------------------------------------------------
+# キー
+# ---------------------------------------------------------------------------
+
+def normalize_segment(text):
+    """URLパス・住所の表記ゆれを吸収（address_normalizerと同じ正規化）"""
+    text = unicodedata.normalize('NFKC', unquote(text))
+    return normalize_address(text).rstrip('-')
+
+
+def route_key(url):
+    """
+    経路URLのキー（出発地|目的地）。タイムスタンプ等のdataパラメータは含めない
+
+    Returns:
+        /maps/dir/ 以外のURLはNone
+    """
+    parts = urlsplit(url).path.split('/')
+    try:
+        index = parts.index('dir')
+    except ValueError:
+        return None
+    points = [p for p in parts[index + 1:] if p and not p.startswith('data=') and not p.startswith('@')]
+    if len(points) < 2:
+        return None
+    return f'{normalize_segment(points[0])}|{normalize_segment(points[1])}'
+
+
+def has_time(url):
+    """URLに時刻指定（!8j）があるか"""
+    return '!8j' in url
+
+
+def panel_text_from_html(html):
+    """HTMLからルートカードのテキストを抜き出す（記録済みHTMLの簡易インデックス用）"""
+    texts = []
+    for fragment in TRIP_PANEL_PATTERN.findall(html):
+        text = re.sub(r'\s+', ' ', TAG_PATTERN.sub(' ', fragment)).strip()
+        if text:
+            texts.append(text)
+    return '\n'.join(texts)
+
+
+# ---------------------------------------------------------------------------
+# 保存先
+# ---------------------------------------------------------------------------
+
+class CaptureStore:
+    """
+    記録の保存先
+    <dir>/<id>.json（メタデータ）と <id>.html.gz（ページHTML）、places.json（Place ID検索の最終URL）
+    """
+
+    def __init__(self, directory=CAPTURE_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self.captures = {}
+        self.places = {}
+        self.load()
+
+    def load(self):
+        self.captures = {}
+        self.places = {}
+        if not os.path.isdir(self.directory):
+            return
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            if name == 'places.json':
+                with open(path, encoding='utf-8') as f:
+                    self.places = json.load(f)
+            elif name.endswith('.json'):
+                with open(path, encoding='utf-8') as f:
+                    capture = json.load(f)
+                self.captures[capture['id']] = capture
+
+    def add(self, url, html, final_url=None, panel_text=None, timings=None, result=None,
+            expected=None, source='recorded'):
+        """ページを1件保存してメタデータを返す"""
+        key = route_key(final_url or url) or route_key(url)
+        capture_id = hashlib.sha1(f'{key}|{url}'.encode('utf-8')).hexdigest()[:12]
+        capture = {
+            'id': capture_id,
+            'key': key,
+            'url': url,
+            'final_url': final_url or url,
+            'has_time': has_time(url),
+            'panel_text': panel_text if panel_text is not None else panel_text_from_html(html),
+            'timings': timings or {},
+            'result': result,
+            'expected': expected,
+            'source': source,
+            'recorded_at': datetime.now().isoformat()
+        }
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with gzip.open(os.path.join(self.directory, f'{capture_id}.html.gz'), 'wt', encoding='utf-8') as f:
+                f.write(html)
+            with open(os.path.join(self.directory, f'{capture_id}.json'), 'w', encoding='utf-8') as f:
+                json.dump(capture, f, ensure_ascii=False, indent=2)
+            self.captures[capture_id] = capture
+        return capture
+
+    def add_place(self, query, final_url):
+        """Place ID検索（/maps/search/<query>）の最終URLを保存"""
+        with self._lock:
+            self.places[normalize_segment(query)] = final_url
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, 'places.json'), 'w', encoding='utf-8') as f:
+                json.dump(self.places, f, ensure_ascii=False, indent=2)
+
+    def html(self, capture_id):
+        with gzip.open(os.path.join(self.directory, f'{capture_id}.html.gz'), 'rt', encoding='utf-8') as f:
+            return f.read()
+
+    def find(self, url):
+        """URLに対応する記録（時刻指定の有無が同じものを優先）"""
+        key = route_key(url)
+        if key is None:
+            return None
+        candidates = [c for c in self.captures.values() if c['key'] == key]
+        if not candidates:
+            return None
+        wanted = has_time(url)
+        return next((c for c in candidates if c['has_time'] == wanted), candidates[0])
+
+    def find_place(self, query):
+        return self.places.get(normalize_segment(query))
+
+
+# ---------------------------------------------------------------------------
+# 記録
+# ---------------------------------------------------------------------------
+
+def record_route(scraper, store, **kwargs):
+    """
+    実サイトでscrape_routeを実行し、抽出直前のページを記録する
+
+    Args:
+        scraper: GoogleMapsScraper
+        store: CaptureStore
+        kwargs: scrape_routeの引数
+
+    Returns:
+        scrape_routeの結果
+    """
+    captured = {}
+    original_extract = scraper.extract_route_details
+    original_place = scraper.get_place_id
+
+    def extract_and_capture(*args, **extract_kwargs):
+        routes = original_extract(*args, **extract_kwargs)
+        driver = scraper.driver
+        captured['html'] = driver.page_source
+        captured['final_url'] = driver.current_url
+        try:
+            elements = driver.execute_script(
+                "return Array.from(document.querySelectorAll('div[data-trip-index]')).map(e => e.innerText)")
+            captured['panel_text'] = '\n'.join(elements or [])
+        except Exception:
+            captured['panel_text'] = None
+        return routes
+
+    def place_and_capture(address, name=None, *args, **place_kwargs):
+        info = original_place(address, name, *args, **place_kwargs)
+        final_url = scraper.driver.current_url
+        # 駅・空港は名前で検索される（それ以外のnameは「出発地」等のラベル）
+        station = name if name and ('駅' in name or '空港' in name) else None
+        for query in filter(None, (station, address, info.get('normalized_address'))):
+            store.add_place(query, final_url)
+        return info
+
+    scraper.extract_route_details = extract_and_capture
+    scraper.get_place_id = place_and_capture
+    try:
+        result = scraper.scrape_route(**kwargs)
+    finally:
+        scraper.extract_route_details = original_extract
+        scraper.get_place_id = original_place
+
+    if 'html' in captured:
+        store.add(result.get('url') or captured['final_url'], captured['html'],
+                  final_url=captured['final_url'], panel_text=captured['panel_text'],
+                  timings=dict(scraper.phase_timings), result=result)
+    return result
+
+
+# ---------------------------------------------------------------------------
+# 初期データ
+# ---------------------------------------------------------------------------
+
+def load_goldens(directory=GOLDEN_DIR):
+    goldens = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.json'):
+            with open(os.path.join(directory, name), encoding='utf-8') as f:
+                goldens.append(json.load(f))
+    return goldens
+
+
+def _matches(a, b):
+    """正規化後の住所が前方一致するか（ゴールデンは建物名付き）"""
+    a, b = normalize_segment(a), normalize_segment(b)
+    return a.startswith(b) or b.startswith(a)
+
+
+def seed_from_artifacts(store, capture_dir=DEBUG_CAPTURE_DIR, golden_dir=GOLDEN_DIR):
+    """
+    debug_capture/（ページHTMLとindex.htmlのURL・読み込み時間）から記録を作り、
+    出発地・目的地が一致するtest_golden/の期待値を付ける
+    （時刻指定ありのURLには到着時刻モード、なしには出発時刻モードのゴールデン）
+
+    Returns:
+        追加した記録のリスト
+    """
+    with open(os.path.join(capture_dir, 'index.html'), encoding='utf-8-sig') as f:
+        index = f.read()
+    cases = re.findall(
+        r'<div class="url">URL: (.*?)</div>.*?読み込み時間:</strong>\s*([\d.]+)秒.*?<a href="([^"]+)">',
+        index, re.DOTALL)
+    goldens = load_goldens(golden_dir)
+    added = []
+    for url, load_seconds, page in cases:
+        key = route_key(url)
+        origin, destination = key.split('|')
+        mode = 'arrival' if has_time(url) else 'departure'
+        golden = next((g for g in goldens
+                       if g['test_info']['mode'] == mode
+                       and _matches(g['test_info']['origin'], origin)
+                       and _matches(g['test_info']['destination'], destination)), None)
+        with open(os.path.join(capture_dir, page), encoding='utf-8') as f:
+            html = f.read()
+        added.append(store.add(
+            url, html,
+            timings={'page_load': float(load_seconds)},
+            expected=golden['expected_result'] if golden else None,
+            source=f'debug_capture/{page}'
+        ))
+    return added
+
+
+# ---------------------------------------------------------------------------
+# 再生サーバー
+# ---------------------------------------------------------------------------
+
+class LatencyModel:
+    """
+    応答遅延
+    fixed: latency ± jitter（一様分布）
+    recorded: 記録時のpage_load秒数 × scale（記録がなければfixed）
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, mode='fixed', scale=1.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.mode = mode
+        self.scale = scale
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self, capture=None):
+        if self.mode == 'recorded' and capture and capture.get('timings', {}).get('page_load'):
+            return capture['timings']['page_load'] * self.scale
+        with self._lock:
+            offset = self._random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0
+        return max(0.0, self.latency + offset)
+
+
+EMPTY_PAGE = '<!DOCTYPE html><html lang="ja"><head><meta charset="UTF-8"><title>Google マップ</title></head><body></body></html>'
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        logger.debug("replay: " + format, *args)
+
+    def _send(self, status, body=b'', content_type='text/html; charset=utf-8', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        path = self.path
+        parts = urlsplit(path).path.split('/')
+        if path.startswith('/__captures'):
+            body = json.dumps(list(server.store.captures.values()), ensure_ascii=False).encode('utf-8')
+            self._send(200, body, 'application/json')
+        elif len(parts) > 3 and parts[1] == 'maps' and parts[2] == 'search':
+            final_url = server.store.find_place(parts[3])
+            time.sleep(server.latency.delay())
+            if final_url:
+                target = urlsplit(final_url)
+                # 記録したURLは未エンコードの場合があるので、ヘッダー用に再エンコード
+                location = quote(unquote(target.path), safe="/!:=@,") + (f'?{target.query}' if target.query else '')
+                self._send(302, headers={'Location': location})
+            else:
+                self._send(200, EMPTY_PAGE.encode('utf-8'))
+        elif len(parts) > 2 and parts[1] == 'maps' and parts[2] == 'dir':
+            capture = server.store.find(path)
+            time.sleep(server.latency.delay(capture))
+            if capture is None:
+                server.misses += 1
+                self._send(404, EMPTY_PAGE.encode('utf-8'))
+                return
+            server.hits += 1
+            html = server.store.html(capture['id'])
+            if server.strip_scripts:
+                # 記録したDOMを固定表示する（オフラインでMapsのJSが動いて書き換えないように）
+                html = SCRIPT_PATTERN.sub('', html)
+            self._send(200, html.encode('utf-8'))
+        else:
+            # /maps 等（ウォームアップ・place遷移先）は空ページ
+            self._send(200, EMPTY_PAGE.encode('utf-8'))
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """記録を再生するGoogle Maps代替サーバー"""
+    daemon_threads = True
+
+    def __init__(self, store, host='0.0.0.0', port=8765, latency=None, strip_scripts=True):
+        super().__init__((host, port), ReplayHandler)
+        self.store = store
+        self.latency = latency or LatencyModel()
+        self.strip_scripts = strip_scripts
+        self.hits = 0
+        self.misses = 0
+
+    def start(self):
+        """バックグラウンドで起動"""
+        thread = threading.Thread(target=self.serve_forever, daemon=True, name='maps-replay')
+        thread.start()
+        return thread
+
+
+# ---------------------------------------------------------------------------
+# ベンチマーク
+# ---------------------------------------------------------------------------
+
+def _args_from_capture(capture):
+    """記録のURLからscrape_routeの引数を復元"""
+    origin, destination = [unquote(p) for p in urlsplit(capture['url']).path.split('/')[3:5]]
+    kwargs = {'origin_address': origin, 'dest_address': destination, 'dest_name': destination}
+    match = re.search(r'!8j(\d+)', capture['url'])
+    if match:
+        # Google MapsのタイムスタンプはJST時刻をUTCとして扱った値
+        naive = datetime.fromtimestamp(int(match.group(1)), tz=timezone.utc).replace(tzinfo=None)
+        kwargs['arrival_time'] = naive.replace(tzinfo=timezone(timedelta(hours=9)))
+    return kwargs
+
+
+def bench(store, repeat=1):
+    """
+    記録済みの全ルートをGoogleMapsScraperで取得し、スループットと期待値との一致を集計
+    （GOOGLE_MAPS_BASE_URLを再生サーバーに向けて実行する）
+    """
+    from google_maps_scraper import GoogleMapsScraper
+
+    captures = [c for c in store.captures.values() if c['key']]
+    scraper = GoogleMapsScraper()
+    rows = []
+    started = time.time()
+    try:
+        for _ in range(repeat):
+            for capture in captures:
+                result = scraper.scrape_route(**_args_from_capture(capture))
+                expected = (capture.get('expected') or {}).get('route', {}).get('total_time')
+                rows.append({
+                    'capture': capture['id'],
+                    'source': capture['source'],
+                    'success': result.get('success', False),
+                    'travel_time': result.get('travel_time'),
+                    'expected': expected,
+                    'match': expected is None or result.get('travel_time') == expected
+                })
+    finally:
+        scraper.close()
+    elapsed = time.time() - started
+    return {
+        'routes': len(rows),
+        'elapsed_seconds': round(elapsed, 1),
+        'routes_per_minute': round(len(rows) / elapsed * 60, 2) if elapsed > 0 else None,
+        'success': sum(1 for r in rows if r['success']),
+        'mismatches': [r for r in rows if not r['match']],
+        'rows': rows
+    }
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Google Maps記録再生ハーネス')
+    parser.add_argument('--dir', default=CAPTURE_DIR, help='記録の保存先')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('seed', help='debug_capture/ と test_golden/ から記録を作成')
+    serve = sub.add_parser('serve', help='再生サーバーを起動')
+    serve.add_argument('--host', default='0.0.0.0')
+    serve.add_argument('--port', type=int, default=8765)
+    serve.add_argument('--latency', type=float, default=1.5, help='応答遅延（秒）')
+    serve.add_argument('--jitter', type=float, default=0.5, help='遅延のゆらぎ（±秒）')
+    serve.add_argument('--recorded-latency', action='store_true', help='記録時の読み込み時間で遅延させる')
+    serve.add_argument('--seed', type=int, default=None, help='遅延の乱数シード')
+    serve.add_argument('--keep-scripts', action='store_true', help='<script>を除去せずに返す')
+    bench_parser = sub.add_parser('bench', help='記録済みルートでスクレイパーを計測')
+    bench_parser.add_argument('--repeat', type=int, default=1)
+    args = parser.parse_args()
+
+    store = CaptureStore(args.dir)
+    if args.command == 'seed':
+        added = seed_from_artifacts(store)
+        for capture in added:
+            label = 'ゴールデンあり' if capture['expected'] else 'ゴールデンなし'
+            print(f"{capture['id']} {capture['source']} ({label})")
+    elif args.command == 'serve':
+        latency = LatencyModel(args.latency, args.jitter, 'recorded' if args.recorded_latency else 'fixed',
+                               seed=args.seed)
+        server = ReplayServer(store, args.host, args.port, latency, strip_scripts=not args.keep_scripts)
+        print(f"再生サーバー起動: http://{args.host}:{args.port} （記録 {len(store.captures)}件）")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+    elif args.command == 'bench':
+        print(json.dumps(bench(store, args.repeat), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Google Maps経路URLの構築・解析とキャッシュキー
+スクレイパー・バッチ・トランジットスクリプトで同じルートが同じURL（同じキー）になるように一本化する。
+
+正規形: {MAPS_BASE_URL}/maps/dir/{出発地}/{目的地}/data=!4m18!4m17!1m5!1m1!1s{ID}!2m2!1d{経度}!2d{緯度}
+        !1m5...（目的地）!2m3!6e1!7e2!8j{時刻}!3e3
+- 両端にPlace IDまたは緯度経度がある場合のみ !4m ブロックで包む（件数は実際の要素数から計算）
+- 時刻（!8j）はJSTの壁時計時刻をUTCとして数えたエポック秒（Google Mapsの仕様）
+- !6e1 = 到着時刻指定、!6e0 = 出発時刻指定、!3e3 = 公共交通機関
+"""
+
+import os
+import re
+import calendar
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from urllib.parse import quote, unquote, urlsplit, parse_qs
+
+from address_normalizer import normalize_address
+
+# Google MapsのベースURL（記録再生サーバーでオフライン検証する場合は差し替える）
+MAPS_BASE_URL = os.environ.get('GOOGLE_MAPS_BASE_URL', 'https://www.google.com').rstrip('/')
+
+# 日本は夏時間がないため固定オフセットで扱う
+JST = timezone(timedelta(hours=9))
+
+ARRIVE = 'arrive'
+DEPART = 'depart'
+TIME_FLAGS = {ARRIVE: '6e1', DEPART: '6e0'}
+TRANSIT_MODE = '3e3'
+
+TIMESTAMP_PATTERN = re.compile(r'!8j\d+')
+
+# 経路の端点（labelはURLパスに表示する住所・名前）
+Endpoint = namedtuple('Endpoint', ['label', 'place_id', 'lat', 'lon'], defaults=(None, None, None))
+# 解析結果
+DirectionsRequest = namedtuple('DirectionsRequest', ['origin', 'destination', 'when', 'time_kind'])
+
+
+def endpoint_from_info(info, label=None):
+    """get_place_id / resolve_place の辞書からEndpointを作る"""
+    return Endpoint(label or info.get('normalized_address'), info.get('place_id'),
+                    info.get('lat'), info.get('lon'))
+
+
+def maps_timestamp(when):
+    """
+    datetimeを!8jの値に変換（分単位、秒は切り捨て）
+    タイムゾーン付きはJSTに変換、naiveはJSTの時刻とみなす
+    """
+    if when.tzinfo is not None:
+        when = when.astimezone(JST)
+    return calendar.timegm(when.replace(second=0, microsecond=0, tzinfo=None).timetuple())
+
+
+def from_maps_timestamp(timestamp):
+    """!8jの値をJSTのdatetimeに戻す"""
+    return datetime.fromtimestamp(int(timestamp), tz=timezone.utc).replace(tzinfo=JST)
+
+
+@lru_cache(maxsize=1024)
+def _endpoint_items(place_id, lat, lon):
+    """端点ブロックの要素（!1m<n>の中身）"""
+    items = []
+    if place_id:
+        items += ['1m1', f'1s{place_id}']
+    if lat and lon:
+        # 緯度経度は小数点4桁まで
+        items += ['2m2', f'1d{float(lon):.4f}', f'2d{float(lat):.4f}']
+    return tuple(items)
+
+
+@lru_cache(maxsize=1024)
+def _route_items(origin_items, dest_items):
+    """両端のブロック（時刻・モードを除く）。同じ出発地・目的地の組は使い回す"""
+    if not origin_items or not dest_items:
+        return ()
+    return (f'1m{len(origin_items)}',) + origin_items + (f'1m{len(dest_items)}',) + dest_items
+
+
+def data_blob(origin, destination, when=None, time_kind=ARRIVE):
+    """dataパラメータ（先頭の!を含む）"""
+    tail = []
+    if when is not None:
+        tail = ['2m3', TIME_FLAGS[time_kind], '7e2', f'8j{maps_timestamp(when)}']
+    tail.append(TRANSIT_MODE)
+    route = _route_items(_endpoint_items(origin.place_id, origin.lat, origin.lon),
+                         _endpoint_items(destination.place_id, destination.lat, destination.lon))
+    if route:
+        inner = len(route) + len(tail)
+        items = [f'4m{inner + 1}', f'4m{inner}', *route, *tail]
+    else:
+        items = tail
+    return '!' + '!'.join(items)
+
+
+def directions_url(origin, destination, when=None, time_kind=ARRIVE, base_url=None):
+    """
+    正規形の経路URL
+
+    Args:
+        origin / destination: Endpoint
+        when: 到着（または出発）時刻。Noneなら時刻指定なし
+        time_kind: ARRIVE / DEPART
+    """
+    base = (base_url or MAPS_BASE_URL).rstrip('/')
+    return (f"{base}/maps/dir/{quote(origin.label or '')}/{quote(destination.label or '')}/"
+            f"data={data_blob(origin, destination, when, time_kind)}")
+
+
+def search_url(query, base_url=None):
+    """Place ID取得用の検索URL"""
+    return f"{(base_url or MAPS_BASE_URL).rstrip('/')}/maps/search/{quote(query)}"
+
+
+def _parse_blob(blob):
+    """dataパラメータから端点（Place ID・緯度経度）と時刻を取り出す"""
+    tokens = [t for t in blob.split('!') if t]
+    endpoints = []
+    when = None
+    time_kind = ARRIVE
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token.startswith('1m') and len(endpoints) < 2 and token != '1m1':
+            # 端点ブロック。件数が実際と合わない旧形式のURLもあるため、既知の要素だけ読む
+            fields = {}
+            i += 1
+            while i < len(tokens) and (tokens[i] in ('1m1', '2m2') or tokens[i][:2] in ('1s', '1d', '2d')):
+                key, value = tokens[i][:2], tokens[i][2:]
+                if key == '1s':
+                    fields['place_id'] = value
+                elif key == '1d':
+                    fields['lon'] = float(value)
+                elif key == '2d':
+                    fields['lat'] = float(value)
+                i += 1
+            endpoints.append(fields)
+            continue
+        if token in ('6e0', '6e1'):
+            time_kind = DEPART if token == '6e0' else ARRIVE
+        elif token.startswith('8j'):
+            when = from_maps_timestamp(token[2:])
+        i += 1
+    return endpoints, when, time_kind
+
+
+def parse_directions_url(url):
+    """
+    経路URLを解析（/maps/dir/のパス形式と ?api=1 形式に対応）
+
+    Returns:
+        DirectionsRequest。経路URLでなければNone
+    """
+    parts = urlsplit(url)
+    segments = parts.path.split('/')
+    if 'dir' not in segments:
+        return None
+    query = parse_qs(parts.query)
+    if query.get('api') == ['1']:
+        when = None
+        time_kind = ARRIVE
+        for key, kind in (('arrival_time', ARRIVE), ('departure_time', DEPART)):
+            if query.get(key) and query[key][0].isdigit():
+                when = datetime.fromtimestamp(int(query[key][0]), tz=JST)
+                time_kind = kind
+        return DirectionsRequest(
+            Endpoint(query.get('origin', [None])[0], query.get('origin_place_id', [None])[0]),
+            Endpoint(query.get('destination', [None])[0], query.get('destination_place_id', [None])[0]),
+            when, time_kind)
+
+    rest = segments[segments.index('dir') + 1:]
+    labels = [unquote(s) for s in rest if s and not s.startswith('data=') and not s.startswith('@')]
+    blob = next((s[len('data='):] for s in rest if s.startswith('data=')), '')
+    endpoints, when, time_kind = _parse_blob(blob)
+    endpoints += [{}] * (2 - len(endpoints))
+    labels += [None] * (2 - len(labels))
+    origin, destination = (Endpoint(label, fields.get('place_id'), fields.get('lat'), fields.get('lon'))
+                           for label, fields in zip(labels[:2], endpoints[:2]))
+    return DirectionsRequest(origin, destination, when, time_kind)
+
+
+def with_time(url, when, time_kind=None):
+    """経路URLの時刻だけを差し替える（!8jがなければ解析して組み直す）"""
+    if time_kind is None and TIMESTAMP_PATTERN.search(url):
+        return TIMESTAMP_PATTERN.sub(f'!8j{maps_timestamp(when)}', url, count=1)
+    parsed = parse_directions_url(url)
+    base = '{0.scheme}://{0.netloc}'.format(urlsplit(url))
+    return directions_url(parsed.origin, parsed.destination, when, time_kind or parsed.time_kind, base)
+
+
+def endpoint_key(endpoint):
+    """端点のキー（Place ID優先、なければ正規化した住所、最後に緯度経度）"""
+    if endpoint.place_id:
+        return f'pid:{endpoint.place_id}'
+    if endpoint.label:
+        return f'addr:{normalize_address(endpoint.label)}'
+    if endpoint.lat and endpoint.lon:
+        return f'll:{float(endpoint.lat):.4f},{float(endpoint.lon):.4f}'
+    return '-'
+
+
+def cache_key(origin, destination, when=None, time_kind=ARRIVE):
+    """
+    ルートのキャッシュキー（URLの形式・ホストに依存しない）
+    例: 'transit|pid:ChIJ...|addr:東京駅|arrive|2025-08-16T10:00'
+    """
+    if when is None:
+        time_part = '-|-'
+    else:
+        local = when.astimezone(JST) if when.tzinfo is not None else when
+        time_part = f"{time_kind}|{local.strftime('%Y-%m-%dT%H:%M')}"
+    return f'transit|{endpoint_key(origin)}|{endpoint_key(destination)}|{time_part}'
+
+
+def url_cache_key(url):
+    """経路URLからキャッシュキーを導出（経路URLでなければNone）"""
+    parsed = parse_directions_url(url)
+    if parsed is None:
+        return None
+    return cache_key(*parsed)
@@ -4,16 +4,17 @@
 未処理3物件のルート情報を取得するスクリプト
 """
 
-import json
 import sys
 import os
 import time
 from datetime import datetime, timedelta
-import pytz
+from jst import JST
 
 # google_maps_scraper_v4_complete.pyをインポート
 sys.path.append('/app/output/japandatascience.com/timeline-mapping/api/')
 from google_maps_scraper_v4_complete import GoogleMapsScraperV4
+import atomic_io
+import log_setup
 
 def process_remaining_properties():
     """未処理3物件を処理"""
@@ -51,8 +52,7 @@ def process_remaining_properties():
     ]
     
     # 明日の10時到着
-    jst = pytz.timezone('Asia/Tokyo')
-    tomorrow = datetime.now(jst) + timedelta(days=1)
+    tomorrow = datetime.now(JST) + timedelta(days=1)
     arrival_time = tomorrow.replace(hour=10, minute=0, second=0, microsecond=0)
     
     print("="*60)
@@ -125,8 +125,7 @@ def process_remaining_properties():
     
     # 結果を保存
     output_file = '/app/output/japandatascience.com/timeline-mapping/data/remaining_properties.json'
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(results, f, ensure_ascii=False, indent=2)
+    atomic_io.atomic_write_json(output_file, results)
     
     print("\n" + "="*60)
     print("処理完了！")
@@ -136,4 +135,5 @@ def process_remaining_properties():
     return results
 
 if __name__ == "__main__":
+    log_setup.configure()
     process_remaining_properties()
\ No newline at end of file
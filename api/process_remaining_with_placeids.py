@@ -10,11 +10,14 @@ import sys
 import os
 import time
 from datetime import datetime, timedelta
-import pytz
+from jst import JST
 
 # google_maps_scraper_v4_complete.pyをインポート
 sys.path.append('/app/output/japandatascience.com/timeline-mapping/api/')
 from google_maps_scraper_v4_complete import GoogleMapsScraperV4
+import request_scheduler
+import atomic_io
+import log_setup
 
 def load_place_ids():
     """Place ID情報を読み込む"""
@@ -67,8 +70,7 @@ def process_remaining_properties_fast():
     ]
     
     # 明日の10時到着
-    jst = pytz.timezone('Asia/Tokyo')
-    tomorrow = datetime.now(jst) + timedelta(days=1)
+    tomorrow = datetime.now(JST) + timedelta(days=1)
     arrival_time = tomorrow.replace(hour=10, minute=0, second=0, microsecond=0)
     
     print("="*60)
@@ -98,6 +100,8 @@ def process_remaining_properties_fast():
                 current_route += 1
                 print(f"  [{current_route}/{total_routes}] {dest['name']}... ", end="", flush=True)
                 
+                # レート制限（共有トークンバケット）
+                request_scheduler.acquire(request_scheduler.BATCH)
                 result = scraper.scrape_route(
                     origin_address=property_data['address'],
                     dest_address=dest['address'],
@@ -137,9 +141,6 @@ def process_remaining_properties_fast():
                         },
                         "total_walk_time": 0
                     })
-                
-                # レート制限対策（短めに設定）
-                time.sleep(2)
             
             # 物件データとして保存
             results.append({
@@ -157,8 +158,7 @@ def process_remaining_properties_fast():
     
     # 結果を保存
     output_file = '/app/output/japandatascience.com/timeline-mapping/data/remaining_3_properties.json'
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(results, f, ensure_ascii=False, indent=2)
+    atomic_io.atomic_write_json(output_file, results)
     
     print("\n" + "="*60)
     print("処理完了！")
@@ -172,4 +172,5 @@ def process_remaining_properties_fast():
     return results
 
 if __name__ == "__main__":
+    log_setup.configure()
     process_remaining_properties_fast()
\ No newline at end of file
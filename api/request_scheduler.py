@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Google Mapsへのページ読み込みの集中スケジューラ
+プロセス間で共有するトークンバケット（状態ファイル＋flock）と優先度レーンで、
+手動のtime.sleepに頼らず安全な最大スループットでアクセスする
+
+レーン（優先度順）:
+    interactive: APIサーバーへのユーザーリクエスト
+    batch:       バッチ処理のルート取得
+    place_id:    Place ID収集
+下位レーンはバケットに予備トークンを残し、上位レーンの待機中は取得を控える
+"""
+
+import os
+import json
+import time
+import fcntl
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+STATE_FILE = os.environ.get('GOOGLE_MAPS_RATE_STATE', '/tmp/timeline_mapping_rate_limit.json')
+RATE_PER_SECOND = float(os.environ.get('GOOGLE_MAPS_RATE_PER_SEC', '0.5'))
+BURST = float(os.environ.get('GOOGLE_MAPS_RATE_BURST', '3'))
+
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+PLACE_ID = 'place_id'
+
+# レーンごとの優先度（小さいほど優先）と、取得後に残すべき予備トークン数
+LANES = {
+    INTERACTIVE: {'priority': 0, 'reserve': 0.0},
+    BATCH: {'priority': 1, 'reserve': 1.0},
+    PLACE_ID: {'priority': 2, 'reserve': 2.0},
+}
+
+# 上位レーンの待機表明の有効期間（秒）
+DEMAND_TTL = 5.0
+
+
+class RateLimitTimeout(Exception):
+    """タイムアウトまでにトークンを取得できなかった"""
+
+
+class RequestScheduler:
+    """
+    プロセス間共有トークンバケット
+
+    状態はJSONファイル1つ（tokens, updated, demand）で、
+    読み書きはflockで排他する。同一プロセス内のスレッドは
+    優先度順に並べてから状態ファイルにアクセスする。
+    """
+
+    def __init__(self, rate=RATE_PER_SECOND, burst=BURST, state_file=STATE_FILE, clock=time.time,
+                 sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self.state_file = state_file
+        self.clock = clock
+        self.sleep = sleep
+        self._cond = threading.Condition()
+        self._waiting = {lane: 0 for lane in LANES}
+        self.stats = {lane: {'acquired': 0, 'waited': 0.0} for lane in LANES}
+
+    @contextmanager
+    def _locked_state(self):
+        """状態ファイルをロックして読み書きする"""
+        fd = os.open(self.state_file, os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            raw = os.read(fd, 4096)
+            try:
+                state = json.loads(raw) if raw else {}
+            except ValueError:
+                state = {}
+            now = self.clock()
+            state.setdefault('tokens', self.burst)
+            state.setdefault('updated', now)
+            state.setdefault('demand', {})
+            # 経過時間分を補充
+            elapsed = max(0.0, now - state['updated'])
+            state['tokens'] = min(self.burst, state['tokens'] + elapsed * self.rate)
+            state['updated'] = now
+            yield state
+            data = json.dumps(state).encode()
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.ftruncate(fd, 0)
+            os.write(fd, data)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def _higher_lane_waiting_locally(self, lane):
+        priority = LANES[lane]['priority']
+        return any(count > 0 for other, count in self._waiting.items()
+                   if LANES[other]['priority'] < priority)
+
+    def _try_take(self, lane):
+        """
+        トークン取得を試みる
+
+        Returns:
+            取得できれば0、できなければ次に試すまでの待ち秒数
+        """
+        priority = LANES[lane]['priority']
+        reserve = LANES[lane]['reserve']
+        with self._locked_state() as state:
+            now = state['updated']
+            demand = state['demand']
+            # 他プロセスの上位レーンが待機中なら譲る
+            blocked = any(float(until) > now for other, until in demand.items()
+                          if other in LANES and LANES[other]['priority'] < priority)
+            if not blocked and state['tokens'] - 1.0 >= reserve - 1e-9:
+                state['tokens'] -= 1.0
+                return 0.0
+            # 自レーンの待機を表明（下位レーンを抑止）
+            demand[lane] = now + DEMAND_TTL
+            deficit = max(0.0, reserve + 1.0 - state['tokens'])
+            return max(0.05, deficit / self.rate if self.rate > 0 else 1.0)
+
+    def _clear_demand(self, lane):
+        with self._locked_state() as state:
+            state['demand'].pop(lane, None)
+
+    def acquire(self, lane=BATCH, timeout=None):
+        """
+        トークンを1つ取得するまで待機
+
+        Args:
+            lane: interactive / batch / place_id
+            timeout: 最大待機秒数（Noneは無制限）
+
+        Returns:
+            待機した秒数
+        """
+        if lane not in LANES:
+            raise ValueError(f"unknown lane: {lane}")
+        started = self.clock()
+        deadline = None if timeout is None else started + timeout
+
+        with self._cond:
+            self._waiting[lane] += 1
+        try:
+            while True:
+                with self._cond:
+                    # 同一プロセス内の上位レーンを先に通す
+                    while self._higher_lane_waiting_locally(lane):
+                        remaining = None if deadline is None else deadline - self.clock()
+                        if remaining is not None and remaining <= 0:
+                            raise RateLimitTimeout(lane)
+                        self._cond.wait(0.1 if remaining is None else min(0.1, remaining))
+                wait = self._try_take(lane)
+                if wait == 0.0:
+                    break
+                if deadline is not None and self.clock() + wait > deadline:
+                    raise RateLimitTimeout(lane)
+                self.sleep(wait)
+        finally:
+            with self._cond:
+                self._waiting[lane] -= 1
+                self._cond.notify_all()
+
+        if LANES[lane]['priority'] < max(l['priority'] for l in LANES.values()):
+            self._clear_demand(lane)
+        waited = self.clock() - started
+        self.stats[lane]['acquired'] += 1
+        self.stats[lane]['waited'] += waited
+        if waited > 1.0:
+            logger.debug("レート制限で%.1f秒待機 (lane=%s)", waited, lane)
+        return waited
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """プロセス共通のスケジューラ"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RequestScheduler()
+        return _scheduler
+
+
+def acquire(lane=BATCH, timeout=None):
+    """get_scheduler().acquire()の短縮形"""
+    return get_scheduler().acquire(lane, timeout)
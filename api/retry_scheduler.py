@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ルート取得の再試行スケジューラ
+失敗コード（failure_codes）ごとに待ち時間・試行回数・取得方法・セッションの切り替えを決め、
+複数のスクレイパーセッションで初回の取得と再試行を同じキューから処理する。
+
+失敗したルートは待ち時間の間キューに戻り、その間も各セッションは他のルートを処理する。
+遅い再試行が最後に直列でまとめて残らないため、全ルートの完了時間が一部の失敗に引きずられない。
+"""
+
+import os
+import time
+import random
+import logging
+import threading
+from collections import namedtuple
+
+import failure_codes
+import log_setup
+
+logger = logging.getLogger(__name__)
+
+# 待ち時間の倍率（0で待たない。テスト・手動の再実行用）
+BACKOFF_SCALE = float(os.environ.get('RETRY_BACKOFF_SCALE', '1'))
+# 別セッション指定の再試行を、指定外のセッションでも実行してよくなるまでの待ち（秒）
+AVOID_GRACE_SECONDS = 30.0
+# 待ち時間のゆらぎ（±割合）
+JITTER = 0.2
+
+# max_attempts: 初回を含む試行回数の上限
+# base_delay / max_delay: 再試行までの待ち（秒、再試行ごとに2倍、上限あり）
+# strategies: n回目の再試行で使う取得方法（scrape_routeのstrategy、足りなければ最後を繰り返す）
+# new_session: 前回と別のセッションで再試行する
+RetryPolicy = namedtuple('RetryPolicy', ['max_attempts', 'base_delay', 'max_delay', 'strategies', 'new_session'])
+
+POLICIES = {
+    # ルート一覧が出ない: Place ID入りのURLが合わない場合があるため住所だけのURL、次にクリック操作
+    failure_codes.TRIPS_TIMEOUT: RetryPolicy(3, 5, 60, (failure_codes.NO_PLACE_ID_URL, failure_codes.CLICK_FLOW),
+                                             False),
+    # Place ID検索の読み込み失敗は一時的なことが多い: 別セッションで検索し直し、だめなら住所だけのURL
+    failure_codes.PLACE_ID_MISS: RetryPolicy(3, 3, 30, (None, failure_codes.NO_PLACE_ID_URL), True),
+    # 同意画面・CAPTCHA: 長めに待って別セッションで
+    failure_codes.BLOCKED: RetryPolicy(3, 60, 300, (None,), True),
+    # セッション切れ: すぐに別セッションで（切れたセッションはscrape_route内で作り直し済み）
+    failure_codes.DRIVER_DEAD: RetryPolicy(3, 1, 10, (None,), True),
+    # カードを読めない: URLパラメータが効いていない可能性があるためクリック操作で設定し直す
+    failure_codes.PARSE_FAILURE: RetryPolicy(2, 2, 10, (failure_codes.CLICK_FLOW,), False),
+    failure_codes.DEADLINE: RetryPolicy(2, 5, 30, (None,), True),
+    # Hub停止中: retry_after以上待つ
+    failure_codes.HUB_UNAVAILABLE: RetryPolicy(5, 10, 120, (None,), True),
+    failure_codes.UNKNOWN: RetryPolicy(2, 10, 60, (None,), True),
+}
+
+
+class RouteTask:
+    """キュー上の1ルート"""
+
+    def __init__(self, index, job):
+        self.index = index
+        self.job = job
+        self.codes = []            # 各試行の失敗コード（成功はNone）
+        self.strategy = None       # 次の試行の取得方法
+        self.avoid_session = None  # 次の試行で避けるセッション番号
+        self.ready_at = 0.0        # この時刻以降に実行可能
+        self.started_at = None
+
+
+class RetryScheduler:
+    """
+    複数セッションでルートを取得し、失敗は分類ごとの方針で再試行する
+
+    Args:
+        scrapers: GoogleMapsScraper（scrape_routeを持つもの）のリスト。1つにつき1スレッド
+        policies: 失敗コード→RetryPolicy（未定義のコードはUNKNOWNの方針）
+    """
+
+    def __init__(self, scrapers, policies=None, backoff_scale=BACKOFF_SCALE,
+                 avoid_grace=AVOID_GRACE_SECONDS, clock=time.monotonic):
+        self.scrapers = list(scrapers)
+        self.policies = dict(POLICIES, **(policies or {}))
+        self.backoff_scale = backoff_scale
+        self.avoid_grace = avoid_grace
+        self.clock = clock
+        self.stats = {}  # 失敗コード→件数（全試行）
+        self._queue = []
+        self._inflight = 0
+        self._results = []
+        self._cond = threading.Condition()
+
+    def policy(self, code):
+        return self.policies.get(code) or self.policies[failure_codes.UNKNOWN]
+
+    def delay(self, policy, retry, result):
+        """retry回目（1始まり）の再試行までの待ち（秒）"""
+        seconds = min(policy.max_delay, policy.base_delay * 2 ** (retry - 1))
+        seconds = max(seconds, result.get('retry_after') or 0)
+        return seconds * self.backoff_scale * random.uniform(1 - JITTER, 1 + JITTER)
+
+    def run(self, jobs):
+        """
+        全ルートを取得する
+
+        Args:
+            jobs: scrape_routeのキーワード引数の辞書のリスト
+
+        Returns:
+            jobsと同じ順の最終結果（scrape_routeの結果に attempts: 各試行の失敗コード（成功はNone）と
+            processing_time: 初回開始から最終結果までの秒数 を付けたもの）
+        """
+        self._queue = [RouteTask(i, job) for i, job in enumerate(jobs)]
+        self._results = [None] * len(jobs)
+        self._inflight = 0
+        workers = [threading.Thread(target=self._worker, args=(i, scraper), daemon=True,
+                                    name=f'retry-worker-{i}')
+                   for i, scraper in enumerate(self.scrapers)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return self._results
+
+    def _pick(self, session, now):
+        """このセッションで実行できる、最も早く実行可能になったタスク"""
+        candidates = [task for task in self._queue if task.ready_at <= now and
+                      (task.avoid_session != session or len(self.scrapers) == 1 or
+                       now - task.ready_at >= self.avoid_grace)]
+        if not candidates:
+            return None
+        task = min(candidates, key=lambda t: (t.ready_at, t.index))
+        self._queue.remove(task)
+        return task
+
+    def _take(self, session):
+        """次のタスク（全タスク完了ならNone）"""
+        with self._cond:
+            while True:
+                now = self.clock()
+                task = self._pick(session, now)
+                if task is not None:
+                    self._inflight += 1
+                    return task
+                if not self._queue and self._inflight == 0:
+                    return None
+                wait = min((t.ready_at for t in self._queue), default=now + 1.0) - now
+                self._cond.wait(timeout=min(max(wait, 0.01), 1.0))
+
+    def _worker(self, session, scraper):
+        while True:
+            task = self._take(session)
+            if task is None:
+                return
+            if task.started_at is None:
+                task.started_at = self.clock()
+            kwargs = dict(task.job)
+            if task.strategy:
+                kwargs['strategy'] = task.strategy
+            try:
+                result = scraper.scrape_route(**kwargs)
+            except Exception as e:
+                # scrape_routeは通常例外を返り値に変換するが、想定外の例外もタスクの失敗として扱う
+                result = {'success': False, 'error': str(e), 'error_code': failure_codes.classify_exception(e)}
+            self._finish(task, session, result)
+
+    def _finish(self, task, session, result):
+        code = None if result.get('success') else (result.get('error_code') or failure_codes.UNKNOWN)
+        task.codes.append(code)
+        with self._cond:
+            self._inflight -= 1
+            policy = self.policy(code)
+            if code is not None:
+                self.stats[code] = self.stats.get(code, 0) + 1
+            if code is not None and len(task.codes) < policy.max_attempts:
+                retry = len(task.codes)
+                task.strategy = policy.strategies[min(retry, len(policy.strategies)) - 1]
+                task.avoid_session = session if policy.new_session else None
+                delay = self.delay(policy, retry, result)
+                task.ready_at = self.clock() + delay
+                self._queue.append(task)
+                logger.info("再試行予約: %s (%s, %d回目, %.1f秒後, 方法:%s)", task.job.get('dest_name'), code,
+                            retry, delay, task.strategy or '通常',
+                            extra=log_setup.fields(destination=task.job.get('dest_name'), error_code=code,
+                                                   retry=retry, delay=round(delay, 2), strategy=task.strategy,
+                                                   session=session))
+            else:
+                result['attempts'] = list(task.codes)
+                result['processing_time'] = self.clock() - task.started_at
+                self._results[task.index] = result
+            self._cond.notify_all()
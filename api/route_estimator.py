@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+近傍物件からのルート所要時間推定
+スクレイピング済みの出発地をグリッド空間インデックスに登録し、
+近くの新しい物件の所要時間を近傍ルート＋徒歩補正で推定する。
+信頼度が低い組み合わせのみスクレイピング対象とする。
+"""
+
+import math
+import logging
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_M = 6371000.0
+WALK_SPEED_M_PER_MIN = 80.0   # 不動産表示規約の徒歩速度（80m/分）
+WALK_DETOUR_FACTOR = 1.3      # 直線距離→道のり距離の補正係数
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """2点間の距離（メートル）"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+class GridIndex:
+    """
+    緯度経度の固定グリッドによる空間インデックス
+    東京の物件数（数十〜数百件）ではKD-treeより単純で十分高速
+    """
+
+    def __init__(self, cell_size_m=300.0):
+        self.cell_size_m = cell_size_m
+        # 緯度1度≒111km、経度は東京付近の緯度で補正
+        self.lat_step = cell_size_m / 111320.0
+        self.lon_step = cell_size_m / (111320.0 * math.cos(math.radians(35.68)))
+        self.cells = defaultdict(list)
+
+    def _cell(self, lat, lon):
+        return (int(math.floor(lat / self.lat_step)), int(math.floor(lon / self.lon_step)))
+
+    def insert(self, key, lat, lon):
+        self.cells[self._cell(lat, lon)].append((key, lat, lon))
+
+    def remove(self, key):
+        for cell_items in self.cells.values():
+            cell_items[:] = [item for item in cell_items if item[0] != key]
+
+    def nearby(self, lat, lon, radius_m) -> List[Tuple[float, str]]:
+        """半径内の(距離, key)を距離順に返す"""
+        ci, cj = self._cell(lat, lon)
+        rings = int(math.ceil(radius_m / self.cell_size_m))
+        found = []
+        for di in range(-rings, rings + 1):
+            for dj in range(-rings, rings + 1):
+                for key, klat, klon in self.cells.get((ci + di, cj + dj), ()):
+                    dist = haversine_m(lat, lon, klat, klon)
+                    if dist <= radius_m:
+                        found.append((dist, key))
+        found.sort()
+        return found
+
+
+class RouteEstimator:
+    """
+    近傍のスクレイピング済み出発地から所要時間を推定する
+
+    推定値 = 近傍の所要時間 + 徒歩補正（目的地座標が分かる場合は
+    目的地までの直線距離差を徒歩換算、分からない場合は補正なし）
+    信頼度 = 距離係数 × 近傍数係数 × 近傍間の一致度
+    """
+
+    def __init__(self, max_distance_m=600.0, k=3, min_confidence=0.7, cell_size_m=300.0):
+        self.max_distance_m = max_distance_m
+        self.k = k
+        self.min_confidence = min_confidence
+        self.index = GridIndex(cell_size_m)
+        self.origins = {}       # origin_id -> (lat, lon)
+        self.routes = {}        # origin_id -> {dest_id: route}
+        self.destinations = {}  # dest_id -> (lat, lon)
+
+    def add_destination(self, dest_id, lat, lon):
+        """目的地の座標を登録（徒歩補正に使用）"""
+        if lat is not None and lon is not None:
+            self.destinations[dest_id] = (float(lat), float(lon))
+
+    def add_route(self, origin_id, lat, lon, dest_id, route):
+        """
+        スクレイピング済みルートを登録
+
+        Args:
+            route: 少なくとも'total_time'を含む辞書（route_type, train_lines, fare等は推定結果に引き継ぐ）
+        """
+        if lat is None or lon is None or not route or route.get('total_time') is None:
+            return
+        if route.get('estimated'):
+            # 推定値から更に推定すると誤差が累積するため登録しない
+            return
+        if origin_id not in self.origins:
+            self.origins[origin_id] = (float(lat), float(lon))
+            self.index.insert(origin_id, float(lat), float(lon))
+            self.routes[origin_id] = {}
+        self.routes[origin_id][dest_id] = route
+
+    def _walk_correction(self, lat, lon, nb_lat, nb_lon, dest_id, distance_m):
+        """近傍との位置差による徒歩時間の補正（分）"""
+        max_correction = distance_m * WALK_DETOUR_FACTOR / WALK_SPEED_M_PER_MIN
+        dest = self.destinations.get(dest_id)
+        if not dest:
+            return 0.0, max_correction
+        delta_m = haversine_m(lat, lon, *dest) - haversine_m(nb_lat, nb_lon, *dest)
+        correction = delta_m * WALK_DETOUR_FACTOR / WALK_SPEED_M_PER_MIN
+        correction = max(-max_correction, min(max_correction, correction))
+        # 補正の不確かさは移動距離に比例して残る
+        return correction, max_correction / 2
+
+    def estimate(self, lat, lon, dest_id, exclude=None) -> Optional[Dict]:
+        """
+        指定座標から目的地への所要時間を推定
+
+        Returns:
+            {'total_time', 'confidence', 'neighbours', 'template'}、近傍がなければNone
+        """
+        if lat is None or lon is None:
+            return None
+        lat, lon = float(lat), float(lon)
+
+        candidates = []
+        for dist, origin_id in self.index.nearby(lat, lon, self.max_distance_m):
+            if origin_id == exclude:
+                continue
+            route = self.routes[origin_id].get(dest_id)
+            if not route:
+                continue
+            nb_lat, nb_lon = self.origins[origin_id]
+            correction, uncertainty = self._walk_correction(lat, lon, nb_lat, nb_lon, dest_id, dist)
+            candidates.append({
+                'origin_id': origin_id,
+                'distance_m': round(dist, 1),
+                'estimate': route['total_time'] + correction,
+                'uncertainty': uncertainty,
+                'route': route
+            })
+            if len(candidates) >= self.k:
+                break
+
+        if not candidates:
+            return None
+
+        # 距離の逆数で重み付け平均（50mの下駄で同一建物の過大評価を防ぐ）
+        weights = [1.0 / (c['distance_m'] + 50.0) for c in candidates]
+        total_weight = sum(weights)
+        estimate = sum(w * c['estimate'] for w, c in zip(weights, candidates)) / total_weight
+
+        # 信頼度
+        nearest = candidates[0]['distance_m']
+        distance_factor = max(0.0, 1.0 - nearest / self.max_distance_m)
+        count_factor = min(1.0, 0.6 + 0.2 * len(candidates))
+        if len(candidates) > 1:
+            mean = sum(c['estimate'] for c in candidates) / len(candidates)
+            spread = math.sqrt(sum((c['estimate'] - mean) ** 2 for c in candidates) / len(candidates))
+        else:
+            spread = candidates[0]['uncertainty']
+        agreement_factor = 1.0 / (1.0 + spread / 5.0)
+        confidence = distance_factor * count_factor * agreement_factor
+
+        return {
+            'total_time': int(round(estimate)),
+            'confidence': round(confidence, 3),
+            'neighbours': [
+                {'origin_id': c['origin_id'], 'distance_m': c['distance_m']}
+                for c in candidates
+            ],
+            'template': candidates[0]['route']
+        }
+
+    def estimate_route(self, origin_id, lat, lon, dest_id) -> Optional[Dict]:
+        """
+        信頼度が閾値以上ならproperties.jsonのルート形式で推定結果を返す
+        閾値未満・近傍なしの場合はNone（スクレイピングが必要）
+        """
+        result = self.estimate(lat, lon, dest_id, exclude=origin_id)
+        if not result or result['confidence'] < self.min_confidence:
+            return None
+        template = result['template']
+        return {
+            'total_time': result['total_time'],
+            'route_type': template.get('route_type'),
+            'train_lines': list(template.get('train_lines') or []),
+            'fare': template.get('fare'),
+            'estimated': True,
+            'confidence': result['confidence'],
+            'estimated_from': result['neighbours']
+        }
+
+    def plan(self, origins, dest_ids):
+        """
+        物件×目的地の組み合わせを推定可能/要スクレイピングに振り分ける
+
+        Args:
+            origins: {'id', 'lat', 'lon'}を含む辞書のリスト
+            dest_ids: 目的地IDのリスト
+
+        Returns:
+            (estimated, to_scrape)
+            estimated: [(origin_id, dest_id, route)]、to_scrape: [(origin_id, dest_id)]
+        """
+        estimated, to_scrape = [], []
+        for origin in origins:
+            for dest_id in dest_ids:
+                if dest_id in self.routes.get(origin['id'], {}):
+                    continue
+                route = self.estimate_route(origin['id'], origin.get('lat'), origin.get('lon'), dest_id)
+                if route:
+                    estimated.append((origin['id'], dest_id, route))
+                else:
+                    to_scrape.append((origin['id'], dest_id))
+        logger.info("推定可能 %d件 / 要スクレイピング %d件", len(estimated), len(to_scrape))
+        return estimated, to_scrape
+
+    @classmethod
+    def from_data(cls, properties_base, properties, destinations, **kwargs):
+        """
+        properties_base.json（座標）とproperties.json（ルート）から推定器を構築
+
+        properties.jsonのdestinationは目的地名・IDのどちらでもよい
+        """
+        estimator = cls(**kwargs)
+        for dest in destinations.get('destinations', []):
+            estimator.add_destination(dest.get('name'), dest.get('lat'), dest.get('lon'))
+            estimator.add_destination(dest.get('id'), dest.get('lat'), dest.get('lon'))
+
+        coords = {p['name']: (p.get('lat'), p.get('lon')) for p in properties_base.get('properties', [])}
+        for prop in properties.get('properties', []):
+            lat, lon = coords.get(prop['name'], (None, None))
+            for route in prop.get('routes', []):
+                estimator.add_route(prop['name'], lat, lon, route.get('destination'), route)
+        return estimator
+
+
+def main():
+    """既存データから推定可能なルート数を表示"""
+    import json
+
+    data_dir = '/app/output/japandatascience.com/timeline-mapping/data'
+    with open(f'{data_dir}/properties_base.json', 'r', encoding='utf-8') as f:
+        properties_base = json.load(f)
+    with open(f'{data_dir}/properties.json', 'r', encoding='utf-8') as f:
+        properties = json.load(f)
+    with open(f'{data_dir}/destinations.json', 'r', encoding='utf-8') as f:
+        destinations = json.load(f)
+
+    estimator = RouteEstimator.from_data(properties_base, properties, destinations)
+    origins = [{'id': p['name'], 'lat': p.get('lat'), 'lon': p.get('lon')}
+               for p in properties_base['properties']]
+    dest_names = [d['name'] for d in destinations['destinations']]
+    estimated, to_scrape = estimator.plan(origins, dest_names)
+
+    print(f"推定可能: {len(estimated)}件 / 要スクレイピング: {len(to_scrape)}件")
+    for origin_id, dest_id, route in estimated:
+        print(f"  {origin_id} → {dest_id}: {route['total_time']}分 (信頼度 {route['confidence']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ルートカード・詳細テキスト・URLの正規表現（事前コンパイル済みの一覧）
+スクレイパー各所のインライン正規表現をここにまとめ、カードテキストは
+extract_card() が所要時間・時刻・運賃・路線をまとめて取り出す。
+
+各項目はテキストの先頭から見て最初に現れたものを採用する。
+「約 4 分、230 m」（徒歩）や「5 分ごと」（運行間隔）は所要時間として数えない。
+"""
+
+import re
+
+# ---------------------------------------------------------------------------
+# 個別パターン
+# ---------------------------------------------------------------------------
+
+# 運賃（「180 円」「1,234円」「¥1,234」「￥180」「180 yen」）
+FARE = re.compile(r'[¥￥]\s*(\d{1,3}(?:,\d{3})+|\d+)|(\d{1,3}(?:,\d{3})+|\d+)\s*(?:円|(?i:yen))')
+# カード上の路線名（「銀座線」「湘南新宿ライン」「Yamanote Line」）
+LINE = re.compile(r'[^\s]+(?:線|ライン|Line)')
+# 詳細テキストの路線名（「地下鉄銀座線各停渋谷行」→「地下鉄銀座線」）
+DETAIL_LINE = re.compile(r'((?:地下鉄)?[^\s]+線)')
+# 徒歩区間（「約 4 分、230 m」「約 15 分、1.2 km」）
+WALK = re.compile(r'約\s*(\d+)\s*分[、,]\s*([\d.,]+)\s*k?m')
+# 乗車駅と発車時刻（「神田駅から 11:27」）
+STATION_DEPARTURE = re.compile(r'([^\s]+駅)から\s*(\d+:\d+)')
+# 時刻の後の駅名（「11:27 神田駅」）
+TIME_THEN_STATION = re.compile(r'(\d+:\d+)\s*([^\s]+駅)')
+STATION = re.compile(r'([^\s]+駅)')
+CLOCK = re.compile(r'(\d{1,2}:\d{2})')
+
+# URL中のPlace ID（優先順）と座標
+PLACE_ID_PATTERNS = tuple(re.compile(pattern) for pattern in (
+    # ChIJ形式
+    r'!1s(ChIJ[A-Za-z0-9_-]+)',
+    r'/place/[^/]+/@[^/]+/data=.*!1s(ChIJ[A-Za-z0-9_-]+)',
+    r'ftid=(ChIJ[A-Za-z0-9_-]+)',
+    # 0x形式
+    r'!1s(0x[0-9a-f]+:0x[0-9a-f]+)',
+    r'/place/[^/]+/@[^/]+/data=.*!1s(0x[0-9a-f]+:0x[0-9a-f]+)',
+    r'ftid=(0x[0-9a-f]+:0x[0-9a-f]+)',
+    r'!3m1!1s(0x[0-9a-f]+:0x[0-9a-f]+)',
+))
+COORDINATES = re.compile(r'@([\d.]+),([\d.]+)')
+
+# ---------------------------------------------------------------------------
+# カードテキストの走査
+# ---------------------------------------------------------------------------
+
+# 数字・「約」・「¥」で始まるトークンを1回の走査で読む。選択肢の順序が優先順位
+# （「約 4 分、230 m」は徒歩、「5 分ごと」は運行間隔として所要時間に数えない）。
+# 先頭の先読みで候補の位置だけを試し、数字の途中からは読み直さない
+CARD_SCANNER = re.compile(r'''
+    (?<![0-9])(?=[0-9約¥￥])
+    (?:
+        (?P<walk>約\s*(?P<walk_minutes>\d+)\s*分[、,]\s*[\d.,]+\s*k?m)
+      | (?P<approx>約\s*\d+\s*分)
+      | (?P<range>(?P<departure>\d{1,2}:\d{2})(?:\([^)\n]*\)|[^\d\n-])*-\s*(?P<arrival>\d{1,2}:\d{2}))
+      | (?P<duration>(?P<amount>\d+)\s*(?:(?P<hour_unit>時間)(?:\s*(?P<minutes>\d+)\s*分)?|分)
+                     (?!\s*(?:ごと|おき|間隔)))
+      | (?P<fare>[¥￥]\s*(?P<fare_prefixed>\d{1,3}(?:,\d{3})+|\d+)
+                |(?P<fare_suffixed>\d{1,3}(?:,\d{3})+|\d+)\s*(?:円|(?i:yen)))
+    )
+''', re.VERBOSE)
+
+
+def _fare_value(text):
+    return int(text.replace(',', ''))
+
+
+def extract_card(text):
+    """
+    ルートカードのテキストから基本情報を取り出す
+    数値の項目は CARD_SCANNER の1回の走査、路線名は LINE の1回の走査で取り出す
+
+    Returns:
+        {'travel_time', 'departure_time', 'arrival_time', 'fare', 'train_lines', 'walks'}
+        見つからない項目はNone（train_linesは出現順・重複なし、walksは徒歩区間の分のリスト）
+    """
+    text = text or ''
+    card = {
+        'travel_time': None,
+        'departure_time': None,
+        'arrival_time': None,
+        'fare': None,
+        'train_lines': list(dict.fromkeys(LINE.findall(text))),
+        'walks': []
+    }
+    for match in CARD_SCANNER.finditer(text):
+        kind = match.lastgroup
+        if kind == 'duration':
+            if card['travel_time'] is None:
+                amount = int(match['amount'])
+                card['travel_time'] = (amount * 60 + int(match['minutes'] or 0)) if match['hour_unit'] else amount
+        elif kind == 'range':
+            if card['departure_time'] is None:
+                card['departure_time'] = match['departure']
+                card['arrival_time'] = match['arrival']
+        elif kind == 'fare':
+            if card['fare'] is None:
+                card['fare'] = _fare_value(match['fare_prefixed'] or match['fare_suffixed'])
+        elif kind == 'walk':
+            card['walks'].append(int(match['walk_minutes']))
+    return card
+
+
+def classify_route_type(text, train_lines=()):
+    """カードテキストからルートの種類（'徒歩のみ' / '公共交通機関' / '不明'）を判定"""
+    transit = any(word in text for word in ('駅', '線', '電車', 'バス'))
+    if '徒歩' in text and not transit:
+        return '徒歩のみ'
+    if transit or train_lines:
+        return '公共交通機関'
+    return '不明'
+
+
+# ---------------------------------------------------------------------------
+# 個別の抽出
+# ---------------------------------------------------------------------------
+
+def parse_duration(text):
+    """最初の所要時間（分）。徒歩・運行間隔は除く"""
+    return extract_card(text)['travel_time']
+
+
+def parse_fare(text, minimum=None, maximum=None):
+    """
+    最初の運賃（円）
+
+    Args:
+        minimum / maximum: 妥当な範囲。範囲外の金額は読み飛ばして次の候補を探す
+    """
+    for match in FARE.finditer(text or ''):
+        fare = _fare_value(match.group(1) or match.group(2))
+        if (minimum is None or fare >= minimum) and (maximum is None or fare <= maximum):
+            return fare
+    return None
+
+
+def extract_place_id(url):
+    """URLからPlace ID（ChIJ形式または0x形式）を取り出す。なければNone"""
+    for pattern in PLACE_ID_PATTERNS:
+        match = pattern.search(url)
+        if match:
+            return match.group(1)
+    return None
+
+
+def extract_coordinates(url):
+    """URLの「@緯度,経度」を文字列のまま返す。なければ(None, None)"""
+    match = COORDINATES.search(url)
+    return (match.group(1), match.group(2)) if match else (None, None)
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+スクレイピング結果 → properties.json形式 のストリーミング変換
+ルート結果を1件ずつ変換・検証し、出力JSONを逐次書き出す（全件・1物件分のルートもメモリに持たない）。
+
+    append_jsonl(journal, route)                           # バッチが1ルートごとに追記
+    groups = group_routes(successful(read_jsonl(journal)))  # またはprogress['routes']のリスト
+    properties = build_properties(groups, property_index(loader.get_all_properties()))
+    write_properties_json(path, properties)
+
+出力はjson.dump(..., ensure_ascii=False, indent=2)と同じ書式。書き込み中は同じディレクトリの
+「.<ファイル名>.<ランダム>.partial」に出力され（先頭の物件から順に確認できる。同時に複数の書き込みが
+あっても一時ファイルは衝突しない）、完了時にfsyncして本来のパスへ置き換える。
+"""
+
+import json
+import logging
+import os
+import tempfile
+from collections.abc import Iterator, Sequence
+from itertools import groupby, islice
+
+import atomic_io
+
+logger = logging.getLogger(__name__)
+
+PARTIAL_SUFFIX = '.partial'
+# 所要時間として妥当な範囲（分）
+MAX_TOTAL_TIME = 600
+
+
+class StreamingJsonWriter:
+    """
+    JSONドキュメントを逐次書き出す（json.dumpと同じインデント書式）
+
+    begin_object / begin_array でコンテナを開き、key → value で要素を追加、end で閉じる。
+    value ごとにflushするため、書き込み途中のファイルも先頭から読める
+    """
+
+    def __init__(self, fp, indent=2, default=None):
+        self.fp = fp
+        self.indent = indent
+        self.default = default
+        self.stack = []  # [種類('{' / '['), 要素数]
+        self._pending_key = False
+
+    def _prefix(self, depth):
+        return '\n' + ' ' * (self.indent * depth)
+
+    def _before_value(self):
+        if not self.stack:
+            return
+        kind, count = self.stack[-1]
+        if kind == '{':
+            if not self._pending_key:
+                raise ValueError('オブジェクト内ではkey()が必要です')
+            self._pending_key = False
+            self.stack[-1][1] += 1
+            return
+        self.fp.write((',' if count else '') + self._prefix(len(self.stack)))
+        self.stack[-1][1] += 1
+
+    def key(self, name):
+        kind, count = self.stack[-1]
+        if kind != '{' or self._pending_key:
+            raise ValueError('key()はオブジェクト内でのみ、値の前に1回だけ呼び出せます')
+        self.fp.write((',' if count else '') + self._prefix(len(self.stack)))
+        self.fp.write(json.dumps(str(name), ensure_ascii=False) + ': ')
+        self._pending_key = True
+        return self
+
+    def value(self, obj):
+        self._before_value()
+        text = json.dumps(obj, ensure_ascii=False, indent=self.indent, default=self.default)
+        if self.stack:
+            text = text.replace('\n', self._prefix(len(self.stack)))
+        self.fp.write(text)
+        self.fp.flush()
+        return self
+
+    def begin_object(self):
+        self._before_value()
+        self.fp.write('{')
+        self.stack.append(['{', 0])
+        return self
+
+    def begin_array(self):
+        self._before_value()
+        self.fp.write('[')
+        self.stack.append(['[', 0])
+        return self
+
+    def end(self):
+        kind, count = self.stack.pop()
+        closer = '}' if kind == '{' else ']'
+        self.fp.write((self._prefix(len(self.stack)) if count else '') + closer)
+        self.fp.flush()
+        return self
+
+    def stream(self, obj):
+        """
+        value()と同じだが、イテレーター（ジェネレーター）は配列として1件ずつ書き出す
+        辞書の値にイテレーターがあれば、その辞書も項目ごとに書き出す
+        """
+        if isinstance(obj, Iterator):
+            self.begin_array()
+            for item in obj:
+                self.stream(item)
+            return self.end()
+        if isinstance(obj, dict) and any(isinstance(item, Iterator) for item in obj.values()):
+            self.begin_object()
+            for name, item in obj.items():
+                self.key(name).stream(item)
+            return self.end()
+        return self.value(obj)
+
+    def field(self, name, obj):
+        """オブジェクトに1項目追加"""
+        return self.key(name).value(obj)
+
+    def array_field(self, name, items):
+        """オブジェクトに配列項目を追加し、itemsを1件ずつ書き出す（stream()参照）。件数を返す"""
+        self.key(name).begin_array()
+        count = 0
+        for item in items:
+            self.stream(item)
+            count += 1
+        self.end()
+        return count
+
+    def close(self):
+        while self.stack:
+            self.end()
+
+
+# ---------------------------------------------------------------------------
+# 入力
+# ---------------------------------------------------------------------------
+
+def append_jsonl(path, record):
+    """JSON Lines（1行1結果）のジャーナルに1件追記する"""
+    line = json.dumps(record, ensure_ascii=False, default=str)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(line + '\n')
+
+
+def read_jsonl(path):
+    """JSON Lines（1行1結果）を1件ずつ読む。壊れた行（書き込み途中の停止など）は警告して飛ばす"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                logger.warning("%s:%d を読み飛ばしました: %s", path, number, e)
+
+
+def truncate_jsonl(path, count):
+    """ジャーナルを先頭count件に切り詰める（再開時に保存済みの進捗と揃える。1行ずつコピー）"""
+    if not os.path.exists(path):
+        return
+    with atomic_io.atomic_open(path) as f:
+        for record in islice(read_jsonl(path), count):
+            f.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+
+
+def successful(routes):
+    """成功したルートだけを通す"""
+    return (route for route in routes if route.get('success'))
+
+
+def group_routes(routes, key='property_name'):
+    """
+    物件ごとにルートをまとめる
+
+    リスト（progress['routes']など）は位置の索引だけを作り、初出順に物件ごとに取り出す。
+    それ以外のイテラブル（ジャーナル・逐次取得）は連続する同じ物件をまとめ、1件ずつ流す
+    （バッチは物件単位で処理するため、同じ物件のルートは連続している）
+    """
+    if isinstance(routes, Sequence):
+        positions = {}
+        for index, route in enumerate(routes):
+            positions.setdefault(route[key], []).append(index)
+        for name, indexes in positions.items():
+            yield name, (routes[i] for i in indexes)
+    else:
+        yield from groupby(routes, key=lambda route: route[key])
+
+
+# ---------------------------------------------------------------------------
+# 変換・検証
+# ---------------------------------------------------------------------------
+
+def batch_route_entry(route, extra_fields=()):
+    """バッチ結果1件 → properties.jsonのroutes要素"""
+    entry = {
+        'destination': route['destination_name'],
+        'total_time': route['travel_time'],
+        'route_type': route['route_type'],
+        'train_lines': route.get('train_lines', []),
+        'fare': route.get('fare')
+    }
+    for field in extra_fields:
+        entry[field] = route.get(field)
+    if route.get('estimated'):
+        entry['estimated'] = True
+        entry['confidence'] = route.get('confidence')
+    return entry
+
+
+def validate_route_entry(entry):
+    """routes要素の検証。問題があれば理由、なければNone"""
+    if not entry.get('destination'):
+        return '目的地がありません'
+    total_time = entry.get('total_time')
+    if not isinstance(total_time, (int, float)) or isinstance(total_time, bool):
+        return f'所要時間が数値ではありません: {total_time!r}'
+    if not 0 < total_time <= MAX_TOTAL_TIME:
+        return f'所要時間が範囲外です: {total_time}'
+    return None
+
+
+def valid_entries(entries, stats=None):
+    """検証に通ったroutes要素だけを通す（不正な要素は警告してskippedに数える）"""
+    for entry in entries:
+        problem = validate_route_entry(entry)
+        if problem:
+            logger.warning("ルートを除外: %s - %s", entry.get('destination'), problem)
+            if stats is not None:
+                stats['skipped'] = stats.get('skipped', 0) + 1
+            continue
+        if stats is not None:
+            stats['routes'] = stats.get('routes', 0) + 1
+        yield entry
+
+
+def property_index(properties):
+    """物件名 → 元データ"""
+    return {prop['name']: prop for prop in properties}
+
+
+def build_properties(groups, properties_by_name, extra_fields=(), stats=None):
+    """
+    物件ごとのルート群 → properties.jsonの物件要素（1物件ずつ生成）
+
+    routesは検証済みの要素を流すジェネレーター。次の物件に進む前に消費すること
+    （write_properties_jsonはそのまま1件ずつ書き出す）。リストが必要ならlist()で受け取る
+    """
+    for name, routes in groups:
+        routes = iter(routes)
+        first = next(routes, None)
+        if first is None:
+            continue
+        prop_data = properties_by_name.get(name, {})
+        entries = valid_entries((batch_route_entry(route, extra_fields) for route in _chain(first, routes)),
+                                stats)
+        yield {
+            'name': name,
+            'address': first.get('property_address') or prop_data.get('address', ''),
+            'rent': prop_data.get('rent'),
+            'area': prop_data.get('area'),
+            'routes': entries
+        }
+        if stats is not None:
+            stats['properties'] = stats.get('properties', 0) + 1
+
+
+def _chain(first, rest):
+    yield first
+    yield from rest
+
+
+# ---------------------------------------------------------------------------
+# 出力
+# ---------------------------------------------------------------------------
+
+def write_properties_json(path, properties, header=None, default=None, snapshots=0):
+    """
+    {'<header項目>': ..., 'properties': [...]} を逐次書き出す
+
+    Args:
+        properties: 物件要素のイテラブル（ジェネレーター可）
+        header: propertiesより前に書く項目（生成日時など）
+        snapshots: 置き換え前のファイルを残す世代数（atomic_io参照）
+
+    Returns:
+        書き出した物件数
+    """
+    fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=PARTIAL_SUFFIX,
+                                     dir=os.path.dirname(os.path.abspath(path)))
+    os.close(fd)
+    with atomic_io.atomic_open(path, temp_path=temp_path, snapshots=snapshots) as f:
+        writer = StreamingJsonWriter(f, default=default)
+        writer.begin_object()
+        for name, value in (header or {}).items():
+            writer.field(name, value)
+        count = writer.array_field('properties', properties)
+        writer.close()
+    return count
@@ -10,28 +10,39 @@ import os
 import json
 import time
 from datetime import datetime, timedelta
-import pytz
+from jst import JST
 import logging
 
 sys.path.insert(0, '/app/output/japandatascience.com/timeline-mapping/api')
 
 from google_maps_scraper import GoogleMapsScraper
 from json_data_loader import JsonDataLoader
+from route_estimator import RouteEstimator
+from tab_multiplexer import TabMultiplexer
+import route_pipeline
+import atomic_io
+import commute_matrix
+import data_versions
+import log_setup
 
-# ロギング設定
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 class RouteBatchProcessor:
     """全ルートをバッチ処理"""
     
-    def __init__(self):
+    def __init__(self, use_estimation=False, min_confidence=0.7, tabs=1, warm_page=False):
         self.data_loader = JsonDataLoader()
+        # 物件ごとに経路ページを1回だけ読み込み、目的地入力欄の差し替えで残りを取得
+        self.warm_page = warm_page
+        # 2以上なら1セッション内の複数タブで物件ごとのルートを並行取得
+        self.tabs = tabs
+        # 近傍物件からの推定で高信頼度のルートはスクレイピングを省略
+        self.use_estimation = use_estimation
+        self.min_confidence = min_confidence
         self.progress_file = '/app/output/japandatascience.com/timeline-mapping/data/batch_progress.json'
         self.results_file = '/app/output/japandatascience.com/timeline-mapping/data/routes_batch.json'
+        # 1ルートごとに追記するJSON Lines。最終JSONはここから1件ずつ読んで生成する
+        self.journal_file = '/app/output/japandatascience.com/timeline-mapping/data/routes_batch.jsonl'
         self.final_file = '/app/output/japandatascience.com/timeline-mapping/data/properties.json'
         
     def load_progress(self):
@@ -49,8 +60,30 @@ class RouteBatchProcessor:
     
     def save_progress(self, progress):
         """進捗状況を保存"""
-        with open(self.progress_file, 'w', encoding='utf-8') as f:
-            json.dump(progress, f, ensure_ascii=False, indent=2)
+        atomic_io.atomic_write_json(self.progress_file, progress)
+    
+    def record_route(self, progress, prop_routes, route_data):
+        """ルート結果を進捗に加え、ジャーナルに追記"""
+        prop_routes.append(route_data)
+        progress['routes'].append(route_data)
+        route_pipeline.append_jsonl(self.journal_file, route_data)
+    
+    def build_estimator(self, properties, destinations, progress):
+        """処理済みルートから近傍推定器を構築"""
+        estimator = RouteEstimator(min_confidence=self.min_confidence)
+        for dest in destinations:
+            estimator.add_destination(dest['name'], dest.get('lat'), dest.get('lon'))
+        coords = {p['name']: (p.get('lat'), p.get('lon')) for p in properties}
+        for route in progress['routes']:
+            if route.get('success') and not route.get('estimated'):
+                lat, lon = coords.get(route['property_name'], (None, None))
+                estimator.add_route(route['property_name'], lat, lon, route['destination_name'], {
+                    'total_time': route.get('travel_time'),
+                    'route_type': route.get('route_type'),
+                    'train_lines': route.get('train_lines', []),
+                    'fare': route.get('fare')
+                })
+        return estimator
     
     def process_all_routes(self):
         """全ルートを処理"""
@@ -65,56 +98,100 @@ class RouteBatchProcessor:
         # 進捗読み込み
         progress = self.load_progress()
         start_index = progress['last_property_index']
+        # 保存済みの進捗より後に追記された（途中で止まった物件の）ルートを捨てる
+        if os.path.exists(self.journal_file):
+            route_pipeline.truncate_jsonl(self.journal_file, len(progress['routes']))
+        estimator = self.build_estimator(properties, destinations, progress) if self.use_estimation else None
         
         # 到着時刻設定（明日の10:00）
-        jst = pytz.timezone('Asia/Tokyo')
-        tomorrow = datetime.now(jst) + timedelta(days=1)
+        tomorrow = datetime.now(JST) + timedelta(days=1)
         arrival_time = tomorrow.replace(hour=10, minute=0, second=0, microsecond=0)
         
         logger.info("=" * 60)
         logger.info("📊 バッチ処理開始")
-        logger.info(f"  物件数: {len(properties)}件")
-        logger.info(f"  目的地数: {len(destinations)}件")
-        logger.info(f"  総ルート数: {len(properties) * len(destinations)}件")
-        logger.info(f"  開始位置: 物件 {start_index + 1}/{len(properties)}")
-        logger.info(f"  到着時刻: {arrival_time.strftime('%Y年%m月%d日 %H:%M')}")
+        logger.info("  物件数: %d件", len(properties))
+        logger.info("  目的地数: %d件", len(destinations))
+        logger.info("  総ルート数: %d件", len(properties) * len(destinations))
+        logger.info("  開始位置: 物件 %d/%d", start_index + 1, len(properties))
+        logger.info("  到着時刻: %s", arrival_time.strftime('%Y年%m月%d日 %H:%M'))
         logger.info("=" * 60)
         
         # 各物件を処理
         for prop_idx, prop in enumerate(properties[start_index:], start_index + 1):
             if prop['name'] in progress['completed_properties']:
-                logger.info(f"物件 {prop_idx}/{len(properties)}: {prop['name']} - スキップ（処理済み）")
+                logger.info("物件 %d/%d: %s - スキップ（処理済み）", prop_idx, len(properties), prop['name'])
                 continue
             
-            logger.info(f"\n🏢 物件 {prop_idx}/{len(properties)}: {prop['name']}")
-            logger.info(f"   住所: {prop['address']}")
+            logger.info("\n🏢 物件 %d/%d: %s", prop_idx, len(properties), prop['name'])
+            logger.info("   住所: %s", prop['address'])
             
             # この物件用の新しいスクレイパーを作成
-            scraper = GoogleMapsScraper()
+            scraper = GoogleMapsScraper(warm_page=self.warm_page)
             prop_routes = []
             
             try:
                 scraper.setup_driver()
                 logger.info("   ✅ WebDriver初期化完了")
+                prefetched = None
+                if self.tabs > 1:
+                    prefetched = self.prefetch_routes(scraper, prop, destinations, estimator, arrival_time)
                 
                 # 各目的地へのルートを検索
                 for dest_idx, dest in enumerate(destinations, 1):
                     route_num = (prop_idx - 1) * len(destinations) + dest_idx
                     total_routes = len(properties) * len(destinations)
                     
-                    print(f"   [{route_num}/{total_routes}] {dest['name']}...", end="", flush=True)
                     start_time = time.time()
                     
+                    # 近傍物件から高信頼度で推定できればスクレイピングを省略
+                    if estimator:
+                        estimated = estimator.estimate_route(prop['name'], prop.get('lat'), prop.get('lon'), dest['name'])
+                        if estimated:
+                            route_data = {
+                                'property_name': prop['name'],
+                                'property_address': prop['address'],
+                                'destination_name': dest['name'],
+                                'destination_address': dest['address'],
+                                'success': True,
+                                'travel_time': estimated['total_time'],
+                                'route_type': estimated['route_type'],
+                                'train_lines': estimated['train_lines'],
+                                'fare': estimated['fare'],
+                                'estimated': True,
+                                'confidence': estimated['confidence'],
+                                'estimated_from': estimated['estimated_from'],
+                                'processing_time': time.time() - start_time,
+                                'timestamp': datetime.now().isoformat()
+                            }
+                            progress['total_success'] += 1
+                            self.record_route(progress, prop_routes, route_data)
+                            logger.info("   [%d/%d] %s: 推定 %s分 (信頼度 %s)", route_num, total_routes, dest['name'],
+                                        estimated['total_time'], estimated['confidence'],
+                                        extra=log_setup.fields(property=prop['name'], destination=dest['name'],
+                                                               outcome='estimated',
+                                                               travel_time=estimated['total_time'],
+                                                               confidence=estimated['confidence']))
+                            continue
+                    
                     try:
-                        # ルート検索実行
-                        result = scraper.scrape_route(
-                            prop['address'],
-                            dest['address'],
-                            dest['name'],
-                            arrival_time
-                        )
+                        # タブ多重化で取得済みの結果は成功した場合だけ使う
+                        result = (prefetched or {}).get(dest['name'])
+                        if not (result and result.get('success')):
+                            # ルート検索実行（未取得・タブでの取得に失敗したルート）
+                            result = scraper.scrape_route(
+                                prop['address'],
+                                dest['address'],
+                                dest['name'],
+                                arrival_time,
+                                origin_place_id=prop.get('place_id'),
+                                dest_place_id=dest.get('place_id'),
+                                origin_lat=prop.get('lat'),
+                                origin_lon=prop.get('lon'),
+                                dest_lat=dest.get('lat'),
+                                dest_lon=dest.get('lon')
+                            )
                         
-                        elapsed = time.time() - start_time
+                        elapsed = result.get('processing_time', time.time() - start_time)
                         
                         # 結果を記録
                         route_data = {
@@ -133,17 +210,35 @@ class RouteBatchProcessor:
                         
                         if result.get('success'):
                             progress['total_success'] += 1
-                            print(f" ✅ {result['travel_time']}分 ({elapsed:.1f}秒)")
+                            logger.info("   [%d/%d] %s: %s分 (%.1f秒)", route_num, total_routes, dest['name'],
+                                        result['travel_time'], elapsed,
+                                        extra=log_setup.fields(property=prop['name'], destination=dest['name'],
+                                                               outcome='success', travel_time=result['travel_time'],
+                                                               elapsed=round(elapsed, 3)))
+                            if estimator:
+                                estimator.add_route(prop['name'], prop.get('lat'), prop.get('lon'), dest['name'], {
+                                    'total_time': result.get('travel_time'),
+                                    'route_type': result.get('route_type'),
+                                    'train_lines': result.get('train_lines', []),
+                                    'fare': result.get('fare')
+                                })
                         else:
                             progress['total_failed'] += 1
                             route_data['error'] = result.get('error', '不明なエラー')
-                            print(f" ❌ {result.get('error', '不明')} ({elapsed:.1f}秒)")
+                            route_data['error_code'] = result.get('error_code')
+                            logger.warning("   [%d/%d] %s: 失敗 %s (%.1f秒)", route_num, total_routes, dest['name'],
+                                           route_data['error'], elapsed,
+                                           extra=log_setup.fields(property=prop['name'], destination=dest['name'],
+                                                                  outcome='failed', error=route_data['error'],
+                                                                  error_code=route_data['error_code'],
+                                                                  elapsed=round(elapsed, 3)))
                         
-                        prop_routes.append(route_data)
-                        progress['routes'].append(route_data)
+                        self.record_route(progress, prop_routes, route_data)
                         
                     except Exception as e:
-                        logger.error(f" ❌ エラー: {e}")
+                        logger.error("   [%d/%d] %s: エラー %s", route_num, total_routes, dest['name'], e,
+                                     extra=log_setup.fields(property=prop['name'], destination=dest['name'],
+                                                            outcome='exception', error=str(e)))
                         progress['total_failed'] += 1
                         route_data = {
                             'property_name': prop['name'],
@@ -153,8 +248,7 @@ class RouteBatchProcessor:
                             'processing_time': time.time() - start_time,
                             'timestamp': datetime.now().isoformat()
                         }
-                        prop_routes.append(route_data)
-                        progress['routes'].append(route_data)
+                        self.record_route(progress, prop_routes, route_data)
                 
                 # 物件完了
                 progress['completed_properties'].append(prop['name'])
@@ -165,27 +259,38 @@ class RouteBatchProcessor:
                 
                 # サマリー表示
                 success_count = sum(1 for r in prop_routes if r['success'])
-                logger.info(f"   物件完了: 成功 {success_count}/{len(destinations)}, 失敗 {len(destinations) - success_count}")
+                logger.info("   物件完了: 成功 %d/%d, 失敗 %d", success_count, len(destinations),
+                            len(destinations) - success_count,
+                            extra=log_setup.fields(property=prop['name'], outcome='property_done',
+                                                   success=success_count,
+                                                   failed=len(destinations) - success_count))
+                if self.warm_page:
+                    logger.info("   ウォームページ: 差し替え %d件, 通常遷移へのフォールバック %d件",
+                                scraper.warm_stats['swapped'], scraper.warm_stats['fallback'],
+                                extra=log_setup.fields(property=prop['name'], outcome='warm_page',
+                                                       swapped=scraper.warm_stats['swapped'],
+                                                       fallback=scraper.warm_stats['fallback']))
                 
             except Exception as e:
-                logger.error(f"   物件処理エラー: {e}")
+                logger.error("   物件処理エラー: %s", e,
+                             extra=log_setup.fields(property=prop['name'], outcome='property_failed', error=str(e)))
                 
             finally:
                 # スクレイパーをクリーンアップ
                 if scraper:
                     scraper.close()
                     logger.info("   WebDriver終了")
-                
-                # 少し待機（メモリ解放のため）
-                time.sleep(2)
         
         # 全体のサマリー
         logger.info("\n" + "=" * 60)
         logger.info("🎉 バッチ処理完了")
-        logger.info(f"  総処理数: {progress['total_success'] + progress['total_failed']}")
-        logger.info(f"  成功: {progress['total_success']}")
-        logger.info(f"  失敗: {progress['total_failed']}")
-        logger.info(f"  成功率: {progress['total_success'] / max(1, progress['total_success'] + progress['total_failed']) * 100:.1f}%")
+        total = progress['total_success'] + progress['total_failed']
+        logger.info("  総処理数: %d", total)
+        logger.info("  成功: %d", progress['total_success'])
+        logger.info("  失敗: %d", progress['total_failed'])
+        logger.info("  成功率: %.1f%%", progress['total_success'] / max(1, total) * 100,
+                    extra=log_setup.fields(outcome='batch_done', total=total, success=progress['total_success'],
+                                           failed=progress['total_failed']))
         logger.info("=" * 60)
         
         # 最終JSONを生成
@@ -193,65 +298,74 @@ class RouteBatchProcessor:
         
         return True
     
+    def prefetch_routes(self, scraper, prop, destinations, estimator, arrival_time):
+        """
+        推定できない目的地のルートをタブ多重化でまとめて取得
+
+        Returns:
+            目的地名 -> scrape_route形式の結果
+        """
+        targets = [dest for dest in destinations
+                   if not (estimator and estimator.estimate_route(prop['name'], prop.get('lat'),
+                                                                  prop.get('lon'), dest['name']))]
+        jobs = [{
+            'origin_address': prop['address'],
+            'dest_address': dest['address'],
+            'dest_name': dest['name'],
+            'arrival_time': arrival_time,
+            'origin_place_id': prop.get('place_id'),
+            'origin_lat': prop.get('lat'),
+            'origin_lon': prop.get('lon'),
+            'dest_place_id': dest.get('place_id'),
+            'dest_lat': dest.get('lat'),
+            'dest_lon': dest.get('lon')
+        } for dest in targets]
+        logger.info("   🗂 %dルートを%dタブで並行取得", len(jobs), self.tabs,
+                    extra=log_setup.fields(property=prop['name'], outcome='prefetch', routes=len(jobs),
+                                           tabs=self.tabs))
+        results = TabMultiplexer(scraper, tabs=self.tabs).scrape_routes(jobs)
+        return {dest['name']: result for dest, result in zip(targets, results)}
+
     def generate_final_json(self, progress):
-        """最終的なproperties.jsonを生成"""
+        """最終的なproperties.jsonを生成（物件ごとに変換して逐次書き出し）"""
         logger.info("\n📄 最終JSON生成中...")
         
-        # 物件ごとにルートをグループ化
-        from collections import defaultdict
-        routes_by_property = defaultdict(list)
-        
-        for route in progress['routes']:
-            if route['success']:
-                routes_by_property[route['property_name']].append(route)
-        
-        # properties.json形式に変換
-        properties_data = []
-        
-        for prop_name, routes in routes_by_property.items():
-            # 元の物件データを取得
-            orig_props = self.data_loader.get_all_properties()
-            prop_data = next((p for p in orig_props if p['name'] == prop_name), {})
-            
-            property_json = {
-                'name': prop_name,
-                'address': routes[0]['property_address'] if routes else prop_data.get('address', ''),
-                'rent': prop_data.get('rent'),
-                'area': prop_data.get('area'),
-                'routes': []
-            }
-            
-            # ルート情報を追加
-            for route in routes:
-                route_entry = {
-                    'destination': route['destination_name'],
-                    'total_time': route['travel_time'],
-                    'route_type': route['route_type'],
-                    'train_lines': route.get('train_lines', []),
-                    'fare': route.get('fare')
-                }
-                property_json['routes'].append(route_entry)
-            
-            properties_data.append(property_json)
-        
-        # JSONファイルに保存
-        output = {'properties': properties_data}
+        stats = {}
+        if os.path.exists(self.journal_file):
+            # ジャーナルから1件ずつ読む（全ルートをリストにしない）
+            routes = route_pipeline.successful(route_pipeline.read_jsonl(self.journal_file))
+        else:
+            routes = [r for r in progress['routes'] if r['success']]
+        properties = route_pipeline.build_properties(
+            route_pipeline.group_routes(routes),
+            route_pipeline.property_index(self.data_loader.get_all_properties()),
+            stats=stats)
+        count = route_pipeline.write_properties_json(self.final_file, properties,
+                                                     snapshots=atomic_io.SNAPSHOT_KEEP)
         
-        with open(self.final_file, 'w', encoding='utf-8') as f:
-            json.dump(output, f, ensure_ascii=False, indent=2)
+        logger.info("✅ properties.json 生成完了")
+        logger.info("   保存先: %s", self.final_file)
+        logger.info("   物件数: %d", count)
+        if stats.get('skipped'):
+            logger.warning("   検証で除外したルート: %d件", stats['skipped'])
         
-        logger.info(f"✅ properties.json 生成完了")
-        logger.info(f"   保存先: {self.final_file}")
-        logger.info(f"   物件数: {len(properties_data)}")
+        # 列指向マトリクスと差分ログ
+        commute_matrix.export_file(self.final_file)
+        data_versions.publish(self.final_file)
         
         # バッチ結果も保存
-        with open(self.results_file, 'w', encoding='utf-8') as f:
-            json.dump(progress, f, ensure_ascii=False, indent=2)
+        atomic_io.atomic_write_json(self.results_file, progress)
         
-        logger.info(f"   詳細結果: {self.results_file}")
+        logger.info("   詳細結果: %s", self.results_file)
 
 
 if __name__ == "__main__":
-    processor = RouteBatchProcessor()
+    log_setup.configure()
+    # --estimate: 近傍物件から推定できるルートはスクレイピングしない
+    # --tabs=K: 1セッション内のKタブで並行取得
+    # --warm-page: 経路ページを読み込み直さず目的地だけ差し替える
+    tabs = next((int(arg.split('=', 1)[1]) for arg in sys.argv if arg.startswith('--tabs=')), 1)
+    processor = RouteBatchProcessor(use_estimation='--estimate' in sys.argv, tabs=tabs,
+                                    warm_page='--warm-page' in sys.argv)
     success = processor.process_all_routes()
     sys.exit(0 if success else 1)
\ No newline at end of file
@@ -12,20 +12,19 @@ import os
 import json
 import time
 from datetime import datetime, timedelta
-import pytz
+from jst import JST
 import logging
-import re
 
 sys.path.insert(0, '/app/output/japandatascience.com/timeline-mapping/api')
 
 from google_maps_scraper import GoogleMapsScraper
 from json_data_loader import JsonDataLoader
+import route_pipeline
+import route_patterns
+import atomic_io
+import data_versions
+import log_setup
 
-# ロギング設定
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 class ImprovedGoogleMapsScraper(GoogleMapsScraper):
@@ -39,43 +38,22 @@ class ImprovedGoogleMapsScraper(GoogleMapsScraper):
         """オーバーライド: 実際のアクセスURLを記録"""
         try:
             # Place IDを事前取得
-            origin_place_id = self.get_place_id(origin, "出発地")
-            dest_place_id = self.get_place_id(destination, dest_name)
+            origin_info = self.get_place_id(origin, "出発地")
+            dest_info = self.get_place_id(destination, dest_name)
             
-            # タイムスタンプ付きURLを構築
-            timestamp = int(arrival_time.timestamp())
+            # 実際にアクセスするURLを記録（基底クラスと同じmaps_urlの正規形）
+            self.last_accessed_url = self.build_url_with_timestamp(origin_info, dest_info, arrival_time)
+            logger.info(f"📍 アクセスURL: {self.last_accessed_url[:100]}...")
             
-            # URLパス部分（表示用の名前）
-            from urllib.parse import quote
-            url = f"https://www.google.com/maps/dir/{quote(origin)}/{quote(destination)}/"
-            
-            # Place IDを使ったdataブロブを構築
-            if origin_place_id and dest_place_id:
-                if origin_place_id.startswith('ChIJ') and dest_place_id.startswith('ChIJ'):
-                    # Place IDをdataブロブに埋め込む
-                    origin_blob = f"!1m5!1m1!1s{origin_place_id}"
-                    dest_blob = f"!1m5!1m1!1s{dest_place_id}"
-                    time_blob = f"!2m3!6e1!7e2!8j{timestamp}"  # !6e1=到着時刻
-                    transit_mode = "!3e3"  # 公共交通機関
-                    
-                    # dataブロブを結合
-                    url += f"data=!4m14!4m13{origin_blob}{dest_blob}{time_blob}{transit_mode}"
-                else:
-                    # Place IDがない場合は従来のパラメータ
-                    url += f"data=!2m3!6e1!7e2!8j{timestamp}!3e3"
-            else:
-                # Place IDがない場合は従来のパラメータ
-                url += f"data=!2m3!6e1!7e2!8j{timestamp}!3e3"
-            
-            # 実際にアクセスするURLを記録
-            self.last_accessed_url = url
-            logger.info(f"📍 アクセスURL: {url[:100]}...")
-            
-            # 基底クラスのメソッドを呼び出し
-            result = super().scrape_route(origin, destination, dest_name, arrival_time)
+            # 基底クラスのメソッドを呼び出し（取得済みのPlace IDを渡して再検索を避ける）
+            result = super().scrape_route(
+                origin, destination, dest_name, arrival_time,
+                origin_place_id=origin_info.get('place_id'), dest_place_id=dest_info.get('place_id'),
+                origin_lat=origin_info.get('lat'), origin_lon=origin_info.get('lon'),
+                dest_lat=dest_info.get('lat'), dest_lon=dest_info.get('lon'))
             
             # アクセスしたURLを結果に追加
-            result['accessed_url'] = self.last_accessed_url
+            result['accessed_url'] = result.get('url') or self.last_accessed_url
             
             return result
             
@@ -89,31 +67,8 @@ class ImprovedGoogleMapsScraper(GoogleMapsScraper):
             }
     
     def _extract_fare(self, text):
-        """改良版: 4桁以上の運賃も正確に抽出"""
-        # 料金パターン（カンマ区切りも対応）
-        fare_patterns = [
-            r'¥\s*(\d{1,3}(?:,\d{3})*)',  # ¥1,234形式
-            r'(\d{1,3}(?:,\d{3})*)\s*円',  # 1,234円形式
-            r'¥\s*(\d+)',                  # ¥1234形式
-            r'(\d+)\s*円',                  # 1234円形式
-            r'￥\s*(\d+)',                  # 全角￥
-            r'(\d+)\s*yen'                 # yen表記
-        ]
-        
-        for pattern in fare_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                # カンマを除去して数値に変換
-                fare_str = match.group(1).replace(',', '')
-                try:
-                    fare = int(fare_str)
-                    # 妥当性チェック（50円〜10000円の範囲）
-                    if 50 <= fare <= 10000:
-                        return fare
-                except ValueError:
-                    continue
-        
-        return None
+        """改良版: 4桁以上の運賃も正確に抽出（妥当な範囲は50円〜10000円）"""
+        return route_patterns.parse_fare(text, minimum=50, maximum=10000)
 
 class RouteBatchProcessorImproved:
     """改良版バッチプロセッサー"""
@@ -135,8 +90,7 @@ class RouteBatchProcessorImproved:
     
     def save_progress(self, progress):
         """進捗状況を保存"""
-        with open(self.progress_file, 'w', encoding='utf-8') as f:
-            json.dump(progress, f, ensure_ascii=False, indent=2)
+        atomic_io.atomic_write_json(self.progress_file, progress)
     
     def process_remaining_routes(self):
         """残りのルートを処理（15物件目から）"""
@@ -163,8 +117,7 @@ class RouteBatchProcessorImproved:
             }
         
         # 到着時刻設定（明日の10:00）
-        jst = pytz.timezone('Asia/Tokyo')
-        tomorrow = datetime.now(jst) + timedelta(days=1)
+        tomorrow = datetime.now(JST) + timedelta(days=1)
         arrival_time = tomorrow.replace(hour=10, minute=0, second=0, microsecond=0)
         
         logger.info("=" * 60)
@@ -198,7 +151,6 @@ class RouteBatchProcessorImproved:
                     route_num = (prop_idx - 1) * len(destinations) + dest_idx
                     total_routes = len(properties) * len(destinations)
                     
-                    print(f"   [{route_num}/{total_routes}] {dest['name']}...", end="", flush=True)
                     start_time = time.time()
                     
                     try:
@@ -230,18 +182,27 @@ class RouteBatchProcessorImproved:
                         
                         if result.get('success'):
                             progress['total_success'] += 1
-                            fare_str = f"¥{result['fare']}" if result.get('fare') else "-"
-                            print(f" ✅ {result['travel_time']}分 {fare_str} ({elapsed:.1f}秒)")
+                            logger.info("   [%d/%d] %s: %s分 ¥%s (%.1f秒)", route_num, total_routes, dest['name'],
+                                        result['travel_time'], result.get('fare') or '-', elapsed,
+                                        extra=log_setup.fields(property=prop['name'], destination=dest['name'],
+                                                               outcome='success', travel_time=result['travel_time'],
+                                                               fare=result.get('fare'), elapsed=round(elapsed, 3)))
                         else:
                             progress['total_failed'] += 1
                             route_data['error'] = result.get('error', '不明なエラー')
-                            print(f" ❌ {result.get('error', '不明')} ({elapsed:.1f}秒)")
+                            logger.warning("   [%d/%d] %s: 失敗 %s (%.1f秒)", route_num, total_routes, dest['name'],
+                                           route_data['error'], elapsed,
+                                           extra=log_setup.fields(property=prop['name'], destination=dest['name'],
+                                                                  outcome='failed', error=route_data['error'],
+                                                                  elapsed=round(elapsed, 3)))
                         
                         prop_routes.append(route_data)
                         progress['routes'].append(route_data)
                         
                     except Exception as e:
-                        logger.error(f" ❌ エラー: {e}")
+                        logger.error("   [%d/%d] %s: エラー %s", route_num, total_routes, dest['name'], e,
+                                     extra=log_setup.fields(property=prop['name'], destination=dest['name'],
+                                                            outcome='exception', error=str(e)))
                         progress['total_failed'] += 1
                         route_data = {
                             'property_name': prop['name'],
@@ -292,59 +253,27 @@ class RouteBatchProcessorImproved:
         return True
     
     def generate_final_json(self, progress):
-        """最終的なproperties.jsonを生成"""
+        """最終的なproperties.jsonを生成（物件ごとに変換して逐次書き出し）"""
         logger.info("\n📄 最終JSON生成中...")
         
-        # 物件ごとにルートをグループ化
-        from collections import defaultdict
-        routes_by_property = defaultdict(list)
-        
-        for route in progress['routes']:
-            if route['success']:
-                routes_by_property[route['property_name']].append(route)
-        
-        # properties.json形式に変換
-        properties_data = []
-        
-        for prop_name, routes in routes_by_property.items():
-            # 元の物件データを取得
-            orig_props = self.data_loader.get_all_properties()
-            prop_data = next((p for p in orig_props if p['name'] == prop_name), {})
-            
-            property_json = {
-                'name': prop_name,
-                'address': routes[0]['property_address'] if routes else prop_data.get('address', ''),
-                'rent': prop_data.get('rent'),
-                'area': prop_data.get('area'),
-                'routes': []
-            }
-            
-            # ルート情報を追加
-            for route in routes:
-                route_entry = {
-                    'destination': route['destination_name'],
-                    'total_time': route['travel_time'],
-                    'route_type': route['route_type'],
-                    'train_lines': route.get('train_lines', []),
-                    'fare': route.get('fare'),
-                    'accessed_url': route.get('accessed_url')  # 実際のアクセスURL
-                }
-                property_json['routes'].append(route_entry)
-            
-            properties_data.append(property_json)
-        
-        # JSONファイルに保存
-        output = {'properties': properties_data}
-        
-        with open(self.final_file, 'w', encoding='utf-8') as f:
-            json.dump(output, f, ensure_ascii=False, indent=2)
+        stats = {}
+        properties = route_pipeline.build_properties(
+            route_pipeline.group_routes([r for r in progress['routes'] if r['success']]),
+            route_pipeline.property_index(self.data_loader.get_all_properties()),
+            extra_fields=('accessed_url',),  # 実際のアクセスURL
+            stats=stats)
+        count = route_pipeline.write_properties_json(self.final_file, properties,
+                                                     snapshots=atomic_io.SNAPSHOT_KEEP)
+        data_versions.publish(self.final_file)
         
         logger.info(f"✅ properties.json 生成完了")
         logger.info(f"   保存先: {self.final_file}")
-        logger.info(f"   物件数: {len(properties_data)}")
-
+        logger.info(f"   物件数: {count}")
+        if stats.get('skipped'):
+            logger.warning(f"   検証で除外したルート: {stats['skipped']}件")
 
 if __name__ == "__main__":
+    log_setup.configure()
     processor = RouteBatchProcessorImproved(start_from_property=15)
     success = processor.process_remaining_routes()
     sys.exit(0 if success else 1)
\ No newline at end of file
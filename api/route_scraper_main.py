@@ -14,13 +14,20 @@ sys.path.append('/app/output/japandatascience.com/timeline-mapping/api')
 
 from google_maps_scraper import GoogleMapsScraper
 from json_data_loader import JsonDataLoader
+import route_pipeline
+import atomic_io
+import data_versions
+import log_setup
 from datetime import datetime, timedelta
-import pytz
+from jst import JST
 import json
 import time
 import os
+import logging
 import traceback
 
+logger = logging.getLogger(__name__)
+
 class RouteScraperManager:
     """
     ルートスクレイピングを管理するクラス
@@ -30,7 +37,7 @@ class RouteScraperManager:
     def __init__(self):
         self.loader = JsonDataLoader()
         self.scraper = None
-        self.jst = pytz.timezone('Asia/Tokyo')
+        self.jst = JST
         
         # 中間結果ファイルのパス
         self.progress_file = '/app/output/japandatascience.com/timeline-mapping/data/scraping_progress.json'
@@ -49,7 +56,7 @@ class RouteScraperManager:
         if os.path.exists(self.progress_file):
             with open(self.progress_file, 'r', encoding='utf-8') as f:
                 progress = json.load(f)
-                print(f"📂 既存の進捗を読み込みました: {progress['completed_count']}/{progress['total_count']} 完了")
+                logger.info("既存の進捗を読み込みました: %d/%d 完了", progress['completed_count'], progress['total_count'])
                 return progress
         else:
             # 新規開始
@@ -71,26 +78,26 @@ class RouteScraperManager:
     
     def save_progress(self):
         """進捗を保存"""
-        with open(self.progress_file, 'w', encoding='utf-8') as f:
-            json.dump(self.progress, f, ensure_ascii=False, indent=2, default=str)
+        atomic_io.atomic_write_json(self.progress_file, self.progress, default=str)
     
     def save_intermediate_results(self, results):
         """中間結果を保存"""
-        # 既存の結果を読み込み
-        if os.path.exists(self.intermediate_file):
-            with open(self.intermediate_file, 'r', encoding='utf-8') as f:
-                all_results = json.load(f)
-        else:
-            all_results = {}
-        
-        # 新しい結果を追加
-        all_results.update(results)
-        
-        # 保存
-        with open(self.intermediate_file, 'w', encoding='utf-8') as f:
-            json.dump(all_results, f, ensure_ascii=False, indent=2, default=str)
+        # 読み込み→追加→保存の間は他の書き込みを排他
+        with atomic_io.locked(self.intermediate_file):
+            # 既存の結果を読み込み
+            if os.path.exists(self.intermediate_file):
+                with open(self.intermediate_file, 'r', encoding='utf-8') as f:
+                    all_results = json.load(f)
+            else:
+                all_results = {}
+            
+            # 新しい結果を追加
+            all_results.update(results)
+            
+            # 保存
+            atomic_io.atomic_write_json(self.intermediate_file, all_results, default=str)
         
-        print(f"💾 中間結果を保存: {self.intermediate_file}")
+        logger.info("中間結果を保存: %s", self.intermediate_file)
     
     def scrape_property_routes(self, property_data, property_index):
         """
@@ -103,18 +110,17 @@ class RouteScraperManager:
             'routes': []
         }
         
-        print(f"\n🏢 物件 {property_index + 1}: {property_results['property_name']}")
-        print(f"   住所: {property_data['address']}")
+        logger.info("物件 %d: %s (%s)", property_index + 1, property_results['property_name'], property_data['address'])
         
         for dest_index, destination in enumerate(destinations):
             route_key = f"{property_data['address']}→{destination['address']}"
             
             # 既に処理済みかチェック
             if route_key in self.progress['completed_routes']:
-                print(f"   ⏭️ スキップ: {destination['name']} (処理済み)")
+                logger.debug("   スキップ: %s (処理済み)", destination['name'],
+                             extra=log_setup.fields(sample='route_skip', destination=destination['name']))
                 continue
             
-            print(f"   [{dest_index + 1}/{len(destinations)}] {destination['name']}")
             
             try:
                 start_time = time.time()
@@ -146,7 +152,12 @@ class RouteScraperManager:
                     self.progress['completed_routes'].append(route_key)
                     self.progress['completed_count'] += 1
                     
-                    print(f"      ✅ {result['travel_time']}分 ({result['route_type']}) - {elapsed:.1f}秒")
+                    logger.info("   [%d/%d] %s: %s分 (%s) - %.1f秒", dest_index + 1, len(destinations),
+                                destination['name'], result['travel_time'], result['route_type'], elapsed,
+                                extra=log_setup.fields(property=property_results['property_name'],
+                                                       destination=destination['name'], outcome='success',
+                                                       travel_time=result['travel_time'],
+                                                       elapsed=round(elapsed, 3)))
                     
                 else:
                     self.progress['failed_routes'].append({
@@ -154,10 +165,17 @@ class RouteScraperManager:
                         'error': result.get('error'),
                         'timestamp': datetime.now(self.jst).isoformat()
                     })
-                    print(f"      ❌ 失敗: {result.get('error')}")
+                    logger.warning("   [%d/%d] %s: 失敗 %s", dest_index + 1, len(destinations),
+                                   destination['name'], result.get('error'),
+                                   extra=log_setup.fields(property=property_results['property_name'],
+                                                          destination=destination['name'], outcome='failed',
+                                                          error=result.get('error'), elapsed=round(elapsed, 3)))
             
             except Exception as e:
-                print(f"      ❌ エラー: {str(e)}")
+                logger.error("   [%d/%d] %s: エラー %s", dest_index + 1, len(destinations), destination['name'], e,
+                             extra=log_setup.fields(property=property_results['property_name'],
+                                                    destination=destination['name'], outcome='exception',
+                                                    error=str(e)))
                 self.progress['failed_routes'].append({
                     'route': route_key,
                     'error': str(e),
@@ -222,7 +240,10 @@ class RouteScraperManager:
                 
                 # 進捗表示
                 total_progress = self.progress['completed_count'] / self.progress['total_count'] * 100
-                print(f"\n📈 全体進捗: {self.progress['completed_count']}/{self.progress['total_count']} ({total_progress:.1f}%)")
+                logger.info("全体進捗: %d/%d (%.1f%%)", self.progress['completed_count'],
+                            self.progress['total_count'], total_progress,
+                            extra=log_setup.fields(completed=self.progress['completed_count'],
+                                                   total=self.progress['total_count']))
                 
                 # エラーチェック（2物件ごと）
                 if (prop_index + 1) % 2 == 0:
@@ -266,35 +287,36 @@ class RouteScraperManager:
         print("-"*40)
     
     def generate_final_json(self, all_results):
-        """最終的なproperties.jsonを生成"""
+        """最終的なproperties.jsonを生成（物件ごとに逐次書き出し）"""
         print("\n📝 最終JSONファイル生成中...")
         
         # properties_base.jsonを読み込み
         properties = self.loader.get_all_properties()
         
-        # ルート情報を追加
-        for prop in properties:
-            if prop['address'] in all_results:
-                prop['routes'] = all_results[prop['address']]['routes']
-            else:
-                prop['routes'] = []
+        def with_routes():
+            # ルート情報を追加
+            for prop in properties:
+                if prop['address'] in all_results:
+                    prop['routes'] = all_results[prop['address']]['routes']
+                else:
+                    prop['routes'] = []
+                yield prop
         
         # 保存
-        output = {
+        header = {
             'generated_at': datetime.now(self.jst).isoformat(),
             'arrival_time': self.arrival_time.isoformat(),
             'total_properties': len(properties),
-            'total_routes_scraped': self.progress['completed_count'],
-            'properties': properties
+            'total_routes_scraped': self.progress['completed_count']
         }
-        
-        with open(self.final_file, 'w', encoding='utf-8') as f:
-            json.dump(output, f, ensure_ascii=False, indent=2, default=str)
+        route_pipeline.write_properties_json(self.final_file, with_routes(), header=header, default=str,
+                                            snapshots=atomic_io.SNAPSHOT_KEEP)
+        data_versions.publish(self.final_file)
         
         print(f"✅ 最終結果を保存: {self.final_file}")
 
-
 if __name__ == "__main__":
+    log_setup.configure()
     import argparse
     
     parser = argparse.ArgumentParser(description='ルートスクレイピング')
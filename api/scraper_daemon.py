@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+常駐スクレイパーデーモン
+Unixソケットで待ち受け、ウォーム済みのWebDriverセッションを使い回す。
+CLIエントリーポイント（google_maps_transit_ultimate.py）は起動時に
+このデーモンへ透過的に委譲し、Python起動・Seleniumのimport・
+Remoteセッション作成/終了のコストを毎回払わずに済む。
+
+起動:
+    python scraper_daemon.py
+
+プロトコル（1行JSON）:
+    → {"command": "ultimate", "args": ["出発地", "目的地", "arrival", "2025-08-20 10:00:00"]}
+    ← {"ok": true, "result": {...}}  /  {"ok": false, "error": "..."}
+エラーの内容はクライアント側（CLI）でDEBUG=trueのときだけ出力する。
+"""
+
+import os
+import sys
+import json
+import socket
+import logging
+import threading
+import socketserver
+
+import log_setup
+
+logger = logging.getLogger(__name__)
+
+SOCKET_PATH = os.environ.get('SCRAPER_DAEMON_SOCKET', '/tmp/timeline_mapping_scraper.sock')
+SESSION_COUNT = int(os.environ.get('SCRAPER_DAEMON_SESSIONS', '1'))
+# メモリ肥大化対策: このルート数ごとにセッションを作り直す
+MAX_USES_PER_SESSION = int(os.environ.get('SCRAPER_DAEMON_MAX_USES', '30'))
+CLIENT_TIMEOUT = float(os.environ.get('SCRAPER_DAEMON_TIMEOUT', '120'))
+
+
+# ---------------------------------------------------------------------------
+# クライアント側（Seleniumをimportしない）
+# ---------------------------------------------------------------------------
+
+def _send(command, args, timeout=CLIENT_TIMEOUT, socket_path=SOCKET_PATH):
+    """
+    デーモンにコマンドを送信して応答（{"ok", "result" / "error"}）を返す
+
+    Returns:
+        応答。デーモンが起動していない・接続できない場合はNone
+
+    Raises:
+        OSError, ValueError: 送信後に応答が得られなかった（タイムアウト・切断・不正な応答）。
+        デーモンはまだ処理中の可能性がある
+    """
+    if not os.path.exists(socket_path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(socket_path)
+        request = json.dumps({'command': command, 'args': list(args)}, ensure_ascii=False)
+        sock.sendall(request.encode('utf-8') + b'\n')
+    except OSError:
+        sock.close()
+        return None
+    try:
+        with sock.makefile('rb') as reader:
+            line = reader.readline()
+    finally:
+        sock.close()
+    if not line:
+        raise ConnectionError('デーモンが応答せずに切断しました')
+    return json.loads(line.decode('utf-8'))
+
+
+def error_output(response):
+    """
+    失敗した応答をCLIのエラー出力にする
+    従来のCLIと同じく、例外の内容はDEBUG=trueのときだけ返す
+    """
+    debug = os.environ.get('DEBUG', '').lower() == 'true'
+    return {
+        'status': 'error',
+        'message': response.get('error', 'Service temporarily unavailable') if debug
+        else 'Service temporarily unavailable'
+    }
+
+
+def call_daemon(command, args, timeout=CLIENT_TIMEOUT, socket_path=SOCKET_PATH):
+    """
+    デーモンにコマンドを送信
+
+    Returns:
+        結果の辞書。デーモンが起動していない場合はNone
+    """
+    response = _send(command, args, timeout, socket_path)
+    if response is None:
+        return None
+    if not response.get('ok'):
+        return error_output(response)
+    return response['result']
+
+
+def delegate_cli(command, args):
+    """
+    CLIからデーモンへ委譲し、従来と同じJSONを出力して終了する
+    デーモンに接続できない場合だけ何もせず戻る（呼び出し元で従来処理にフォールバック）。
+    送信後のタイムアウト・切断では、デーモンが処理中の可能性があるためローカルで重ねて
+    実行せず、従来のエラーJSONを出力する
+    """
+    if os.environ.get('SCRAPER_DAEMON', '1') == '0':
+        return
+    try:
+        response = _send(command, args, timeout=CLIENT_TIMEOUT, socket_path=SOCKET_PATH)
+    except (OSError, ValueError) as e:
+        response = {'ok': False, 'error': f'デーモンから応答がありません: {e}'}
+    if response is None:
+        return
+    if response.get('ok'):
+        print(json.dumps(response['result'], ensure_ascii=False, indent=2))
+    else:
+        # 例外時のエラーは従来のCLIと同じく1行で出力
+        print(json.dumps(error_output(response)))
+    sys.exit(0)
+
+
+# ---------------------------------------------------------------------------
+# デーモン側
+# ---------------------------------------------------------------------------
+
+class SessionPool:
+    """ウォーム済みWebDriverセッションのプール"""
+
+    def __init__(self, factory, size=SESSION_COUNT, max_uses=MAX_USES_PER_SESSION):
+        self.factory = factory
+        self.max_uses = max_uses
+        self._idle = []
+        self._cond = threading.Condition()
+        for _ in range(size):
+            self._idle.append(self._new_session())
+
+    def _new_session(self):
+        driver = self.factory()
+        logger.info("WebDriverセッション作成")
+        return {'driver': driver, 'uses': 0}
+
+    @staticmethod
+    def _alive(session):
+        try:
+            session['driver'].current_url
+            return True
+        except Exception:
+            return False
+
+    def checkout(self):
+        with self._cond:
+            while not self._idle:
+                self._cond.wait()
+            session = self._idle.pop()
+        if not self._alive(session):
+            logger.warning("セッションが応答しないため再作成")
+            self._quit(session)
+            session = self._new_session()
+        return session
+
+    def checkin(self, session, broken=False):
+        session['uses'] += 1
+        if broken or session['uses'] >= self.max_uses:
+            self._quit(session)
+            session = self._new_session()
+        with self._cond:
+            self._idle.append(session)
+            self._cond.notify()
+
+    @staticmethod
+    def _quit(session):
+        try:
+            session['driver'].quit()
+        except Exception:
+            pass
+
+    def close(self):
+        with self._cond:
+            for session in self._idle:
+                self._quit(session)
+            self._idle = []
+
+
+def run_ultimate(driver, args):
+    """google_maps_transit_ultimate.pyのCLIと同じ引数で実行"""
+    import google_maps_transit_ultimate as ultimate
+
+    parsed = ultimate.parse_cli_args(args)
+    if parsed is None:
+        return ultimate.usage_error()
+    origin, destination, arrival_time, departure_time = parsed
+    return ultimate.extract_route_details(driver, origin, destination, arrival_time, departure_time)
+
+
+COMMANDS = {
+    'ultimate': run_ultimate,
+}
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+    """1接続1リクエスト"""
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            request = json.loads(line.decode('utf-8'))
+            handler = COMMANDS[request['command']]
+        except (ValueError, KeyError) as e:
+            self._reply({'ok': False, 'error': f'invalid request: {e}'})
+            return
+
+        session = self.server.pool.checkout()
+        broken = False
+        try:
+            result = handler(session['driver'], request.get('args', []))
+            response = {'ok': True, 'result': result}
+        except Exception as e:
+            logger.exception("コマンド実行エラー")
+            broken = True
+            response = {'ok': False, 'error': str(e)}
+        finally:
+            self.server.pool.checkin(session, broken=broken)
+        self._reply(response)
+
+    def _reply(self, response):
+        self.wfile.write(json.dumps(response, ensure_ascii=False, default=str).encode('utf-8') + b'\n')
+
+
+class ScraperDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, pool):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, DaemonHandler)
+        os.chmod(socket_path, 0o666)
+        self.pool = pool
+
+
+def main():
+    log_setup.configure()
+    from google_maps_transit_ultimate import setup_driver
+
+    pool = SessionPool(setup_driver)
+    server = ScraperDaemon(SOCKET_PATH, pool)
+    logger.info("スクレイパーデーモン起動: %s（セッション数 %d）", SOCKET_PATH, SESSION_COUNT)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pool.close()
+        if os.path.exists(SOCKET_PATH):
+            os.unlink(SOCKET_PATH)
+        logger.info("スクレイパーデーモン終了")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+スクレイパーセッションプール
+APIサーバー起動時に指定数のGoogleMapsScraperを事前生成し、
+Google Mapsを一度読み込んでキャッシュ・JSを温めておく。
+アイドル中のセッションはキープアライブで定期的に触り、
+Selenium Gridのセッションタイムアウト前に更新する。
+"""
+
+import os
+import time
+import logging
+import threading
+
+import request_scheduler
+
+logger = logging.getLogger(__name__)
+
+POOL_SIZE = int(os.environ.get('SCRAPER_POOL_SIZE', '1'))
+WARMUP_URL = os.environ.get('SCRAPER_WARMUP_URL', 'https://www.google.com/maps')
+# Gridの既定セッションタイムアウト（300秒）より十分短く
+KEEPALIVE_INTERVAL = float(os.environ.get('SCRAPER_KEEPALIVE_INTERVAL', '120'))
+
+WARMING = 'warming'
+READY = 'ready'
+BUSY = 'busy'
+
+
+class PooledSession:
+    """プール内の1セッション"""
+
+    def __init__(self, index):
+        self.index = index
+        self.scraper = None
+        self.state = WARMING
+        self.last_used = time.time()
+        self.error = None
+
+
+class ScraperPool:
+    """
+    ウォーム済みスクレイパーのプール
+
+    Args:
+        factory: スクレイパーを生成する関数（driver属性を持つこと）
+        size: セッション数
+    """
+
+    def __init__(self, factory, size=POOL_SIZE, warmup_url=WARMUP_URL,
+                 keepalive_interval=KEEPALIVE_INTERVAL):
+        self.factory = factory
+        self.size = size
+        self.warmup_url = warmup_url
+        self.keepalive_interval = keepalive_interval
+        self.sessions = [PooledSession(i) for i in range(size)]
+        self.respawn_count = 0
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._keepalive_thread = None
+
+    # ---- ライフサイクル ----
+
+    def start(self, wait=False):
+        """全セッションをバックグラウンドで生成・ウォームアップ"""
+        threads = []
+        for session in self.sessions:
+            thread = threading.Thread(target=self._spawn, args=(session,), daemon=True,
+                                      name=f'scraper-warmup-{session.index}')
+            thread.start()
+            threads.append(thread)
+        if self.keepalive_interval > 0:
+            self._keepalive_thread = threading.Thread(target=self._keepalive_loop, daemon=True,
+                                                      name='scraper-keepalive')
+            self._keepalive_thread.start()
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def _spawn(self, session):
+        with self._cond:
+            session.state = WARMING
+        try:
+            scraper = self.factory()
+            if self.warmup_url:
+                request_scheduler.acquire(request_scheduler.INTERACTIVE)
+                scraper.driver.get(self.warmup_url)
+            with self._cond:
+                session.scraper = scraper
+                session.state = READY
+                session.error = None
+                session.last_used = time.time()
+                self._cond.notify_all()
+            logger.info("セッション%d ウォームアップ完了", session.index)
+        except Exception as e:
+            logger.error("セッション%d 生成失敗: %s", session.index, e)
+            with self._cond:
+                session.error = str(e)
+                session.state = WARMING
+            # 次のキープアライブ周期で再試行される
+
+    def respawn(self, session):
+        """セッションを破棄して作り直す（バックグラウンド）"""
+        self._quit(session)
+        with self._cond:
+            session.scraper = None
+            session.state = WARMING
+            self.respawn_count += 1
+        threading.Thread(target=self._spawn, args=(session,), daemon=True,
+                         name=f'scraper-respawn-{session.index}').start()
+
+    def close(self):
+        self._stop.set()
+        for session in self.sessions:
+            self._quit(session)
+            session.scraper = None
+
+    @staticmethod
+    def _quit(session):
+        if session.scraper is not None:
+            try:
+                session.scraper.close()
+            except Exception:
+                pass
+
+    # ---- 貸し出し ----
+
+    def checkout(self, timeout=None):
+        """
+        READYのセッションを1つ借りる
+
+        Returns:
+            PooledSession、timeoutまでに空きがなければNone
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while True:
+                for session in self.sessions:
+                    if session.state == READY:
+                        session.state = BUSY
+                        return session
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def checkin(self, session, broken=False):
+        """セッションを返却（broken=Trueなら作り直す）"""
+        if broken:
+            self.respawn(session)
+            return
+        with self._cond:
+            session.state = READY
+            session.last_used = time.time()
+            self._cond.notify_all()
+
+    # ---- キープアライブ ----
+
+    def _keepalive_loop(self):
+        while not self._stop.wait(self.keepalive_interval / 2):
+            self.keepalive()
+
+    def keepalive(self):
+        """アイドルが長いセッションに軽いコマンドを送り、失敗したら作り直す"""
+        now = time.time()
+        for session in self.sessions:
+            with self._cond:
+                if session.state == WARMING and session.scraper is None and session.error:
+                    # 生成に失敗したセッションを再試行
+                    session.error = None
+                    retry = True
+                elif session.state == READY and now - session.last_used >= self.keepalive_interval:
+                    session.state = BUSY
+                    retry = False
+                else:
+                    continue
+            if retry:
+                threading.Thread(target=self._spawn, args=(session,), daemon=True).start()
+                continue
+            try:
+                session.scraper.driver.execute_script('return 1')
+                self.checkin(session)
+                logger.debug("セッション%d キープアライブ", session.index)
+            except Exception as e:
+                logger.warning("セッション%d キープアライブ失敗、再作成: %s", session.index, e)
+                self.checkin(session, broken=True)
+
+    # ---- 状態 ----
+
+    def counts(self):
+        """状態別のセッション数"""
+        with self._cond:
+            result = {WARMING: 0, READY: 0, BUSY: 0}
+            for session in self.sessions:
+                result[session.state] += 1
+            return result
+
+    def driver_restarts(self):
+        """WebDriver再起動＋セッション再作成の累計"""
+        total = self.respawn_count
+        for session in self.sessions:
+            if session.scraper is not None:
+                total += getattr(session.scraper, 'restart_count', 0)
+        return total
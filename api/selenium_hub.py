@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Selenium Hub接続の管理
+複数のHub（SELENIUM_HUB_URLS、カンマ区切り）から負荷の低いものを選び、
+Hubごとのサーキットブレーカーで障害中のHubへの接続を即座に打ち切る。
+Hubが落ちている間、各リクエストが接続タイムアウトを待たずに済むようにする。
+
+ブレーカーの状態:
+    closed:    通常。直近ウィンドウの失敗率が閾値を超えたらopenへ
+    open:      即座に失敗。open_seconds経過後にhalf_openへ
+    half_open: 1件だけ試行（プローブ）を通し、成功でclosed、失敗でopenへ戻る
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+
+import log_setup
+
+logger = logging.getLogger(__name__)
+
+HUB_URLS = [url.strip() for url in
+            os.environ.get('SELENIUM_HUB_URLS', 'http://selenium:4444/wd/hub').split(',') if url.strip()]
+# 失敗率を計算する時間窓（秒）
+BREAKER_WINDOW_SECONDS = float(os.environ.get('SELENIUM_BREAKER_WINDOW', '60'))
+# この失敗率以上でopen
+BREAKER_FAILURE_RATE = float(os.environ.get('SELENIUM_BREAKER_FAILURE_RATE', '0.5'))
+# 判定に必要な最小試行数
+BREAKER_MIN_CALLS = int(os.environ.get('SELENIUM_BREAKER_MIN_CALLS', '3'))
+# openを維持する秒数（経過後half_openでプローブ）
+BREAKER_OPEN_SECONDS = float(os.environ.get('SELENIUM_BREAKER_OPEN_SECONDS', '30'))
+# Grid /status の取得タイムアウトとキャッシュ期間（秒）
+STATUS_TIMEOUT = 2.0
+STATUS_TTL = 5.0
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Hub接続障害とみなす例外名（selenium/urllib3をimportせずに判定する）
+CONNECTION_ERROR_NAMES = {
+    'MaxRetryError', 'NewConnectionError', 'ProtocolError', 'ReadTimeoutError',
+    'RemoteDisconnected', 'InvalidSessionIdException', 'SessionNotCreatedException',
+}
+
+
+class HubUnavailable(Exception):
+    """利用可能なHubがない（ブレーカーがopen）"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_connection_error(exc):
+    """例外がHub・セッションへの接続障害によるものか"""
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    names = {cls.__name__ for cls in type(exc).__mro__}
+    if names & CONNECTION_ERROR_NAMES:
+        return True
+    message = str(exc)
+    return 'Max retries exceeded' in message or 'Connection refused' in message
+
+
+class CircuitBreaker:
+    """失敗率ウィンドウ方式のサーキットブレーカー"""
+
+    def __init__(self, window_seconds=BREAKER_WINDOW_SECONDS, failure_rate=BREAKER_FAILURE_RATE,
+                 min_calls=BREAKER_MIN_CALLS, open_seconds=BREAKER_OPEN_SECONDS, clock=time.monotonic):
+        self.window_seconds = window_seconds
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.clock = clock
+        self.state = CLOSED
+        self.opened_at = None
+        self._probe_in_flight = False
+        self._events = deque()
+        self._lock = threading.Lock()
+
+    def _prune(self, now):
+        while self._events and now - self._events[0][0] > self.window_seconds:
+            self._events.popleft()
+
+    def _open(self, now):
+        self.state = OPEN
+        self.opened_at = now
+        self._probe_in_flight = False
+        self._events.clear()
+
+    def retry_after(self):
+        """次にプローブできるまでの秒数（open以外は0）"""
+        with self._lock:
+            if self.state != OPEN:
+                return 0.0
+            return max(0.0, self.opened_at + self.open_seconds - self.clock())
+
+    def can_attempt(self):
+        """試行できる見込みがあるか（状態は変えない）"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                return self.clock() - self.opened_at >= self.open_seconds
+            return not self._probe_in_flight
+
+    def allow(self):
+        """試行してよいか（half_openではプローブ枠を確保する）"""
+        with self._lock:
+            now = self.clock()
+            if self.state == OPEN and now - self.opened_at >= self.open_seconds:
+                self.state = HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                logger.info("サーキットブレーカー: プローブ成功、closedに復帰")
+                self.state = CLOSED
+                self._probe_in_flight = False
+                self._events.clear()
+                return
+            now = self.clock()
+            self._events.append((now, True))
+            self._prune(now)
+
+    def record_failure(self):
+        with self._lock:
+            now = self.clock()
+            if self.state == HALF_OPEN:
+                logger.warning("サーキットブレーカー: プローブ失敗、openに戻します")
+                self._open(now)
+                return
+            if self.state == OPEN:
+                return
+            self._events.append((now, False))
+            self._prune(now)
+            failures = sum(1 for _, ok in self._events if not ok)
+            if len(self._events) >= self.min_calls and failures / len(self._events) >= self.failure_rate:
+                logger.warning("サーキットブレーカー: 失敗率%d/%dでopen", failures, len(self._events),
+                               extra=log_setup.fields(failures=failures, calls=len(self._events)))
+                self._open(now)
+
+
+def status_url(hub_url):
+    """Hub URLからGrid /status のURLを作る"""
+    base = hub_url.rstrip('/')
+    if base.endswith('/wd/hub'):
+        base = base[:-len('/wd/hub')]
+    return base + '/status'
+
+
+def fetch_load(hub_url, timeout=STATUS_TIMEOUT):
+    """
+    Grid /status から使用率（使用中スロット/全スロット）を取得
+
+    Returns:
+        0.0〜1.0。readyでない・取得失敗はinf
+    """
+    from urllib.request import urlopen  # import時間短縮のため使用時に読み込む
+    try:
+        with urlopen(status_url(hub_url), timeout=timeout) as response:
+            value = json.loads(response.read().decode('utf-8')).get('value', {})
+    except Exception as e:
+        logger.debug("Hubステータス取得失敗 %s: %s", hub_url, e)
+        return float('inf')
+    if not value.get('ready', False):
+        return float('inf')
+    total = busy = 0
+    for node in value.get('nodes', []):
+        for slot in node.get('slots', []):
+            total += 1
+            if slot.get('session'):
+                busy += 1
+    if total == 0:
+        # Grid 3 / スタンドアロンはスロット情報なし
+        return 0.0
+    return busy / total
+
+
+class Hub:
+    """1つのHubエンドポイント"""
+
+    def __init__(self, url, breaker):
+        self.url = url
+        self.breaker = breaker
+        self.load = 0.0
+        self.load_checked_at = None
+
+
+def _default_remote_factory(url, options):
+    from selenium import webdriver
+    return webdriver.Remote(command_executor=url, options=options)
+
+
+class HubRegistry:
+    """
+    複数Hubの選択とブレーカー管理
+
+    Args:
+        urls: Hub URLのリスト
+        remote_factory: (url, options) -> WebDriver
+        load_fetcher: url -> 使用率
+    """
+
+    def __init__(self, urls=None, remote_factory=None, load_fetcher=fetch_load,
+                 breaker_factory=CircuitBreaker, clock=time.monotonic):
+        self.hubs = [Hub(url, breaker_factory()) for url in (urls or HUB_URLS)]
+        self.remote_factory = remote_factory or _default_remote_factory
+        self.load_fetcher = load_fetcher
+        self.clock = clock
+        self._lock = threading.Lock()
+
+    def hub_for(self, url):
+        for hub in self.hubs:
+            if hub.url == url:
+                return hub
+        return None
+
+    def available(self):
+        """試行できるHubが1つでもあるか"""
+        return any(hub.breaker.can_attempt() for hub in self.hubs)
+
+    def retry_after(self):
+        return min(hub.breaker.retry_after() for hub in self.hubs)
+
+    def _refresh_load(self, hub):
+        now = self.clock()
+        if hub.load_checked_at is None or now - hub.load_checked_at >= STATUS_TTL:
+            hub.load = self.load_fetcher(hub.url)
+            hub.load_checked_at = now
+
+    def candidates(self):
+        """試行可能なHubを負荷の低い順に"""
+        hubs = [hub for hub in self.hubs if hub.breaker.can_attempt()]
+        if len(hubs) > 1:
+            for hub in hubs:
+                self._refresh_load(hub)
+            hubs.sort(key=lambda hub: hub.load)
+        return hubs
+
+    def create_session(self, options):
+        """
+        最も空いているHubでRemoteセッションを作成
+
+        Returns:
+            (driver, hub_url)
+
+        Raises:
+            HubUnavailable: 全Hubのブレーカーがopen、または全Hubで作成失敗
+        """
+        last_error = None
+        for hub in self.candidates():
+            if not hub.breaker.allow():
+                continue
+            try:
+                driver = self.remote_factory(hub.url, options)
+            except Exception as e:
+                logger.error("WebDriverセッション作成失敗 %s: %s", hub.url, e,
+                             extra=log_setup.fields(hub=hub.url, error=str(e)))
+                hub.breaker.record_failure()
+                hub.load_checked_at = None
+                last_error = e
+                continue
+            hub.breaker.record_success()
+            return driver, hub.url
+        if last_error is not None:
+            raise HubUnavailable(f'Selenium Hubに接続できません: {last_error}', self.retry_after())
+        raise HubUnavailable('Selenium Hubが停止中です（サーキットブレーカーopen）', self.retry_after())
+
+    def record_success(self, url):
+        hub = self.hub_for(url)
+        if hub:
+            hub.breaker.record_success()
+
+    def record_failure(self, url):
+        hub = self.hub_for(url)
+        if hub:
+            hub.breaker.record_failure()
+
+    def states(self):
+        """Hubごとのブレーカー状態"""
+        return {hub.url: hub.breaker.state for hub in self.hubs}
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """プロセス共通のHubレジストリ"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = HubRegistry()
+        return _registry
+
+
+def create_remote(options):
+    """get_registry().create_session()のdriverのみを返す短縮形"""
+    driver, _ = get_registry().create_session(options)
+    return driver
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+1つのChromeセッション内の複数タブでルートを並行取得する
+Remoteセッション（=Chromeプロセス）を増やさずに、あるタブがネットワーク待ちの間に
+別タブのページ読み込みを進める。
+
+各タブは window.location で遷移を開始するだけで完了を待たず（driver.getはブロックする）、
+ルート要素（data-trip-index）が現れたタブから順に抽出する。
+詳細パネルのクリック展開は行わないため、結果はルートカードから取れる情報のみ。
+"""
+
+import os
+import time
+import logging
+from collections import deque
+
+import request_scheduler
+import failure_codes
+import log_setup
+from deadline import Deadline
+
+logger = logging.getLogger(__name__)
+
+TAB_COUNT = int(os.environ.get('SCRAPER_TABS', '3'))
+# 1タブあたりの読み込みタイムアウト（秒）
+LOAD_TIMEOUT = 30.0
+# 抽出1回あたりの時間予算（秒）。要素は出現済みなので待機はほぼ発生しない
+EXTRACT_SECONDS = 10.0
+POLL_INTERVAL = 0.2
+
+READY_SCRIPT = "return document.querySelectorAll('div[data-trip-index]').length"
+
+
+class TabMultiplexer:
+    """
+    GoogleMapsScraperのドライバー上でK個のタブを使い回す
+
+    Args:
+        scraper: GoogleMapsScraper（driverとURL構築・抽出処理を借りる）
+        tabs: タブ数
+        on_loaded: ルート要素が出たタブで抽出前に呼ばれる関数（引数なし）
+    """
+
+    def __init__(self, scraper, tabs=TAB_COUNT, load_timeout=LOAD_TIMEOUT,
+                 poll_interval=POLL_INTERVAL, clock=time.time, on_loaded=None):
+        self.scraper = scraper
+        self.on_loaded = on_loaded  # 読み込み完了時のフック（ベンチマークのメモリ計測用）
+        self.tabs = max(1, tabs)
+        self.load_timeout = load_timeout
+        self.poll_interval = poll_interval
+        self.clock = clock
+        self.handles = []
+
+    @property
+    def driver(self):
+        return self.scraper.driver
+
+    def open_tabs(self):
+        """タブを用意（既存のタブ＋new_windowで追加）"""
+        driver = self.driver
+        self.scraper.invalidate_warm_page()
+        self.handles = [driver.current_window_handle]
+        driver.execute_script("window.location.href='about:blank'")
+        for _ in range(self.tabs - 1):
+            driver.switch_to.new_window('tab')
+            self.handles.append(driver.current_window_handle)
+        driver.switch_to.window(self.handles[0])
+        logger.info("🗂 タブ%d個で並行取得", len(self.handles))
+
+    def close_tabs(self):
+        """追加したタブを閉じて最初のタブに戻る"""
+        driver = self.driver
+        for handle in self.handles[1:]:
+            try:
+                driver.switch_to.window(handle)
+                driver.close()
+            except Exception as e:
+                logger.warning("タブクローズエラー: %s", e)
+        if self.handles:
+            driver.switch_to.window(self.handles[0])
+        self.handles = []
+
+    def _start(self, handle, job):
+        """ジョブのURLを組み立て、タブで遷移を開始（完了は待たない）"""
+        scraper = self.scraper
+        driver = self.driver
+        driver.switch_to.window(handle)
+        # Place IDが未取得の場合はこのタブで検索（同期）
+        origin_info = scraper.resolve_place(job['origin_address'], "出発地", job.get('origin_place_id'),
+                                            job.get('origin_lat'), job.get('origin_lon'))
+        dest_info = scraper.resolve_place(job['dest_address'], job.get('dest_name'), job.get('dest_place_id'),
+                                          job.get('dest_lat'), job.get('dest_lon'))
+        url = scraper.build_url_with_timestamp(origin_info, dest_info, job.get('arrival_time'))
+        request_scheduler.acquire(scraper.lane)
+        driver.execute_script("window.location.href = arguments[0];", url)
+        return {'job': job, 'url': url, 'origin_info': origin_info, 'dest_info': dest_info,
+                'started': self.clock()}
+
+    def _finish(self, handle, task):
+        """ルート要素が出たタブから抽出して結果を作る"""
+        scraper = self.scraper
+        job = task['job']
+        scraper.failure_code = None
+        routes = scraper.extract_route_details(Deadline(EXTRACT_SECONDS))
+        if routes:
+            result = scraper.build_route_result(routes, job['origin_address'], job['dest_address'],
+                                                job.get('dest_name'), task['origin_info'],
+                                                task['dest_info'], task['url'])
+        else:
+            place_id_missed = not (task['origin_info'].get('place_id') and task['dest_info'].get('place_id'))
+            result = {'success': False, 'error': 'ルート情報を取得できませんでした',
+                      'error_code': scraper.classify_empty_result(place_id_missed), 'url': task['url']}
+        result['processing_time'] = self.clock() - task['started']
+        return result
+
+    def _blank(self, handle):
+        """読み込み済みページを破棄してメモリを解放（次の準備完了判定の誤検知も防ぐ）"""
+        try:
+            self.driver.switch_to.window(handle)
+            self.driver.execute_script("window.location.href='about:blank'")
+        except Exception as e:
+            logger.warning("タブ初期化エラー: %s", e)
+
+    def scrape_routes(self, jobs):
+        """
+        複数ルートを並行取得
+
+        Args:
+            jobs: scrape_routeのキーワード引数の辞書のリスト
+                  （origin_address, dest_address, dest_name, arrival_time, *_place_id, *_lat, *_lon）
+
+        Returns:
+            jobsと同じ順の結果リスト（scrape_routeと同形式、processing_time付き）
+        """
+        results = [None] * len(jobs)
+        pending = deque(enumerate(jobs))
+        running = {}  # handle -> task
+        self.scraper.ensure_driver()
+        self.open_tabs()
+        try:
+            while pending or running:
+                # 空いているタブに次のジョブを投入
+                for handle in self.handles:
+                    if handle in running or not pending:
+                        continue
+                    index, job = pending.popleft()
+                    try:
+                        task = self._start(handle, job)
+                    except Exception as e:
+                        logger.warning("タブ%d 遷移開始エラー: %s", self.handles.index(handle), e)
+                        results[index] = {'success': False, 'error': str(e),
+                                          'error_code': failure_codes.classify_exception(e)}
+                        continue
+                    task['index'] = index
+                    running[handle] = task
+
+                # 準備できたタブから抽出
+                progressed = False
+                for handle, task in list(running.items()):
+                    self.driver.switch_to.window(handle)
+                    try:
+                        ready = self.driver.execute_script(READY_SCRIPT)
+                    except Exception as e:
+                        logger.warning("タブ状態確認エラー: %s", e)
+                        ready = 0
+                    timed_out = self.clock() - task['started'] > self.load_timeout
+                    if not ready and not timed_out:
+                        continue
+                    progressed = True
+                    del running[handle]
+                    if ready:
+                        if self.on_loaded:
+                            self.on_loaded()
+                        try:
+                            results[task['index']] = self._finish(handle, task)
+                        except Exception as e:
+                            logger.warning("抽出エラー: %s", e)
+                            results[task['index']] = {'success': False, 'error': str(e), 'url': task['url'],
+                                                      'error_code': failure_codes.classify_exception(e)}
+                    else:
+                        logger.warning("タブ読み込みタイムアウト: %s", task['job'].get('dest_name'),
+                                       extra=log_setup.fields(destination=task['job'].get('dest_name'),
+                                                              outcome='tab_timeout'))
+                        results[task['index']] = {'success': False, 'error': '読み込みタイムアウト',
+                                                  'error_code': failure_codes.TRIPS_TIMEOUT, 'url': task['url']}
+                    self._blank(handle)
+
+                if not progressed and running:
+                    time.sleep(self.poll_interval)
+        finally:
+            self.close_tabs()
+            self.scraper.route_count += len(jobs)
+        return results
+
+
+def browser_memory_bytes(driver):
+    """
+    全タブのJSヒープ使用量の合計（performance.memory、Chrome限定）
+    RemoteのChromeプロセスのRSSはスクレイパー側から見えないため、その代替指標
+    """
+    total = 0
+    current = driver.current_window_handle
+    for handle in driver.window_handles:
+        driver.switch_to.window(handle)
+        try:
+            total += int(driver.execute_script(
+                "return (performance.memory && performance.memory.usedJSHeapSize) || 0") or 0)
+        except Exception:
+            pass
+    driver.switch_to.window(current)
+    return total
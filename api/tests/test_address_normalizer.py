@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+address_normalizer.pyのテスト
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from address_normalizer import normalize_address, normalize_many, cache_info
+
+
+def test_normalize_address_variants():
+    assert normalize_address('東京都千代田区 神田須田町１丁目２０−１') == '東京都千代田区神田須田町1-20-1'
+    assert normalize_address('東京都渋谷区神宮前２丁目２２番３号') == '東京都渋谷区神宮前2-22-3'
+    assert normalize_address('東京都中央区日本橋２ー５ー１') == '東京都中央区日本橋2-5-1'
+    assert normalize_address('港区芝公園４丁目２－８　東京タワー') == '港区芝公園4-2-8東京タワー'
+    assert normalize_address('千代田区大手町１丁目') == '千代田区大手町1丁目'
+    assert normalize_address('ＪＲ東京駅') == 'JR東京駅'
+    # カタカナの長音記号は変換しない
+    assert normalize_address('渋谷スクランブルスクエア センター') == '渋谷スクランブルスクエアセンター'
+    assert normalize_address('') == ''
+    assert normalize_address(None) is None
+
+
+def test_normalize_many_uses_cache():
+    normalize_address.cache_clear()
+    addresses = ['神田須田町１丁目２０−１', '神田須田町１丁目２０−１', None]
+    assert normalize_many(addresses) == ['神田須田町1-20-1', '神田須田町1-20-1', None]
+    assert cache_info().hits == 1
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+atomic_io.pyのテスト
+"""
+
+import os
+import sys
+import json
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import atomic_io
+
+
+def test_atomic_write_replaces_and_cleans_up_on_error(tmp_path):
+    path = str(tmp_path / 'properties.json')
+    atomic_io.atomic_write_json(path, {'properties': ['東京']})
+    assert json.load(open(path, encoding='utf-8')) == {'properties': ['東京']}
+    assert '東京' in open(path, encoding='utf-8').read()  # ensure_ascii=False
+    assert oct(os.stat(path).st_mode & 0o777) == oct(0o644)
+
+    with pytest.raises(RuntimeError):
+        with atomic_io.atomic_open(path) as f:
+            f.write('{"壊れた')
+            raise RuntimeError('書き込み中に失敗')
+
+    # 元のファイルはそのまま、一時ファイルも残らない
+    assert json.load(open(path, encoding='utf-8')) == {'properties': ['東京']}
+    assert sorted(os.listdir(tmp_path)) == ['properties.json', 'properties.json.lock']
+
+
+def test_snapshots_are_rotated_and_restorable(tmp_path):
+    path = str(tmp_path / 'destinations.json')
+    for version in range(1, 6):
+        atomic_io.atomic_write_json(path, {'version': version}, snapshots=3)
+
+    # 置き換え前の4世代のうち新しい3世代だけ残る
+    assert atomic_io.list_generations(path) == [2, 3, 4]
+    latest = atomic_io.generation_path(path, 4)
+    assert json.load(open(latest)) == {'version': 4}
+
+    atomic_io.restore_generation(path, snapshots=3)
+    assert json.load(open(path)) == {'version': 4}
+    # 復元前の内容も世代として残る
+    assert json.load(open(atomic_io.generation_path(path, 5))) == {'version': 5}
+    assert atomic_io.list_generations(path) == [3, 4, 5]
+
+
+def test_lock_is_reentrant_around_read_modify_write(tmp_path):
+    path = str(tmp_path / 'progress.json')
+    atomic_io.atomic_write_json(path, {'count': 0})
+    with atomic_io.locked(path):
+        data = json.load(open(path))
+        data['count'] += 1
+        # atomic_open内でも同じロックを取るが、デッドロックしない
+        atomic_io.atomic_write_json(path, data)
+    assert json.load(open(path)) == {'count': 1}
+    assert atomic_io._locks[os.path.abspath(path) + atomic_io.LOCK_SUFFIX][2] == 0
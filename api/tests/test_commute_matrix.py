@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+commute_matrix.pyのテスト
+"""
+
+import os
+import sys
+import gzip
+import json
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import commute_matrix
+
+
+PROPERTIES = [
+    {'name': '物件A', 'address': '東京都千代田区', 'rent': '280,000円', 'area': '40.70', 'routes': [
+        {'destination': '東京駅', 'total_time': 12, 'fare': 180, 'train_lines': ['銀座線', '丸ノ内線'],
+         'details': {'station_used': '神田', 'walk_to_station': 4, 'walk_from_station': 2}},
+        {'destination': '羽田空港', 'total_time': 44, 'fare': None, 'train_lines': []},
+    ]},
+    {'name': '物件B', 'address': '東京都中央区', 'rent': '205,000円', 'area': None, 'routes': [
+        {'destination': '羽田空港', 'total_time': 30, 'fare': 0, 'train_lines': ['銀座線'],
+         'total_walk_time': 9},
+    ]},
+]
+
+
+def test_round_trip_through_binary(tmp_path):
+    manifest = commute_matrix.export_matrix(PROPERTIES, str(tmp_path), destination_order=['羽田空港'])
+    matrix = commute_matrix.load_matrix(str(tmp_path / commute_matrix.MANIFEST_NAME))
+
+    assert matrix['strings']['destinations'] == ['羽田空港', '東京駅']
+    assert matrix['strings']['lines'] == ['銀座線', '丸ノ内線']
+    assert matrix['data']['rent'] == [280000, 205000]
+    routes = {(p, dest): values for p, dest, values in commute_matrix.iter_routes(matrix)}
+    assert routes == {
+        (0, '羽田空港'): {'total_time': 44, 'fare': None, 'walk_time': None, 'station': None,
+                        'train_lines': []},
+        (0, '東京駅'): {'total_time': 12, 'fare': 180, 'walk_time': 6, 'station': '神田',
+                      'train_lines': ['銀座線', '丸ノ内線']},
+        (1, '羽田空港'): {'total_time': 30, 'fare': 0, 'walk_time': 9, 'station': None,
+                        'train_lines': ['銀座線']},
+    }
+    # 物件Bの東京駅はルートなし
+    assert len(routes) == 3
+
+    raw = open(tmp_path / manifest['files']['raw']['path'], 'rb').read()
+    assert gzip.decompress(open(tmp_path / manifest['files']['gzip']['path'], 'rb').read()) == raw
+
+
+def test_columns_are_aligned_for_typed_arrays():
+    _, columns = commute_matrix.build_matrix(PROPERTIES)
+    raw, layout = commute_matrix.pack_columns(columns)
+    for column in layout.values():
+        size = commute_matrix.DTYPES[column['dtype']][1]
+        assert column['offset'] % size == 0
+    last = max(layout.values(), key=lambda c: c['offset'])
+    assert len(raw) == last['offset'] + last['length'] * commute_matrix.DTYPES[last['dtype']][1]
+
+
+def test_versions_are_content_addressed_and_pruned(tmp_path):
+    first = commute_matrix.export_matrix(PROPERTIES, str(tmp_path))
+    again = commute_matrix.export_matrix(PROPERTIES, str(tmp_path))
+    assert again['version'] == first['version']
+
+    changed = json.loads(json.dumps(PROPERTIES))
+    versions = [first['version']]
+    for minutes in (13, 14):
+        changed[0]['routes'][0]['total_time'] = minutes
+        versions.append(commute_matrix.export_matrix(changed, str(tmp_path))['version'])
+
+    binaries = {name.split('.')[1] for name in os.listdir(tmp_path) if name.endswith('.bin')}
+    # 公開中と直前の版だけ残る
+    assert binaries == set(versions[1:])
+    manifest = json.load(open(tmp_path / commute_matrix.MANIFEST_NAME))
+    assert manifest['version'] == versions[-1]
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+data_versions.pyのテスト
+"""
+
+import os
+import sys
+import json
+import copy
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import data_versions
+
+
+def properties():
+    return [
+        {'name': '物件A', 'rent': '280,000円', 'routes': [
+            {'destination': '東京駅', 'total_time': 12},
+            {'destination': '羽田空港', 'total_time': 44},
+        ]},
+        {'name': '物件B/2', 'rent': '205,000円', 'routes': [
+            {'destination': '東京駅', 'total_time': 20},
+        ]},
+    ]
+
+
+def write(path, props):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'properties': props}, f, ensure_ascii=False)
+    return data_versions.publish(path)
+
+
+def apply(document, ops):
+    """テスト用の簡易パッチ適用（名前キーのdict形式）"""
+    for op in ops:
+        parts = [p.replace('~1', '/').replace('~0', '~') for p in op['path'].split('/')[1:]]
+        if len(parts) == 2:
+            if op['op'] == 'remove':
+                document.pop(parts[1], None)
+            else:
+                routes = document.get(parts[1], {}).get('routes', {})
+                document[parts[1]] = dict(op['value'], routes=routes)
+        elif op['op'] == 'remove':
+            document.get(parts[1], {}).get('routes', {}).pop(parts[3], None)
+        else:
+            document[parts[1]]['routes'][parts[3]] = op['value']
+    return document
+
+
+def as_document(props):
+    return {p['name']: dict({k: v for k, v in p.items() if k != 'routes'},
+                            routes={r['destination']: r for r in p['routes']}) for p in props}
+
+
+def test_publish_only_records_changed_rows(tmp_path):
+    path = str(tmp_path / 'properties.json')
+    assert write(path, properties()) == (1, 5)
+    # 変更なしならバージョンは据え置き
+    assert write(path, properties()) == (1, 0)
+
+    changed = properties()
+    changed[0]['routes'][0]['total_time'] = 11
+    assert write(path, changed) == (2, 1)
+
+    log = [json.loads(line) for line in open(data_versions.delta_path(path), encoding='utf-8')]
+    assert [entry['version'] for entry in log] == [1, 2]
+    assert log[1]['ops'] == [{'op': 'replace', 'path': '/properties/物件A/routes/東京駅',
+                              'value': {'destination': '東京駅', 'total_time': 11}}]
+
+
+def test_changes_since_patches_client_to_current(tmp_path):
+    path = str(tmp_path / 'properties.json')
+    write(path, properties())
+    client = as_document(properties())
+
+    changed = properties()
+    changed[0]['routes'].pop()                      # ルート削除
+    changed[1]['rent'] = '199,000円'                # 物件の項目変更
+    write(path, changed)
+    changed = copy.deepcopy(changed)
+    changed.append({'name': '物件C', 'rent': None, 'routes': [{'destination': '東京駅', 'total_time': 5}]})
+    changed.pop(0)                                  # 物件削除
+    write(path, changed)
+
+    delta = data_versions.changes_since(path, since=1)
+    assert delta['version'] == 3 and not delta['full']
+    assert apply(client, delta['ops']) == as_document(changed)
+    assert data_versions.changes_since(path, since=3)['ops'] == []
+
+
+def test_old_or_missing_since_returns_full(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_versions, 'DELTA_LOG_KEEP', 1)
+    path = str(tmp_path / 'properties.json')
+    write(path, properties())
+    changed = properties()
+    changed[0]['rent'] = '1円'
+    write(path, changed)
+
+    assert data_versions.changes_since(path)['full']
+    assert data_versions.changes_since(path, since=0)['full']
+    delta = data_versions.changes_since(path, since=1)
+    assert not delta['full'] and [op['path'] for op in delta['ops']] == ['/properties/物件A']
+
+
+def test_changes_since_records_writes_that_skipped_publish(tmp_path):
+    path = str(tmp_path / 'properties.json')
+    write(path, properties())
+
+    # publishを呼ばない書き込み元（PHPの保存APIなど）
+    changed = properties()
+    changed[1]['routes'][0]['total_time'] = 18
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'properties': changed}, f, ensure_ascii=False, indent=2)
+
+    delta = data_versions.changes_since(path, since=1)
+    assert delta['version'] == 2 and not delta['full']
+    assert [op['path'] for op in delta['ops']] == ['/properties/物件B~12/routes/東京駅']
+    assert data_versions.changes_since(path, since=2)['ops'] == []
+
+    # 書式だけの書き換えはバージョンを進めない
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'properties': changed}, f, ensure_ascii=False)
+    assert data_versions.changes_since(path, since=2) == {'version': 2, 'since': 2, 'full': False, 'ops': []}
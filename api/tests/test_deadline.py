@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+deadline.pyのテスト
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from deadline import Deadline, DeadlineExceeded
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_unlimited_deadline_keeps_legacy_timeouts():
+    deadline = Deadline.coerce(None)
+    assert deadline.unlimited
+    assert deadline.clamp(30) == 30
+    assert deadline.has_time_for(1e9)
+    deadline.check()
+
+
+def test_budget_is_consumed():
+    clock = FakeClock()
+    deadline = Deadline(20, clock=clock)
+    clock.now = 15
+    assert deadline.remaining() == 5
+    assert deadline.clamp(30) == 5
+    assert not deadline.has_time_for(10)
+    clock.now = 25
+    assert deadline.expired()
+    assert deadline.clamp(5) == 0.1
+    with pytest.raises(DeadlineExceeded):
+        deadline.check('page_load')
+
+
+def test_coerce_passes_through_existing_deadline():
+    deadline = Deadline(10)
+    assert Deadline.coerce(deadline) is deadline
+    assert Deadline.coerce(3).budget == 3
+
+
+def test_child_cancel_is_independent():
+    clock = FakeClock()
+    parent = Deadline(10, clock)
+    child = parent.child()
+    clock.now = 2.0
+    assert child.remaining() == 8.0
+    child.cancel()
+    assert child.expired()
+    assert not parent.expired()
+    with pytest.raises(DeadlineExceeded, match='cancelled'):
+        child.check('details')
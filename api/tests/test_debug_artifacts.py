@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+debug_artifacts.pyのテスト
+"""
+
+import os
+import sys
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from debug_artifacts import ArtifactWriter, read_artifact
+
+
+def test_capture_compresses_and_evicts_oldest(tmp_path):
+    writer = ArtifactWriter(str(tmp_path), max_per_minute=0, max_entries=3, compression='gzip')
+    paths = [writer.capture(f'req{i}', 'timeout', '<html>' + 'x' * 10000 + '</html>') for i in range(5)]
+    assert writer.flush(timeout=5)
+
+    assert all(path.endswith('.html.gz') for path in paths)
+    remaining = sorted(os.listdir(tmp_path))
+    assert remaining == sorted(os.path.basename(p) for p in paths[2:])
+    assert writer.stats['evicted'] == 2
+    assert read_artifact(paths[-1]).decode('utf-8').startswith('<html>xxx')
+    assert os.path.getsize(paths[-1]) < 1000
+    assert writer.find('req4') == [paths[-1]]
+
+    # 再起動しても連番とリングの状態を引き継ぐ
+    reopened = ArtifactWriter(str(tmp_path), max_per_minute=0, max_entries=3, compression='gzip')
+    assert len(reopened.entries) == 3
+    assert reopened.sequence == 5
+
+
+def test_sampling_and_rate_limit_skip_fetch(tmp_path):
+    fetched = []
+
+    def fetch():
+        fetched.append(1)
+        return 'page'
+
+    sampled = ArtifactWriter(str(tmp_path), sample_rate=0.5, rng=lambda: 0.9)
+    assert sampled.capture('r', 'timeout', fetch) is None
+    # 間引かれた場合はpage_sourceの取得自体を行わない
+    assert fetched == []
+
+    limited = ArtifactWriter(str(tmp_path), max_per_minute=2, clock=lambda: 100.0)
+    results = [limited.capture('r', 'timeout', fetch) for _ in range(3)]
+    assert results[2] is None
+    assert len(fetched) == 2
+    assert limited.stats['rate_limited'] == 1
+    limited.flush(timeout=5)
+
+
+def test_full_queue_drops_and_truncates(tmp_path):
+    writer = ArtifactWriter(str(tmp_path), max_per_minute=0, queue_size=1,
+                            max_artifact_bytes=4, compression='gzip')
+    # バックグラウンドスレッドを起動させずにキューを埋める
+    writer._ensure_thread = lambda: None
+    assert writer.capture('r', 'a', 'abcdefgh') is not None
+    assert writer.capture('r', 'b', 'abcdefgh') is None
+    assert writer.stats['dropped'] == 1
+
+    path, data = writer.queue.get_nowait()
+    writer._write(path, data)
+    assert read_artifact(path) == b'abcd'
+    assert writer.stats['truncated'] == 1
+
+
+def test_wait_writes_before_returning(tmp_path):
+    writer = ArtifactWriter(str(tmp_path / 'sync'), max_per_minute=0, compression='gzip')
+    path = writer.capture('r', 'page-source', lambda: '<html>', wait=True)
+    assert os.path.exists(path)
+    assert read_artifact(path) == b'<html>'
+
+    # 書き込みに失敗した場合はパスを返さない
+    blocked = tmp_path / 'file'
+    blocked.write_text('x')
+    failing = ArtifactWriter(str(blocked / 'sub'), max_per_minute=0)
+    assert failing.capture('r', 'page-source', '<html>', wait=True) is None
+    assert failing.stats['errors'] == 1
+
+
+def test_queued_capture_is_written_at_exit(tmp_path):
+    directory = str(tmp_path / 'exit')
+    code = ("import debug_artifacts; "
+            "print(debug_artifacts.capture('rid', 'page-source', 'x' * 100000))")
+    env = dict(os.environ, DEBUG_ARTIFACT_DIR=directory)
+    result = subprocess.run([sys.executable, '-c', code], cwd=os.path.join(os.path.dirname(__file__), '..'),
+                            env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    path = result.stdout.strip()
+    assert os.path.exists(path)
+    assert read_artifact(path) == b'x' * 100000
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+hedging.pyのテスト
+"""
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from deadline import Deadline
+from hedging import LatencyTracker, HedgedRunner
+from scraper_pool import ScraperPool, READY, WARMING
+
+
+class FakeDriver:
+    def get(self, url):
+        pass
+
+    def execute_script(self, script):
+        return 1
+
+
+class FakeScraper:
+    """1台目は詳細フェーズで止まり、2台目以降はすぐ返る"""
+    created = []
+
+    def __init__(self):
+        self.driver = FakeDriver()
+        self.restart_count = 0
+        self.phase_timings = {}
+        self.current_phase = None
+        self.phase_started_at = None
+        self.slow = not FakeScraper.created
+        FakeScraper.created.append(self)
+
+    def scrape_route(self, deadline=None, **kwargs):
+        self.deadline = deadline
+        self.current_phase = 'details'
+        self.phase_started_at = time.time()
+        if self.slow:
+            while not deadline.expired():
+                time.sleep(0.01)
+            self.current_phase = None
+            return {'success': False, 'error': 'cancelled'}
+        self.phase_timings = {'details': 0.01}
+        self.current_phase = None
+        return {'success': True, 'travel_time': 30, 'origin': kwargs['origin_address']}
+
+    def close(self):
+        pass
+
+
+def test_percentile_needs_samples():
+    tracker = LatencyTracker(min_samples=3)
+    tracker.record('details', 1.0)
+    assert tracker.percentile('details', 95) is None
+    tracker.record_timings({'details': 2.0})
+    tracker.record('details', 3.0)
+    assert tracker.percentile('details', 50) == 2.0
+    assert abs(tracker.percentile('details', 95) - 2.9) < 1e-9
+
+
+def test_hedge_wins_and_loser_is_recycled():
+    FakeScraper.created = []
+    pool = ScraperPool(FakeScraper, size=2, warmup_url=None, keepalive_interval=0)
+    pool.start(wait=True)
+    slow = pool.sessions[0].scraper
+    assert slow.slow
+
+    tracker = LatencyTracker(min_samples=1)
+    tracker.record('details', 0.05)
+    runner = HedgedRunner(pool, tracker, percentile=95)
+    outcome = runner.run(Deadline(5), origin_address='A')
+
+    assert outcome.result['success']
+    assert outcome.hedged and outcome.hedge_won
+    assert slow.deadline.cancelled
+    # 負けたセッションは作り直されて再びREADYになる
+    end = time.time() + 2
+    while pool.counts()[READY] < 2 and time.time() < end:
+        time.sleep(0.01)
+    assert pool.counts()[READY] == 2
+    assert pool.respawn_count == 1
+    assert all(session.scraper is not slow for session in pool.sessions)
+
+
+def test_no_hedge_without_history():
+    FakeScraper.created = [object()]  # 全て即時応答
+    pool = ScraperPool(FakeScraper, size=2, warmup_url=None, keepalive_interval=0)
+    pool.start(wait=True)
+    runner = HedgedRunner(pool, LatencyTracker(min_samples=5))
+    outcome = runner.run(Deadline(5), origin_address='A')
+    assert outcome.result['success']
+    assert not outcome.hedged
+    assert pool.respawn_count == 0
+    assert runner.tracker.percentile('details', 50) is None
+
+
+class BlockingDriver(FakeDriver):
+    """release()されるまでWebDriver呼び出しが戻らない"""
+
+    def __init__(self):
+        self.entered = threading.Event()
+        self.unblock = threading.Event()
+        self.quit_during_call = False
+        self.in_call = False
+
+    def find_element(self, by, selector):
+        self.in_call = True
+        self.entered.set()
+        self.unblock.wait(5)
+        self.in_call = False
+        return None
+
+
+class BlockingScraper(FakeScraper):
+    """1台目はドライバー呼び出しの中で止まる"""
+
+    def __init__(self):
+        super().__init__()
+        if self.slow:
+            self.driver = BlockingDriver()
+
+    def scrape_route(self, deadline=None, **kwargs):
+        if not self.slow:
+            return super().scrape_route(deadline=deadline, **kwargs)
+        self.deadline = deadline
+        self.current_phase = 'details'
+        self.phase_started_at = time.time()
+        self.driver.find_element('xpath', '//div')
+        deadline.check()
+
+    def close(self):
+        if self.slow and self.driver.in_call:
+            self.driver.quit_during_call = True
+
+
+def test_loser_is_recycled_only_after_blocked_call_returns():
+    FakeScraper.created = []
+    pool = ScraperPool(BlockingScraper, size=2, warmup_url=None, keepalive_interval=0)
+    pool.start(wait=True)
+    slow = pool.sessions[0].scraper
+    assert slow.slow
+
+    tracker = LatencyTracker(min_samples=1)
+    tracker.record('details', 0.05)
+    runner = HedgedRunner(pool, tracker, percentile=95)
+    outcome = runner.run(Deadline(5), origin_address='A')
+
+    assert outcome.hedge_won
+    assert slow.driver.entered.is_set() and slow.deadline.cancelled
+    # 呼び出し中はセッションを返却せず、ドライバーも閉じない
+    time.sleep(0.05)
+    assert pool.sessions[0].scraper is slow
+    assert pool.respawn_count == 0
+
+    slow.driver.unblock.set()
+    end = time.time() + 2
+    while pool.counts()[READY] < 2 and time.time() < end:
+        time.sleep(0.01)
+    assert pool.respawn_count == 1
+    assert pool.counts()[READY] == 2 and pool.counts()[WARMING] == 0
+    assert not slow.driver.quit_during_call
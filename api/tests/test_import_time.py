@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+import時間のテスト（python -X importtime）
+スクレイパー・APIサーバーのimportが重い依存（selenium・pytz・uvicorn）を読み込まず、
+ログ設定などの副作用がなく、予算（IMPORT_BUDGET_MS、既定300ms）内に収まることを確認
+"""
+
+import os
+import sys
+import importlib.util
+import subprocess
+
+import pytest
+
+API_DIR = os.path.join(os.path.dirname(__file__), '..')
+BUDGET_MS = float(os.environ.get('IMPORT_BUDGET_MS', '300'))
+HEAVY_MODULES = ('selenium', 'pytz', 'uvicorn')
+
+MODULES = [
+    'google_maps_scraper',
+    pytest.param('google_maps_api_server', marks=pytest.mark.skipif(
+        importlib.util.find_spec('fastapi') is None, reason='fastapiが未インストール')),
+]
+
+
+def run_python(code, *options):
+    result = subprocess.run([sys.executable, *options, '-c', code], cwd=API_DIR,
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    return result
+
+
+def import_profile(module):
+    """(importしたモジュール名の集合, 対象モジュールの累積import時間[ms])"""
+    result = run_python(f'import {module}', '-X', 'importtime')
+    names, cumulative = set(), None
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, total_us, name = line[len('import time:'):].split('|')
+        name = name.strip()
+        names.add(name)
+        if name == module:
+            cumulative = int(total_us) / 1000
+    return names, cumulative
+
+
+@pytest.mark.parametrize('module', MODULES)
+def test_import_skips_heavy_dependencies_within_budget(module):
+    # 1回目は.pycの生成を含むため、2回のうち速い方で判定する
+    profiles = [import_profile(module) for _ in range(2)]
+    names = profiles[-1][0]
+    loaded = sorted(name for name in names if name.split('.')[0] in HEAVY_MODULES)
+    assert loaded == []
+    fastest = min(cumulative for _, cumulative in profiles)
+    assert fastest < BUDGET_MS, f'{module}のimportに{fastest:.0f}ms（予算{BUDGET_MS:.0f}ms）'
+
+
+@pytest.mark.parametrize('module', MODULES)
+def test_import_has_no_logging_side_effects(module):
+    run_python(f'import logging, {module}; assert not logging.getLogger().handlers, logging.getLogger().handlers')
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+log_setup.pyのテスト
+繰り返しログの間引き・JSON出力の構造化フィールド・モジュール別レベル・遅延フォーマットを確認
+"""
+
+import io
+import os
+import sys
+import json
+import logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import log_setup
+
+
+def make_logger(name, fmt='json', sample_every=3, levels=None):
+    stream = io.StringIO()
+    log_setup.configure(level='INFO', levels=levels or {}, fmt=fmt, sample_every=sample_every,
+                        stream=stream, force=True)
+    return logging.getLogger(name), stream
+
+
+def records(stream):
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_sampling_keeps_every_nth_and_reports_weight():
+    logger, stream = make_logger('test_log_setup.sampling')
+    for i in range(7):
+        logger.info("ルート%d", i, extra=log_setup.fields(sample='card', route=i))
+    logger.warning("警告は間引かない", extra=log_setup.fields(sample='card'))
+    logger.info("キーなし")
+
+    lines = records(stream)
+    assert [line.get('route') for line in lines] == [0, 3, 6, None, None]
+    assert lines[0]['suppressed'] == 0 and lines[1]['suppressed'] == 2
+    assert lines[1]['sample_every'] == 3
+    assert lines[3]['level'] == 'WARNING'
+
+
+def test_json_fields_and_exception():
+    logger, stream = make_logger('test_log_setup.json')
+    logger.info("取得完了: %s分", 27, extra=log_setup.fields(travel_time=27, destination='渋谷'))
+    try:
+        raise ValueError('boom')
+    except ValueError:
+        logger.exception("エラー")
+
+    first, second = records(stream)
+    assert first['msg'] == '取得完了: 27分'
+    assert first['travel_time'] == 27 and first['destination'] == '渋谷'
+    assert first['logger'] == 'test_log_setup.json'
+    assert 'ValueError: boom' in second['exc']
+
+
+def test_module_levels_skip_formatting():
+    class Exploding:
+        def __str__(self):
+            raise AssertionError('DEBUGで文字列化された')
+
+    levels = log_setup.parse_levels('test_log_setup.quiet=WARNING, bad, test_log_setup.loud=debug')
+    assert levels == {'test_log_setup.quiet': logging.WARNING, 'test_log_setup.loud': logging.DEBUG}
+
+    logger, stream = make_logger('test_log_setup.quiet', fmt='text', levels=levels)
+    logger.debug("値: %s", Exploding())
+    logger.info("値: %s", Exploding())
+    logging.getLogger('test_log_setup.loud').debug("表示される")
+    assert stream.getvalue().strip().endswith('DEBUG - 表示される')
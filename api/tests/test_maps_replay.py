@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+maps_replay.pyのテスト
+"""
+
+import os
+import sys
+import time
+from urllib.parse import quote
+from urllib.request import urlopen
+from urllib.error import HTTPError
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from maps_replay import CaptureStore, LatencyModel, ReplayServer, route_key, seed_from_artifacts
+
+DIR_URL = ('https://www.google.com/maps/dir/%E6%9D%B1%E4%BA%AC%E9%83%BD%E4%B8%AD%E5%A4%AE%E5%8C%BA'
+           '%E6%97%A5%E6%9C%AC%E6%A9%8B%EF%BC%92%E4%B8%81%E7%9B%AE%EF%BC%95%E2%88%92%EF%BC%91/'
+           '%E6%9D%B1%E4%BA%AC%E9%A7%85/data=!2m3!6e1!7e2!8j1755306000!3e3')
+
+
+def test_route_key_ignores_notation_and_data():
+    # 「日本橋２丁目５−１」と「日本橋2-5-1」は同じキー、dataパラメータは無視
+    assert route_key(DIR_URL) == '東京都中央区日本橋2-5-1|東京駅'
+    assert route_key('http://localhost:8765/maps/dir/東京都中央区日本橋2-5-1/東京駅/') == route_key(DIR_URL)
+    assert route_key('https://www.google.com/maps/search/東京駅') is None
+
+
+def test_seed_attaches_goldens(tmp_path):
+    store = CaptureStore(str(tmp_path))
+    added = seed_from_artifacts(store)
+    assert len(added) == 3
+    assert all(c['expected']['route']['total_time'] == 8 for c in added)
+    timed = [c for c in added if c['has_time']]
+    assert len(timed) == 1
+    assert timed[0]['expected']['search_info']['type'] == 'arrival'
+    # 再読み込みしても同じ内容
+    assert set(CaptureStore(str(tmp_path)).captures) == {c['id'] for c in added}
+
+
+def test_server_replays_with_latency(tmp_path):
+    store = CaptureStore(str(tmp_path))
+    store.add(DIR_URL, '<html><script>alert(1)</script><div data-trip-index="0">8 分</div></html>')
+    store.add_place('東京駅', 'https://www.google.com/maps/place/東京駅/data=!4m2!3m1!1s0x1:0x2')
+    server = ReplayServer(store, '127.0.0.1', 0, LatencyModel(0.05))
+    server.start()
+    base = f'http://127.0.0.1:{server.server_address[1]}'
+    try:
+        started = time.time()
+        local_url = base + '/maps/dir/' + quote('東京都中央区日本橋2-5-1') + '/' + quote('東京駅') + '/data=!8j1'
+        with urlopen(local_url) as response:
+            html = response.read().decode('utf-8')
+        assert time.time() - started >= 0.05
+        assert 'data-trip-index' in html
+        assert '<script' not in html
+
+        with urlopen(base + '/maps/search/' + quote('東京駅')) as response:
+            assert '/maps/place/' in response.geturl()
+
+        try:
+            urlopen(base + '/maps/dir/a/b')
+            assert False
+        except HTTPError as e:
+            assert e.code == 404
+        assert server.hits == 1 and server.misses == 1
+    finally:
+        server.shutdown()
+        server.server_close()
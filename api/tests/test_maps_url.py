@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+maps_url.pyのテスト
+"""
+
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from maps_url import (Endpoint, JST, ARRIVE, DEPART, directions_url, parse_directions_url,
+                      with_time, cache_key, url_cache_key, maps_timestamp)
+
+ORIGIN = Endpoint('東京都千代田区神田須田町1-20-1', '0x60188c02f64e1cd9:0x987c1c7aa7e7f84a', 35.6949994, 139.7711379)
+DEST = Endpoint('東京駅', '0x601889d738b39701:0x996fd0bd4cfffd56', 35.6814238, 139.773935)
+ARRIVAL = datetime(2025, 8, 16, 10, 0, tzinfo=JST)
+
+
+def test_canonical_url_matches_verified_format():
+    url = directions_url(ORIGIN, DEST, ARRIVAL, base_url='https://www.google.com')
+    assert url.endswith(
+        '/data=!4m18!4m17!1m5!1m1!1s0x60188c02f64e1cd9:0x987c1c7aa7e7f84a!2m2!1d139.7711!2d35.6950'
+        '!1m5!1m1!1s0x601889d738b39701:0x996fd0bd4cfffd56!2m2!1d139.7739!2d35.6814'
+        '!2m3!6e1!7e2!8j1755338400!3e3')
+    # JSTの壁時計時刻をUTCとして数える
+    assert maps_timestamp(ARRIVAL) == maps_timestamp(datetime(2025, 8, 16, 10, 0)) == 1755338400
+
+    # Place IDのみ・住所のみでも件数が正しい
+    no_coords = directions_url(ORIGIN._replace(lat=None, lon=None), DEST._replace(lat=None, lon=None))
+    assert 'data=!4m8!4m7!1m2!1m1!1s' in no_coords
+    assert directions_url(Endpoint('A'), Endpoint('B')).endswith('/maps/dir/A/B/data=!3e3')
+
+
+def test_parse_round_trip_and_legacy_forms():
+    url = directions_url(ORIGIN, DEST, ARRIVAL)
+    parsed = parse_directions_url(url)
+    assert parsed.origin.label == ORIGIN.label and parsed.origin.place_id == ORIGIN.place_id
+    assert parsed.destination.lat == 35.6814
+    assert parsed.when == ARRIVAL and parsed.time_kind == ARRIVE
+
+    # 件数が合わない旧形式（!4m14!4m13、緯度経度なしで!1m5）
+    legacy = ('https://www.google.com/maps/dir/A/B/data=!4m14!4m13!1m5!1m1!1sChIJa'
+              '!1m5!1m1!1sChIJb!2m3!6e1!7e2!8j1755338400!3e3')
+    parsed = parse_directions_url(legacy)
+    assert (parsed.origin.place_id, parsed.destination.place_id) == ('ChIJa', 'ChIJb')
+    assert parsed.when == ARRIVAL
+
+    api = parse_directions_url('https://www.google.com/maps/dir/?api=1&origin=A&destination=B'
+                               '&travelmode=transit&departure_time=1755306000')
+    assert api.origin.label == 'A' and api.time_kind == DEPART
+    assert parse_directions_url('https://www.google.com/maps/search/A') is None
+
+
+def test_cache_key_is_stable_across_forms():
+    canonical = directions_url(Endpoint('神田須田町１丁目２０−１'), Endpoint('東京駅'), ARRIVAL)
+    replay = directions_url(Endpoint('神田須田町1-20-1'), Endpoint('東京駅'), ARRIVAL,
+                            base_url='http://localhost:8765')
+    assert url_cache_key(canonical) == url_cache_key(replay) == \
+        'transit|addr:神田須田町1-20-1|addr:東京駅|arrive|2025-08-16T10:00'
+    assert cache_key(ORIGIN, DEST).startswith('transit|pid:0x60188c02f64e1cd9')
+
+    later = datetime(2025, 8, 16, 9, 30, tzinfo=JST)
+    rewritten = with_time(canonical, later)
+    assert parse_directions_url(rewritten).when == later
+    assert with_time(directions_url(Endpoint('A'), Endpoint('B')), later, DEPART).endswith(
+        '/maps/dir/A/B/data=!2m3!6e0!7e2!8j1755336600!3e3')
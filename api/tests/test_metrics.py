@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+metrics.pyのテスト
+Prometheusテキスト形式の出力を検証
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from metrics import Registry, _Metric
+
+
+def test_counter_with_labels():
+    registry = Registry()
+    requests = registry.counter('transit_requests_total', 'Requests.', ['outcome'])
+    requests.inc(outcome='success')
+    requests.inc(outcome='success')
+    requests.inc(outcome='exception')
+
+    text = registry.render()
+    assert '# TYPE transit_requests_total counter' in text
+    assert 'transit_requests_total{outcome="success"} 2' in text
+    assert 'transit_requests_total{outcome="exception"} 1' in text
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    latency = registry.histogram('scrape_seconds', 'Latency.', buckets=(1, 5))
+    for value in (0.5, 3, 3, 10):
+        latency.observe(value)
+
+    lines = registry.render().splitlines()
+    assert 'scrape_seconds_bucket{le="1"} 1' in lines
+    assert 'scrape_seconds_bucket{le="5"} 3' in lines
+    assert 'scrape_seconds_bucket{le="+Inf"} 4' in lines
+    assert 'scrape_seconds_sum 16.5' in lines
+    assert 'scrape_seconds_count 4' in lines
+
+
+def test_gauge_function_and_label_escaping():
+    registry = Registry()
+    registry.gauge('sessions_ready', 'Ready.').set_function(lambda: 3)
+    phases = registry.gauge('phase', 'Phase.', ['name'])
+    phases.set(1, name='a"b')
+
+    text = registry.render()
+    assert 'sessions_ready 3' in text
+    assert 'phase{name="a\\"b"} 1' in text
+
+
+def test_registering_same_name_returns_existing_metric():
+    registry = Registry()
+    first = registry.counter('c', 'C.')
+    assert registry.counter('c', 'C.') is first
+
+
+def test_counter_function_and_abstract_base():
+    registry = Registry()
+    restarts = [0]
+    registry.counter('driver_restarts_total', 'Restarts.').set_function(lambda: restarts[0])
+    restarts[0] = 2
+
+    text = registry.render()
+    assert '# TYPE driver_restarts_total counter' in text
+    assert 'driver_restarts_total 2' in text
+    with pytest.raises(ValueError):
+        registry.counter('c', 'C.').inc(-1)
+    with pytest.raises(TypeError):
+        _Metric('m', 'M.')
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+request_scheduler.pyのテスト
+トークンバケットの補充・予備トークン・上位レーン優先を検証
+"""
+
+import os
+import sys
+import json
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from request_scheduler import RequestScheduler, RateLimitTimeout, INTERACTIVE, BATCH, PLACE_ID
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def make_scheduler(tmp_path, rate=1.0, burst=3.0):
+    clock = FakeClock()
+    scheduler = RequestScheduler(rate=rate, burst=burst, state_file=str(tmp_path / 'rate.json'),
+                                 clock=clock, sleep=clock.sleep)
+    return scheduler, clock
+
+
+def test_burst_then_paced(tmp_path):
+    scheduler, clock = make_scheduler(tmp_path)
+    waits = [scheduler.acquire(INTERACTIVE) for _ in range(4)]
+    # バースト3件は即時、4件目は補充待ち
+    assert waits[:3] == [0.0, 0.0, 0.0]
+    assert waits[3] >= 1.0
+
+
+def test_batch_keeps_reserve_for_interactive(tmp_path):
+    scheduler, clock = make_scheduler(tmp_path)
+    scheduler.acquire(BATCH)
+    scheduler.acquire(BATCH)
+    # 残り1トークンは予備: バッチは待たされるが対話リクエストは即時
+    assert scheduler.acquire(INTERACTIVE) == 0.0
+
+
+def test_place_id_lane_keeps_larger_reserve(tmp_path):
+    scheduler, clock = make_scheduler(tmp_path)
+    assert scheduler.acquire(PLACE_ID) == 0.0
+    assert scheduler.acquire(PLACE_ID) > 0.0
+
+
+def test_state_is_shared_between_instances(tmp_path):
+    first, clock = make_scheduler(tmp_path)
+    second = RequestScheduler(rate=1.0, burst=3.0, state_file=first.state_file,
+                              clock=clock, sleep=clock.sleep)
+    for _ in range(3):
+        first.acquire(INTERACTIVE)
+    assert second.acquire(INTERACTIVE) > 0.0
+
+
+def test_higher_lane_demand_blocks_lower_lane_in_other_process(tmp_path):
+    scheduler, clock = make_scheduler(tmp_path, rate=1.0, burst=5.0)
+    # 別プロセスの対話レーンが待機表明している状態（トークンは十分）
+    with open(scheduler.state_file, 'w') as f:
+        json.dump({'tokens': 5.0, 'updated': clock.now, 'demand': {INTERACTIVE: clock.now + 5}}, f)
+    with pytest.raises(RateLimitTimeout):
+        scheduler.acquire(BATCH, timeout=0.0)
+    # 表明が期限切れになればバッチも取得できる
+    clock.now += 6
+    assert scheduler.acquire(BATCH) == 0.0
+
+
+def test_timeout(tmp_path):
+    scheduler, clock = make_scheduler(tmp_path, rate=0.01, burst=1.0)
+    scheduler.acquire(INTERACTIVE)
+    with pytest.raises(RateLimitTimeout):
+        scheduler.acquire(INTERACTIVE, timeout=1.0)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+retry_scheduler.py・failure_codes.pyのテスト
+"""
+
+import os
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import failure_codes
+import selenium_hub
+from deadline import DeadlineExceeded
+from retry_scheduler import RetryScheduler, RetryPolicy
+
+
+class FakeScraper:
+    """宛先ごとに決めた失敗コードを順に返し、尽きたら成功する"""
+
+    def __init__(self, name, script, calls, delay=0.0):
+        self.name = name
+        self.script = script
+        self.calls = calls
+        self.delay = delay
+        self.lock = threading.Lock()
+
+    def scrape_route(self, origin_address, dest_address, dest_name=None, arrival_time=None, strategy=None):
+        time.sleep(self.delay)
+        with self.lock:
+            self.calls.append((dest_name, self.name, strategy))
+            codes = self.script.get(dest_name, [])
+            code = codes.pop(0) if codes else None
+        if code:
+            return {'success': False, 'error': code, 'error_code': code}
+        return {'success': True, 'travel_time': 20}
+
+
+def jobs(*names):
+    return [{'origin_address': '東京都千代田区', 'dest_address': name, 'dest_name': name} for name in names]
+
+
+def test_classify_exception_and_blocked_page():
+    class InvalidSessionIdException(Exception):
+        pass
+
+    class TimeoutException(Exception):
+        pass
+
+    assert failure_codes.classify_exception(selenium_hub.HubUnavailable('down')) == failure_codes.HUB_UNAVAILABLE
+    assert failure_codes.classify_exception(DeadlineExceeded('page_load')) == failure_codes.DEADLINE
+    assert failure_codes.classify_exception(InvalidSessionIdException()) == failure_codes.DRIVER_DEAD
+    assert failure_codes.classify_exception(ConnectionRefusedError()) == failure_codes.DRIVER_DEAD
+    assert failure_codes.classify_exception(TimeoutException()) == failure_codes.TRIPS_TIMEOUT
+    assert failure_codes.classify_exception(ValueError('x')) == failure_codes.UNKNOWN
+
+    assert failure_codes.is_blocked_page('https://consent.google.com/ml?continue=https://www.google.com/maps')
+    assert failure_codes.is_blocked_page('https://www.google.com/maps', '通常と異なるトラフィックが検出されました')
+    assert not failure_codes.is_blocked_page('https://www.google.com/maps/dir/a/b', '27 分 銀座線')
+
+
+def test_retries_switch_strategy_and_session_per_failure_class():
+    calls = []
+    script = {
+        'A': [failure_codes.TRIPS_TIMEOUT, failure_codes.TRIPS_TIMEOUT],
+        'B': [failure_codes.DRIVER_DEAD],
+        'C': [failure_codes.PARSE_FAILURE, failure_codes.PARSE_FAILURE],
+    }
+    scrapers = [FakeScraper(name, script, calls) for name in ('s0', 's1')]
+    results = RetryScheduler(scrapers, backoff_scale=0).run(jobs('A', 'B', 'C', 'D'))
+
+    assert [r['success'] for r in results] == [True, True, False, True]
+    # 一覧が出ない → 住所だけのURL → クリック操作
+    assert [strategy for dest, _, strategy in calls if dest == 'A'] == [
+        None, failure_codes.NO_PLACE_ID_URL, failure_codes.CLICK_FLOW]
+    assert results[0]['attempts'] == [failure_codes.TRIPS_TIMEOUT, failure_codes.TRIPS_TIMEOUT, None]
+    # セッション切れは別セッションで再試行
+    sessions_b = [session for dest, session, _ in calls if dest == 'B']
+    assert len(sessions_b) == 2 and sessions_b[0] != sessions_b[1]
+    # 読み取り失敗は2回で打ち切り、最終結果に分類コードが残る
+    assert results[2]['error_code'] == failure_codes.PARSE_FAILURE
+    assert results[2]['attempts'] == [failure_codes.PARSE_FAILURE, failure_codes.PARSE_FAILURE]
+
+
+def test_backoff_does_not_block_other_routes():
+    calls = []
+    script = {'A': [failure_codes.BLOCKED]}
+    policies = {failure_codes.BLOCKED: RetryPolicy(2, 0.3, 0.3, (None,), False)}
+    scraper = FakeScraper('s0', script, calls, delay=0.02)
+    started = time.monotonic()
+    results = RetryScheduler([scraper], policies=policies).run(jobs('A', 'B', 'C', 'D'))
+    elapsed = time.monotonic() - started
+
+    assert all(r['success'] for r in results)
+    # 待ち時間の間に他のルートを先に処理し、Aの再試行は最後
+    assert [dest for dest, _, _ in calls] == ['A', 'B', 'C', 'D', 'A']
+    assert 0.2 < elapsed < 1.0
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+route_estimator.pyのテスト
+近傍推定・信頼度・徒歩補正の検証（ネットワーク不要）
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from route_estimator import GridIndex, RouteEstimator, haversine_m
+
+# 神田須田町周辺の実座標
+KANDA = (35.6949994, 139.7711379)
+KANDA_NEAR = (35.6955, 139.7715)     # 約70m
+AKIHABARA = (35.700603, 139.7685984)  # 約650m
+TSUKISHIMA = (35.6640, 139.7820)      # 約3.5km
+SHIZENKAN = (35.6813393, 139.7739613)
+
+
+def test_haversine_known_distance():
+    # 神田→秋葉原は直線で600m前後
+    dist = haversine_m(*KANDA, *AKIHABARA)
+    assert 550 < dist < 700
+
+
+def test_grid_index_returns_sorted_neighbours_within_radius():
+    index = GridIndex(cell_size_m=300)
+    index.insert('kanda', *KANDA)
+    index.insert('akihabara', *AKIHABARA)
+    index.insert('tsukishima', *TSUKISHIMA)
+
+    found = index.nearby(*KANDA_NEAR, radius_m=1000)
+    assert [key for _, key in found] == ['kanda', 'akihabara']
+
+
+def test_estimate_route_uses_close_neighbour():
+    estimator = RouteEstimator(max_distance_m=600, min_confidence=0.5)
+    estimator.add_destination('shizenkan', *SHIZENKAN)
+    estimator.add_route('kanda', *KANDA, 'shizenkan', {
+        'total_time': 12, 'route_type': '公共交通機関', 'train_lines': ['銀座線'], 'fare': 180
+    })
+
+    route = estimator.estimate_route('new', *KANDA_NEAR, 'shizenkan')
+    assert route is not None
+    assert route['estimated'] is True
+    assert abs(route['total_time'] - 12) <= 2
+    assert route['train_lines'] == ['銀座線']
+    assert route['estimated_from'][0]['origin_id'] == 'kanda'
+
+
+def test_far_origin_needs_scrape():
+    estimator = RouteEstimator(max_distance_m=600)
+    estimator.add_route('kanda', *KANDA, 'shizenkan', {'total_time': 12})
+
+    assert estimator.estimate_route('tsukishima', *TSUKISHIMA, 'shizenkan') is None
+
+
+def test_disagreeing_neighbours_lower_confidence():
+    agree = RouteEstimator(max_distance_m=800)
+    disagree = RouteEstimator(max_distance_m=800)
+    for estimator, other_time in ((agree, 13), (disagree, 35)):
+        estimator.add_route('kanda', *KANDA, 'dest', {'total_time': 12})
+        estimator.add_route('akihabara', *AKIHABARA, 'dest', {'total_time': other_time})
+
+    assert (disagree.estimate(*KANDA_NEAR, 'dest')['confidence']
+            < agree.estimate(*KANDA_NEAR, 'dest')['confidence'])
+
+
+def test_estimated_routes_are_not_reused_as_neighbours():
+    estimator = RouteEstimator()
+    estimator.add_route('kanda', *KANDA, 'dest', {'total_time': 12, 'estimated': True})
+    assert estimator.estimate(*KANDA_NEAR, 'dest') is None
+
+
+def test_plan_splits_pairs():
+    estimator = RouteEstimator(max_distance_m=600, min_confidence=0.5)
+    estimator.add_route('kanda', *KANDA, 'dest', {'total_time': 12})
+    origins = [
+        {'id': 'kanda', 'lat': KANDA[0], 'lon': KANDA[1]},
+        {'id': 'near', 'lat': KANDA_NEAR[0], 'lon': KANDA_NEAR[1]},
+        {'id': 'far', 'lat': TSUKISHIMA[0], 'lon': TSUKISHIMA[1]},
+        {'id': 'no_coords', 'lat': None, 'lon': None},
+    ]
+    estimated, to_scrape = estimator.plan(origins, ['dest'])
+    assert [e[0] for e in estimated] == ['near']
+    assert to_scrape == [('far', 'dest'), ('no_coords', 'dest')]
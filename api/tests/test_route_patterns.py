@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+route_patterns.pyのテスト（ゴールデンテキスト: golden_route_cards.json）
+"""
+
+import os
+import sys
+import json
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import route_patterns
+
+GOLDEN_FILE = os.path.join(os.path.dirname(__file__), 'golden_route_cards.json')
+GOLDEN_CARDS = json.load(open(GOLDEN_FILE, encoding='utf-8'))['cards']
+
+
+@pytest.mark.parametrize('card', GOLDEN_CARDS, ids=[card['name'] for card in GOLDEN_CARDS])
+def test_extract_card_matches_golden_text(card):
+    assert route_patterns.extract_card(card['text']) == card['expected']
+    # 同じ入力は常に同じ結果（路線の順序を含む）
+    assert route_patterns.extract_card(card['text']) == route_patterns.extract_card(card['text'])
+
+
+def test_parse_fare_skips_implausible_amounts():
+    assert route_patterns.parse_fare('IC 20 円 / 切符 ¥1,234', minimum=50, maximum=10000) == 1234
+    assert route_patterns.parse_fare('180 YEN') == 180
+    assert route_patterns.parse_fare('運賃情報なし') is None
+
+
+def test_url_patterns():
+    url = ('https://www.google.com/maps/place/%E7%A5%9E%E7%94%B0/@35.6917,139.7709,17z/'
+           'data=!3m1!4b1!4m6!3m5!1s0x60188c02f4f5c5e3:0x3c5d2e3e8b4c6d1a!8m2')
+    assert route_patterns.extract_place_id(url) == '0x60188c02f4f5c5e3:0x3c5d2e3e8b4c6d1a'
+    assert route_patterns.extract_place_id(url + '!1sChIJy_fF8PKJGGAR') == 'ChIJy_fF8PKJGGAR'
+    assert route_patterns.extract_coordinates(url) == ('35.6917', '139.7709')
+    assert route_patterns.extract_coordinates('https://www.google.com/maps') == (None, None)
+
+
+def test_classify_route_type():
+    assert route_patterns.classify_route_type('徒歩 25 分 1.9 km') == '徒歩のみ'
+    assert route_patterns.classify_route_type('27 分 銀座線 徒歩 4 分', ['銀座線']) == '公共交通機関'
+    assert route_patterns.classify_route_type('27 分', ['Yamanote Line']) == '公共交通機関'
+    assert route_patterns.classify_route_type('27 分') == '不明'
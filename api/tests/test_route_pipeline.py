@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+route_pipeline.pyのテスト
+"""
+
+import io
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from route_pipeline import (StreamingJsonWriter, group_routes, build_properties, property_index,
+                            write_properties_json, append_jsonl, read_jsonl, truncate_jsonl, successful)
+
+
+def route(prop, dest, minutes, success=True):
+    return {'success': success, 'property_name': prop, 'property_address': f'{prop}の住所',
+            'destination_name': dest, 'travel_time': minutes, 'route_type': '公共交通機関'}
+
+
+def partials(directory):
+    return [name for name in os.listdir(directory) if name.endswith('.partial')]
+
+
+def test_writer_matches_json_dump():
+    document = {'generated_at': '2025-08-16', 'empty': [], 'nested': {},
+                'properties': [{'name': '物件A', 'routes': [{'a': 1}, {'b': [1, 2]}]}, {'name': 'B'}]}
+    buffer = io.StringIO()
+    writer = StreamingJsonWriter(buffer)
+    writer.begin_object()
+    writer.field('generated_at', '2025-08-16')
+    writer.key('empty').begin_array().end()
+    writer.key('nested').begin_object().end()
+    writer.array_field('properties', iter(document['properties']))
+    writer.close()
+    assert buffer.getvalue() == json.dumps(document, ensure_ascii=False, indent=2)
+
+
+def test_pipeline_groups_validates_and_streams(tmp_path):
+    routes = [route('A', '東京駅', 10), route('B', '東京駅', 20), route('A', '新宿駅', None),
+              route('A', '渋谷駅', 15), route('B', '渋谷駅', 5, success=False)]
+    stats = {}
+    path = str(tmp_path / 'properties.json')
+    seen_partial = []
+
+    def properties():
+        for prop in build_properties(group_routes([r for r in routes if r['success']]),
+                                     property_index([{'name': 'A', 'rent': 100000}]), stats=stats):
+            # 書き込み中は一意な名前の.partialに先頭から出ている
+            seen_partial.append(partials(tmp_path))
+            yield prop
+
+    assert write_properties_json(path, properties()) == 2
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    # 初出順に物件をまとめ、後から追加されたAのルートも同じ物件に入る
+    assert [p['name'] for p in data['properties']] == ['A', 'B']
+    assert [r['destination'] for r in data['properties'][0]['routes']] == ['東京駅', '渋谷駅']
+    assert data['properties'][0]['rent'] == 100000
+    assert stats == {'routes': 3, 'skipped': 1, 'properties': 2}
+    assert len(seen_partial[0]) == 1 and seen_partial[0][0].startswith('.properties.json.')
+    assert seen_partial[1] == seen_partial[0]
+    assert partials(tmp_path) == []
+
+
+
+def test_writer_streams_nested_generators():
+    document = {'properties': [{'name': 'A', 'routes': [{'a': 1}, {'b': 2}]}, {'name': 'B', 'routes': []}]}
+    buffer = io.StringIO()
+    writer = StreamingJsonWriter(buffer)
+    writer.begin_object()
+    writer.array_field('properties', ({'name': p['name'], 'routes': iter(p['routes'])}
+                                      for p in document['properties']))
+    writer.close()
+    assert buffer.getvalue() == json.dumps(document, ensure_ascii=False, indent=2)
+
+
+def test_jsonl_journal_streams_consecutive_groups(tmp_path):
+    path = str(tmp_path / 'routes.jsonl')
+    for record in [route('A', 'X', 10), route('A', 'Y', 11), route('B', 'X', 12, success=False),
+                   route('B', 'Y', 13), route('C', 'X', 14)]:
+        append_jsonl(path, record)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"success": tr')  # 書き込み途中で止まった行
+
+    # 再開時は保存済みの進捗（先頭4件）に揃える
+    truncate_jsonl(path, 4)
+    groups = [(name, [r['destination_name'] for r in group])
+              for name, group in group_routes(successful(read_jsonl(path)))]
+    assert groups == [('A', ['X', 'Y']), ('B', ['Y'])]
+
+    out = str(tmp_path / 'properties.json')
+    assert write_properties_json(out, build_properties(group_routes(successful(read_jsonl(path))), {})) == 2
+    with open(out, encoding='utf-8') as f:
+        assert [len(p['routes']) for p in json.load(f)['properties']] == [2, 1]
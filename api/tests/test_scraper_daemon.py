@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+scraper_daemon.pyのテスト
+Unixソケット経由の委譲とセッション再利用を検証（Selenium不要のダミードライバー）
+"""
+
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import scraper_daemon
+from scraper_daemon import ScraperDaemon, SessionPool, call_daemon
+
+
+class DummyDriver:
+    created = 0
+
+    def __init__(self):
+        DummyDriver.created += 1
+        self.current_url = 'about:blank'
+        self.quit_called = False
+
+    def quit(self):
+        self.quit_called = True
+
+
+def start_daemon(socket_path, max_uses=30):
+    pool = SessionPool(DummyDriver, size=1, max_uses=max_uses)
+    server = ScraperDaemon(socket_path, pool)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def test_requests_reuse_warm_session(tmp_path, monkeypatch):
+    drivers = []
+    monkeypatch.setitem(scraper_daemon.COMMANDS, 'echo',
+                        lambda driver, args: drivers.append(driver) or {'status': 'success', 'args': args})
+    socket_path = str(tmp_path / 'daemon.sock')
+    server = start_daemon(socket_path)
+    try:
+        first = call_daemon('echo', ['東京駅', '新宿駅'], socket_path=socket_path)
+        second = call_daemon('echo', ['a', 'b'], socket_path=socket_path)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert first == {'status': 'success', 'args': ['東京駅', '新宿駅']}
+    assert second['args'] == ['a', 'b']
+    assert drivers[0] is drivers[1]
+
+
+def test_failed_command_recycles_session(tmp_path, monkeypatch, capsys):
+    def boom(driver, args):
+        raise RuntimeError('driver dead')
+
+    monkeypatch.setitem(scraper_daemon.COMMANDS, 'boom', boom)
+    monkeypatch.delenv('DEBUG', raising=False)
+    monkeypatch.delenv('SCRAPER_DAEMON', raising=False)
+    socket_path = str(tmp_path / 'daemon.sock')
+    monkeypatch.setattr(scraper_daemon, 'SOCKET_PATH', socket_path)
+    server = start_daemon(socket_path)
+    before = DummyDriver.created
+    try:
+        result = call_daemon('boom', [], socket_path=socket_path)
+        monkeypatch.setenv('DEBUG', 'true')
+        debug_result = call_daemon('boom', [], socket_path=socket_path)
+        monkeypatch.delenv('DEBUG')
+        with pytest.raises(SystemExit):
+            scraper_daemon.delegate_cli('boom', [])
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # 例外の内容はDEBUG=trueのときだけ返す（従来のCLIと同じ）
+    assert result == {'status': 'error', 'message': 'Service temporarily unavailable'}
+    assert debug_result == {'status': 'error', 'message': 'driver dead'}
+    # エラーは従来のCLIと同じく1行で出力
+    assert capsys.readouterr().out == '{"status": "error", "message": "Service temporarily unavailable"}\n'
+    assert DummyDriver.created == before + 3
+
+
+def test_missing_daemon_returns_none(tmp_path):
+    assert call_daemon('ultimate', ['a', 'b'], socket_path=str(tmp_path / 'none.sock')) is None
+
+
+def test_read_timeout_prints_error_instead_of_falling_back(tmp_path, monkeypatch, capsys):
+    release = threading.Event()
+    monkeypatch.setitem(scraper_daemon.COMMANDS, 'slow', lambda driver, args: release.wait(5) and {})
+    monkeypatch.delenv('DEBUG', raising=False)
+    monkeypatch.delenv('SCRAPER_DAEMON', raising=False)
+    socket_path = str(tmp_path / 'daemon.sock')
+    monkeypatch.setattr(scraper_daemon, 'SOCKET_PATH', socket_path)
+    monkeypatch.setattr(scraper_daemon, 'CLIENT_TIMEOUT', 0.2)
+    server = start_daemon(socket_path)
+    try:
+        # デーモンは処理中なので、ローカル実行に戻らずエラーJSONを出力して終了する
+        with pytest.raises(SystemExit):
+            scraper_daemon.delegate_cli('slow', [])
+    finally:
+        release.set()
+        server.shutdown()
+        server.server_close()
+
+    assert capsys.readouterr().out == '{"status": "error", "message": "Service temporarily unavailable"}\n'
+
+
+def test_unreachable_daemon_falls_back(tmp_path, monkeypatch):
+    monkeypatch.delenv('SCRAPER_DAEMON', raising=False)
+    socket_path = tmp_path / 'stale.sock'
+    socket_path.write_text('')  # 残ったソケットファイル（接続できない）
+    monkeypatch.setattr(scraper_daemon, 'SOCKET_PATH', str(socket_path))
+    assert scraper_daemon.delegate_cli('ultimate', ['a', 'b']) is None
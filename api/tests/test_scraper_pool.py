@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+scraper_pool.pyのテスト
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import request_scheduler
+from scraper_pool import ScraperPool, READY, WARMING, BUSY
+
+
+class FakeDriver:
+    def __init__(self):
+        self.visited = []
+        self.alive = True
+
+    def get(self, url):
+        self.visited.append(url)
+
+    def execute_script(self, script):
+        if not self.alive:
+            raise RuntimeError('session gone')
+        return 1
+
+
+class FakeScraper:
+    created = 0
+
+    def __init__(self):
+        FakeScraper.created += 1
+        self.driver = FakeDriver()
+        self.restart_count = 0
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def wait_until(predicate, timeout=2.0):
+    end = time.time() + timeout
+    while time.time() < end:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_start_warms_sessions(monkeypatch):
+    lanes = []
+    monkeypatch.setattr(request_scheduler, 'acquire', lambda lane, timeout=None: lanes.append(lane) or 0.0)
+    pool = ScraperPool(FakeScraper, size=2, warmup_url='https://www.google.com/maps', keepalive_interval=0)
+    assert pool.counts()[WARMING] == 2
+    pool.start(wait=True)
+    assert pool.counts() == {WARMING: 0, READY: 2, BUSY: 0}
+    for session in pool.sessions:
+        assert session.scraper.driver.visited == ['https://www.google.com/maps']
+    # ウォームアップの読み込みもレート制限を通す
+    assert lanes == [request_scheduler.INTERACTIVE] * 2
+
+
+def test_checkout_and_timeout():
+    pool = ScraperPool(FakeScraper, size=1, warmup_url=None, keepalive_interval=0)
+    pool.start(wait=True)
+    session = pool.checkout(timeout=0.1)
+    assert session is not None
+    assert pool.counts()[BUSY] == 1
+    assert pool.checkout(timeout=0.05) is None
+    pool.checkin(session)
+    assert pool.checkout(timeout=0.1) is session
+
+
+def test_keepalive_respawns_dead_session():
+    pool = ScraperPool(FakeScraper, size=1, warmup_url=None, keepalive_interval=0)
+    pool.start(wait=True)
+    session = pool.sessions[0]
+    old = session.scraper
+    old.driver.alive = False
+    session.last_used = 0
+    pool.keepalive()
+    assert old.closed
+    assert wait_until(lambda: pool.counts()[READY] == 1)
+    assert session.scraper is not old
+    assert pool.driver_restarts() == 1
@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+"""
+google_maps_scraper.pyのページ操作ステップのテスト（偽のWebDriverを使用）
+"""
+
+import os
+import sys
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import google_maps_scraper
+from google_maps_scraper import GoogleMapsScraper
+import request_scheduler
+from deadline import Deadline, DeadlineExceeded
+
+ORIGIN = {'place_id': 'ChIJorigin', 'normalized_address': '東京都千代田区神田須田町1-20-1'}
+ARRIVAL = datetime(2025, 8, 20, 10, 0)
+
+
+class FakeWait:
+    """WebDriverWaitと同じくconditionが真になるまでpoll_frequencyごとに呼ぶ"""
+
+    def __init__(self, driver, timeout, poll_frequency=0.5):
+        self.driver = driver
+        self.timeout = timeout
+        self.poll_frequency = poll_frequency
+
+    def until(self, condition):
+        end = time.monotonic() + self.timeout
+        while True:
+            value = condition(self.driver)
+            if value:
+                return value
+            if time.monotonic() >= end:
+                raise TimeoutError('wait timeout')
+            time.sleep(self.poll_frequency)
+
+
+@pytest.fixture
+def fake_selenium(monkeypatch):
+    """seleniumなしで動くよう、モジュール変数のBy・Keys・WebDriverWaitを差し替える"""
+    monkeypatch.setattr(google_maps_scraper, 'By',
+                        SimpleNamespace(XPATH='xpath', CSS_SELECTOR='css selector'), raising=False)
+    monkeypatch.setattr(google_maps_scraper, 'Keys',
+                        SimpleNamespace(CONTROL='<ctrl>', DELETE='<del>', RETURN='<ret>'), raising=False)
+    monkeypatch.setattr(google_maps_scraper, 'WebDriverWait', FakeWait, raising=False)
+
+
+class FakeDriver:
+    """呼び出しを記録するだけのWebDriver"""
+
+    def __init__(self):
+        self.calls = []
+
+    def find_element(self, by, selector):
+        self.calls.append(('find_element', selector))
+        raise AssertionError('時間不足なら要素を探さない')
+
+
+class FakeBox:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def click(self):
+        pass
+
+    def send_keys(self, *keys):
+        if keys == ('<ret>',):
+            self.driver.current_url = f"https://www.google.com/maps/dir/origin/{self.driver.typed}/"
+        elif keys == ('<del>',):
+            self.driver.typed = ''
+        elif keys[0] != '<ctrl>':
+            self.driver.typed += keys[0]
+
+
+class FakeSwapDriver:
+    """目的地入力欄とルート一覧を持つ経路ページ。差し替え後settle_polls回のポーリングで一覧が落ち着く"""
+
+    def __init__(self, list_visible=True, settle_polls=2):
+        self.list_visible = list_visible
+        self.settle_polls = settle_polls
+        self.current_url = 'https://www.google.com/maps/dir/origin/first/'
+        self.typed = ''
+        self.ready_polls = 0
+        self.settle_args = []
+        self.calls = []
+
+    def execute_script(self, script, *args):
+        self.calls.append(script)
+        if script == google_maps_scraper.WARM_LIST_SCRIPT:
+            return self.list_visible
+        if script == google_maps_scraper.WARM_OBSERVER_SCRIPT:
+            return True
+        if script == google_maps_scraper.WARM_URL_SWAP_SCRIPT:
+            self.current_url = args[0]
+            return True
+        if script == google_maps_scraper.WARM_READY_SCRIPT:
+            self.ready_polls += 1
+            self.settle_args.append(args[0])
+            return self.ready_polls > self.settle_polls
+        raise AssertionError(script)
+
+    def find_element(self, by, selector):
+        assert selector == '#directions-searchbox-1 input'
+        return FakeBox(self)
+
+
+DETAIL_TEXT = ("11:23 - 11:31 （8 分）\n徒歩  地下鉄銀座線\n神田駅から 11:27\n11:23 ルフォンプログレ神田プレミア\n"
+               "徒歩 約 4 分、230 m\n11:27 神田駅\n地下鉄銀座線各停渋谷行 3 分（2 駅乗車）\n11:30 日本橋駅\n"
+               "徒歩 約 1 分、230 m\n11:31 日本橋髙島屋三井ビルディング")
+
+
+class FakeElement:
+    def __init__(self, text='', on_click=None, buttons=()):
+        self.text = text
+        self.on_click = on_click
+        self.buttons = list(buttons)
+
+    def click(self):
+        self.on_click()
+
+    def is_displayed(self):
+        return True
+
+    def find_elements(self, by, selector):
+        return self.buttons
+
+
+class FakeTripsDriver:
+    """ルート一覧と詳細パネルを切り替えるページ。back_works=Falseなら一覧に戻れない"""
+
+    def __init__(self, cards, back_works=True):
+        self.cards = cards
+        self.back_works = back_works
+        self.panel = None  # 詳細を開いているルートの番号
+        self.opened = []
+
+    def open(self, index):
+        self.panel = index
+        self.opened.append(index)
+
+    def find_elements(self, by, selector):
+        assert selector == "//div[@data-trip-index]"
+        if self.panel is not None:
+            return []
+        return [FakeElement(text) for text in self.cards]
+
+    def find_element(self, by, selector):
+        if selector.startswith("//div[@data-trip-index='"):
+            index = int(selector.split("'")[1])
+            button = FakeElement(on_click=lambda: self.open(index))
+            return FakeElement(self.cards[index], buttons=[button])
+        if selector in google_maps_scraper.DETAIL_TEXT_SELECTORS and self.panel is not None:
+            return FakeElement(DETAIL_TEXT)
+        raise LookupError(selector)
+
+    def execute_script(self, script, *args):
+        assert script == google_maps_scraper.WARM_LIST_SCRIPT
+        if self.back_works:
+            self.panel = None
+        return False
+
+
+def make_scraper(driver, warm_key=None):
+    """WebDriverを起動せずにスクレイパーを作る"""
+    scraper = GoogleMapsScraper.__new__(GoogleMapsScraper)
+    scraper.driver = driver
+    scraper.failure_code = None
+    scraper.warm_page = True
+    scraper._warm_key = warm_key
+    scraper.warm_stats = {'swapped': 0, 'fallback': 0}
+    return scraper
+
+
+def warm_scraper(driver):
+    scraper = make_scraper(driver)
+    scraper._warm_key = scraper._warm_page_key(ORIGIN, ARRIVAL)
+    return scraper
+
+
+def test_set_time_skipped_for_short_deadline_is_recorded():
+    driver = FakeDriver()
+    skipped = []
+    scraper = make_scraper(driver)
+
+    assert scraper.click_transit_and_set_time('10:00', Deadline(1), skipped)
+    assert skipped == ['set_time']
+    assert driver.calls == []
+
+
+def test_swap_skipped_for_key_mismatch(fake_selenium):
+    driver = FakeSwapDriver()
+    scraper = warm_scraper(driver)
+    dest = {'place_id': None, 'normalized_address': '東京都渋谷区神宮前1-8-10'}
+
+    # 出発地・到着時刻が違うページは使い回さない
+    assert scraper.swap_destination(ORIGIN, dest, 'Yawara', datetime(2025, 8, 20, 9, 0)) is None
+    assert scraper.swap_destination(dict(ORIGIN, place_id='ChIJother'), dest, 'Yawara', ARRIVAL) is None
+    assert driver.calls == []
+    assert scraper.warm_stats == {'swapped': 0, 'fallback': 0}
+
+
+def test_swap_keeps_destination_place_id_by_switching_url(fake_selenium):
+    driver = FakeSwapDriver()
+    scraper = warm_scraper(driver)
+    dest = {'place_id': 'ChIJdest', 'lat': None, 'lon': None, 'normalized_address': '東京都渋谷区神宮前1-8-10'}
+
+    # 入力欄ではPlace IDを指定できないため、Place ID入りのURLにアプリ内で切り替える
+    url = scraper.swap_destination(ORIGIN, dest, 'Yawara', ARRIVAL, Deadline(10))
+    assert url == driver.current_url == scraper.build_url_with_timestamp(ORIGIN, dest, ARRIVAL)
+    assert 'ChIJdest' in url
+    assert driver.typed == ''
+    assert scraper.warm_stats == {'swapped': 1, 'fallback': 0}
+
+
+def test_swap_waits_for_settled_list_and_returns_loaded_url(fake_selenium):
+    driver = FakeSwapDriver(settle_polls=2)
+    scraper = warm_scraper(driver)
+    dest = {'place_id': None, 'normalized_address': '東京都渋谷区神宮前1-8-10'}
+
+    url = scraper.swap_destination(ORIGIN, dest, 'Yawara', ARRIVAL, Deadline(10))
+    assert url == driver.current_url == 'https://www.google.com/maps/dir/origin/東京都渋谷区神宮前1-8-10/'
+    # 一覧の変化が止まるまで待つ（落ち着くまでの時間を毎回スクリプトに渡す）
+    assert driver.ready_polls == 3
+    assert driver.settle_args == [google_maps_scraper.WARM_SETTLE_MS] * 3
+    assert scraper.warm_stats == {'swapped': 1, 'fallback': 0}
+
+    # 駅・空港は名前で検索
+    scraper.swap_destination(ORIGIN, dest, '東京駅', ARRIVAL, Deadline(10))
+    assert driver.current_url.endswith('/東京駅/')
+
+
+def test_swap_falls_back_when_list_is_not_shown(fake_selenium):
+    driver = FakeSwapDriver(list_visible=False)
+    scraper = warm_scraper(driver)
+    dest = {'place_id': None, 'normalized_address': '東京都渋谷区神宮前1-8-10'}
+
+    assert scraper.swap_destination(ORIGIN, dest, 'Yawara', ARRIVAL, Deadline(0.2)) is None
+    assert scraper._warm_key is None
+    assert scraper.warm_stats == {'swapped': 0, 'fallback': 1}
+    assert google_maps_scraper.WARM_READY_SCRIPT not in driver.calls
+
+
+def test_expand_trip_details_reads_panel_and_returns_to_list(fake_selenium, monkeypatch):
+    monkeypatch.setattr(google_maps_scraper, 'DETAILS_EXPAND_WAIT', 0)
+    driver = FakeTripsDriver(['8 分\n19:46 - 19:54\n銀座線', '12 分\n19:50 - 20:02\n丸ノ内線'])
+    scraper = make_scraper(driver)
+
+    info = scraper.expand_trip_details(1, Deadline(10))
+    assert driver.opened == [1]
+    assert driver.panel is None
+    assert info['station_used'] == '神田'
+    assert (info['walk_to_station'], info['walk_from_station']) == (4, 1)
+
+
+def test_return_to_trip_list_gives_up_within_deadline(fake_selenium):
+    driver = FakeTripsDriver(['8 分\n19:46 - 19:54\n銀座線'], back_works=False)
+    driver.panel = 0
+    scraper = make_scraper(driver)
+
+    started = time.monotonic()
+    assert not scraper.return_to_trip_list(Deadline(0.3))
+    assert time.monotonic() - started < 2
+    driver.back_works = True
+    assert scraper.return_to_trip_list(Deadline(5))
+
+
+def test_all_details_keeps_cards_when_expansion_is_cut_short(fake_selenium):
+    driver = FakeTripsDriver(['8 分\n19:46 - 19:54\n銀座線', '12 分\n19:50 - 20:02\n丸ノ内線',
+                              '15 分\n19:48 - 20:03\n日比谷線'])
+    scraper = make_scraper(driver)
+    expanded = []
+
+    def expand(index, deadline=None):
+        expanded.append(index)
+        raise DeadlineExceeded('details')
+
+    scraper.expand_trip_details = expand
+    skipped = []
+    routes = scraper.extract_route_details(Deadline(60), details=True, skipped=skipped)
+
+    # 時間切れ以降の詳細展開は省略し、カードの情報は部分結果として残す
+    assert [route['travel_time'] for route in routes] == [8, 12, 15]
+    assert expanded == [0]
+    assert skipped == ['details:1', 'details:2', 'details:3']
+
+
+class FakeRouteDriver(FakeSwapDriver):
+    """scrape_routeを通しで動かす経路ページ（ルート一覧は常に表示）"""
+
+    def __init__(self):
+        super().__init__()
+        self.loaded = []
+
+    def get(self, url):
+        self.loaded.append(url)
+        self.current_url = url
+
+    def implicitly_wait(self, seconds):
+        pass
+
+    def set_page_load_timeout(self, seconds):
+        pass
+
+    def find_elements(self, by, selector):
+        assert selector == "//div[@data-trip-index]"
+        return [FakeElement('8 分\n19:46 - 19:54\n銀座線')]
+
+
+def test_scrape_route_swaps_warm_page_for_next_destination(fake_selenium, monkeypatch):
+    monkeypatch.setattr(request_scheduler, 'acquire', lambda *args, **kwargs: 0.0)
+    monkeypatch.setattr(time, 'sleep', lambda seconds: None)
+    driver = FakeRouteDriver()
+    scraper = make_scraper(driver)
+    scraper.lane = request_scheduler.BATCH
+    scraper.hub_url = None
+    scraper.route_count = 0
+    ids = dict(origin_place_id='ChIJorigin', origin_lat=35.69, origin_lon=139.77)
+
+    first = scraper.scrape_route('東京都千代田区神田須田町1-20-1', '東京都渋谷区神宮前1-8-10', 'Yawara',
+                                 ARRIVAL, dest_place_id='ChIJdest1', deadline=Deadline(8), **ids)
+    second = scraper.scrape_route('東京都千代田区神田須田町1-20-1', '東京都中央区日本橋2-4-1', '髙島屋',
+                                  ARRIVAL, dest_place_id='ChIJdest2', deadline=Deadline(8), **ids)
+
+    assert first['success'] and second['success']
+    # 2件目はページを読み込み直さず、Place ID入りのURLに差し替えた
+    assert driver.loaded == [first['url']]
+    assert 'ChIJdest2' in second['url'] and second['url'] == driver.current_url
+    assert second['place_ids'] == {'origin': 'ChIJorigin', 'destination': 'ChIJdest2'}
+    assert scraper.warm_stats == {'swapped': 1, 'fallback': 0}
+
+
+def test_other_page_loads_invalidate_warm_page(fake_selenium, monkeypatch):
+    monkeypatch.setattr(request_scheduler, 'acquire', lambda *args, **kwargs: 0.0)
+    monkeypatch.setattr(time, 'sleep', lambda seconds: None)
+    driver = FakeRouteDriver()
+    scraper = warm_scraper(driver)
+    scraper.lane = request_scheduler.BATCH
+
+    scraper.get_place_id('東京都渋谷区神宮前1-8-10', 'Yawara')
+    assert scraper._warm_key is None
+    assert scraper.swap_destination(ORIGIN, {'place_id': None, 'normalized_address': '渋谷'},
+                                    'Yawara', ARRIVAL) is None
+
+
+class FakeSweepDriver(FakeRouteDriver):
+    """fail_at回目の読み込みで例外、cancel_at回目の読み込み後にデッドラインを打ち切る"""
+
+    def __init__(self, fail_at=None, deadline=None, cancel_at=None):
+        super().__init__()
+        self.fail_at = fail_at
+        self.deadline = deadline
+        self.cancel_at = cancel_at
+
+    def get(self, url):
+        super().get(url)
+        if len(self.loaded) == self.fail_at:
+            raise RuntimeError('page crashed')
+        if len(self.loaded) == self.cancel_at:
+            self.deadline.cancel()
+
+    def execute_script(self, script, *args):
+        assert script == "window.location.href='about:blank'"
+
+
+def sweep_scraper(driver):
+    scraper = make_scraper(driver)
+    scraper.warm_page = False
+    scraper.lane = request_scheduler.BATCH
+    scraper.hub_url = None
+    scraper.route_count = 0
+    return scraper
+
+
+SLOTS = [datetime(2025, 8, 20, hour, 0) for hour in (8, 9, 10)]
+
+
+def test_sweep_records_failed_slot_and_continues(fake_selenium, monkeypatch):
+    monkeypatch.setattr(request_scheduler, 'acquire', lambda *args, **kwargs: 0.0)
+    monkeypatch.setattr(time, 'sleep', lambda seconds: None)
+    driver = FakeSweepDriver(fail_at=2)
+    samples = sweep_scraper(driver).sweep_arrival_times(
+        '東京都千代田区神田須田町1-20-1', '東京都中央区日本橋2-4-1', SLOTS, '髙島屋',
+        origin_place_id='ChIJorigin', dest_place_id='ChIJdest')
+
+    assert [s['arrival_slot'] for s in samples] == ['08:00', '09:00', '10:00']
+    assert [s['travel_time'] for s in samples] == [8, None, 8]
+
+
+def test_sweep_stops_at_deadline(fake_selenium, monkeypatch):
+    monkeypatch.setattr(request_scheduler, 'acquire', lambda *args, **kwargs: 0.0)
+    monkeypatch.setattr(time, 'sleep', lambda seconds: None)
+    deadline = Deadline(60)
+    driver = FakeSweepDriver(deadline=deadline, cancel_at=1)
+    samples = sweep_scraper(driver).sweep_arrival_times(
+        '東京都千代田区神田須田町1-20-1', '東京都中央区日本橋2-4-1', SLOTS, '髙島屋',
+        origin_place_id='ChIJorigin', dest_place_id='ChIJdest', deadline=deadline)
+
+    # 打ち切り後のスロットは読み込まずにtravel_time=Noneで残す
+    assert len(driver.loaded) == 1
+    assert [s['travel_time'] for s in samples] == [8, None, None]
+
+
+class FakeDetailDriver(FakeTripsDriver):
+    """「詳細」ボタンで1番目のルートの詳細パネルが開く経路ページ"""
+
+    def __init__(self):
+        super().__init__(['8 分\n11:23 - 11:31\n銀座線'])
+        self.current_url = None
+
+    def get(self, url):
+        self.current_url = url
+
+    def implicitly_wait(self, seconds):
+        pass
+
+    def set_page_load_timeout(self, seconds):
+        pass
+
+    def find_element(self, by, selector):
+        if selector == "//button[contains(@id, 'section-directions-trip-details-msg-0')]":
+            return FakeElement(on_click=lambda: self.open(0))
+        return super().find_element(by, selector)
+
+    def execute_script(self, script, *args):
+        assert script == "window.location.href='about:blank'"
+
+
+def test_first_details_result_is_built_like_list_result(fake_selenium, monkeypatch):
+    monkeypatch.setattr(request_scheduler, 'acquire', lambda *args, **kwargs: 0.0)
+    monkeypatch.setattr(time, 'sleep', lambda seconds: None)
+    successes = []
+    monkeypatch.setattr(google_maps_scraper.selenium_hub, 'get_registry',
+                        lambda: SimpleNamespace(record_success=successes.append))
+    driver = FakeDetailDriver()
+    scraper = sweep_scraper(driver)
+    scraper.hub_url = 'http://hub:4444'
+
+    result = scraper.scrape_route('東京都千代田区神田須田町1-20-1', '東京都中央区日本橋2-4-1', '髙島屋',
+                                  ARRIVAL, origin_place_id='ChIJorigin', dest_place_id='ChIJdest',
+                                  deadline=Deadline(60))
+
+    # 1番目のルートの詳細パネルから結果を返す場合も一覧経由と同じ形にする
+    assert driver.opened == [0]
+    assert result['success'] and result['travel_time'] == 8
+    assert result['station_used'] == '神田'
+    assert [route['travel_time'] for route in result['all_routes']] == [8]
+    # 重複排除用のキーも一覧経由の結果と同じく付く
+    assert result['cache_key'] == google_maps_scraper.maps_url.url_cache_key(result['url'])
+    assert successes == ['http://hub:4444']
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+selenium_hub.pyのテスト
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from selenium_hub import (
+    CircuitBreaker, HubRegistry, HubUnavailable, is_connection_error, status_url,
+    CLOSED, OPEN, HALF_OPEN
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_breaker(clock):
+    return CircuitBreaker(window_seconds=60, failure_rate=0.5, min_calls=3, open_seconds=30, clock=clock)
+
+
+def test_breaker_opens_and_probes():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED  # 試行数不足
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.retry_after() == 30
+
+    clock.now = 31
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()  # プローブは1件だけ
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+    clock.now = 62
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+
+
+def test_registry_prefers_least_loaded_and_fails_fast():
+    clock = FakeClock()
+    loads = {'http://a:4444/wd/hub': 0.9, 'http://b:4444/wd/hub': 0.1}
+    attempts = []
+
+    def factory(url, options):
+        attempts.append(url)
+        if url.startswith('http://b'):
+            raise ConnectionRefusedError('Connection refused')
+        return f'driver@{url}'
+
+    registry = HubRegistry(list(loads), remote_factory=factory, load_fetcher=loads.get,
+                           breaker_factory=lambda: make_breaker(clock), clock=clock)
+    driver, url = registry.create_session(None)
+    # 空いているbを先に試し、失敗したらaへ
+    assert attempts == ['http://b:4444/wd/hub', 'http://a:4444/wd/hub']
+    assert url == 'http://a:4444/wd/hub'
+
+    for hub in registry.hubs:
+        for _ in range(3):
+            hub.breaker.record_failure()
+    assert not registry.available()
+    attempts.clear()
+    with pytest.raises(HubUnavailable) as info:
+        registry.create_session(None)
+    assert attempts == []
+    assert info.value.retry_after == 30
+
+
+def test_helpers():
+    assert status_url('http://selenium:4444/wd/hub') == 'http://selenium:4444/status'
+    assert status_url('http://grid:4444/') == 'http://grid:4444/status'
+    assert is_connection_error(ConnectionRefusedError())
+    assert is_connection_error(Exception('Max retries exceeded with url: /session'))
+    assert not is_connection_error(ValueError('bad'))
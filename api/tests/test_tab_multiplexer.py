@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+tab_multiplexer.pyのテスト
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import request_scheduler
+from tab_multiplexer import TabMultiplexer, READY_SCRIPT
+
+
+class FakeSwitchTo:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def window(self, handle):
+        self.driver.current_window_handle = handle
+
+    def new_window(self, kind):
+        handle = f'tab{len(self.driver.tabs)}'
+        self.driver.tabs[handle] = {'url': 'about:blank', 'polls': 0}
+        self.driver.current_window_handle = handle
+
+
+class FakeDriver:
+    """遷移先URLの末尾の数字回だけポーリングされるとルート要素が出るタブ"""
+
+    def __init__(self):
+        self.tabs = {'tab0': {'url': 'https://www.google.com/maps', 'polls': 0}}
+        self.current_window_handle = 'tab0'
+        self.switch_to = FakeSwitchTo(self)
+        self.concurrent = 0
+        self.max_concurrent = 0
+
+    @property
+    def tab(self):
+        return self.tabs[self.current_window_handle]
+
+    def _loading(self):
+        return sum(1 for tab in self.tabs.values() if tab['url'] != 'about:blank')
+
+    def execute_script(self, script, *args):
+        if script == READY_SCRIPT:
+            if self.tab['url'] == 'about:blank':
+                return 0
+            self.tab['polls'] += 1
+            delay = int(self.tab['url'].rsplit('/', 1)[1])
+            return 3 if self.tab['polls'] > delay else 0
+        if args:
+            self.tab['url'] = args[0]
+            self.tab['polls'] = 0
+            self.max_concurrent = max(self.max_concurrent, self._loading())
+        else:
+            self.tab['url'] = 'about:blank'
+
+    def close(self):
+        del self.tabs[self.current_window_handle]
+
+
+class FakeScraper:
+    lane = request_scheduler.BATCH
+
+    def __init__(self):
+        self.driver = FakeDriver()
+        self.route_count = 0
+
+    def ensure_driver(self):
+        pass
+
+    def invalidate_warm_page(self):
+        pass
+
+    def resolve_place(self, address, name=None, place_id=None, lat=None, lon=None, deadline=None):
+        return {'place_id': place_id, 'normalized_address': address}
+
+    def build_url_with_timestamp(self, origin_info, dest_info, arrival_time):
+        return f"https://maps/{dest_info['normalized_address']}"
+
+    def extract_route_details(self, deadline=None):
+        delay = int(self.driver.tab['url'].rsplit('/', 1)[1])
+        return [{'travel_time': 10 + delay, 'route_type': '公共交通機関'}]
+
+    def build_route_result(self, routes, origin_address, dest_address, dest_name, origin_info, dest_info, url):
+        return {'success': True, 'travel_time': routes[0]['travel_time'], 'destination_name': dest_name}
+
+
+def test_results_keep_job_order_and_tabs_overlap(monkeypatch):
+    monkeypatch.setattr(request_scheduler, 'acquire', lambda *args, **kwargs: 0.0)
+    scraper = FakeScraper()
+    jobs = [{'origin_address': 'A', 'dest_address': str(delay), 'dest_name': f'D{delay}'}
+            for delay in (5, 1, 2, 0)]
+
+    results = TabMultiplexer(scraper, tabs=3, poll_interval=0).scrape_routes(jobs)
+
+    assert [r['travel_time'] for r in results] == [15, 11, 12, 10]
+    assert scraper.driver.max_concurrent == 3
+    # 追加したタブは閉じられ、最初のタブに戻る
+    assert list(scraper.driver.tabs) == ['tab0']
+    assert scraper.driver.current_window_handle == 'tab0'
+    assert scraper.route_count == 4
+
+
+def test_load_timeout(monkeypatch):
+    monkeypatch.setattr(request_scheduler, 'acquire', lambda *args, **kwargs: 0.0)
+    scraper = FakeScraper()
+    ticks = iter(range(1000))
+    multiplexer = TabMultiplexer(scraper, tabs=2, poll_interval=0, load_timeout=3,
+                                 clock=lambda: next(ticks))
+    results = multiplexer.scrape_routes([{'origin_address': 'A', 'dest_address': '99'}])
+    assert results[0]['success'] is False
+    assert results[0]['error'] == '読み込みタイムアウト'
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+transit_names.pyのテスト
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from transit_names import (Automaton, find_line, find_lines, normalize_line_name, normalize_line_names,
+                           clean_station_name, normalize_station_name)
+
+
+def test_longest_match_wins():
+    # 先勝ちだと「新宿線」→都営新宿線、「中央線」→JR中央線になってしまう
+    assert normalize_line_name('西武新宿線') == '西武新宿線'
+    assert normalize_line_name('都営新宿線各停本八幡行') == '都営新宿線'
+    assert normalize_line_name('中央線快速高尾行') == 'JR中央線快速'
+    assert normalize_line_name('JR中央・総武線各駅停車') == 'JR中央・総武線'
+    assert normalize_line_name('東京メトロ丸の内線') == '東京メトロ丸ノ内線'
+    assert normalize_line_name('バス') == 'バス'
+    assert normalize_line_names(['銀座線', '', '東京メトロ銀座線']) == ['東京メトロ銀座線', '', '東京メトロ銀座線']
+
+    assert find_line('銀座線各停渋谷行') == '銀座線'
+    assert find_line('中央線快速東京行') == '中央線快速'
+    assert find_line('徒歩') is None
+    assert find_lines('銀座線  日比谷線 西武新宿線') == ['銀座線', '日比谷線', '西武新宿線']
+
+
+def test_station_names():
+    assert normalize_station_name('日本橋駅') == '日本橋(東京都)'
+    assert normalize_station_name('市ヶ谷駅') == '市ケ谷(東京都)'
+    assert normalize_station_name('神田(東京都)') == '神田(東京都)'
+    assert clean_station_name('駅前広場') == '駅前広場'
+    # 出力はinternされる
+    assert clean_station_name('神田駅') is clean_station_name('神田')
+
+
+def test_automaton_reports_overlaps():
+    automaton = Automaton({'he': 1, 'she': 2, 'hers': 3, 'his': 4})
+    assert sorted(automaton.iter_matches('ushers')) == [(1, 4, 2), (2, 4, 1), (2, 6, 3)]
+    assert automaton.longest('ushers') == (2, 6, 3)
+    assert automaton.scan('ushers') == [(1, 4, 2)]
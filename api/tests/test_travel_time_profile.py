@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+travel_time_profile.pyのテスト
+区分線形補間とコンパクト保存形式の検証
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from travel_time_profile import TravelTimeProfile, load_profiles, save_profiles, profile_key, query_travel_time
+
+
+def test_query_interpolates_between_samples():
+    profile = TravelTimeProfile([(8 * 60, 30), (9 * 60, 20)])
+    assert profile.query('08:00') == 30
+    assert profile.query('08:30') == 25
+    assert profile.query('09:00') == 20
+
+
+def test_query_clamps_outside_range():
+    profile = TravelTimeProfile([(8 * 60, 30), (9 * 60, 20)])
+    assert profile.query('06:00') == 30
+    assert profile.query('23:00') == 20
+
+
+def test_failed_slots_are_skipped():
+    profile = TravelTimeProfile()
+    profile.add('08:00', 30)
+    profile.add('09:00', None)
+    profile.add('10:00', 40)
+    assert profile.points == [(480, 30), (600, 40)]
+
+
+def test_uniform_profile_is_stored_compactly():
+    profile = TravelTimeProfile([(480, 30), (540, 25), (600, 28)])
+    data = profile.to_dict()
+    assert data == {'start': 480, 'step': 60, 'times': [30, 25, 28]}
+    assert TravelTimeProfile.from_dict(data).points == profile.points
+
+
+def test_irregular_profile_roundtrip(tmp_path):
+    profile = TravelTimeProfile([(480, 30), (500, 25), (600, 28)])
+    path = tmp_path / 'profiles.json'
+    save_profiles({profile_key('物件', '東京駅'): profile}, str(path))
+    loaded = load_profiles(str(path))
+    assert loaded['物件|東京駅'].points == profile.points
+
+
+def test_query_travel_time_reads_saved_profiles(tmp_path):
+    path = str(tmp_path / 'profiles.json')
+    assert query_travel_time('物件A', '東京駅', '08:30', path) is None
+    save_profiles({profile_key('物件A', '東京駅'): TravelTimeProfile([(480, 30), (540, 20)])}, path)
+    assert query_travel_time('物件A', '東京駅', '08:30', path) == 25
+    assert query_travel_time('物件A', '渋谷駅', '08:30', path) is None
+
+    # 保存し直したら読み直す
+    save_profiles({profile_key('物件A', '東京駅'): TravelTimeProfile([(480, 40)])}, path)
+    os.utime(path, ns=(0, 10 ** 9))
+    assert query_travel_time('物件A', '東京駅', '08:30', path) == 40
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+東京の路線名・駅名の正規化
+既知の路線名（略称・正式名・別表記）からAho-Corasickオートマトンを事前構築し、
+テキスト中の路線名を1回の走査で見つける。複数の候補があれば最長一致を採用する
+（「西武新宿線」を「都営新宿線」と誤認しない、「中央線快速」を「中央線」に丸めない）。
+
+出力文字列はsys.internで共有し、同じ入力の再計算はlru_cacheで省く。
+"""
+
+import re
+import sys
+from functools import lru_cache
+
+# 略称 → 正式名（変換先のない私鉄等は、より短い路線名への誤一致を防ぐために登録）
+LINE_NAME_MAP = {
+    # 東京メトロ
+    "銀座線": "東京メトロ銀座線",
+    "丸ノ内線": "東京メトロ丸ノ内線",
+    "日比谷線": "東京メトロ日比谷線",
+    "東西線": "東京メトロ東西線",
+    "千代田線": "東京メトロ千代田線",
+    "有楽町線": "東京メトロ有楽町線",
+    "半蔵門線": "東京メトロ半蔵門線",
+    "南北線": "東京メトロ南北線",
+    "副都心線": "東京メトロ副都心線",
+    # JR
+    "山手線": "JR山手線",
+    "中央線": "JR中央線",
+    "中央線快速": "JR中央線快速",
+    "中央・総武線": "JR中央・総武線",
+    "総武線": "JR総武線",
+    "総武線快速": "JR総武線快速",
+    "京浜東北線": "JR京浜東北線",
+    "埼京線": "JR埼京線",
+    "京葉線": "JR京葉線",
+    "常磐線": "JR常磐線",
+    "横須賀線": "JR横須賀線",
+    "東海道線": "JR東海道線",
+    "湘南新宿ライン": "JR湘南新宿ライン",
+    # 都営
+    "浅草線": "都営浅草線",
+    "三田線": "都営三田線",
+    "新宿線": "都営新宿線",
+    "大江戸線": "都営大江戸線",
+    # 私鉄・その他
+    "西武新宿線": "西武新宿線",
+    "西武池袋線": "西武池袋線",
+    "京王線": "京王線",
+    "京王新線": "京王新線",
+    "井の頭線": "京王井の頭線",
+    "小田急線": "小田急線",
+    "東横線": "東急東横線",
+    "田園都市線": "東急田園都市線",
+    "目黒線": "東急目黒線",
+    "東上線": "東武東上線",
+    "りんかい線": "りんかい線",
+    "ゆりかもめ": "ゆりかもめ",
+    "つくばエクスプレス": "つくばエクスプレス",
+}
+
+# 別表記 → 略称
+LINE_VARIANTS = {
+    "丸の内線": "丸ノ内線",
+    "京王井の頭線": "井の頭線",
+    "小田急小田原線": "小田急線",
+}
+
+# 駅名の表記ゆれ（Google Maps表示 → 保存データの表記）
+STATION_ALIASES = {
+    "市ヶ谷": "市ケ谷",
+    "霞ヶ関": "霞ケ関",
+    "千駄ヶ谷": "千駄ケ谷",
+    "阿佐ヶ谷": "阿佐ケ谷",
+    "お茶の水": "御茶ノ水",
+}
+
+# 駅名末尾の「駅」（「駅前」等の途中の「駅」は残す）
+STATION_SUFFIX = re.compile(r'駅(?=$|[\s（(、,])')
+TOKYO_SUFFIX = "(東京都)"
+
+
+class Automaton:
+    """
+    Aho-Corasickオートマトン（パターン → 値）
+
+    パターンの重なりは最長一致で解決する
+    """
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.outputs = [()]   # ノードで終わるパターン（長さ, 値）。失敗リンク先の分も含む
+        for pattern, value in patterns.items():
+            self._add(pattern, value)
+        self._link()
+
+    def _add(self, pattern, value):
+        node = 0
+        for char in pattern:
+            nxt = self.goto[node].get(char)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[node][char] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.outputs.append(())
+            node = nxt
+        self.outputs[node] = ((len(pattern), value),)
+
+    def _link(self):
+        """幅優先で失敗リンクを張り、出力を長い順にまとめる"""
+        queue = list(self.goto[0].values())
+        for node in queue:
+            for char, child in self.goto[node].items():
+                state = self.fail[node]
+                while state and char not in self.goto[state]:
+                    state = self.fail[state]
+                self.fail[child] = self.goto[state].get(char, 0)
+                self.outputs[child] = tuple(sorted(self.outputs[child] + self.outputs[self.fail[child]],
+                                                   reverse=True))
+                queue.append(child)
+
+    def iter_matches(self, text):
+        """全ての一致を (開始, 終了, 値) で返す"""
+        node = 0
+        for end, char in enumerate(text, 1):
+            while node and char not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(char, 0)
+            for length, value in self.outputs[node]:
+                yield end - length, end, value
+
+    def longest(self, text):
+        """最長一致（同じ長さなら先頭側）。見つからなければNone"""
+        best = None
+        for start, end, value in self.iter_matches(text):
+            if best is None or end - start > best[1] - best[0] or \
+                    (end - start == best[1] - best[0] and start < best[0]):
+                best = (start, end, value)
+        return best
+
+    def scan(self, text):
+        """重ならない一致を左から最長優先で返す"""
+        matches = sorted(self.iter_matches(text), key=lambda m: (m[0], m[0] - m[1]))
+        result = []
+        position = 0
+        for start, end, value in matches:
+            if start >= position:
+                result.append((start, end, value))
+                position = end
+        return result
+
+
+def _line_patterns():
+    """略称・正式名・別表記 → 略称"""
+    patterns = {}
+    for short, full in LINE_NAME_MAP.items():
+        patterns[short] = short
+        patterns[full] = short
+    for variant, short in LINE_VARIANTS.items():
+        patterns[variant] = short
+    return patterns
+
+
+LINE_AUTOMATON = Automaton(_line_patterns())
+STATION_AUTOMATON = Automaton(STATION_ALIASES)
+
+
+@lru_cache(maxsize=4096)
+def find_line(text):
+    """
+    テキスト中の既知の路線名（最長一致）を、テキスト上の表記のまま返す
+    例: "銀座線各停渋谷行" → "銀座線"、"中央線快速高尾行" → "中央線快速"
+
+    Returns:
+        見つからなければNone
+    """
+    if not text:
+        return None
+    match = LINE_AUTOMATON.longest(text)
+    return sys.intern(text[match[0]:match[1]]) if match else None
+
+
+def find_lines(text):
+    """テキスト中の既知の路線名を出現順に全て返す（ヘッダーの路線一覧用）"""
+    if not text:
+        return []
+    return [sys.intern(text[start:end]) for start, end, _ in LINE_AUTOMATON.scan(text)]
+
+
+@lru_cache(maxsize=4096)
+def normalize_line_name(line_name):
+    """路線名を正式名に正規化（既知の路線が含まれなければそのまま）"""
+    if not line_name:
+        return line_name
+    match = LINE_AUTOMATON.longest(line_name)
+    if not match:
+        return line_name
+    return sys.intern(LINE_NAME_MAP[match[2]])
+
+
+@lru_cache(maxsize=4096)
+def clean_station_name(station_name):
+    """駅名から末尾の「駅」を除き、表記ゆれを揃える（例: "市ヶ谷駅" → "市ケ谷"）"""
+    if not station_name:
+        return station_name
+    cleaned = STATION_SUFFIX.sub('', station_name).strip()
+    parts = []
+    position = 0
+    for start, end, value in STATION_AUTOMATON.scan(cleaned):
+        parts.append(cleaned[position:start])
+        parts.append(value)
+        position = end
+    parts.append(cleaned[position:])
+    return sys.intern(''.join(parts))
+
+
+@lru_cache(maxsize=4096)
+def normalize_station_name(station_name):
+    """駅名を正規化（「駅」を除いて「(東京都)」を追加）"""
+    if not station_name:
+        return station_name
+    if TOKYO_SUFFIX in station_name:
+        return station_name
+    return sys.intern(f"{clean_station_name(station_name)}{TOKYO_SUFFIX}")
+
+
+def normalize_line_names(line_names):
+    """複数の路線名をまとめて正規化"""
+    return [normalize_line_name(name) for name in line_names]
+
+
+def normalize_station_names(station_names):
+    """複数の駅名をまとめて正規化"""
+    return [normalize_station_name(name) for name in station_names]
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+到着時刻別の所要時間プロファイル
+1ルートにつき複数の到着時刻でスクレイピングした結果を
+区分線形プロファイルとして保存し、任意の到着時刻の所要時間を返す
+"""
+
+import json
+import os
+import threading
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+import atomic_io
+
+PROFILES_FILE = '/app/output/japandatascience.com/timeline-mapping/data/travel_time_profiles.json'
+
+_loaded = {}  # path -> (更新時刻, プロファイル)
+_loaded_lock = threading.Lock()
+
+
+def to_minute_of_day(value):
+    """"HH:MM"文字列・datetime・分（int）を0時からの分に変換"""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        hour, minute = map(int, value.split(':'))
+        return hour * 60 + minute
+    return value.hour * 60 + value.minute
+
+
+class TravelTimeProfile:
+    """
+    到着時刻（0時からの分）→所要時間（分）の区分線形プロファイル
+
+    サンプル間は線形補間、範囲外は端の値を使用する。
+    等間隔サンプルは{"start", "step", "times"}の形でコンパクトに保存する。
+    """
+
+    def __init__(self, points: Optional[List[Tuple[int, int]]] = None):
+        self.points = []  # [(arrival_minute, travel_time)] 到着時刻順
+        for minute, travel_time in points or []:
+            self.add(minute, travel_time)
+
+    def add(self, arrival, travel_time):
+        """サンプルを追加（同じ到着時刻は上書き）"""
+        if travel_time is None:
+            return
+        minute = to_minute_of_day(arrival)
+        keys = [p[0] for p in self.points]
+        i = bisect_left(keys, minute)
+        if i < len(keys) and keys[i] == minute:
+            self.points[i] = (minute, int(travel_time))
+        else:
+            self.points.insert(i, (minute, int(travel_time)))
+
+    def query(self, arrival) -> Optional[int]:
+        """任意の到着時刻の所要時間（分）"""
+        if not self.points:
+            return None
+        minute = to_minute_of_day(arrival)
+        keys = [p[0] for p in self.points]
+        i = bisect_left(keys, minute)
+        if i < len(keys) and keys[i] == minute:
+            return self.points[i][1]
+        if i == 0:
+            return self.points[0][1]
+        if i == len(keys):
+            return self.points[-1][1]
+        (m0, t0), (m1, t1) = self.points[i - 1], self.points[i]
+        return int(round(t0 + (t1 - t0) * (minute - m0) / (m1 - m0)))
+
+    def to_dict(self) -> Dict:
+        """JSON保存用のコンパクト表現"""
+        if len(self.points) >= 2:
+            step = self.points[1][0] - self.points[0][0]
+            uniform = all(self.points[i + 1][0] - self.points[i][0] == step
+                          for i in range(len(self.points) - 1))
+            if uniform:
+                return {
+                    'start': self.points[0][0],
+                    'step': step,
+                    'times': [t for _, t in self.points]
+                }
+        return {'points': [list(p) for p in self.points]}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'TravelTimeProfile':
+        if 'times' in data:
+            start, step = data['start'], data['step']
+            return cls([(start + i * step, t) for i, t in enumerate(data['times'])])
+        return cls([tuple(p) for p in data.get('points', [])])
+
+
+def profile_key(origin, destination):
+    """プロファイルの保存キー（物件名|目的地名）"""
+    return f"{origin}|{destination}"
+
+
+def load_profiles(path=PROFILES_FILE) -> Dict[str, TravelTimeProfile]:
+    """保存済みプロファイルを読み込む"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return {key: TravelTimeProfile.from_dict(p) for key, p in data.get('profiles', {}).items()}
+
+
+def save_profiles(profiles: Dict[str, TravelTimeProfile], path=PROFILES_FILE):
+    """プロファイルを保存"""
+    data = {
+        'version': 1,
+        'profiles': {key: profile.to_dict() for key, profile in profiles.items()}
+    }
+    atomic_io.atomic_write_json(path, data, indent=None, separators=(',', ':'))
+
+
+def query_travel_time(origin, destination, arrival, path=PROFILES_FILE) -> Optional[int]:
+    """
+    保存済みプロファイルから任意の到着時刻の所要時間（分）を返す
+    ファイルは更新時刻が変わったときだけ読み直す
+
+    Returns:
+        所要時間（分）。ファイル・ルートのプロファイルがなければNone
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _loaded_lock:
+        cached = _loaded.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, load_profiles(path))
+            _loaded[path] = cached
+    profile = cached[1].get(profile_key(origin, destination))
+    return profile.query(arrival) if profile else None
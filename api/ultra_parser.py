@@ -8,6 +8,8 @@ import re
 import json
 from datetime import datetime
 
+import transit_names
+
 def parse_google_maps_panel(panel_text):
     """
     Parse Google Maps directions panel with a structured approach
@@ -46,7 +48,7 @@ def extract_header_info(header_lines):
     for line in header_lines:
         if '線' in line and len(line) < 50:
             # Extract all line names
-            line_names = re.findall(r'([^\s、]+線)', line)
+            line_names = transit_names.find_lines(line) or re.findall(r'([^\s、]+線)', line)
             info['lines_summary'].extend(line_names)
     
     return info
@@ -211,7 +213,12 @@ def extract_train_duration(details):
 
 def extract_line_name(action):
     """Extract train line name from action text"""
-    # First try to find specific line patterns
+    # Known lines first (longest match, e.g. 中央線快速 rather than 中央線)
+    known = transit_names.find_line(action)
+    if known:
+        return known
+    
+    # Then try to find specific line patterns
     patterns = [
         r'(東京メトロ[^各停急行快速\s]+線)',
         r'(都営[^各停急行快速\s]+線)',
@@ -239,13 +246,10 @@ def clean_station_name(location):
     if not location or '〒' in location:
         return None
     
-    # Remove common suffixes
-    station = location.replace('駅', '').strip()
-    
-    # Remove any address info after station name
-    station = re.split(r'[、,]', station)[0]
+    # Remove any address info after station name, then the 駅 suffix and spelling variants
+    station = re.split(r'[、,]', location)[0]
     
-    return station
+    return transit_names.clean_station_name(station)
 
 def calculate_wait_time(arrival_time, departure_time):
     """Calculate wait time between arrival and departure"""
@@ -7,6 +7,9 @@ v3スクレイパーの結果に基づいて、ルフォンプログレ神田プ
 
 import json
 
+import atomic_io
+import data_versions
+
 def update_properties():
     # v3スクレイパーの結果（v3_results_summary.htmlから）
     new_times = {
@@ -52,17 +55,10 @@ def update_properties():
                     if dest_id == "tokyo_station":
                         print(f"    注意: 車ルートとして検出されています（要改善）")
     
-    # バックアップを作成
-    from datetime import datetime
-    backup_filename = f'/app/output/japandatascience.com/timeline-mapping/data/properties_backup_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json'
-    with open(backup_filename, 'w', encoding='utf-8') as f:
-        with open('/app/output/japandatascience.com/timeline-mapping/data/properties.json', 'r', encoding='utf-8') as orig:
-            f.write(orig.read())
-    print(f"\nバックアップ作成: {backup_filename}")
-    
-    # 更新したデータを保存
-    with open('/app/output/japandatascience.com/timeline-mapping/data/properties.json', 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=4)
+    # 更新したデータを保存（置き換え前の内容は data/.snapshots/ に世代として残る）
+    atomic_io.atomic_write_json('/app/output/japandatascience.com/timeline-mapping/data/properties.json', data,
+                                snapshots=atomic_io.SNAPSHOT_KEEP, indent=4)
+    data_versions.publish('/app/output/japandatascience.com/timeline-mapping/data/properties.json')
     
     print(f"\nproperties.json を更新しました")
     print("\n=== 更新後の所要時間一覧 ===")
@@ -5,6 +5,7 @@ import sys
 sys.path.append('/app/output/japandatascience.com/timeline-mapping/api')
 
 from collect_place_ids import PlaceIdCollector
+import atomic_io
 import json
 
 collector = PlaceIdCollector()
@@ -54,8 +55,8 @@ for dest in data['destinations']:
         print(f"✅ 羽田空港を更新: {dest['place_id']}")
 
 # ファイル保存
-with open('/app/output/japandatascience.com/timeline-mapping/data/destinations.json', 'w', encoding='utf-8') as f:
-    json.dump(data, f, ensure_ascii=False, indent=2)
+atomic_io.atomic_write_json('/app/output/japandatascience.com/timeline-mapping/data/destinations.json', data,
+                            snapshots=atomic_io.SNAPSHOT_KEEP)
 
 collector.close()
 
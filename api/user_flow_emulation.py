@@ -8,22 +8,18 @@ json-generator.html のユーザー操作を再現して
 
 import sys
 import os
-import json
 import time
 from datetime import datetime, timedelta
-import pytz
+from jst import JST
 
 sys.path.insert(0, '/app/output/japandatascience.com/timeline-mapping/api')
 
 from google_maps_scraper import GoogleMapsScraper
 from json_data_loader import JsonDataLoader
+import atomic_io
 import logging
+import log_setup
 
-# ロギング設定
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 class UserFlowEmulator:
@@ -75,8 +71,7 @@ class UserFlowEmulator:
         logger.info("=" * 60)
         
         # 到着時刻設定（明日の10:00）
-        jst = pytz.timezone('Asia/Tokyo')
-        tomorrow = datetime.now(jst) + timedelta(days=1)
+        tomorrow = datetime.now(JST) + timedelta(days=1)
         arrival_time = tomorrow.replace(hour=10, minute=0, second=0, microsecond=0)
         
         # 検索対象を制限
@@ -218,8 +213,7 @@ class UserFlowEmulator:
         # JSONファイルに保存
         output = {'properties': properties_data}
         
-        with open(self.final_properties_file, 'w', encoding='utf-8') as f:
-            json.dump(output, f, ensure_ascii=False, indent=2)
+        atomic_io.atomic_write_json(self.final_properties_file, output, snapshots=atomic_io.SNAPSHOT_KEEP)
         
         logger.info(f"✅ properties_emulated.json を生成しました")
         logger.info(f"   保存先: {self.final_properties_file}")
@@ -236,8 +230,7 @@ class UserFlowEmulator:
     
     def _save_intermediate_progress(self, progress):
         """中間進捗を保存"""
-        with open(self.intermediate_file, 'w', encoding='utf-8') as f:
-            json.dump(progress, f, ensure_ascii=False, indent=2)
+        atomic_io.atomic_write_json(self.intermediate_file, progress)
     
     def cleanup(self):
         """クリーンアップ処理"""
@@ -293,6 +286,7 @@ class UserFlowEmulator:
 
 
 if __name__ == "__main__":
+    log_setup.configure()
     emulator = UserFlowEmulator()
     
     # 2物件でテスト実行（エラーチェック用）